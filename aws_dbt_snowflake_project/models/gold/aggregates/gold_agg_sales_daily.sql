@@ -0,0 +1,44 @@
+{{ config(
+    materialized='incremental',
+    unique_key='order_date',
+    incremental_strategy='delete+insert',
+    tags=['gold', 'aggregate', 'dashboard']
+) }}
+
+-- Daily sales rollup backing the dashboard time series.
+-- Additive measures roll up to week/month with SUM; distinct customers are
+-- stored as HyperLogLog states and merged with HLL_COMBINE at query time.
+
+WITH orders AS (
+    SELECT * FROM {{ ref('gold_fact_order_summary') }}
+    {% if is_incremental() %}
+    -- Re-aggregate a trailing window of days so late status changes
+    -- (e.g. shipped -> delivered) replace the affected days entirely
+    WHERE order_purchase_timestamp >= (
+        SELECT DATEADD(DAY, -{{ var('sales_daily_lookback_days', 30) }}, MAX(order_date)) FROM {{ this }}
+    )
+    {% endif %}
+),
+
+daily AS (
+    SELECT
+        order_purchase_timestamp::DATE AS order_date,
+        order_status,
+        
+        -- Additive measures (one row per order in the fact table)
+        COUNT(DISTINCT order_id) AS order_count,
+        SUM(total_order_value) AS revenue,
+        COUNT(total_order_value) AS revenue_order_count,
+        SUM(total_items) AS total_items,
+        SUM(total_freight_value) AS total_freight_value,
+        
+        -- Mergeable distinct-count sketches
+        HLL_ACCUMULATE(customer_id) AS customer_hll,
+        
+        CURRENT_TIMESTAMP() AS dw_updated_at
+    FROM orders
+    WHERE order_purchase_timestamp IS NOT NULL
+    GROUP BY 1, 2
+)
+
+SELECT * FROM daily
@@ -0,0 +1,104 @@
+"""
+Benchmark: Arrow batch fetching vs pd.read_sql on an OBT-shaped result set
+
+Each method runs in a fresh process against a DuckDB table with the same
+columns as gold_obt_orders_ml_export, so peak RSS is not polluted by the
+other method. Before timing, rebatch() is checked against result chunks
+with mixed integer widths (as Snowflake sends them); the script exits
+non-zero if it fails.
+
+Usage:
+    python benchmarks/bench_arrow_fetch.py --rows 1000000
+"""
+import argparse
+import multiprocessing as mp
+import sys
+import time
+import warnings
+
+from common import PeakRSSMonitor, create_ml_export_table
+
+METHODS = ['read_sql', 'arrow', 'arrow_nullable']
+
+
+def _run(method: str, n_rows: int, queue):
+    import duckdb
+    import pandas as pd
+    from arrow_fetch import fetch_dataframe
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    conn = duckdb.connect()
+    create_ml_export_table(conn, n_rows)
+    query = "SELECT * FROM gold_obt_orders_ml_export"
+
+    with PeakRSSMonitor() as rss:
+        started = time.perf_counter()
+        if method == 'read_sql':
+            df = pd.read_sql(query, conn)
+        elif method == 'arrow':
+            df = fetch_dataframe(conn, query)
+        else:
+            df = fetch_dataframe(conn, query, dtype_backend='numpy_nullable')
+        elapsed = time.perf_counter() - started
+
+    queue.put({
+        'method': method,
+        'rows': len(df),
+        'seconds': elapsed,
+        'rows_per_sec': len(df) / elapsed,
+        'peak_rss_delta_mb': rss.delta_mb,
+        'frame_mb': df.memory_usage(deep=True).sum() / 1024 ** 2,
+        'object_columns': int((df.dtypes == object).sum()),
+    })
+
+
+def check_rebatch() -> bool:
+    """rebatch() over chunks whose integer columns narrow and widen per chunk"""
+    import pyarrow as pa
+    from arrow_fetch import rebatch
+
+    chunks = [
+        pa.table({'ORDER_ID': pa.array([1, 2], pa.int8()), 'PRICE': pa.array([None, None], pa.null())}),
+        pa.table({'ORDER_ID': pa.array([300, 70000], pa.int32()), 'PRICE': pa.array([9.5, 1.25])}),
+        pa.table({'ORDER_ID': pa.array([2 ** 40], pa.int64()), 'PRICE': pa.array([3.0])}),
+        pa.table({'ORDER_ID': pa.array([5, 6, 7], pa.int16()), 'PRICE': pa.array([1.0, 2.0, 3.0])}),
+    ]
+    try:
+        tables = list(rebatch(iter(chunks), batch_rows=3))
+    except pa.ArrowInvalid as e:
+        print(f"FAIL  rebatch over mixed integer widths: {e}")
+        return False
+    order_ids = [v for t in tables for v in t.column('ORDER_ID').to_pylist()]
+    ok = (order_ids == [1, 2, 300, 70000, 2 ** 40, 5, 6, 7]
+          and all(t.schema.field('ORDER_ID').type == pa.int64() for t in tables))
+    print(f"{'PASS' if ok else 'FAIL'}  rebatch over mixed integer widths "
+          f"({', '.join(str(t.schema.field('ORDER_ID').type) for t in tables)})")
+    return ok
+
+
+def run(n_rows: int) -> list:
+    ctx = mp.get_context('spawn')
+    results = []
+    for method in METHODS:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(method, n_rows, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=500_000)
+    args = parser.parse_args()
+
+    if not check_rebatch():
+        sys.exit(1)
+
+    print(f"\n=== Fetch benchmark ({args.rows:,} rows) ===")
+    print(f"{'method':<16}{'seconds':>10}{'rows/sec':>14}{'peak RSS Δ MB':>16}{'frame MB':>11}{'object cols':>13}")
+    for r in run(args.rows):
+        print(f"{r['method']:<16}{r['seconds']:>10.2f}{r['rows_per_sec']:>14,.0f}"
+              f"{r['peak_rss_delta_mb']:>16.1f}{r['frame_mb']:>11.1f}{r['object_columns']:>13}")
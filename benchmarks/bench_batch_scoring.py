@@ -0,0 +1,117 @@
+"""
+Benchmark: sharded parallel batch scoring vs scoring the full frame in one process
+
+Scores gold_obt_orders_ml_export of the offline DuckDB backend (synthetic
+Olist at --scale) with a delivery-delay model trained on a sample of it.
+Each configuration runs in a fresh process:
+
+- single:  SnowflakeDataLoader.load_obt_data + one predict_with_confidence
+           call (what DeliveryDelayPredictor.get_high_risk_orders does)
+- sharded: batch_scoring.run_batch_scoring with N workers, writing
+           partitioned parquet (--workers lists the pool sizes to try)
+
+Peak RSS is the largest ru_maxrss of any process doing the scoring.
+
+Usage:
+    python benchmarks/bench_batch_scoring.py --scale 10 --workers 1 4 8
+    python benchmarks/bench_batch_scoring.py --scale 1 --partition-by hash --buckets 32
+"""
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+import common  # noqa: F401  (puts ml_pipeline/src on sys.path)
+
+TARGET = 'IS_DELAYED'
+
+
+def _setup(scale: float, model_path: str, train_rows: int = 50_000) -> int:
+    import logging
+    from load_training_data import SnowflakeDataLoader
+    from train_model import MLTrainer
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.INFO)
+    with SnowflakeDataLoader(use_cache=False) as loader:
+        df = loader.load_obt_data(sample_size=train_rows)
+        rows = int(loader.conn.execute("SELECT COUNT(*) FROM gold_obt_orders_ml_export").fetchone()[0])
+    trainer = MLTrainer('xgboost')
+    trainer.train(df.drop(columns=[TARGET]), df[TARGET])
+    trainer.save_model(model_path)
+    return rows
+
+
+def _single(model_path: str, queue):
+    import logging
+    from load_training_data import SnowflakeDataLoader
+    from predict import _scoring_features, get_registry
+    from train_grid import _peak_rss_mb
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.INFO)
+    predictor = get_registry().get(model_path)
+    started = time.perf_counter()
+    with SnowflakeDataLoader(use_cache=False) as loader:
+        df = loader.load_obt_data()
+    predictions = predictor.predict_with_confidence(_scoring_features(predictor, df))
+    queue.put({'rows': len(predictions), 'seconds': time.perf_counter() - started, 'peak_rss_mb': _peak_rss_mb()})
+
+
+def _sharded(model_path: str, output_dir: str, workers: int, partition_by: str, buckets: int, queue):
+    import logging
+    from batch_scoring import run_batch_scoring
+    from train_grid import _peak_rss_mb
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.INFO)
+    started = time.perf_counter()
+    metrics = run_batch_scoring(model_path, output_dir, partition_by=partition_by, buckets=buckets,
+                                workers=workers)
+    queue.put({'rows': int(metrics['rows'].sum()), 'seconds': time.perf_counter() - started,
+               'partitions': len(metrics),
+               'peak_rss_mb': max(metrics['peak_rss_mb'].max(), _peak_rss_mb())})
+
+
+def run(scale: float, workers: list, partition_by: str = 'month', buckets: int = 16) -> list:
+    os.environ.update(DATA_BACKEND='duckdb', DUCKDB_SCALE=str(scale))
+    work_dir = tempfile.mkdtemp(prefix='batch_scoring_bench_')
+    model_path = os.path.join(work_dir, 'IS_DELAYED_xgboost_model.pkl')
+    ctx = mp.get_context('spawn')
+    try:
+        with ctx.Pool(1) as pool:
+            pool.apply(_setup, (scale, model_path))
+
+        configs = [('single', _single, (model_path,))]
+        configs += [(f"sharded x{n}", _sharded, (model_path, os.path.join(work_dir, f"out{n}"), n,
+                                                 partition_by, buckets))
+                    for n in workers]
+        results = []
+        for label, target, args in configs:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=target, args=(*args, queue))
+            proc.start()
+            result = queue.get()
+            proc.join()
+            results.append({'config': label, 'rows_per_sec': result['rows'] / result['seconds'], **result})
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument('--partition-by', choices=['month', 'hash'], default='month')
+    parser.add_argument('--buckets', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"\n=== Batch scoring (synthetic Olist ×{args.scale:g}, partition by {args.partition_by}) ===")
+    print(f"{'config':<14}{'rows':>12}{'seconds':>10}{'rows/sec':>12}{'peak RSS MB':>14}")
+    for r in run(args.scale, args.workers, args.partition_by, args.buckets):
+        print(f"{r['config']:<14}{r['rows']:>12,}{r['seconds']:>10.2f}{r['rows_per_sec']:>12,.0f}"
+              f"{r['peak_rss_mb']:>14.1f}")
@@ -0,0 +1,109 @@
+"""
+Benchmark: compiled (flattened NumPy) trees vs the libraries' own predictors
+
+Trains each model type on a synthetic ML export table, saves it with
+MLTrainer.save_model (which writes <name>_compiled.pkl), and scores through
+ModelPredictor with backend='native' and backend='compiled':
+
+- single row: predict_proba latency on one-row frames (p50/p99)
+- batch:      predict_proba throughput on --batch-rows rows
+
+Both paths include the preprocessor. max |dp| is the largest probability
+difference between the two backends.
+
+Usage:
+    python benchmarks/bench_compiled_trees.py --batch-rows 1000000
+    python benchmarks/bench_compiled_trees.py --models xgboost lightgbm --single-calls 5000
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from common import create_ml_export_table
+
+MODELS = ['xgboost', 'lightgbm', 'catboost', 'random_forest']
+TARGET = 'is_delayed'
+
+
+def _frame(n_rows: int):
+    import duckdb
+    from arrow_fetch import fetch_dataframe
+
+    conn = duckdb.connect()
+    create_ml_export_table(conn, n_rows)
+    return fetch_dataframe(conn, "SELECT * FROM gold_obt_orders_ml_export")
+
+
+def _single_row(predictor, frame, calls: int) -> np.ndarray:
+    rows = [frame.iloc[[i % len(frame)]] for i in range(calls)]
+    latencies = np.empty(calls)
+    for i, row in enumerate(rows):
+        started = time.perf_counter()
+        predictor.predict_proba(row)
+        latencies[i] = time.perf_counter() - started
+    return latencies * 1000
+
+
+def run(models: list, train_rows: int, batch_rows: int, single_calls: int) -> list:
+    from predict import ModelPredictor
+    from train_model import MLTrainer
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.INFO)
+    train = _frame(train_rows)
+    batch = _frame(batch_rows)
+    model_dir = tempfile.mkdtemp(prefix='compiled_bench_')
+    results = []
+    try:
+        for model_type in models:
+            if model_type == 'catboost' and importlib.util.find_spec('catboost') is None:
+                print("   catboost not installed, skipped")
+                continue
+            trainer = MLTrainer(model_type)
+            trainer.train(train, train[TARGET])
+            path = os.path.join(model_dir, f"{TARGET}_{model_type}_model.pkl")
+            trainer.save_model(path)
+
+            probabilities = {}
+            for backend in ('native', 'compiled'):
+                predictor = ModelPredictor(path, backend=backend)
+                if backend == 'compiled' and predictor.compiled is None:
+                    print(f"   {model_type}: not compiled, skipped")
+                    break
+                predictor.predict_proba(batch.head(10))  # warm up
+                latencies = _single_row(predictor, batch, single_calls)
+                started = time.perf_counter()
+                probabilities[backend] = predictor.predict_proba(batch)[:, 1]
+                elapsed = time.perf_counter() - started
+                results.append({'model_type': model_type, 'backend': backend,
+                                'p50_ms': float(np.percentile(latencies, 50)),
+                                'p99_ms': float(np.percentile(latencies, 99)),
+                                'batch_s': elapsed, 'rows_per_sec': len(batch) / elapsed})
+            if len(probabilities) == 2:
+                results[-1]['max_diff'] = float(np.abs(probabilities['native'] - probabilities['compiled']).max())
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--models', nargs='+', default=MODELS, choices=MODELS)
+    parser.add_argument('--train-rows', type=int, default=100_000)
+    parser.add_argument('--batch-rows', type=int, default=1_000_000)
+    parser.add_argument('--single-calls', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"\n=== Compiled trees ({args.single_calls:,} single-row calls, {args.batch_rows:,}-row batch) ===")
+    print(f"{'model':<15}{'backend':<10}{'p50 ms':>9}{'p99 ms':>9}{'batch s':>10}{'rows/sec':>13}{'max |dp|':>11}")
+    for r in run(args.models, args.train_rows, args.batch_rows, args.single_calls):
+        diff = f"{r['max_diff']:.1e}" if 'max_diff' in r else ''
+        print(f"{r['model_type']:<15}{r['backend']:<10}{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}"
+              f"{r['batch_s']:>10.2f}{r['rows_per_sec']:>13,.0f}{diff:>11}")
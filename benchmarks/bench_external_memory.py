@@ -0,0 +1,100 @@
+"""
+Benchmark: external-memory (out-of-core) vs in-memory training
+
+Writes a synthetic ML export table to parquet (--row-group-rows rows per
+row group), then trains each model type two ways, each in a fresh process
+so peak RSS is not polluted by the other run:
+
+- in_memory: pd.read_parquet + MLTrainer.train
+- external:  MLTrainer.train_external_memory (row groups streamed into
+             XGBoost's ExtMemQuantileDMatrix / a LightGBM Sequence Dataset)
+
+Usage:
+    python benchmarks/bench_external_memory.py --rows 2000000
+    python benchmarks/bench_external_memory.py --rows 500000 --row-group-rows 50000 --models lightgbm
+"""
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+from common import PeakRSSMonitor, create_ml_export_table
+
+MODELS = ['xgboost', 'lightgbm']
+MODES = ['in_memory', 'external']
+TARGET = 'is_delayed'
+
+
+def _write_parquet(n_rows: int, row_group_rows: int, path: str):
+    import duckdb
+
+    conn = duckdb.connect()
+    create_ml_export_table(conn, n_rows)
+    conn.execute(f"COPY gold_obt_orders_ml_export TO '{path}' (FORMAT parquet, ROW_GROUP_SIZE {int(row_group_rows)})")
+
+
+def _run(model_type: str, mode: str, path: str, queue):
+    import logging
+    import pandas as pd
+    import pyarrow.parquet as pq
+    from train_model import MLTrainer
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.INFO)
+
+    trainer = MLTrainer(model_type)
+    with PeakRSSMonitor() as rss:
+        started = time.perf_counter()
+        if mode == 'in_memory':
+            df = pd.read_parquet(path)
+            trainer.train(df.drop(columns=[TARGET]), df[TARGET])
+            rows = len(df)
+        else:
+            trainer.train_external_memory(path, target_col=TARGET)
+            rows = pq.ParquetFile(path).metadata.num_rows
+        elapsed = time.perf_counter() - started
+
+    queue.put({
+        'model_type': model_type,
+        'mode': mode,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed,
+        'peak_rss_delta_mb': rss.delta_mb,
+    })
+
+
+def run(n_rows: int, row_group_rows: int, models: list = MODELS) -> list:
+    work_dir = tempfile.mkdtemp(prefix='extmem_bench_')
+    path = os.path.join(work_dir, 'ml_export.parquet')
+    try:
+        _write_parquet(n_rows, row_group_rows, path)
+        ctx = mp.get_context('spawn')
+        results = []
+        for model_type in models:
+            for mode in MODES:
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_run, args=(model_type, mode, path, queue))
+                proc.start()
+                results.append(queue.get())
+                proc.join()
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--row-group-rows', type=int, default=100_000)
+    parser.add_argument('--models', nargs='+', default=MODELS, choices=MODELS)
+    args = parser.parse_args()
+
+    print(f"\n=== External-memory training ({args.rows:,} rows, {args.row_group_rows:,} per row group) ===")
+    print(f"{'model':<10}{'mode':<12}{'seconds':>10}{'rows/sec':>12}{'peak RSS Δ MB':>16}")
+    for r in run(args.rows, args.row_group_rows, args.models):
+        print(f"{r['model_type']:<10}{r['mode']:<12}{r['seconds']:>10.2f}{r['rows_per_sec']:>12,.0f}"
+              f"{r['peak_rss_delta_mb']:>16.1f}")
@@ -0,0 +1,115 @@
+"""
+Benchmark: training from arrays vs from cached native datasets
+
+For each installed booster, fits the MLTrainer default model --repeats
+times (standing in for repeated runs, CV folds or tuning trials) three ways:
+
+- in_memory:   estimator.fit(X, y), which re-ingests/re-bins X every fit
+- native_cold: fit_native on an empty NativeDatasetCache (build + save)
+- native_warm: fit_native with the dataset already on disk (load only)
+
+dataset_s is the ingest part of one fit (DMatrix / lgb.Dataset / quantized
+Pool construction, or loading its binary); fit_s is the whole fit.
+
+Usage:
+    python benchmarks/bench_native_datasets.py --rows 1000000 --repeats 5
+    python benchmarks/bench_native_datasets.py --libraries xgboost lightgbm
+"""
+import argparse
+import importlib.util
+import shutil
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from common import create_ml_export_table
+
+LIBRARIES = ['xgboost', 'lightgbm', 'catboost']
+TARGET = 'is_delayed'
+
+
+def _load(n_rows: int):
+    import duckdb
+    from arrow_fetch import fetch_dataframe
+    from preprocessing import FeaturePreprocessor
+
+    conn = duckdb.connect()
+    create_ml_export_table(conn, n_rows)
+    df = fetch_dataframe(conn, "SELECT * FROM gold_obt_orders_ml_export")
+    y = df[TARGET].to_numpy(dtype='int64')
+    features = df.drop(columns=[c for c in df.columns if c.startswith(('is_', 'target_')) or c == 'order_id'])
+    return FeaturePreprocessor().fit(features).transform(features), y
+
+
+def _ingest(library: str, X, y) -> float:
+    """Seconds to build the library's training dataset in memory"""
+    started = time.perf_counter()
+    if library == 'xgboost':
+        import xgboost as xgb
+        xgb.DMatrix(X, label=y)
+    elif library == 'lightgbm':
+        import lightgbm as lgb
+        lgb.Dataset(X, label=y, params={'verbosity': -1, 'feature_pre_filter': False}).construct()
+    else:
+        from catboost import Pool
+        Pool(X, label=y).quantize()
+    return time.perf_counter() - started
+
+
+def run(n_rows: int, repeats: int, libraries: list = LIBRARIES) -> list:
+    from native_datasets import NativeDatasetCache, fit_native
+    from train_model import MLTrainer
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    X, y = _load(n_rows)
+    results = []
+    for library in libraries:
+        if importlib.util.find_spec(library) is None:
+            print(f"   {library} not installed, skipped")
+            continue
+
+        ingest = [_ingest(library, X, y) for _ in range(repeats)]
+        fits = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            MLTrainer(library).model.fit(X, y)
+            fits.append(time.perf_counter() - started)
+        results.append({'library': library, 'mode': 'in_memory', 'dataset_s': np.mean(ingest),
+                        'fit_s': np.mean(fits), 'cache_mb': 0.0})
+
+        root = tempfile.mkdtemp(prefix='native_bench_')
+        try:
+            cache = NativeDatasetCache(root)
+            fits = []
+            for _ in range(repeats + 1):
+                started = time.perf_counter()
+                fit_native(MLTrainer(library).model, library, X, y, cache)
+                fits.append(time.perf_counter() - started)
+            loads = [s['seconds'] for s in cache.stats[1:]]
+            cache_mb = cache.total_bytes() / 1024 ** 2
+            results.append({'library': library, 'mode': 'native_cold', 'dataset_s': cache.stats[0]['seconds'],
+                            'fit_s': fits[0], 'cache_mb': cache_mb})
+            results.append({'library': library, 'mode': 'native_warm', 'dataset_s': np.mean(loads),
+                            'fit_s': np.mean(fits[1:]), 'cache_mb': cache_mb})
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--repeats', type=int, default=3, help='Fits per mode (runs, folds or trials)')
+    parser.add_argument('--libraries', nargs='+', default=LIBRARIES, choices=LIBRARIES)
+    args = parser.parse_args()
+
+    print(f"\n=== Native dataset benchmark ({args.rows:,} rows, {args.repeats} fits per mode) ===")
+    print(f"{'library':<10}{'mode':<14}{'dataset_s':>11}{'fit_s':>9}{'ingest saved':>14}{'cache MB':>10}")
+    results = run(args.rows, args.repeats, args.libraries)
+    baseline = {r['library']: r['dataset_s'] for r in results if r['mode'] == 'in_memory'}
+    for r in results:
+        saved = 1 - r['dataset_s'] / baseline[r['library']] if r['mode'] != 'in_memory' else 0.0
+        print(f"{r['library']:<10}{r['mode']:<14}{r['dataset_s']:>11.3f}{r['fit_s']:>9.2f}"
+              f"{saved:>14.0%}{r['cache_mb']:>10.1f}")
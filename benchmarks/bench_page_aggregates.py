@@ -0,0 +1,362 @@
+"""
+Benchmark: server-side page aggregates vs the LIMIT-10000 pandas sample
+
+Builds a synthetic gold_obt_orders table in DuckDB and, for the payment,
+delivery, product and review pages:
+
+1. checks every aggregate loader in dashboard/utils/data_loader.py against
+   the equivalent pandas computation over the full table (parity), and
+2. compares rows/bytes shipped to the client by the old approach
+   (load_gold_obt_summary(limit=...) + pandas groupby) with the new one.
+
+Exits non-zero if any loader disagrees with pandas.
+
+Usage:
+    python benchmarks/bench_page_aggregates.py --rows 200000
+    python benchmarks/bench_page_aggregates.py --rows 200000 --seed 7
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from common import PROJECT_ROOT, create_dashboard_obt_table
+
+sys.path.append(str(PROJECT_ROOT / 'dashboard'))
+
+# Measure the warehouse path, not the in-process snapshot cache
+os.environ['DASHBOARD_LOCAL_CACHE'] = '0'
+
+# Page -> LIMIT the page used with load_gold_obt_summary before
+OLD_PAGE_LIMITS = {'payment': 10000, 'delivery': 10000, 'product': 5000, 'review': 10000}
+
+
+def _frame_bytes(result) -> int:
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, dict):
+        return sum(_frame_bytes(v) for v in result.values()) or len(repr(result))
+    return 0
+
+
+def _frame_rows(result) -> int:
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(_frame_rows(v) for v in result.values()) or 1
+    return 0
+
+
+def _compare_frames(actual: pd.DataFrame, expected: pd.DataFrame, keys: list) -> float:
+    """Max relative difference between two aggregate frames joined on keys"""
+    actual = actual.reset_index(drop=True)
+    expected = expected.reset_index(drop=True)
+    if len(actual) != len(expected):
+        return float('inf')
+    actual = actual.sort_values(keys).reset_index(drop=True)
+    expected = expected.sort_values(keys).reset_index(drop=True)
+    worst = 0.0
+    for column in expected.columns:
+        a, e = actual[column], expected[column]
+        numeric = pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(e)
+        if not numeric:
+            if not (a.astype(str).values == e.astype(str).values).all():
+                return float('inf')
+            continue
+        a = a.astype(float).values
+        e = e.astype(float).values
+        both_nan = np.isnan(a) & np.isnan(e)
+        diff = np.abs(a - e) / np.maximum(np.abs(e), 1e-9)
+        diff[both_nan] = 0.0
+        worst = max(worst, float(np.nanmax(diff)) if len(diff) else 0.0)
+    return worst
+
+
+def _compare_scalars(actual: dict, expected: dict) -> float:
+    worst = 0.0
+    for key, value in expected.items():
+        worst = max(worst, abs(float(actual[key]) - value) / max(abs(value), 1e-9))
+    return worst
+
+
+def _reference_distribution(values: pd.Series, bins: int, trim=None, extra=None):
+    """pandas/numpy version of data_loader._value_distribution"""
+    values = values.dropna()
+    mask = pd.Series(True, index=values.index)
+    if trim is not None:
+        low, high = values.quantile(list(trim))
+        mask = (values >= low) & (values <= high)
+    kept = values[mask]
+    counts, edges = np.histogram(kept, bins=bins)
+    histogram = pd.DataFrame({'BIN': np.arange(bins), 'COUNT': counts, 'BIN_START': edges[:-1]})
+    if extra is not None:
+        # Same bin assignment as np.histogram (the last bin is closed)
+        bin_index = pd.Series(np.minimum(np.searchsorted(edges, kept, side='right') - 1, bins - 1), index=kept.index)
+        histogram = histogram.merge(
+            extra[mask].groupby(bin_index).mean().rename('AVG_SCORE').rename_axis('BIN').reset_index(),
+            on='BIN', how='left'
+        )
+    histogram = histogram[histogram['COUNT'] > 0].reset_index(drop=True)
+    q1, median, q3 = kept.quantile([0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    box = {
+        'count': len(kept), 'min': kept.min(), 'max': kept.max(),
+        'q1': q1, 'median': median, 'q3': q3,
+        'lowerfence': kept[kept >= q1 - 1.5 * iqr].min(),
+        'upperfence': kept[kept <= q3 + 1.5 * iqr].max(),
+    }
+    return histogram, box
+
+
+def parity_checks(dl, full: pd.DataFrame) -> list:
+    """Run each aggregate loader and the matching pandas computation"""
+    checks = []
+
+    def check(page, name, actual, expected_fn, compare):
+        started = time.perf_counter()
+        expected = expected_fn()
+        pandas_seconds = time.perf_counter() - started
+        checks.append({
+            'page': page, 'loader': name,
+            'max_rel_diff': compare(actual, expected),
+            'rows': _frame_rows(actual), 'pandas_seconds': pandas_seconds,
+        })
+
+    paid = full[full['PAYMENT_TYPES'].notna()]
+    delivered = full[full['ACTUAL_DELIVERY_DAYS'].notna()
+                     & (full['ACTUAL_DELIVERY_DAYS'] > 0)
+                     & (full['ACTUAL_DELIVERY_DAYS'] < 100)]
+    reviewed = full[full['REVIEW_SCORE'].notna()]
+    reviewed_delivered = delivered[delivered['REVIEW_SCORE'].notna()]
+
+    # Payment page
+    check('payment', 'get_payment_summary', dl.get_payment_summary(), lambda: {
+        'TOTAL_TRANSACTIONS': len(paid),
+        'TOTAL_VALUE': paid['PAYMENT_VALUE'].sum(),
+        'AVG_TRANSACTION': paid['PAYMENT_VALUE'].mean(),
+        'AVG_INSTALLMENTS': paid['PAYMENT_INSTALLMENTS'].mean(),
+    }, _compare_scalars)
+
+    def payment_types():
+        stats = paid.groupby('PAYMENT_TYPES').agg(
+            TRANSACTION_COUNT=('ORDER_ID', 'count'),
+            TOTAL_VALUE=('PAYMENT_VALUE', 'sum'),
+            AVG_VALUE=('PAYMENT_VALUE', 'mean'),
+            MEDIAN_VALUE=('PAYMENT_VALUE', 'median'),
+            STD_VALUE=('PAYMENT_VALUE', 'std'),
+            AVG_INSTALLMENTS=('PAYMENT_INSTALLMENTS', 'mean'),
+        )
+        return stats.rename_axis('PAYMENT_TYPE').reset_index()
+    check('payment', 'get_payment_type_stats', dl.get_payment_type_stats(), payment_types,
+          lambda a, e: _compare_frames(a, e, ['PAYMENT_TYPE']))
+
+    def installments():
+        rows = paid[paid['PAYMENT_INSTALLMENTS'] > 0]
+        return rows.groupby('PAYMENT_INSTALLMENTS').agg(
+            COUNT=('ORDER_ID', 'size'), AVG_VALUE=('PAYMENT_VALUE', 'mean')
+        ).rename_axis('INSTALLMENTS').reset_index()
+    check('payment', 'get_installment_distribution', dl.get_installment_distribution(), installments,
+          lambda a, e: _compare_frames(a, e, ['INSTALLMENTS']))
+
+    def compare_distribution(actual, expected):
+        histogram, box = expected
+        return max(
+            _compare_frames(actual['histogram'][['BIN', 'COUNT', 'BIN_START']
+                                                + [c for c in ['AVG_SCORE'] if c in histogram]],
+                            histogram, ['BIN']),
+            _compare_scalars(actual['box'], box)
+        )
+    check('payment', 'get_payment_value_distribution', dl.get_payment_value_distribution(bins=50),
+          lambda: _reference_distribution(paid['PAYMENT_VALUE'], 50, trim=(0.01, 0.99)),
+          compare_distribution)
+
+    def payment_trends():
+        rows = paid[paid['ORDER_PURCHASE_TIMESTAMP'].notna()]
+        return rows.groupby([rows['ORDER_PURCHASE_TIMESTAMP'].dt.floor('D').rename('DATE'),
+                             rows['PAYMENT_TYPES'].rename('PAYMENT_TYPE')]).agg(
+            TOTAL_VALUE=('PAYMENT_VALUE', 'sum'), TRANSACTION_COUNT=('ORDER_ID', 'count')
+        ).reset_index()
+    check('payment', 'get_payment_trends', dl.get_payment_trends(), payment_trends,
+          lambda a, e: _compare_frames(a, e, ['DATE', 'PAYMENT_TYPE']))
+
+    # Delivery page
+    check('delivery', 'get_delivery_days_distribution', dl.get_delivery_days_distribution(bins=50),
+          lambda: _reference_distribution(delivered['ACTUAL_DELIVERY_DAYS'], 50), compare_distribution)
+
+    check('delivery', 'get_late_delivery_split', dl.get_late_delivery_split(),
+          lambda: delivered[delivered['IS_LATE_DELIVERY'].notna()]
+          .groupby('IS_LATE_DELIVERY').size().rename('COUNT').reset_index(),
+          lambda a, e: _compare_frames(a, e, ['IS_LATE_DELIVERY']))
+
+    def estimate_grid():
+        rows = delivered[delivered['ESTIMATED_DELIVERY_DAYS'].notna() & (delivered['ESTIMATED_DELIVERY_DAYS'] > 0)]
+        return rows.groupby(['ESTIMATED_DELIVERY_DAYS', 'ACTUAL_DELIVERY_DAYS', 'IS_LATE_DELIVERY']).size() \
+            .rename('ORDER_COUNT').reset_index()
+    check('delivery', 'get_delivery_estimate_grid', dl.get_delivery_estimate_grid(), estimate_grid,
+          lambda a, e: _compare_frames(a, e, ['ESTIMATED_DELIVERY_DAYS', 'ACTUAL_DELIVERY_DAYS', 'IS_LATE_DELIVERY']))
+
+    # Product page
+    top_categories = (full.groupby('PRODUCT_CATEGORY')['PRICE'].sum()
+                      .sort_values(ascending=False).head(5).index.tolist())
+
+    def category_trends():
+        rows = full[full['PRODUCT_CATEGORY'].isin(top_categories) & full['ORDER_PURCHASE_TIMESTAMP'].notna()]
+        return rows.groupby([rows['ORDER_PURCHASE_TIMESTAMP'].dt.floor('D').rename('DATE'),
+                             rows['PRODUCT_CATEGORY'].rename('CATEGORY')]).agg(
+            ORDERS=('ORDER_ID', 'count'), REVENUE=('PAYMENT_VALUE', 'sum')
+        ).reset_index()
+    check('product', 'get_category_trends', dl.get_category_trends(top_categories), category_trends,
+          lambda a, e: _compare_frames(a, e, ['DATE', 'CATEGORY']))
+
+    # Review page
+    check('review', 'get_review_summary', dl.get_review_summary(), lambda: {
+        'TOTAL_REVIEWS': len(reviewed),
+        'AVG_SCORE': reviewed['REVIEW_SCORE'].mean(),
+        'POSITIVE_RATE': (reviewed['REVIEW_SCORE'] >= 4).mean(),
+        'NEGATIVE_RATE': (reviewed['REVIEW_SCORE'] <= 2).mean(),
+    }, _compare_scalars)
+
+    check('review', 'get_review_score_distribution', dl.get_review_score_distribution(),
+          lambda: reviewed['REVIEW_SCORE'].value_counts().rename_axis('SCORE').rename('COUNT').reset_index(),
+          lambda a, e: _compare_frames(a, e, ['SCORE']))
+
+    check('review', 'get_review_sentiment_distribution', dl.get_review_sentiment_distribution(),
+          lambda: reviewed['REVIEW_SENTIMENT'].value_counts().rename_axis('SENTIMENT').rename('COUNT').reset_index(),
+          lambda a, e: _compare_frames(a, e, ['SENTIMENT']))
+
+    def categories():
+        stats = reviewed.groupby('PRODUCT_CATEGORY').agg(
+            AVG_SCORE=('REVIEW_SCORE', 'mean'), REVIEW_COUNT=('REVIEW_SCORE', 'count')
+        ).rename_axis('CATEGORY').reset_index()
+        return stats[stats['REVIEW_COUNT'] >= 10]
+    check('review', 'get_review_scores_by_category', dl.get_review_scores_by_category(min_reviews=10), categories,
+          lambda a, e: _compare_frames(a, e, ['CATEGORY']))
+
+    check('review', 'get_review_delivery_grid', dl.get_review_delivery_grid(),
+          lambda: reviewed_delivered.groupby(['ACTUAL_DELIVERY_DAYS', 'REVIEW_SCORE']).size()
+          .rename('REVIEW_COUNT').reset_index(),
+          lambda a, e: _compare_frames(a, e, ['ACTUAL_DELIVERY_DAYS', 'REVIEW_SCORE']))
+
+    def delivery_buckets():
+        buckets = pd.cut(reviewed_delivered['ACTUAL_DELIVERY_DAYS'], bins=[0, 7, 14, 21, 30, 100],
+                         labels=['0-7 days', '8-14 days', '15-21 days', '22-30 days', '30+ days'])
+        return reviewed_delivered.groupby(buckets, observed=True).agg(
+            REVIEW_SCORE=('REVIEW_SCORE', 'mean'), REVIEW_COUNT=('REVIEW_SCORE', 'size')
+        ).rename_axis('DELIVERY_BUCKET').reset_index().astype({'DELIVERY_BUCKET': str})
+    check('review', 'get_review_score_by_delivery_bucket', dl.get_review_score_by_delivery_bucket(),
+          delivery_buckets, lambda a, e: _compare_frames(a, e, ['DELIVERY_BUCKET']))
+
+    check('review', 'get_review_score_by_price_bucket', dl.get_review_score_by_price_bucket(buckets=5),
+          lambda: _reference_distribution(reviewed['PAYMENT_VALUE'], 5, trim=(0.01, 0.99),
+                                          extra=reviewed['REVIEW_SCORE'])[0],
+          lambda a, e: _compare_frames(a[['BIN', 'COUNT', 'BIN_START', 'AVG_SCORE']], e, ['BIN']))
+
+    def monthly():
+        rows = reviewed[reviewed['ORDER_PURCHASE_TIMESTAMP'].notna()]
+        return rows.groupby(rows['ORDER_PURCHASE_TIMESTAMP'].dt.to_period('M').dt.to_timestamp().rename('DATE')).agg(
+            AVG_SCORE=('REVIEW_SCORE', 'mean'), REVIEW_COUNT=('REVIEW_SCORE', 'count')
+        ).reset_index()
+    check('review', 'get_monthly_review_trend', dl.get_monthly_review_trend(), monthly,
+          lambda a, e: _compare_frames(a, e, ['DATE']))
+
+    return checks
+
+
+PAGE_LOADERS = {
+    'payment': lambda dl: [dl.get_payment_summary(), dl.get_payment_type_stats(),
+                           dl.get_installment_distribution(), dl.get_payment_value_distribution(),
+                           dl.get_payment_trends()],
+    'delivery': lambda dl: [dl.get_delivery_days_distribution(), dl.get_late_delivery_split(),
+                            dl.get_delivery_estimate_grid()],
+    'product': lambda dl: [dl.get_category_trends(dl.get_top_products(limit=5)['PRODUCT_CATEGORY'].tolist())],
+    'review': lambda dl: [dl.get_review_summary(), dl.get_review_score_distribution(),
+                          dl.get_review_sentiment_distribution(), dl.get_review_scores_by_category(),
+                          dl.get_review_delivery_grid(), dl.get_review_score_by_delivery_bucket(),
+                          dl.get_review_score_by_price_bucket(), dl.get_monthly_review_trend()],
+}
+
+
+def transfer_comparison(dl, query_cache) -> list:
+    """Rows/bytes reaching the client per page view, old sample vs new aggregates"""
+    results = []
+    for page, limit in OLD_PAGE_LIMITS.items():
+        query_cache.clear()
+        started = time.perf_counter()
+        sample = dl.load_gold_obt_summary(limit=limit)
+        old_seconds = time.perf_counter() - started
+
+        query_cache.clear()
+        started = time.perf_counter()
+        aggregates = PAGE_LOADERS[page](dl)
+        new_seconds = time.perf_counter() - started
+
+        old_bytes = _frame_bytes(sample)
+        new_bytes = sum(_frame_bytes(r) for r in aggregates)
+        results.append({
+            'page': page,
+            'old_rows': len(sample), 'old_kb': old_bytes / 1024, 'old_seconds': old_seconds,
+            'new_rows': sum(_frame_rows(r) for r in aggregates), 'new_kb': new_bytes / 1024,
+            'new_seconds': new_seconds,
+            'reduction': old_bytes / max(new_bytes, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000, help="Rows in the synthetic gold_obt_orders table")
+    parser.add_argument('--seed', type=int, default=42, help="Seed for the synthetic data")
+    parser.add_argument('--tolerance', type=float, default=1e-6, help="Max relative difference for parity")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.WARNING)
+
+    import duckdb
+    from connection_pool import ConnectionPool
+    from utils import data_loader as dl
+    from utils.snowflake_connector import get_query_cache
+
+    conn = duckdb.connect()
+    create_dashboard_obt_table(conn, args.rows, seed=args.seed)
+    pool = ConnectionPool(lambda: conn.cursor(), max_size=4, name='bench')
+    dl.get_snowflake_connection = lambda: pool
+
+    # The pandas reference needs the table's own dtypes: float32 columns move
+    # histogram edges and declared categories add zero-count rows
+    downcast = os.environ.get('DASHBOARD_DOWNCAST')
+    os.environ['DASHBOARD_DOWNCAST'] = '0'
+    full = dl.load_gold_obt_summary(limit=args.rows)
+    if downcast is None:
+        del os.environ['DASHBOARD_DOWNCAST']
+    else:
+        os.environ['DASHBOARD_DOWNCAST'] = downcast
+    print(f"\n=== Page aggregate parity vs pandas ({len(full):,} rows) ===")
+    checks = parity_checks(dl, full)
+    failed = 0
+    for c in checks:
+        ok = c['max_rel_diff'] <= args.tolerance
+        failed += not ok
+        print(f"{'PASS' if ok else 'FAIL'}  {c['page']:<9} {c['loader']:<38} rows={c['rows']:>6,}  "
+              f"max_rel_diff={c['max_rel_diff']:.2e}")
+
+    print(f"\n=== Transfer volume per page view ===")
+    print(f"{'page':<9} {'old rows':>9} {'old KB':>9} {'new rows':>9} {'new KB':>8} {'reduction':>10}")
+    for r in transfer_comparison(dl, get_query_cache(pool)):
+        print(f"{r['page']:<9} {r['old_rows']:>9,} {r['old_kb']:>9.1f} {r['new_rows']:>9,} "
+              f"{r['new_kb']:>8.1f} {r['reduction']:>9.1f}x")
+
+    pool.close()
+    if failed:
+        print(f"\n❌ {failed} loader(s) disagree with pandas")
+        sys.exit(1)
+    print("\n✅ All aggregate loaders match pandas over the full table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: dashboard query cache layers, and freshness after a dbt rebuild
+
+Builds a synthetic gold_obt_orders table in DuckDB standing in for
+Snowflake and times one page aggregate through each layer:
+
+- warehouse: the query sent to the warehouse connection
+- snapshot:  answered by LocalColumnarCache (after the snapshot is loaded)
+- cached:    a StaleWhileRevalidateCache hit
+
+It then simulates a dbt rebuild (rows change and the table version moves)
+and checks that the background refresh returns the rebuilt rows instead
+of re-reading the local snapshot taken before the rebuild. Exits non-zero
+if a stale result survives revalidation.
+
+Usage:
+    python benchmarks/bench_query_cache.py --rows 200000
+"""
+import argparse
+import logging
+import statistics
+import sys
+import time
+import warnings
+
+from common import PROJECT_ROOT, create_dashboard_obt_table
+
+sys.path.append(str(PROJECT_ROOT / 'dashboard'))
+
+TABLE = 'gold_obt_orders'
+
+
+def _timed(fn, repeat: int) -> float:
+    """Median milliseconds per call"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _wait_for_refresh(cache, refreshes: int, timeout: float = 30.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        stats = cache.stats()
+        if stats['refreshes'] + stats['refresh_errors'] >= refreshes:
+            return stats['refresh_errors'] == 0
+        time.sleep(0.01)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000, help="Rows in the synthetic gold_obt_orders table")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed calls per layer")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.WARNING)
+
+    import duckdb
+    from connection_pool import ConnectionPool
+    from arrow_fetch import fetch_dataframe
+    from query_builder import QueryBuilder
+    from utils.local_cache import LocalColumnarCache
+    from utils.query_cache import StaleWhileRevalidateCache
+    from utils.snowflake_connector import _run_query
+
+    conn = duckdb.connect()
+    create_dashboard_obt_table(conn, args.rows)
+    pool = ConnectionPool(lambda: conn.cursor(), max_size=4, name='bench')
+
+    versions = {TABLE: 1}
+    local_cache = LocalColumnarCache(pool, ttl_seconds=900)
+    query_cache = StaleWhileRevalidateCache(
+        version_probe=lambda tables: {t: versions.get(t) for t in tables},
+        version_check_seconds=0.0,
+        on_version_change=local_cache.invalidate
+    )
+
+    query = (QueryBuilder(TABLE)
+             .select('ORDER_STATUS', 'COUNT(*) AS ORDERS', 'SUM(TOTAL_PAYMENT_VALUE) AS REVENUE')
+             .where_not_null('ORDER_STATUS')
+             .group_by('ORDER_STATUS')
+             .order_by('ORDER_STATUS')
+             .build())
+
+    def warehouse():
+        with pool.connection() as c:
+            return fetch_dataframe(c, *query)
+
+    def loader():
+        return _run_query(pool, local_cache, *query, use_arrow=True)
+
+    def delivered_orders(df) -> int:
+        return int(df.loc[df['ORDER_STATUS'] == 'delivered', 'ORDERS'].iloc[0])
+
+    print(f"\n=== Query cache layers ({args.rows:,} rows, median of {args.repeat}) ===")
+    before = delivered_orders(query_cache.get(*query, loader=loader, ttl=3600))
+    for label, fn in [('warehouse', warehouse),
+                      ('snapshot', lambda: local_cache.query(*query)),
+                      ('cached', lambda: query_cache.get(*query, loader=loader, ttl=3600))]:
+        print(f"{label:<10} {_timed(fn, args.repeat):>9.2f} ms")
+
+    print(f"\n=== Freshness after a dbt rebuild ===")
+    query_cache.clear()
+    query_cache.get(*query, loader=loader, ttl=0.1)
+    conn.execute(f"DELETE FROM {TABLE} WHERE ORDER_STATUS = 'delivered' AND ORDER_ID < '8'")
+    versions[TABLE] = 2
+    expected = delivered_orders(warehouse())
+    time.sleep(0.2)
+
+    # Served stale while the background refresh re-runs the query
+    refreshes = query_cache.stats()['refreshes']
+    query_cache.get(*query, loader=loader)
+    refreshed = _wait_for_refresh(query_cache, refreshes + 1)
+    after = delivered_orders(query_cache.get(*query, loader=loader))
+
+    pool.close()
+    print(f"delivered orders: before rebuild={before:,}  warehouse={expected:,}  after refresh={after:,}")
+    if not refreshed or after != expected:
+        print("\n❌ Revalidated result still reflects the pre-rebuild snapshot")
+        sys.exit(1)
+    print("\n✅ Revalidation after a rebuild returns the rebuilt rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark: online scoring server latency and throughput under concurrent load
+
+Trains a delivery-delay (xgboost) and a churn (lightgbm) model on a
+synthetic ML export table, starts ml_pipeline/src/scoring_server.py in a
+separate process, and drives it with --concurrency keep-alive connections
+sending single-order requests. Each configuration runs in a fresh server
+process:
+
+- batched:   micro-batching (--max-wait-ms, --max-batch-rows)
+- unbatched: max_batch_rows=1, one predict_proba call per request
+
+Usage:
+    python benchmarks/bench_scoring_server.py --requests 5000 --concurrency 64
+    python benchmarks/bench_scoring_server.py --max-wait-ms 5 --rows-per-request 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from common import create_ml_export_table
+
+PORT = 8765
+
+
+def _train_models(model_dir: str, n_rows: int = 50_000) -> list:
+    """Save both models and return sample scoring records"""
+    import duckdb
+    import logging
+    from arrow_fetch import fetch_dataframe
+    from train_model import MLTrainer
+
+    logging.disable(logging.INFO)
+    conn = duckdb.connect()
+    create_ml_export_table(conn, n_rows)
+    df = fetch_dataframe(conn, "SELECT * FROM gold_obt_orders_ml_export")
+
+    delivery = MLTrainer('xgboost')
+    delivery.train(df, df['is_delayed'])
+    delivery.save_model(os.path.join(model_dir, 'IS_DELAYED_xgboost_model.pkl'))
+
+    churn = MLTrainer('lightgbm')
+    features = df.drop(columns=['days_since_last_order'])
+    churn.train(features, (df['days_since_last_order'] > 90).astype(int))
+    churn.save_model(os.path.join(model_dir, 'churn_prediction_model.pkl'))
+
+    sample = df.drop(columns=['is_delayed', 'is_canceled', 'is_satisfied', 'target_review_score',
+                              'target_delivery_days']).head(2000)
+    return json.loads(sample.to_json(orient='records'))
+
+
+def _serve(model_dir: str, max_batch_rows: int, max_wait_ms: float):
+    import logging
+    from scoring_server import serve
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.INFO)
+    models = {'delivery': os.path.join(model_dir, 'IS_DELAYED_xgboost_model.pkl'),
+              'churn': os.path.join(model_dir, 'churn_prediction_model.pkl')}
+    asyncio.run(serve(models, port=PORT, max_batch_rows=max_batch_rows, max_wait_ms=max_wait_ms))
+
+
+async def _request(reader, writer, method: str, path: str, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                 + body)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = next(int(line.split(b':', 1)[1]) for line in head.split(b'\r\n')
+                  if line.lower().startswith(b'content-length'))
+    status = int(head.split(b' ', 2)[1])
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _wait_ready(timeout: float = 60.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+            await _request(reader, writer, 'GET', '/health')
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def load(records: list, n_requests: int, concurrency: int, rows_per_request: int) -> dict:
+    """
+    Drive the running server and measure client-side latency
+
+    Requests alternate between /predict/delivery and /predict/churn.
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(n_requests))
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+        try:
+            for i in counter:
+                start = (i * rows_per_request) % (len(records) - rows_per_request)
+                path = '/predict/delivery' if i % 2 == 0 else '/predict/churn'
+                started = time.perf_counter()
+                status, _ = await _request(reader, writer, 'POST', path,
+                                           {'records': records[start:start + rows_per_request]})
+                latencies.append(time.perf_counter() - started)
+                errors += status != 200
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    _, metrics = await _request(reader, writer, 'GET', '/metrics')
+    writer.close()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': elapsed,
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_batch_rows': np.mean([m['mean_batch_rows'] for m in metrics.values()]),
+        'server': metrics,
+    }
+
+
+def run(n_requests: int, concurrency: int, rows_per_request: int, max_batch_rows: int,
+        max_wait_ms: float) -> list:
+    model_dir = tempfile.mkdtemp(prefix='scoring_bench_')
+    try:
+        records = _train_models(model_dir)
+        ctx = mp.get_context('spawn')
+        results = []
+        for label, batch_rows, wait_ms in [('batched', max_batch_rows, max_wait_ms), ('unbatched', 1, 0.0)]:
+            proc = ctx.Process(target=_serve, args=(model_dir, batch_rows, wait_ms), daemon=True)
+            proc.start()
+            try:
+                asyncio.run(_wait_ready())
+                # Warm up both models before measuring
+                asyncio.run(load(records, 50, 4, rows_per_request))
+                result = asyncio.run(load(records, n_requests, concurrency, rows_per_request))
+            finally:
+                proc.terminate()
+                proc.join()
+            results.append({'config': label, **result})
+        return results
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--rows-per-request', type=int, default=1)
+    parser.add_argument('--max-batch-rows', type=int, default=512)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"\n=== Scoring server ({args.requests:,} requests, {args.concurrency} connections, "
+          f"{args.rows_per_request} rows/request) ===")
+    print(f"{'config':<12}{'req/sec':>10}{'p50 ms':>9}{'p99 ms':>9}{'batch rows':>12}{'errors':>8}")
+    for r in run(args.requests, args.concurrency, args.rows_per_request, args.max_batch_rows, args.max_wait_ms):
+        print(f"{r['config']:<12}{r['requests_per_sec']:>10,.0f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['mean_batch_rows']:>12.1f}{r['errors']:>8}")
@@ -0,0 +1,200 @@
+"""
+Shared helpers for the offline benchmarks
+"""
+import os
+import sys
+import threading
+import time
+import resource
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+ML_SRC = PROJECT_ROOT / 'ml_pipeline' / 'src'
+
+if str(ML_SRC) not in sys.path:
+    sys.path.append(str(ML_SRC))
+
+
+def _set_seed(conn, seed: int):
+    """Make random() in the following statements reproducible (setseed takes [-1, 1])"""
+    conn.execute("SELECT setseed(?)", [(int(seed) % 2 ** 31) / 2 ** 31])
+
+
+def _nullable(expr: str, rate: float = 0.02) -> str:
+    return f"CASE WHEN random() < {rate} THEN NULL ELSE {expr} END"
+
+
+# Column name -> DuckDB expression producing an OBT-shaped value per row,
+# mirroring models/gold/obt/gold_obt_orders_ml_export.sql
+ML_EXPORT_COLUMNS = [
+    ('order_id', "md5(range::VARCHAR)"),
+    ('customer_order_count', "1 + (random() * random() * 6)::INT"),
+    ('customer_lifetime_value', "round(20 + random() * 900, 2)"),
+    ('customer_avg_order_value', "round(20 + random() * 400, 2)"),
+    ('customer_tenure_days', "(random() * random() * 600)::INT"),
+    ('days_since_last_order', _nullable("(random() * 700)::INT")),
+    ('actual_delivery_days', _nullable("(2 + random() * 30)::INT")),
+    ('estimated_delivery_days', "(10 + random() * 30)::INT"),
+    ('order_year', "2016 + (random() * 2.99)::INT"),
+    ('order_quarter', "1 + (random() * 3.99)::INT"),
+    ('order_month', "1 + (random() * 11.99)::INT"),
+    ('order_week', "1 + (random() * 51.99)::INT"),
+    ('order_day', "1 + (random() * 27.99)::INT"),
+    ('order_day_of_week', "(random() * 6.99)::INT"),
+    ('order_hour', "(random() * 23.99)::INT"),
+    ('order_on_weekend', "(random() < 0.28)::INT"),
+    ('product_weight_g', _nullable("(50 + random() * 5000)::INT")),
+    ('product_length_cm', _nullable("(10 + random() * 60)::INT")),
+    ('product_height_cm', _nullable("(2 + random() * 40)::INT")),
+    ('product_width_cm', _nullable("(8 + random() * 50)::INT")),
+    ('product_volume_cm3', _nullable("(500 + random() * 60000)::INT")),
+    ('product_photos_qty', _nullable("1 + (random() * 5)::INT")),
+    ('product_order_count', "1 + (random() * random() * 400)::INT"),
+    ('product_avg_price', "round(5 + random() * 500, 2)"),
+    ('seller_order_count', "1 + (random() * random() * 2000)::INT"),
+    ('seller_avg_item_price', "round(5 + random() * 500, 2)"),
+    ('is_same_state', "(random() < 0.36)::INT"),
+    ('is_same_city', "(random() < 0.05)::INT"),
+    ('total_unique_products', "1 + (random() * random() * 3)::INT"),
+    ('total_items', "1 + (random() * random() * 4)::INT"),
+    ('total_product_value', "round(5 + random() * 600, 2)"),
+    ('total_freight_value', "round(random() * 80, 2)"),
+    ('total_order_value', "round(10 + random() * 650, 2)"),
+    ('avg_item_price', "round(5 + random() * 500, 2)"),
+    ('min_item_price', "round(5 + random() * 300, 2)"),
+    ('max_item_price', "round(5 + random() * 700, 2)"),
+    ('stddev_item_price', _nullable("round(random() * 50, 2)", 0.85)),
+    ('max_installments', "1 + (random() * random() * 10)::INT"),
+    ('avg_installments', "round(1 + random() * random() * 10, 2)"),
+    ('payment_types_count', "1 + (random() < 0.03)::INT"),
+    ('payment_credit_card', "(random() < 0.74)::INT"),
+    ('payment_boleto', "(random() < 0.19)::INT"),
+    ('payment_voucher', "(random() < 0.05)::INT"),
+    ('payment_debit_card', "(random() < 0.02)::INT"),
+    ('review_score', _nullable("1 + (random() * 4.99)::INT", 0.01)),
+    ('is_positive_review', "(random() < 0.77)::INT"),
+    ('is_negative_review', "(random() < 0.14)::INT"),
+    ('freight_to_product_ratio', _nullable("round(random() * 0.6, 4)")),
+    ('avg_value_per_item', "round(10 + random() * 500, 2)"),
+    ('total_credit_extended', "round(random() * 5000, 2)"),
+    ('is_delayed', "(random() < 0.08)::INT"),
+    ('is_canceled', "(random() < 0.01)::INT"),
+    ('is_satisfied', "(random() < 0.77)::INT"),
+    ('target_review_score', "1 + (random() * 4.99)::INT"),
+    ('target_delivery_days', "(2 + random() * 30)::INT"),
+]
+
+
+def create_ml_export_table(conn, n_rows: int, table: str = 'gold_obt_orders_ml_export', seed: int = 42):
+    """
+    Create a synthetic OBT-shaped ML export table inside a DuckDB connection
+
+    Rows are generated by the engine itself, so no pandas frame is allocated
+    in the benchmarking process during setup. The same seed produces the
+    same rows.
+    """
+    _set_seed(conn, seed)
+    select_list = ',\n    '.join(f"{expr} AS {name}" for name, expr in ML_EXPORT_COLUMNS)
+    conn.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT\n    {select_list}\nFROM range({int(n_rows)})")
+
+
+CATEGORIES = [
+    'bed_bath_table', 'health_beauty', 'sports_leisure', 'furniture_decor',
+    'computers_accessories', 'housewares', 'watches_gifts', 'telephony',
+    'garden_tools', 'auto', 'toys', 'cool_stuff', 'perfumery', 'baby',
+    'electronics', 'stationery', 'fashion_bags_accessories', 'pet_shop',
+    'office_furniture', 'consoles_games'
+]
+STATES = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'DF', 'ES', 'GO', 'PE', 'CE', 'PA', 'MT', 'MA']
+
+
+def _pick(values: list, u: str) -> str:
+    quoted = ', '.join(f"'{v}'" for v in values)
+    return f"[{quoted}][1 + ({u} * {len(values) - 0.01})::INT]"
+
+
+def create_dashboard_obt_table(conn, n_rows: int, table: str = 'gold_obt_orders', seed: int = 42):
+    """
+    Create a synthetic gold_obt_orders table with the columns the dashboard
+    pages read (see data_loader.load_gold_obt_summary)
+
+    The same seed produces the same rows, so a parity failure can be
+    reproduced with --seed.
+    """
+    _set_seed(conn, seed)
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE {table} AS
+        WITH u AS (
+            SELECT range AS i, random() AS u1, random() AS u2, random() AS u3,
+                   random() AS u4, random() AS u5, random() AS u6
+            FROM range({int(n_rows)})
+        )
+        SELECT
+            md5(i::VARCHAR) AS ORDER_ID,
+            md5((i % {max(int(n_rows) // 3, 1)})::VARCHAR || 'c') AS CUSTOMER_ID,
+            CASE WHEN u1 < 0.001 THEN NULL WHEN u1 < 0.97 THEN 'delivered'
+                 WHEN u1 < 0.985 THEN 'shipped' ELSE 'canceled' END AS ORDER_STATUS,
+            TIMESTAMP '2016-09-04' + to_seconds((u2 * 62000000)::BIGINT) AS ORDER_PURCHASE_TIMESTAMP,
+            {_pick(STATES, 'u3')} AS CUSTOMER_STATE,
+            'city_' || (u4 * 400)::INT AS CUSTOMER_CITY,
+            CASE WHEN u5 < 0.015 THEN NULL ELSE {_pick(CATEGORIES, 'u6')} END AS PRODUCT_CATEGORY_ENGLISH,
+            {_pick(STATES, 'u4')} AS SELLER_STATE,
+            CASE WHEN u3 < 0.001 THEN NULL WHEN u3 < 0.74 THEN 'credit_card' WHEN u3 < 0.93 THEN 'boleto'
+                 WHEN u3 < 0.96 THEN 'voucher' WHEN u3 < 0.975 THEN 'credit_card, voucher'
+                 ELSE 'debit_card' END AS PAYMENT_TYPES,
+            (u5 * u6 * 11)::INT AS MAX_INSTALLMENTS,
+            round(10 + exp(u2 * 4 + u4 * 3), 2) AS TOTAL_PAYMENT_VALUE,
+            round(8 + exp(u2 * 4 + u4 * 2.8), 2) AS TOTAL_ORDER_VALUE,
+            round(u6 * 60, 2) AS TOTAL_FREIGHT_VALUE,
+            CASE WHEN u1 >= 0.97 THEN NULL ELSE (1 + u4 * u5 * 60)::INT END AS ACTUAL_DELIVERY_DAYS,
+            CASE WHEN u6 < 0.002 THEN NULL ELSE (8 + u6 * 40)::INT END AS ESTIMATED_DELIVERY_DAYS,
+            ((1 + u4 * u5 * 60)::INT > (8 + u6 * 40)::INT)::INT AS IS_LATE_DELIVERY,
+            CASE WHEN u5 < 0.008 THEN NULL ELSE 1 + (u2 * u3 * 4.99 + u6 * 2)::INT % 5 END AS REVIEW_SCORE,
+            CASE WHEN u5 < 0.008 THEN NULL WHEN u6 < 0.6 THEN 'POSITIVE' WHEN u6 < 0.8 THEN 'NEUTRAL'
+                 ELSE 'NEGATIVE' END AS REVIEW_SENTIMENT,
+            1 + (u1 * u2 * 5)::INT AS CUSTOMER_ORDER_COUNT,
+            round(20 + u3 * 900, 2) AS CUSTOMER_LIFETIME_VALUE,
+            (u4 * 700)::INT AS DAYS_SINCE_LAST_ORDER
+        FROM u
+    """)
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB (Linux; falls back to ru_maxrss)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakRSSMonitor:
+    """Sample process RSS on a background thread and record the peak"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.baseline_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.baseline_mb = self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    @property
+    def delta_mb(self) -> float:
+        return self.peak_mb - self.baseline_mb
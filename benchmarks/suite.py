@@ -0,0 +1,444 @@
+"""
+End-to-end benchmark suite: dashboard loaders, feature prep, training and scoring
+
+Runs every case against the offline DuckDB backend (synthetic Olist data,
+see ml_pipeline/src/synthetic_olist.py) at one or more scale factors. Each
+scale runs in a fresh process so peak RSS is not polluted by the previous
+scale. Cases:
+
+- loader:    every public function in dashboard/utils/data_loader.py
+- page:      render() of every dashboard page (Streamlit bare mode)
+- ml_data:   SnowflakeDataLoader.load_obt_data and prepare_ml_dataset
+- train:     MLTrainer.train for each model_type
+- predict:   ModelPredictor.batch_predict for each model_type
+
+Every run appends one JSON record (commit, host, per-case timings, rows/sec
+and peak RSS) to benchmarks/results/history.jsonl; --compare checks it
+against the previous run at the same scale on the same host.
+
+Usage:
+    python benchmarks/suite.py --scales 0.1 1
+    python benchmarks/suite.py --scales 1 --filter loader. --repeat 5
+    python benchmarks/suite.py --scales 1 --compare --fail-on-regression
+"""
+import argparse
+import fnmatch
+import importlib
+import inspect
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import warnings
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import cached_property
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from common import PROJECT_ROOT, PeakRSSMonitor
+
+sys.path.append(str(PROJECT_ROOT / 'dashboard'))
+
+# Measure the warehouse path, not the in-process snapshot cache
+os.environ['DASHBOARD_LOCAL_CACHE'] = '0'
+
+DEFAULT_HISTORY = Path(__file__).parent / 'results' / 'history.jsonl'
+
+MODEL_TYPES = ['xgboost', 'lightgbm', 'catboost', 'random_forest']
+TARGET = 'IS_DELAYED'
+
+PAGES = ['overview', 'sales_analytics', 'customer_analytics', 'product_analytics',
+         'payment_analytics', 'delivery_performance', 'review_analytics']
+
+# Extra arguments for loaders that cannot run with their defaults
+LOADER_ARGS = {
+    'get_category_trends': lambda ctx: ([ctx.top_categories], {}),
+}
+
+
+@dataclass
+class Case:
+    """
+    One benchmark case
+
+    setup(ctx) does the untimed preparation and returns the zero-argument
+    callable that is timed; its result's len() (or rows(result)) gives the
+    rows processed per call.
+    """
+    name: str
+    group: str
+    setup: Callable[['Context'], Callable[[], object]]
+    repeat: Optional[int] = None
+    warmup: Optional[int] = None
+    rows: Optional[Callable[[object], int]] = None
+
+
+class Context:
+    """Per-scale state shared by the cases (built lazily, never timed)"""
+
+    def __init__(self, scale: float, seed: int, model_dir: str):
+        from backends import DuckDBBackend, set_backend
+        from connection_pool import ConnectionPool
+        from utils import data_loader
+
+        self.scale = scale
+        self.backend = set_backend(DuckDBBackend(scale=scale, seed=seed))
+        self.backend.database()
+        self.pool = ConnectionPool(self.backend.connection_factory(), max_size=4, name=f'bench-sf{scale:g}')
+        self.model_dir = model_dir
+        self.closing = []
+
+        os.environ['DATA_BACKEND'] = self.backend.name
+        data_loader.get_snowflake_connection = lambda: self.pool
+        self.data_loader = data_loader
+
+    def close(self):
+        for resource in self.closing:
+            resource.close()
+        self.pool.close()
+
+    def reset_caches(self):
+        """Drop cached query results so every call reaches the database"""
+        from utils.snowflake_connector import get_query_cache
+        get_query_cache(self.pool).clear()
+
+    @cached_property
+    def top_categories(self) -> list:
+        return self.data_loader.get_top_products(limit=5)['PRODUCT_CATEGORY'].tolist()
+
+    @cached_property
+    def ml_export(self) -> pd.DataFrame:
+        from load_training_data import SnowflakeDataLoader
+        loader = SnowflakeDataLoader(pool=self.pool, use_cache=False)
+        try:
+            return loader.load_obt_data()
+        finally:
+            loader.close()
+
+    @cached_property
+    def dataset(self):
+        from load_training_data import prepare_ml_dataset
+        return prepare_ml_dataset(self.ml_export, target_col=TARGET)
+
+    def model_path(self, model_type: str) -> str:
+        """Path of a model trained on the full dataset (trained on first use)"""
+        path = os.path.join(self.model_dir, f"sf{self.scale:g}_{TARGET}_{model_type}_model.pkl")
+        if not os.path.exists(path):
+            from train_model import MLTrainer
+            X, y = self.dataset
+            trainer = MLTrainer(model_type=model_type)
+            trainer.train(X, y)
+            trainer.save_model(path)
+        return path
+
+
+def _result_rows(result) -> int:
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, np.ndarray):
+        # Structured prediction arrays from batch_predict / predict_with_confidence
+        return len(result) if result.ndim else 1
+    if isinstance(result, tuple):
+        return _result_rows(result[0])
+    if isinstance(result, dict):
+        return sum(_result_rows(v) for v in result.values()) or 1
+    return 0
+
+
+def _loader_cases() -> List[Case]:
+    from utils import data_loader
+
+    def make(name):
+        def setup(ctx):
+            loader = getattr(ctx.data_loader, name)
+            args, kwargs = LOADER_ARGS[name](ctx) if name in LOADER_ARGS else ((), {})
+            return lambda: loader(*args, **kwargs)
+        return setup
+
+    return [
+        Case(f"loader.{name}", 'loader', make(name))
+        for name, fn in inspect.getmembers(data_loader, inspect.isfunction)
+        if fn.__module__ == data_loader.__name__ and not name.startswith('_')
+    ]
+
+
+def _page_cases() -> List[Case]:
+    def make(page):
+        def setup(ctx):
+            module = importlib.import_module(f"pages.{page}")
+            return module.render
+        return setup
+
+    return [Case(f"page.{page}", 'page', make(page), rows=lambda _: 0) for page in PAGES]
+
+
+def _ml_cases() -> List[Case]:
+    def load_obt(ctx):
+        from load_training_data import SnowflakeDataLoader
+        loader = SnowflakeDataLoader(pool=ctx.pool, use_cache=False)
+        ctx.closing.append(loader)
+        return loader.load_obt_data
+
+    def prepare(ctx):
+        from load_training_data import prepare_ml_dataset
+        df = ctx.ml_export
+        return lambda: prepare_ml_dataset(df, target_col=TARGET)
+
+    def train(model_type):
+        def setup(ctx):
+            from train_model import MLTrainer
+            X, y = ctx.dataset
+
+            def run():
+                MLTrainer(model_type=model_type).train(X, y)
+                return X
+            return run
+        return setup
+
+    def predict(model_type):
+        def setup(ctx):
+            from predict import ModelPredictor
+            predictor = ModelPredictor(ctx.model_path(model_type))
+            X, _ = ctx.dataset
+            return lambda: predictor.batch_predict(X)
+        return setup
+
+    cases = [
+        Case('ml_data.load_obt_data', 'ml_data', load_obt),
+        Case('ml_data.prepare_ml_dataset', 'ml_data', prepare),
+    ]
+    cases += [Case(f"train.{m}", 'train', train(m), repeat=1, warmup=0) for m in MODEL_TYPES]
+    cases += [Case(f"predict.{m}.batch_predict", 'predict', predict(m)) for m in MODEL_TYPES]
+    return cases
+
+
+def all_cases() -> List[Case]:
+    return _loader_cases() + _page_cases() + _ml_cases()
+
+
+def run_case(case: Case, ctx: Context, repeat: int, warmup: int) -> dict:
+    """Time one case; setup failures (e.g. a missing optional library) are reported, not raised"""
+    record = {'case': case.name, 'group': case.group}
+    try:
+        fn = case.setup(ctx)
+    except Exception as e:
+        record.update(status='skipped', error=f"{type(e).__name__}: {e}")
+        return record
+
+    repeat = case.repeat or repeat
+    warmup = case.warmup if case.warmup is not None else warmup
+    timings = []
+    try:
+        for _ in range(warmup):
+            ctx.reset_caches()
+            fn()
+        with PeakRSSMonitor() as rss:
+            for _ in range(repeat):
+                ctx.reset_caches()
+                started = time.perf_counter()
+                result = fn()
+                timings.append(time.perf_counter() - started)
+    except Exception as e:
+        record.update(status='error', error=f"{type(e).__name__}: {e}",
+                      traceback=traceback.format_exc(limit=3))
+        return record
+
+    rows = case.rows(result) if case.rows else _result_rows(result)
+    median = statistics.median(timings)
+    record.update(
+        status='ok',
+        repeat=repeat,
+        min_s=round(min(timings), 6),
+        median_s=round(median, 6),
+        mean_s=round(statistics.fmean(timings), 6),
+        rows=rows,
+        rows_per_sec=round(rows / median, 1) if rows and median > 0 else None,
+        peak_rss_delta_mb=round(rss.delta_mb, 1),
+        peak_rss_mb=round(rss.peak_mb, 1),
+    )
+    return record
+
+
+def _run_scale(scale: float, seed: int, patterns: List[str], repeat: int, warmup: int, queue):
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix='bench-models-') as model_dir:
+        started = time.perf_counter()
+        ctx = Context(scale, seed, model_dir)
+        setup_seconds = time.perf_counter() - started
+
+        results = []
+        for case in all_cases():
+            if patterns and not any(fnmatch.fnmatch(case.name, p if '*' in p else f"*{p}*") for p in patterns):
+                continue
+            record = run_case(case, ctx, repeat, warmup)
+            print(_format_line(record), flush=True)
+            results.append(record)
+        ctx.close()
+
+    queue.put({'dataset_setup_s': round(setup_seconds, 3),
+               'dataset': ctx.backend.describe(),
+               'results': results})
+
+
+def _git(*args) -> Optional[str]:
+    try:
+        return subprocess.run(['git', *args], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def host_info() -> dict:
+    return {
+        'node': platform.node(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def load_history(path: Path) -> List[dict]:
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_baseline(history: List[dict], scale: float, host: dict) -> Optional[dict]:
+    """Latest earlier run at the same scale on the same host"""
+    for record in reversed(history):
+        if record['scale'] == scale and record['host'].get('node') == host['node']:
+            return record
+    return None
+
+
+def compare(record: dict, baseline: dict, threshold: float,
+            min_seconds: float, min_rss_mb: float) -> List[dict]:
+    """
+    Cases that got slower or hungrier than the baseline
+
+    A case regresses when its median time grows by more than threshold
+    (relative) and by more than min_seconds, or its peak RSS delta grows by
+    more than threshold and by more than min_rss_mb.
+    """
+    previous = {r['case']: r for r in baseline['results'] if r.get('status') == 'ok'}
+    regressions = []
+    for r in record['results']:
+        old = previous.get(r['case'])
+        if r.get('status') != 'ok' or old is None:
+            continue
+        slower = r['median_s'] / max(old['median_s'], 1e-9) - 1
+        grew = r['peak_rss_delta_mb'] - old['peak_rss_delta_mb']
+        if slower > threshold and r['median_s'] - old['median_s'] > min_seconds:
+            regressions.append({'case': r['case'], 'metric': 'median_s',
+                                'old': old['median_s'], 'new': r['median_s'], 'change': slower})
+        if grew > min_rss_mb and grew / max(old['peak_rss_delta_mb'], 1.0) > threshold:
+            regressions.append({'case': r['case'], 'metric': 'peak_rss_delta_mb',
+                                'old': old['peak_rss_delta_mb'], 'new': r['peak_rss_delta_mb'],
+                                'change': grew / max(old['peak_rss_delta_mb'], 1.0)})
+    return regressions
+
+
+def _format_line(r: dict) -> str:
+    if r['status'] != 'ok':
+        return f"{r['status'].upper():<8}{r['case']:<48}{r.get('error', '')[:70]}"
+    rate = f"{r['rows_per_sec']:>14,.0f}" if r['rows_per_sec'] else f"{'-':>14}"
+    return (f"{'ok':<8}{r['case']:<48}{r['median_s']:>10.3f}{r['rows']:>12,}{rate}"
+            f"{r['peak_rss_delta_mb']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.1, 1.0],
+                        help="Dataset scale factors (1 = Olist size)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--filter', nargs='*', default=[], help="Case name substrings or globs")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed calls per case (training: 1)")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed calls per case (training: 0)")
+    parser.add_argument('--history', type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument('--no-save', action='store_true', help="Do not append to the history file")
+    parser.add_argument('--compare', action='store_true', help="Compare with the previous run per scale")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative change flagged as a regression")
+    parser.add_argument('--min-seconds', type=float, default=0.005,
+                        help="Ignore median time growth below this many seconds")
+    parser.add_argument('--min-rss-mb', type=float, default=10.0,
+                        help="Ignore peak RSS growth below this many MB")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--list', action='store_true', help="List case names and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for case in all_cases():
+            print(case.name)
+        return
+
+    history = load_history(args.history)
+    host = host_info()
+    commit = _git('rev-parse', 'HEAD')
+    dirty = bool(_git('status', '--porcelain', '--untracked-files=no'))
+    ctx = mp.get_context('spawn')
+    failed = False
+
+    for scale in args.scales:
+        print(f"\n=== Benchmark suite: scale {scale:g} ===")
+        print(f"{'status':<8}{'case':<48}{'median s':>10}{'rows':>12}{'rows/sec':>14}{'RSS Δ MB':>10}")
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_scale, args=(scale, args.seed, args.filter, args.repeat, args.warmup, queue))
+        proc.start()
+        outcome = queue.get()
+        proc.join()
+
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': commit,
+            'dirty': dirty,
+            'host': host,
+            'scale': scale,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'filter': args.filter,
+            **outcome,
+        }
+
+        if args.compare:
+            baseline = find_baseline(history, scale, host)
+            if baseline is None:
+                print(f"\nNo earlier run at scale {scale:g} on this host to compare with")
+            else:
+                regressions = compare(record, baseline, args.threshold, args.min_seconds, args.min_rss_mb)
+                record['baseline_commit'] = baseline.get('commit')
+                record['regressions'] = regressions
+                print(f"\nCompared with {str(baseline.get('commit'))[:10]} ({baseline['timestamp']}):")
+                for r in regressions:
+                    print(f"  ⚠️ {r['case']}: {r['metric']} {r['old']} -> {r['new']} (+{r['change']:.0%})")
+                if not regressions:
+                    print("  ✅ no regressions")
+                failed = failed or bool(regressions)
+
+        if not args.no_save:
+            args.history.parent.mkdir(parents=True, exist_ok=True)
+            with open(args.history, 'a') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+            history.append(record)
+
+    if not args.no_save:
+        print(f"\nHistory: {args.history}")
+    if failed and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ Main Streamlit application
 """
 import streamlit as st
 from datetime import datetime, timedelta
+from utils.instrumentation import traced_render, render_debug_panel
 
 # Page configuration
 st.set_page_config(
@@ -103,12 +104,16 @@ with st.sidebar:
         "Date Range",
         value=(datetime(2016, 1, 1), datetime(2018, 12, 31)),
         min_value=datetime(2016, 1, 1),
-        max_value=datetime(2018, 12, 31)
+        max_value=datetime(2018, 12, 31),
+        key='filter_date_range'
     )
     
-    # Additional filters
-    st.selectbox("Order Status", ["All", "delivered", "shipped", "canceled"])
-    st.selectbox("Region", ["All", "North", "South", "East", "West"])
+    # Read by the overview and sales pages
+    st.selectbox(
+        "Order Status",
+        ["All", "delivered", "shipped", "canceled"],
+        key='filter_order_status'
+    )
     
     st.markdown("---")
     st.info("🔄 Data from: 2016-2018 | Brazilian E-Commerce Dataset")
@@ -116,31 +121,49 @@ with st.sidebar:
 # Main content area
 if page == "🏠 Overview":
     from pages import overview
-    overview.render()
+    traced_render('overview', overview.render)()
     
 elif page == "📈 Sales Analytics":
     from pages import sales_analytics
-    sales_analytics.render()
+    traced_render('sales_analytics', sales_analytics.render)()
     
 elif page == "👥 Customer Analytics":
     from pages import customer_analytics
-    customer_analytics.render()
+    traced_render('customer_analytics', customer_analytics.render)()
     
 elif page == "📦 Product Analytics":
     from pages import product_analytics
-    product_analytics.render()
+    traced_render('product_analytics', product_analytics.render)()
     
 elif page == "🚚 Delivery Performance":
     from pages import delivery_performance
-    delivery_performance.render()
+    traced_render('delivery_performance', delivery_performance.render)()
     
 elif page == "💰 Payment Analytics":
     from pages import payment_analytics
-    payment_analytics.render()
+    traced_render('payment_analytics', payment_analytics.render)()
     
 elif page == "⭐ Review Analytics":
     from pages import review_analytics
-    review_analytics.render()
+    traced_render('review_analytics', review_analytics.render)()
+
+# Cache hit/miss counters (after the page so this run is counted)
+from utils.snowflake_connector import get_local_cache_stats, get_query_cache_stats
+cache_stats = get_local_cache_stats()
+query_stats = get_query_cache_stats()
+with st.sidebar.expander("⚡ Caches"):
+    st.caption(
+        f"Results: {query_stats['hits']} fresh · {query_stats['stale_hits']} stale · "
+        f"{query_stats['misses']} misses · {query_stats['refreshes']} refreshed"
+    )
+    if cache_stats:
+        st.metric("Local Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+        st.caption(
+            f"{cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+            f"{cache_stats['bypassed']} bypassed · "
+            f"{cache_stats['bytes'] / 1024 ** 2:.1f} / {cache_stats['max_bytes'] / 1024 ** 2:.0f} MB"
+        )
+render_debug_panel()
 
 # Footer
 st.markdown("---")
@@ -9,7 +9,13 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.data_loader import get_delivery_performance_by_state, load_gold_obt_summary
+from utils.data_loader import (
+    PageQueryPlan,
+    get_delivery_performance_by_state,
+    get_delivery_days_distribution,
+    get_late_delivery_split,
+    get_delivery_estimate_grid
+)
 
 
 def render():
@@ -18,12 +24,20 @@ def render():
     st.title("🚚 Delivery Performance")
     st.markdown("Logistics and delivery metrics analysis")
     
-    # Load data
+    # Load all page aggregates concurrently (exact, over every order)
+    plan = (
+        PageQueryPlan('delivery')
+        .add('states', get_delivery_performance_by_state)
+        .add('days', get_delivery_days_distribution, bins=50)
+        .add('late', get_late_delivery_split)
+        .add('estimates', get_delivery_estimate_grid)
+    )
     with st.spinner("Loading delivery data..."):
-        state_delivery = get_delivery_performance_by_state()
-        obt_data = load_gold_obt_summary(limit=10000)
+        data = plan.run()
+    
+    state_delivery = data['states']
     
-    if state_delivery.empty:
+    if state_delivery is None or state_delivery.empty:
         st.warning("No delivery data available")
         return
     
@@ -94,50 +108,51 @@ def render():
     fig_volume.update_layout(height=450, showlegend=False)
     st.plotly_chart(fig_volume, use_container_width=True)
     
-    # Delivery days distribution
-    if not obt_data.empty and 'ACTUAL_DELIVERY_DAYS' in obt_data.columns:
+    # Delivery days distribution (0-100 days, outliers removed server-side)
+    distribution = data['days'] or {'histogram': None, 'box': {}}
+    histogram = distribution['histogram']
+    box = distribution['box']
+    
+    if histogram is not None and not histogram.empty:
         st.markdown("---")
         st.subheader("📊 Delivery Days Distribution")
         
-        # Filter valid delivery data
-        delivery_data = obt_data[
-            (obt_data['ACTUAL_DELIVERY_DAYS'].notna()) & 
-            (obt_data['ACTUAL_DELIVERY_DAYS'] > 0) &
-            (obt_data['ACTUAL_DELIVERY_DAYS'] < 100)  # Remove outliers
-        ]
+        col1, col2 = st.columns(2)
         
-        if not delivery_data.empty:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                fig_hist = px.histogram(
-                    delivery_data,
-                    x='ACTUAL_DELIVERY_DAYS',
-                    nbins=50,
-                    title='Distribution of Delivery Days',
-                    labels={'ACTUAL_DELIVERY_DAYS': 'Delivery Days'},
-                    color_discrete_sequence=['#1f77b4']
-                )
-                fig_hist.update_layout(showlegend=False)
-                st.plotly_chart(fig_hist, use_container_width=True)
-            
-            with col2:
-                fig_box = px.box(
-                    delivery_data,
-                    y='ACTUAL_DELIVERY_DAYS',
-                    title='Delivery Days Box Plot',
-                    labels={'ACTUAL_DELIVERY_DAYS': 'Delivery Days'},
-                    color_discrete_sequence=['#2ca02c']
-                )
-                st.plotly_chart(fig_box, use_container_width=True)
-            
-            # Late delivery analysis
+        with col1:
+            fig_hist = px.bar(
+                histogram,
+                x=(histogram['BIN_START'] + histogram['BIN_END']) / 2,
+                y='COUNT',
+                title='Distribution of Delivery Days',
+                labels={'x': 'Delivery Days', 'COUNT': 'count'},
+                color_discrete_sequence=['#1f77b4']
+            )
+            fig_hist.update_traces(width=float(histogram['BIN_END'].iloc[0] - histogram['BIN_START'].iloc[0]))
+            fig_hist.update_layout(showlegend=False, bargap=0)
+            st.plotly_chart(fig_hist, use_container_width=True)
+        
+        with col2:
+            fig_box = go.Figure(go.Box(
+                name='ACTUAL_DELIVERY_DAYS',
+                q1=[box['q1']],
+                median=[box['median']],
+                q3=[box['q3']],
+                lowerfence=[box['lowerfence']],
+                upperfence=[box['upperfence']],
+                marker_color='#2ca02c'
+            ))
+            fig_box.update_layout(title='Delivery Days Box Plot', yaxis_title='Delivery Days')
+            st.plotly_chart(fig_box, use_container_width=True)
+        
+        # Late delivery analysis
+        late_analysis = data['late']
+        if late_analysis is not None and not late_analysis.empty:
             st.markdown("---")
             st.subheader("⏰ On-Time vs Late Deliveries")
             
-            late_analysis = delivery_data.groupby('IS_LATE_DELIVERY').size().reset_index()
-            late_analysis.columns = ['STATUS', 'COUNT']
-            late_analysis['STATUS'] = late_analysis['STATUS'].map({0: 'On Time', 1: 'Late'})
+            late_analysis = late_analysis.rename(columns={'IS_LATE_DELIVERY': 'STATUS'})
+            late_analysis['STATUS'] = late_analysis['STATUS'].astype('boolean').map({False: 'On Time', True: 'Late'})
             
             fig_late = px.pie(
                 late_analysis,
@@ -150,40 +165,42 @@ def render():
             )
             fig_late.update_traces(textposition='inside', textinfo='percent+label')
             st.plotly_chart(fig_late, use_container_width=True)
-            
-            # Delivery days vs estimated days
+        
+        # Delivery days vs estimated days
+        comparison_data = data['estimates']
+        if comparison_data is not None and not comparison_data.empty:
             st.markdown("---")
             st.subheader("📅 Actual vs Estimated Delivery Days")
             
-            if 'ESTIMATED_DELIVERY_DAYS' in delivery_data.columns:
-                comparison_data = delivery_data[
-                    (delivery_data['ESTIMATED_DELIVERY_DAYS'].notna()) &
-                    (delivery_data['ESTIMATED_DELIVERY_DAYS'] > 0)
-                ].sample(min(1000, len(delivery_data)))
-                
-                fig_comparison = px.scatter(
-                    comparison_data,
-                    x='ESTIMATED_DELIVERY_DAYS',
-                    y='ACTUAL_DELIVERY_DAYS',
-                    title='Actual vs Estimated Delivery Days (Sample)',
-                    labels={
-                        'ESTIMATED_DELIVERY_DAYS': 'Estimated Days',
-                        'ACTUAL_DELIVERY_DAYS': 'Actual Days'
-                    },
-                    color='IS_LATE_DELIVERY',
-                    color_discrete_map={0: '#2ca02c', 1: '#d62728'},
-                    opacity=0.6
-                )
-                # Add diagonal line (perfect estimation)
-                fig_comparison.add_trace(go.Scatter(
-                    x=[0, 50],
-                    y=[0, 50],
-                    mode='lines',
-                    name='Perfect Estimation',
-                    line=dict(color='gray', dash='dash')
-                ))
-                fig_comparison.update_layout(height=500)
-                st.plotly_chart(fig_comparison, use_container_width=True)
+            # IS_LATE_DELIVERY arrives as a boolean or as 0/1 depending on the engine
+            comparison_data = comparison_data.copy()
+            comparison_data['STATUS'] = comparison_data['IS_LATE_DELIVERY'].astype('boolean').map({False: 'On Time', True: 'Late'})
+            
+            # One point per (estimated, actual) cell, sized by order count
+            fig_comparison = px.scatter(
+                comparison_data,
+                x='ESTIMATED_DELIVERY_DAYS',
+                y='ACTUAL_DELIVERY_DAYS',
+                size='ORDER_COUNT',
+                title='Actual vs Estimated Delivery Days (point size = orders)',
+                labels={
+                    'ESTIMATED_DELIVERY_DAYS': 'Estimated Days',
+                    'ACTUAL_DELIVERY_DAYS': 'Actual Days'
+                },
+                color='STATUS',
+                color_discrete_map={'On Time': '#2ca02c', 'Late': '#d62728'},
+                opacity=0.6
+            )
+            # Add diagonal line (perfect estimation)
+            fig_comparison.add_trace(go.Scatter(
+                x=[0, 50],
+                y=[0, 50],
+                mode='lines',
+                name='Perfect Estimation',
+                line=dict(color='gray', dash='dash')
+            ))
+            fig_comparison.update_layout(height=500)
+            st.plotly_chart(fig_comparison, use_container_width=True)
     
     # State performance table
     st.markdown("---")
@@ -200,6 +217,10 @@ def render():
         height=400
     )
     
+    # Query timings
+    st.markdown("---")
+    plan.render_timings()
+    
     # Download button
     st.markdown("---")
     csv = state_delivery.to_csv(index=False)
@@ -12,6 +12,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.data_loader import (
+    PageQueryPlan,
     get_kpi_metrics,
     get_sales_over_time,
     get_customer_segments,
@@ -26,13 +27,30 @@ def render():
     st.markdown("High-level business metrics and trends")
     
     # Date range - Brazilian E-Commerce data is from 2016-2018
-    # Use full data range by default
+    # Use the sidebar filters, falling back to the full data range
     start_date = "2016-01-01"
     end_date = "2018-12-31"
-    
-    # Load KPI metrics
-    with st.spinner("Loading KPI metrics..."):
-        kpis = get_kpi_metrics(start_date, end_date)
+    date_range = st.session_state.get('filter_date_range')
+    if date_range and len(date_range) == 2:
+        start_date, end_date = date_range
+    order_status = st.session_state.get('filter_order_status', 'All')
+    
+    # Granularity widget is rendered further down; read its last value so
+    # every dataset can be requested up front
+    granularity = st.session_state.get('overview_granularity', 'week')
+    
+    # Load all page datasets concurrently
+    plan = (
+        PageQueryPlan('overview')
+        .add('kpis', get_kpi_metrics, start_date, end_date, order_status)
+        .add('sales', get_sales_over_time, start_date, end_date, granularity, order_status=order_status)
+        .add('segments', get_customer_segments)
+        .add('products', get_top_products, limit=10)
+    )
+    with st.spinner("Loading overview data..."):
+        data = plan.run()
+    
+    kpis = data['kpis']
     
     if not kpis:
         st.warning("No data available for the selected date range")
@@ -107,16 +125,16 @@ def render():
     col1, col2 = st.columns([3, 1])
     
     with col2:
-        granularity = st.selectbox(
+        st.selectbox(
             "Granularity",
             ["day", "week", "month"],
-            index=1
+            index=1,
+            key='overview_granularity'
         )
     
-    with st.spinner("Loading sales trends..."):
-        sales_data = get_sales_over_time(start_date, end_date, granularity)
+    sales_data = data['sales']
     
-    if not sales_data.empty:
+    if sales_data is not None and not sales_data.empty:
         # Revenue trend
         fig_revenue = go.Figure()
         fig_revenue.add_trace(go.Scatter(
@@ -170,10 +188,9 @@ def render():
     
     with col1:
         st.subheader("👥 Customer Segments")
-        with st.spinner("Loading customer segments..."):
-            segments = get_customer_segments()
+        segments = data['segments']
         
-        if not segments.empty:
+        if segments is not None and not segments.empty:
             fig_segments = px.pie(
                 segments,
                 values='CUSTOMER_COUNT',
@@ -192,10 +209,9 @@ def render():
     
     with col2:
         st.subheader("📦 Top Product Categories")
-        with st.spinner("Loading top products..."):
-            products = get_top_products(limit=10)
+        products = data['products']
         
-        if not products.empty:
+        if products is not None and not products.empty:
             fig_products = px.bar(
                 products,
                 x='TOTAL_REVENUE',
@@ -211,9 +227,13 @@ def render():
         else:
             st.info("No product data available")
     
-    # Refresh button
+    # Query timings
     st.markdown("---")
+    plan.render_timings()
+    
+    # Refresh button
     if st.button("🔄 Refresh Data", type="primary"):
-        from utils.snowflake_connector import clear_cache
-        clear_cache()
+        # Drop cached results only; the connection pool stays warm
+        from utils.snowflake_connector import refresh_data
+        refresh_data('gold_fact_order_summary', 'gold_agg_sales_daily', 'gold_obt_orders', 'fs_customer_features')
         st.rerun()
@@ -9,7 +9,14 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.data_loader import load_gold_obt_summary
+from utils.data_loader import (
+    PageQueryPlan,
+    get_payment_summary,
+    get_payment_type_stats,
+    get_installment_distribution,
+    get_payment_value_distribution,
+    get_payment_trends
+)
 
 
 def render():
@@ -18,11 +25,22 @@ def render():
     st.title("💰 Payment Analytics")
     st.markdown("Payment methods, installments, and transaction analysis")
     
-    # Load data
+    # Load all page aggregates concurrently (exact, over every order)
+    plan = (
+        PageQueryPlan('payment')
+        .add('summary', get_payment_summary)
+        .add('types', get_payment_type_stats)
+        .add('installments', get_installment_distribution)
+        .add('values', get_payment_value_distribution, bins=50)
+        .add('trends', get_payment_trends)
+    )
     with st.spinner("Loading payment data..."):
-        obt_data = load_gold_obt_summary(limit=10000)
+        data = plan.run()
+    
+    summary = data['summary']
+    payment_types = data['types']
     
-    if obt_data.empty or 'PAYMENT_TYPE' not in obt_data.columns:
+    if not summary or payment_types is None or payment_types.empty:
         st.warning("No payment data available")
         return
     
@@ -31,10 +49,10 @@ def render():
     
     col1, col2, col3, col4 = st.columns(4)
     
-    total_transactions = len(obt_data)
-    total_value = obt_data['PAYMENT_VALUE'].sum()
-    avg_transaction = obt_data['PAYMENT_VALUE'].mean()
-    avg_installments = obt_data['PAYMENT_INSTALLMENTS'].mean()
+    total_transactions = int(summary['TOTAL_TRANSACTIONS'])
+    total_value = summary['TOTAL_VALUE']
+    avg_transaction = summary['AVG_TRANSACTION']
+    avg_installments = summary['AVG_INSTALLMENTS']
     
     col1.metric("Total Transactions", f"{total_transactions:,}")
     col2.metric("Total Payment Value", f"R$ {total_value:,.2f}")
@@ -46,12 +64,7 @@ def render():
     # Payment type distribution
     st.subheader("💳 Payment Method Distribution")
     
-    payment_dist = obt_data.groupby('PAYMENT_TYPE').agg({
-        'ORDER_ID': 'count',
-        'PAYMENT_VALUE': 'sum'
-    }).reset_index()
-    payment_dist.columns = ['PAYMENT_TYPE', 'TRANSACTION_COUNT', 'TOTAL_VALUE']
-    payment_dist = payment_dist.sort_values('TOTAL_VALUE', ascending=False)
+    payment_dist = payment_types[['PAYMENT_TYPE', 'TRANSACTION_COUNT', 'TOTAL_VALUE']]
     
     col1, col2 = st.columns(2)
     
@@ -97,15 +110,11 @@ def render():
     st.markdown("---")
     st.subheader("📅 Installment Analysis")
     
-    installment_data = obt_data[obt_data['PAYMENT_INSTALLMENTS'] > 0]
+    installment_dist = data['installments']
     
     col1, col2 = st.columns(2)
     
     with col1:
-        installment_dist = installment_data.groupby('PAYMENT_INSTALLMENTS').size().reset_index()
-        installment_dist.columns = ['INSTALLMENTS', 'COUNT']
-        installment_dist = installment_dist.sort_values('INSTALLMENTS')
-        
         fig_installments = px.bar(
             installment_dist,
             x='INSTALLMENTS',
@@ -120,11 +129,8 @@ def render():
     
     with col2:
         # Average payment value by installments
-        avg_by_installments = installment_data.groupby('PAYMENT_INSTALLMENTS')['PAYMENT_VALUE'].mean().reset_index()
-        avg_by_installments.columns = ['INSTALLMENTS', 'AVG_VALUE']
-        
         fig_avg_installments = px.line(
-            avg_by_installments,
+            installment_dist,
             x='INSTALLMENTS',
             y='AVG_VALUE',
             title='Average Payment Value by Installments',
@@ -138,48 +144,46 @@ def render():
     st.markdown("---")
     st.subheader("💵 Payment Value Distribution")
     
-    # Filter outliers for better visualization
-    payment_values = obt_data['PAYMENT_VALUE']
-    q1, q99 = payment_values.quantile([0.01, 0.99])
-    filtered_payments = obt_data[(payment_values >= q1) & (payment_values <= q99)]
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        fig_hist = px.histogram(
-            filtered_payments,
-            x='PAYMENT_VALUE',
-            nbins=50,
-            title='Payment Value Distribution (1st-99th percentile)',
-            labels={'PAYMENT_VALUE': 'Payment Value (R$)'},
-            color_discrete_sequence=['#1f77b4']
-        )
-        fig_hist.update_layout(showlegend=False)
-        st.plotly_chart(fig_hist, use_container_width=True)
+    # Outliers (outside the 1st-99th percentile) are filtered server-side
+    distribution = data['values'] or {'histogram': None, 'box': {}}
+    histogram = distribution['histogram']
+    box = distribution['box']
     
-    with col2:
-        fig_box = px.box(
-            filtered_payments,
-            y='PAYMENT_VALUE',
-            title='Payment Value Box Plot',
-            labels={'PAYMENT_VALUE': 'Payment Value (R$)'},
-            color_discrete_sequence=['#ff7f0e']
-        )
-        st.plotly_chart(fig_box, use_container_width=True)
+    if histogram is not None and not histogram.empty:
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            fig_hist = px.bar(
+                histogram,
+                x=(histogram['BIN_START'] + histogram['BIN_END']) / 2,
+                y='COUNT',
+                title='Payment Value Distribution (1st-99th percentile)',
+                labels={'x': 'Payment Value (R$)', 'COUNT': 'count'},
+                color_discrete_sequence=['#1f77b4']
+            )
+            fig_hist.update_traces(width=float(histogram['BIN_END'].iloc[0] - histogram['BIN_START'].iloc[0]))
+            fig_hist.update_layout(showlegend=False, bargap=0)
+            st.plotly_chart(fig_hist, use_container_width=True)
+        
+        with col2:
+            fig_box = go.Figure(go.Box(
+                name='PAYMENT_VALUE',
+                q1=[box['q1']],
+                median=[box['median']],
+                q3=[box['q3']],
+                lowerfence=[box['lowerfence']],
+                upperfence=[box['upperfence']],
+                marker_color='#ff7f0e'
+            ))
+            fig_box.update_layout(title='Payment Value Box Plot', yaxis_title='Payment Value (R$)')
+            st.plotly_chart(fig_box, use_container_width=True)
     
     # Payment trends over time
-    if 'ORDER_PURCHASE_TIMESTAMP' in obt_data.columns:
+    payment_trends = data['trends']
+    if payment_trends is not None and not payment_trends.empty:
         st.markdown("---")
         st.subheader("📈 Payment Trends Over Time")
         
-        obt_data['ORDER_DATE'] = obt_data['ORDER_PURCHASE_TIMESTAMP'].dt.date
-        
-        payment_trends = obt_data.groupby(['ORDER_DATE', 'PAYMENT_TYPE']).agg({
-            'PAYMENT_VALUE': 'sum',
-            'ORDER_ID': 'count'
-        }).reset_index()
-        payment_trends.columns = ['DATE', 'PAYMENT_TYPE', 'TOTAL_VALUE', 'TRANSACTION_COUNT']
-        
         fig_trend = px.line(
             payment_trends,
             x='DATE',
@@ -195,17 +199,15 @@ def render():
     st.markdown("---")
     st.subheader("📋 Payment Method Statistics")
     
-    payment_stats = obt_data.groupby('PAYMENT_TYPE').agg({
-        'ORDER_ID': 'count',
-        'PAYMENT_VALUE': ['sum', 'mean', 'median', 'std'],
-        'PAYMENT_INSTALLMENTS': 'mean'
-    }).round(2)
-    
+    payment_stats = payment_types.set_index('PAYMENT_TYPE').round(2)
     payment_stats.columns = ['Transaction Count', 'Total Value', 'Avg Value', 'Median Value', 'Std Dev', 'Avg Installments']
-    payment_stats = payment_stats.sort_values('Total Value', ascending=False)
     
     st.dataframe(payment_stats, use_container_width=True)
     
+    # Query timings
+    st.markdown("---")
+    plan.render_timings()
+    
     # Download button
     st.markdown("---")
     csv = payment_dist.to_csv(index=False)
@@ -8,7 +8,7 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.data_loader import get_top_products, load_gold_obt_summary
+from utils.data_loader import get_top_products, get_category_trends
 
 
 def render():
@@ -20,7 +20,6 @@ def render():
     # Load data
     with st.spinner("Loading product data..."):
         products = get_top_products(limit=20)
-        obt_data = load_gold_obt_summary(limit=5000)
     
     if products.empty:
         st.warning("No product data available")
@@ -136,36 +135,25 @@ def render():
         height=400
     )
     
-    # Product trends over time (if OBT data available)
-    if not obt_data.empty and 'PRODUCT_CATEGORY' in obt_data.columns:
+    # Product trends over time
+    # Get top 5 categories
+    top_5_cats = products.head(5)['PRODUCT_CATEGORY'].tolist()
+    trend_summary = get_category_trends(top_5_cats)
+    
+    if not trend_summary.empty:
         st.markdown("---")
         st.subheader("📅 Category Trends Over Time")
         
-        # Get top 5 categories
-        top_5_cats = products.head(5)['PRODUCT_CATEGORY'].tolist()
-        
-        # Filter OBT data
-        trend_data = obt_data[obt_data['PRODUCT_CATEGORY'].isin(top_5_cats)]
-        
-        if not trend_data.empty:
-            # Group by date and category
-            trend_data['ORDER_DATE'] = trend_data['ORDER_PURCHASE_TIMESTAMP'].dt.date
-            trend_summary = trend_data.groupby(['ORDER_DATE', 'PRODUCT_CATEGORY']).agg({
-                'ORDER_ID': 'count',
-                'PAYMENT_VALUE': 'sum'
-            }).reset_index()
-            trend_summary.columns = ['DATE', 'CATEGORY', 'ORDERS', 'REVENUE']
-            
-            fig_trend = px.line(
-                trend_summary,
-                x='DATE',
-                y='REVENUE',
-                color='CATEGORY',
-                title='Revenue Trend - Top 5 Categories',
-                labels={'REVENUE': 'Revenue (R$)', 'DATE': 'Date'}
-            )
-            fig_trend.update_layout(height=450)
-            st.plotly_chart(fig_trend, use_container_width=True)
+        fig_trend = px.line(
+            trend_summary,
+            x='DATE',
+            y='REVENUE',
+            color='CATEGORY',
+            title='Revenue Trend - Top 5 Categories',
+            labels={'REVENUE': 'Revenue (R$)', 'DATE': 'Date'}
+        )
+        fig_trend.update_layout(height=450)
+        st.plotly_chart(fig_trend, use_container_width=True)
     
     # Download button
     st.markdown("---")
@@ -9,7 +9,17 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.data_loader import load_gold_obt_summary, load_order_summary
+from utils.data_loader import (
+    PageQueryPlan,
+    get_review_summary,
+    get_review_score_distribution,
+    get_review_sentiment_distribution,
+    get_review_scores_by_category,
+    get_review_delivery_grid,
+    get_review_score_by_delivery_bucket,
+    get_review_score_by_price_bucket,
+    get_monthly_review_trend
+)
 
 
 def render():
@@ -18,19 +28,24 @@ def render():
     st.title("⭐ Review Analytics")
     st.markdown("Customer feedback and review analysis")
     
-    # Load data
+    # Load all page aggregates concurrently (exact, over every reviewed order)
+    plan = (
+        PageQueryPlan('review')
+        .add('summary', get_review_summary)
+        .add('scores', get_review_score_distribution)
+        .add('sentiment', get_review_sentiment_distribution)
+        .add('categories', get_review_scores_by_category, min_reviews=10)
+        .add('delivery_grid', get_review_delivery_grid)
+        .add('delivery_buckets', get_review_score_by_delivery_bucket)
+        .add('price_buckets', get_review_score_by_price_bucket, buckets=5)
+        .add('monthly', get_monthly_review_trend)
+    )
     with st.spinner("Loading review data..."):
-        obt_data = load_gold_obt_summary(limit=10000)
-        order_summary = load_order_summary()
-    
-    if obt_data.empty or 'REVIEW_SCORE' not in obt_data.columns:
-        st.warning("No review data available")
-        return
+        data = plan.run()
     
-    # Filter only orders with reviews
-    review_data = obt_data[obt_data['REVIEW_SCORE'].notna()]
+    summary = data['summary']
     
-    if review_data.empty:
+    if not summary:
         st.warning("No reviews found in the dataset")
         return
     
@@ -39,10 +54,10 @@ def render():
     
     col1, col2, col3, col4 = st.columns(4)
     
-    total_reviews = len(review_data)
-    avg_score = review_data['REVIEW_SCORE'].mean()
-    positive_rate = (review_data['REVIEW_SCORE'] >= 4).sum() / len(review_data)
-    negative_rate = (review_data['REVIEW_SCORE'] <= 2).sum() / len(review_data)
+    total_reviews = int(summary['TOTAL_REVIEWS'])
+    avg_score = summary['AVG_SCORE']
+    positive_rate = summary['POSITIVE_RATE']
+    negative_rate = summary['NEGATIVE_RATE']
     
     col1.metric("Total Reviews", f"{total_reviews:,}")
     col2.metric("Avg Review Score", f"{avg_score:.2f} / 5.0")
@@ -54,8 +69,7 @@ def render():
     # Review score distribution
     st.subheader("⭐ Review Score Distribution")
     
-    score_dist = review_data['REVIEW_SCORE'].value_counts().sort_index().reset_index()
-    score_dist.columns = ['SCORE', 'COUNT']
+    score_dist = data['scores']
     
     col1, col2 = st.columns([2, 1])
     
@@ -82,19 +96,17 @@ def render():
             names='SCORE',
             title='Score Proportions',
             color='SCORE',
-            color_discrete_sequence=px.colors.sequential.RdYlGn
+            color_discrete_sequence=px.colors.diverging.RdYlGn
         )
         fig_pie.update_traces(textposition='inside', textinfo='percent')
         st.plotly_chart(fig_pie, use_container_width=True)
     
     # Review sentiment analysis
-    if 'REVIEW_SENTIMENT' in review_data.columns:
+    sentiment_data = data['sentiment']
+    if sentiment_data is not None and not sentiment_data.empty:
         st.markdown("---")
         st.subheader("😊 Review Sentiment")
         
-        sentiment_data = review_data['REVIEW_SENTIMENT'].value_counts().reset_index()
-        sentiment_data.columns = ['SENTIMENT', 'COUNT']
-        
         fig_sentiment = px.bar(
             sentiment_data,
             x='SENTIMENT',
@@ -110,18 +122,12 @@ def render():
         )
         st.plotly_chart(fig_sentiment, use_container_width=True)
     
-    # Review scores by product category
-    if 'PRODUCT_CATEGORY' in review_data.columns:
+    # Review scores by product category (min 10 reviews, best first)
+    category_reviews = data['categories']
+    if category_reviews is not None and not category_reviews.empty:
         st.markdown("---")
         st.subheader("📦 Review Scores by Product Category")
         
-        category_reviews = review_data.groupby('PRODUCT_CATEGORY').agg({
-            'REVIEW_SCORE': ['mean', 'count']
-        }).reset_index()
-        category_reviews.columns = ['CATEGORY', 'AVG_SCORE', 'REVIEW_COUNT']
-        category_reviews = category_reviews[category_reviews['REVIEW_COUNT'] >= 10]  # Min 10 reviews
-        category_reviews = category_reviews.sort_values('AVG_SCORE', ascending=False)
-        
         col1, col2 = st.columns(2)
         
         with col1:
@@ -157,78 +163,54 @@ def render():
             st.plotly_chart(fig_bottom, use_container_width=True)
     
     # Review score vs delivery performance
-    if 'ACTUAL_DELIVERY_DAYS' in review_data.columns:
+    delivery_grid = data['delivery_grid']
+    bucket_avg = data['delivery_buckets']
+    if delivery_grid is not None and not delivery_grid.empty:
         st.markdown("---")
         st.subheader("📊 Review Score vs Delivery Performance")
         
-        # Filter valid delivery data
-        delivery_review_data = review_data[
-            (review_data['ACTUAL_DELIVERY_DAYS'].notna()) & 
-            (review_data['ACTUAL_DELIVERY_DAYS'] > 0) &
-            (review_data['ACTUAL_DELIVERY_DAYS'] < 100)
-        ]
+        col1, col2 = st.columns(2)
         
-        if not delivery_review_data.empty:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Scatter plot
-                fig_scatter = px.scatter(
-                    delivery_review_data.sample(min(2000, len(delivery_review_data))),
-                    x='ACTUAL_DELIVERY_DAYS',
-                    y='REVIEW_SCORE',
-                    title='Review Score vs Delivery Days (Sample)',
-                    labels={'ACTUAL_DELIVERY_DAYS': 'Delivery Days', 'REVIEW_SCORE': 'Review Score'},
-                    color='REVIEW_SCORE',
-                    color_continuous_scale='RdYlGn',
-                    opacity=0.6
-                )
-                st.plotly_chart(fig_scatter, use_container_width=True)
-            
-            with col2:
-                # Average score by delivery time buckets
-                delivery_review_data['DELIVERY_BUCKET'] = pd.cut(
-                    delivery_review_data['ACTUAL_DELIVERY_DAYS'],
-                    bins=[0, 7, 14, 21, 30, 100],
-                    labels=['0-7 days', '8-14 days', '15-21 days', '22-30 days', '30+ days']
-                )
-                
-                bucket_avg = delivery_review_data.groupby('DELIVERY_BUCKET')['REVIEW_SCORE'].mean().reset_index()
-                
-                fig_bucket = px.bar(
-                    bucket_avg,
-                    x='DELIVERY_BUCKET',
-                    y='REVIEW_SCORE',
-                    title='Average Review Score by Delivery Time',
-                    labels={'DELIVERY_BUCKET': 'Delivery Time', 'REVIEW_SCORE': 'Avg Review Score'},
-                    color='REVIEW_SCORE',
-                    color_continuous_scale='RdYlGn',
-                    range_color=[1, 5]
-                )
-                fig_bucket.update_layout(showlegend=False)
-                st.plotly_chart(fig_bucket, use_container_width=True)
+        with col1:
+            # One point per (delivery days, score) cell, sized by review count
+            fig_scatter = px.scatter(
+                delivery_grid,
+                x='ACTUAL_DELIVERY_DAYS',
+                y='REVIEW_SCORE',
+                size='REVIEW_COUNT',
+                title='Review Score vs Delivery Days (point size = reviews)',
+                labels={'ACTUAL_DELIVERY_DAYS': 'Delivery Days', 'REVIEW_SCORE': 'Review Score'},
+                color='REVIEW_SCORE',
+                color_continuous_scale='RdYlGn',
+                opacity=0.6
+            )
+            st.plotly_chart(fig_scatter, use_container_width=True)
+        
+        with col2:
+            # Average score by delivery time buckets
+            fig_bucket = px.bar(
+                bucket_avg,
+                x='DELIVERY_BUCKET',
+                y='REVIEW_SCORE',
+                title='Average Review Score by Delivery Time',
+                labels={'DELIVERY_BUCKET': 'Delivery Time', 'REVIEW_SCORE': 'Avg Review Score'},
+                color='REVIEW_SCORE',
+                color_continuous_scale='RdYlGn',
+                range_color=[1, 5]
+            )
+            fig_bucket.update_layout(showlegend=False)
+            st.plotly_chart(fig_bucket, use_container_width=True)
     
-    # Review score vs payment value
-    if 'PAYMENT_VALUE' in review_data.columns:
+    # Review score vs payment value (1st-99th percentile, filtered server-side)
+    bucket_stats = data['price_buckets']
+    if bucket_stats is not None and not bucket_stats.empty:
         st.markdown("---")
         st.subheader("💰 Review Score vs Payment Value")
         
-        # Filter outliers
-        payment_values = review_data['PAYMENT_VALUE']
-        q1, q99 = payment_values.quantile([0.01, 0.99])
-        filtered_data = review_data[(payment_values >= q1) & (payment_values <= q99)]
-        
         # Payment value buckets
-        filtered_data['PRICE_BUCKET'] = pd.cut(
-            filtered_data['PAYMENT_VALUE'],
-            bins=5,
-            labels=['Very Low', 'Low', 'Medium', 'High', 'Very High']
-        )
-        
-        bucket_stats = filtered_data.groupby('PRICE_BUCKET').agg({
-            'REVIEW_SCORE': ['mean', 'count']
-        }).reset_index()
-        bucket_stats.columns = ['PRICE_BUCKET', 'AVG_SCORE', 'COUNT']
+        labels = ['Very Low', 'Low', 'Medium', 'High', 'Very High']
+        bucket_stats = bucket_stats.copy()
+        bucket_stats['PRICE_BUCKET'] = bucket_stats['BIN'].map(dict(enumerate(labels)))
         
         fig_price = px.bar(
             bucket_stats,
@@ -246,17 +228,11 @@ def render():
         st.plotly_chart(fig_price, use_container_width=True)
     
     # Review trends over time
-    if 'ORDER_PURCHASE_TIMESTAMP' in review_data.columns:
+    monthly_reviews = data['monthly']
+    if monthly_reviews is not None and not monthly_reviews.empty:
         st.markdown("---")
         st.subheader("📈 Review Score Trends Over Time")
         
-        review_data['ORDER_DATE'] = review_data['ORDER_PURCHASE_TIMESTAMP'].dt.to_period('M').dt.to_timestamp()
-        
-        monthly_reviews = review_data.groupby('ORDER_DATE').agg({
-            'REVIEW_SCORE': ['mean', 'count']
-        }).reset_index()
-        monthly_reviews.columns = ['DATE', 'AVG_SCORE', 'REVIEW_COUNT']
-        
         fig_trend = go.Figure()
         fig_trend.add_trace(go.Scatter(
             x=monthly_reviews['DATE'],
@@ -284,15 +260,16 @@ def render():
         )
         st.plotly_chart(fig_trend, use_container_width=True)
     
+    # Query timings
+    st.markdown("---")
+    plan.render_timings()
+    
     # Download button
     st.markdown("---")
-    csv = review_data.to_csv(index=False)
+    csv = category_reviews.to_csv(index=False) if category_reviews is not None else ''
     st.download_button(
         label="📥 Download Review Data",
         data=csv,
         file_name="review_analytics.csv",
         mime="text/csv"
     )
-
-# Import pandas for data manipulation in this module
-import pandas as pd
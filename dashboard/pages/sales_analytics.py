@@ -40,12 +40,15 @@ def render():
     with col3:
         granularity = st.selectbox("View By", ["day", "week", "month"])
     
+    order_status = st.session_state.get('filter_order_status', 'All')
+    
     # Load data
     with st.spinner("Loading sales data..."):
         sales_data = get_sales_over_time(
             start_date.strftime("%Y-%m-%d"),
             end_date.strftime("%Y-%m-%d"),
-            granularity
+            granularity,
+            order_status=order_status
         )
     
     if sales_data.empty:
@@ -126,7 +129,8 @@ def render():
     with st.spinner("Loading order details..."):
         orders = load_order_summary(
             start_date.strftime("%Y-%m-%d"),
-            end_date.strftime("%Y-%m-%d")
+            end_date.strftime("%Y-%m-%d"),
+            order_status
         )
     
     if not orders.empty:
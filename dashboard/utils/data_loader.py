@@ -2,10 +2,19 @@
 Data loading utilities for analytics dashboard
 Queries dbt gold layer tables
 """
+import time
+import logging
 import pandas as pd
-from typing import Optional, Tuple
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
 from datetime import datetime
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from .snowflake_connector import get_snowflake_connection, execute_query
+from .instrumentation import propagate, span
+from query_builder import QueryBuilder, validate_identifier
+
+logger = logging.getLogger(__name__)
 
 
 def load_order_summary(
@@ -26,40 +35,36 @@ def load_order_summary(
     """
     conn = get_snowflake_connection()
     
-    query = """
-    SELECT 
-        ORDER_ID,
-        CUSTOMER_ID,
-        ORDER_STATUS,
-        ORDER_PURCHASE_TIMESTAMP,
-        ORDER_DATE_KEY,
-        ACTUAL_DELIVERY_DAYS,
-        IS_LATE_DELIVERY,
-        TOTAL_UNIQUE_PRODUCTS,
-        TOTAL_ITEMS,
-        TOTAL_PRODUCT_VALUE,
-        TOTAL_FREIGHT_VALUE,
-        TOTAL_ORDER_VALUE,
-        TOTAL_PAYMENT_VALUE,
-        MAX_INSTALLMENTS,
-        PAYMENT_TYPES_USED,
-        REVIEW_SCORE,
-        REVIEW_SENTIMENT,
-        HAS_REVIEW_COMMENT
-    FROM gold_fact_order_summary
-    WHERE 1=1
-    """
-    
-    if start_date:
-        query += f"\n  AND ORDER_PURCHASE_TIMESTAMP >= '{start_date}'"
-    if end_date:
-        query += f"\n  AND ORDER_PURCHASE_TIMESTAMP <= '{end_date}'"
-    if order_status and order_status != 'All':
-        query += f"\n  AND ORDER_STATUS = '{order_status}'"
-    
-    query += "\nORDER BY ORDER_PURCHASE_TIMESTAMP DESC"
-    
-    return execute_query(conn, query)
+    query = (
+        QueryBuilder('gold_fact_order_summary')
+        .select(
+            'ORDER_ID',
+            'CUSTOMER_ID',
+            'ORDER_STATUS',
+            'ORDER_PURCHASE_TIMESTAMP',
+            'ORDER_DATE_KEY',
+            'ACTUAL_DELIVERY_DAYS',
+            'IS_LATE_DELIVERY',
+            'TOTAL_UNIQUE_PRODUCTS',
+            'TOTAL_ITEMS',
+            'TOTAL_PRODUCT_VALUE',
+            'TOTAL_FREIGHT_VALUE',
+            'TOTAL_ORDER_VALUE',
+            'TOTAL_PAYMENT_VALUE',
+            'MAX_INSTALLMENTS',
+            'PAYMENT_TYPES_USED',
+            'REVIEW_SCORE',
+            'REVIEW_SENTIMENT',
+            'HAS_REVIEW_COMMENT'
+        )
+        .where_gte('ORDER_PURCHASE_TIMESTAMP', start_date)
+        .where_lte('ORDER_PURCHASE_TIMESTAMP', end_date)
+        .where_eq('ORDER_STATUS', order_status if order_status != 'All' else None)
+        .order_by('ORDER_PURCHASE_TIMESTAMP DESC')
+        .build()
+    )
+    
+    return execute_query(conn, *query, model='gold_fact_order_summary')
 
 
 def load_customer_features() -> pd.DataFrame:
@@ -71,22 +76,34 @@ def load_customer_features() -> pd.DataFrame:
     """
     conn = get_snowflake_connection()
     
-    query = """
-    SELECT 
-        CUSTOMER_ID,
-        CUSTOMER_STATE,
-        CUSTOMER_ORDER_COUNT,
-        CUSTOMER_LIFETIME_VALUE,
-        CUSTOMER_AVG_ORDER_VALUE,
-        CUSTOMER_TENURE_DAYS,
-        CUSTOMER_SEGMENT,
-        FEATURE_TIMESTAMP
-    FROM fs_customer_features
-    WHERE CUSTOMER_ORDER_COUNT > 0
-    ORDER BY CUSTOMER_LIFETIME_VALUE DESC
-    """
+    query = (
+        QueryBuilder('fs_customer_features')
+        .select(
+            'CUSTOMER_ID',
+            'CUSTOMER_STATE',
+            'CUSTOMER_ORDER_COUNT',
+            'CUSTOMER_LIFETIME_VALUE',
+            'CUSTOMER_AVG_ORDER_VALUE',
+            'CUSTOMER_TENURE_DAYS',
+            'CUSTOMER_SEGMENT',
+            'FEATURE_TIMESTAMP'
+        )
+        .where('CUSTOMER_ORDER_COUNT > 0')
+        .order_by('CUSTOMER_LIFETIME_VALUE DESC')
+        .build()
+    )
     
-    return execute_query(conn, query)
+    return execute_query(conn, *query, model='fs_customer_features')
+
+
+# Renamed columns of load_gold_obt_summary -> gold_obt_orders columns
+_OBT_SUMMARY_ALIASES = {
+    'PRODUCT_CATEGORY': 'PRODUCT_CATEGORY_ENGLISH',
+    'PAYMENT_INSTALLMENTS': 'MAX_INSTALLMENTS',
+    'PAYMENT_VALUE': 'TOTAL_PAYMENT_VALUE',
+    'PRICE': 'TOTAL_ORDER_VALUE',
+    'FREIGHT_VALUE': 'TOTAL_FREIGHT_VALUE',
+}
 
 
 def load_gold_obt_summary(limit: int = 10000) -> pd.DataFrame:
@@ -101,41 +118,44 @@ def load_gold_obt_summary(limit: int = 10000) -> pd.DataFrame:
     """
     conn = get_snowflake_connection()
     
-    query = f"""
-    SELECT 
-        ORDER_ID,
-        CUSTOMER_ID,
-        ORDER_STATUS,
-        ORDER_PURCHASE_TIMESTAMP,
-        CUSTOMER_STATE,
-        CUSTOMER_CITY,
-        PRODUCT_CATEGORY_ENGLISH AS PRODUCT_CATEGORY,
-        SELLER_STATE,
-        PAYMENT_TYPES,
-        MAX_INSTALLMENTS AS PAYMENT_INSTALLMENTS,
-        TOTAL_PAYMENT_VALUE AS PAYMENT_VALUE,
-        TOTAL_ORDER_VALUE AS PRICE,
-        TOTAL_FREIGHT_VALUE AS FREIGHT_VALUE,
-        ACTUAL_DELIVERY_DAYS,
-        ESTIMATED_DELIVERY_DAYS,
-        IS_LATE_DELIVERY,
-        REVIEW_SCORE,
-        REVIEW_SENTIMENT,
-        CUSTOMER_ORDER_COUNT,
-        CUSTOMER_LIFETIME_VALUE,
-        DAYS_SINCE_LAST_ORDER
-    FROM gold_obt_orders
-    WHERE ORDER_STATUS IS NOT NULL
-    ORDER BY ORDER_PURCHASE_TIMESTAMP DESC
-    LIMIT {limit}
-    """
-    
-    return execute_query(conn, query)
+    query = (
+        QueryBuilder('gold_obt_orders')
+        .select(
+            'ORDER_ID',
+            'CUSTOMER_ID',
+            'ORDER_STATUS',
+            'ORDER_PURCHASE_TIMESTAMP',
+            'CUSTOMER_STATE',
+            'CUSTOMER_CITY',
+            'PRODUCT_CATEGORY_ENGLISH AS PRODUCT_CATEGORY',
+            'SELLER_STATE',
+            'PAYMENT_TYPES',
+            'MAX_INSTALLMENTS AS PAYMENT_INSTALLMENTS',
+            'TOTAL_PAYMENT_VALUE AS PAYMENT_VALUE',
+            'TOTAL_ORDER_VALUE AS PRICE',
+            'TOTAL_FREIGHT_VALUE AS FREIGHT_VALUE',
+            'ACTUAL_DELIVERY_DAYS',
+            'ESTIMATED_DELIVERY_DAYS',
+            'IS_LATE_DELIVERY',
+            'REVIEW_SCORE',
+            'REVIEW_SENTIMENT',
+            'CUSTOMER_ORDER_COUNT',
+            'CUSTOMER_LIFETIME_VALUE',
+            'DAYS_SINCE_LAST_ORDER'
+        )
+        .where_not_null('ORDER_STATUS')
+        .order_by('ORDER_PURCHASE_TIMESTAMP DESC')
+        .limit(limit)
+        .build()
+    )
+    
+    return execute_query(conn, *query, model='gold_obt_orders', aliases=_OBT_SUMMARY_ALIASES)
 
 
 def get_kpi_metrics(
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    order_status: Optional[str] = None
 ) -> dict:
     """
     Get high-level KPI metrics
@@ -143,33 +163,33 @@ def get_kpi_metrics(
     Args:
         start_date: Start date filter
         end_date: End date filter
+        order_status: Order status filter ('All' or None for every status)
         
     Returns:
         Dictionary with KPI metrics
     """
     conn = get_snowflake_connection()
     
-    query = """
-    SELECT 
-        COUNT(DISTINCT ORDER_ID) AS TOTAL_ORDERS,
-        COUNT(DISTINCT CUSTOMER_ID) AS TOTAL_CUSTOMERS,
-        SUM(TOTAL_ORDER_VALUE) AS TOTAL_REVENUE,
-        AVG(TOTAL_ORDER_VALUE) AS AVG_ORDER_VALUE,
-        AVG(ACTUAL_DELIVERY_DAYS) AS AVG_DELIVERY_DAYS,
-        AVG(CASE WHEN IS_LATE_DELIVERY = 1 THEN 1.0 ELSE 0.0 END) AS LATE_DELIVERY_RATE,
-        AVG(REVIEW_SCORE) AS AVG_REVIEW_SCORE,
-        COUNT(DISTINCT CASE WHEN ORDER_STATUS = 'canceled' THEN ORDER_ID END) AS CANCELED_ORDERS,
-        AVG(CASE WHEN ORDER_STATUS = 'canceled' THEN 1.0 ELSE 0.0 END) AS CANCELLATION_RATE
-    FROM gold_fact_order_summary
-    WHERE 1=1
-    """
-    
-    if start_date:
-        query += f"\n  AND ORDER_PURCHASE_TIMESTAMP >= '{start_date}'"
-    if end_date:
-        query += f"\n  AND ORDER_PURCHASE_TIMESTAMP <= '{end_date}'"
+    query = (
+        QueryBuilder('gold_fact_order_summary')
+        .select(
+            'COUNT(DISTINCT ORDER_ID) AS TOTAL_ORDERS',
+            'COUNT(DISTINCT CUSTOMER_ID) AS TOTAL_CUSTOMERS',
+            'SUM(TOTAL_ORDER_VALUE) AS TOTAL_REVENUE',
+            'AVG(TOTAL_ORDER_VALUE) AS AVG_ORDER_VALUE',
+            'AVG(ACTUAL_DELIVERY_DAYS) AS AVG_DELIVERY_DAYS',
+            'AVG(CASE WHEN IS_LATE_DELIVERY = 1 THEN 1.0 ELSE 0.0 END) AS LATE_DELIVERY_RATE',
+            'AVG(REVIEW_SCORE) AS AVG_REVIEW_SCORE',
+            "COUNT(DISTINCT CASE WHEN ORDER_STATUS = 'canceled' THEN ORDER_ID END) AS CANCELED_ORDERS",
+            "AVG(CASE WHEN ORDER_STATUS = 'canceled' THEN 1.0 ELSE 0.0 END) AS CANCELLATION_RATE"
+        )
+        .where_gte('ORDER_PURCHASE_TIMESTAMP', start_date)
+        .where_lte('ORDER_PURCHASE_TIMESTAMP', end_date)
+        .where_eq('ORDER_STATUS', order_status if order_status != 'All' else None)
+        .build()
+    )
     
-    df = execute_query(conn, query)
+    df = execute_query(conn, *query)
     
     if not df.empty:
         return df.iloc[0].to_dict()
@@ -179,15 +199,27 @@ def get_kpi_metrics(
 def get_sales_over_time(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    granularity: str = 'day'
+    granularity: str = 'day',
+    use_rollup: bool = True,
+    order_status: Optional[str] = None
 ) -> pd.DataFrame:
     """
     Get sales trends over time
     
+    Reads the gold_agg_sales_daily rollup by default, so switching
+    granularity scans one row per day and status instead of every order.
+    Weekly and monthly buckets are summed from the daily rows and unique
+    customers are estimated by merging the daily HyperLogLog sketches
+    (about 1.6% relative error).
+    
     Args:
         start_date: Start date filter
         end_date: End date filter
         granularity: 'day', 'week', or 'month'
+        use_rollup: Query the daily rollup instead of gold_fact_order_summary
+            (set False for exact unique-customer counts)
+        order_status: Only count orders with this status ('All' or None
+            counts every status except canceled)
         
     Returns:
         DataFrame with time series data
@@ -202,26 +234,52 @@ def get_sales_over_time(
     
     date_trunc = date_trunc_map.get(granularity, 'DAY')
     
-    query = f"""
-    SELECT 
-        DATE_TRUNC('{date_trunc}', ORDER_PURCHASE_TIMESTAMP) AS DATE,
-        COUNT(DISTINCT ORDER_ID) AS ORDER_COUNT,
-        SUM(TOTAL_ORDER_VALUE) AS REVENUE,
-        AVG(TOTAL_ORDER_VALUE) AS AVG_ORDER_VALUE,
-        COUNT(DISTINCT CUSTOMER_ID) AS UNIQUE_CUSTOMERS
-    FROM gold_fact_order_summary
-    WHERE ORDER_STATUS != 'canceled'
-    """
+    if order_status == 'All':
+        order_status = None
+    # Canceled orders are left out unless they are asked for explicitly
+    excluded_status = 'canceled' if order_status is None else None
     
-    if start_date:
-        query += f"\n  AND ORDER_PURCHASE_TIMESTAMP >= '{start_date}'"
-    if end_date:
-        query += f"\n  AND ORDER_PURCHASE_TIMESTAMP <= '{end_date}'"
+    if use_rollup:
+        # ORDER_DATE is a DATE, so the end date bound includes that whole day
+        query = (
+            QueryBuilder('gold_agg_sales_daily')
+            .select(
+                f"DATE_TRUNC('{date_trunc}', ORDER_DATE) AS DATE",
+                'SUM(ORDER_COUNT) AS ORDER_COUNT',
+                'SUM(REVENUE) AS REVENUE',
+                'SUM(REVENUE) / NULLIF(SUM(REVENUE_ORDER_COUNT), 0) AS AVG_ORDER_VALUE',
+                'HLL_ESTIMATE(HLL_COMBINE(CUSTOMER_HLL)) AS UNIQUE_CUSTOMERS'
+            )
+            .where_ne('ORDER_STATUS', excluded_status)
+            .where_eq('ORDER_STATUS', order_status)
+            .where_gte('ORDER_DATE', start_date)
+            .where_lte('ORDER_DATE', end_date)
+            .group_by(f"DATE_TRUNC('{date_trunc}', ORDER_DATE)")
+            .order_by('DATE')
+            .build()
+        )
+        return execute_query(conn, *query)
     
-    query += f"\nGROUP BY DATE_TRUNC('{date_trunc}', ORDER_PURCHASE_TIMESTAMP)"
-    query += "\nORDER BY DATE"
+    # date_trunc comes from the fixed map above, so it is safe to inline
+    query = (
+        QueryBuilder('gold_fact_order_summary')
+        .select(
+            f"DATE_TRUNC('{date_trunc}', ORDER_PURCHASE_TIMESTAMP) AS DATE",
+            'COUNT(DISTINCT ORDER_ID) AS ORDER_COUNT',
+            'SUM(TOTAL_ORDER_VALUE) AS REVENUE',
+            'AVG(TOTAL_ORDER_VALUE) AS AVG_ORDER_VALUE',
+            'COUNT(DISTINCT CUSTOMER_ID) AS UNIQUE_CUSTOMERS'
+        )
+        .where_ne('ORDER_STATUS', excluded_status)
+        .where_eq('ORDER_STATUS', order_status)
+        .where_gte('ORDER_PURCHASE_TIMESTAMP', start_date)
+        .where_lte('ORDER_PURCHASE_TIMESTAMP', end_date)
+        .group_by(f"DATE_TRUNC('{date_trunc}', ORDER_PURCHASE_TIMESTAMP)")
+        .order_by('DATE')
+        .build()
+    )
     
-    return execute_query(conn, query)
+    return execute_query(conn, *query)
 
 
 def get_top_products(limit: int = 10) -> pd.DataFrame:
@@ -236,21 +294,23 @@ def get_top_products(limit: int = 10) -> pd.DataFrame:
     """
     conn = get_snowflake_connection()
     
-    query = f"""
-    SELECT 
-        PRODUCT_CATEGORY_ENGLISH AS PRODUCT_CATEGORY,
-        COUNT(DISTINCT ORDER_ID) AS ORDER_COUNT,
-        SUM(TOTAL_ORDER_VALUE) AS TOTAL_REVENUE,
-        AVG(TOTAL_ORDER_VALUE) AS AVG_PRICE,
-        AVG(REVIEW_SCORE) AS AVG_REVIEW_SCORE
-    FROM gold_obt_orders
-    WHERE PRODUCT_CATEGORY_ENGLISH IS NOT NULL
-    GROUP BY PRODUCT_CATEGORY_ENGLISH
-    ORDER BY TOTAL_REVENUE DESC
-    LIMIT {limit}
-    """
+    query = (
+        QueryBuilder('gold_obt_orders')
+        .select(
+            'PRODUCT_CATEGORY_ENGLISH AS PRODUCT_CATEGORY',
+            'COUNT(DISTINCT ORDER_ID) AS ORDER_COUNT',
+            'SUM(TOTAL_ORDER_VALUE) AS TOTAL_REVENUE',
+            'AVG(TOTAL_ORDER_VALUE) AS AVG_PRICE',
+            'AVG(REVIEW_SCORE) AS AVG_REVIEW_SCORE'
+        )
+        .where_not_null('PRODUCT_CATEGORY_ENGLISH')
+        .group_by('PRODUCT_CATEGORY_ENGLISH')
+        .order_by('TOTAL_REVENUE DESC')
+        .limit(limit)
+        .build()
+    )
     
-    return execute_query(conn, query)
+    return execute_query(conn, *query)
 
 
 def get_customer_segments() -> pd.DataFrame:
@@ -262,19 +322,21 @@ def get_customer_segments() -> pd.DataFrame:
     """
     conn = get_snowflake_connection()
     
-    query = """
-    SELECT 
-        CUSTOMER_SEGMENT,
-        COUNT(DISTINCT CUSTOMER_ID) AS CUSTOMER_COUNT,
-        AVG(CUSTOMER_LIFETIME_VALUE) AS AVG_REVENUE,
-        AVG(CUSTOMER_AVG_ORDER_VALUE) AS AVG_ORDER_VALUE
-    FROM fs_customer_features
-    WHERE CUSTOMER_ORDER_COUNT > 0
-    GROUP BY CUSTOMER_SEGMENT
-    ORDER BY CUSTOMER_COUNT DESC
-    """
+    query = (
+        QueryBuilder('fs_customer_features')
+        .select(
+            'CUSTOMER_SEGMENT',
+            'COUNT(DISTINCT CUSTOMER_ID) AS CUSTOMER_COUNT',
+            'AVG(CUSTOMER_LIFETIME_VALUE) AS AVG_REVENUE',
+            'AVG(CUSTOMER_AVG_ORDER_VALUE) AS AVG_ORDER_VALUE'
+        )
+        .where('CUSTOMER_ORDER_COUNT > 0')
+        .group_by('CUSTOMER_SEGMENT')
+        .order_by('CUSTOMER_COUNT DESC')
+        .build()
+    )
     
-    return execute_query(conn, query)
+    return execute_query(conn, *query)
 
 
 def get_delivery_performance_by_state() -> pd.DataFrame:
@@ -286,18 +348,708 @@ def get_delivery_performance_by_state() -> pd.DataFrame:
     """
     conn = get_snowflake_connection()
     
-    query = """
-    SELECT 
-        CUSTOMER_STATE,
-        COUNT(DISTINCT ORDER_ID) AS ORDER_COUNT,
-        AVG(ACTUAL_DELIVERY_DAYS) AS AVG_DELIVERY_DAYS,
-        AVG(CASE WHEN IS_LATE_DELIVERY = 1 THEN 1.0 ELSE 0.0 END) AS LATE_DELIVERY_RATE,
-        AVG(REVIEW_SCORE) AS AVG_REVIEW_SCORE
-    FROM gold_obt_orders
-    WHERE ORDER_STATUS = 'delivered'
-      AND CUSTOMER_STATE IS NOT NULL
-    GROUP BY CUSTOMER_STATE
-    ORDER BY ORDER_COUNT DESC
-    """
-    
-    return execute_query(conn, query)
+    query = (
+        QueryBuilder('gold_obt_orders')
+        .select(
+            'CUSTOMER_STATE',
+            'COUNT(DISTINCT ORDER_ID) AS ORDER_COUNT',
+            'AVG(ACTUAL_DELIVERY_DAYS) AS AVG_DELIVERY_DAYS',
+            'AVG(CASE WHEN IS_LATE_DELIVERY = 1 THEN 1.0 ELSE 0.0 END) AS LATE_DELIVERY_RATE',
+            'AVG(REVIEW_SCORE) AS AVG_REVIEW_SCORE'
+        )
+        .where_eq('ORDER_STATUS', 'delivered')
+        .where_not_null('CUSTOMER_STATE')
+        .group_by('CUSTOMER_STATE')
+        .order_by('ORDER_COUNT DESC')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+# ---------------------------------------------------------------------------
+# Page aggregates over the full gold_obt_orders table
+#
+# Each loader returns only the aggregated rows a chart needs, computed in
+# the warehouse over every order instead of a LIMIT-ed sample.
+# ---------------------------------------------------------------------------
+
+def _obt_rows() -> QueryBuilder:
+    """gold_obt_orders rows the analytics pages aggregate over"""
+    return QueryBuilder('gold_obt_orders').where_not_null('ORDER_STATUS')
+
+
+def _payment_rows() -> QueryBuilder:
+    return _obt_rows().where_not_null('PAYMENT_TYPES')
+
+
+def _delivered_rows() -> QueryBuilder:
+    """Rows with a plausible delivery time (outliers of 100+ days removed)"""
+    return (
+        _obt_rows()
+        .where_not_null('ACTUAL_DELIVERY_DAYS')
+        .where('ACTUAL_DELIVERY_DAYS > 0')
+        .where('ACTUAL_DELIVERY_DAYS < 100')
+    )
+
+
+def _review_rows() -> QueryBuilder:
+    return _obt_rows().where_not_null('REVIEW_SCORE')
+
+
+def _sql_float(value) -> str:
+    # Bin edges are computed from earlier query results; float() guarantees
+    # a numeric literal, so inlining them into select expressions is safe
+    return repr(float(value))
+
+
+def _value_distribution(
+    rows: Callable[[], QueryBuilder],
+    column: str,
+    bins: int = 50,
+    trim: Optional[Tuple[float, float]] = None,
+    extra: Tuple[str, ...] = ()
+) -> dict:
+    """
+    Histogram and box-plot statistics for one numeric column
+    
+    Runs three small aggregate queries (trim bounds, quartiles, bin counts)
+    instead of shipping the raw values. Bins are equal-width over
+    [min, max] of the (trimmed) values, left-closed with the last bin
+    closed, matching numpy.histogram.
+    
+    Args:
+        rows: Factory returning the filtered base query
+        column: Numeric column to describe
+        bins: Number of histogram bins
+        trim: Optional (lower, upper) quantiles; values outside are dropped
+        extra: Additional per-bin aggregate expressions
+        
+    Returns:
+        Dictionary with 'histogram' (BIN, BIN_START, BIN_END, COUNT, ...)
+        and 'box' (min, q1, median, q3, max, lowerfence, upperfence, count)
+    """
+    conn = get_snowflake_connection()
+    column = validate_identifier(column)
+    
+    def base() -> QueryBuilder:
+        return rows().where_not_null(column)
+    
+    def trimmed() -> QueryBuilder:
+        query = base()
+        if bounds is not None:
+            query = query.where_gte(column, bounds[0]).where_lte(column, bounds[1])
+        return query
+    
+    empty = {'histogram': pd.DataFrame(columns=['BIN', 'BIN_START', 'BIN_END', 'COUNT']), 'box': {}}
+    
+    bounds = None
+    if trim is not None:
+        query = (
+            base()
+            .select(
+                f"PERCENTILE_CONT({_sql_float(trim[0])}) WITHIN GROUP (ORDER BY {column}) AS LOWER_BOUND",
+                f"PERCENTILE_CONT({_sql_float(trim[1])}) WITHIN GROUP (ORDER BY {column}) AS UPPER_BOUND"
+            )
+            .build()
+        )
+        df = execute_query(conn, *query)
+        if df.empty or df['LOWER_BOUND'].isna().iloc[0]:
+            return empty
+        # PERCENTILE_CONT interpolates between two equal values with a few
+        # ulps of error; widen the bounds so values equal to them are kept
+        lower, upper = float(df['LOWER_BOUND'].iloc[0]), float(df['UPPER_BOUND'].iloc[0])
+        bounds = (lower - abs(lower) * 1e-12, upper + abs(upper) * 1e-12)
+    
+    query = (
+        trimmed()
+        .select(
+            'COUNT(*) AS VALUE_COUNT',
+            f'MIN({column}) AS MIN_VALUE',
+            f'MAX({column}) AS MAX_VALUE',
+            f'PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY {column}) AS Q1',
+            f'PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY {column}) AS MEDIAN_VALUE',
+            f'PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY {column}) AS Q3'
+        )
+        .build()
+    )
+    stats = execute_query(conn, *query)
+    if stats.empty or not stats['VALUE_COUNT'].iloc[0]:
+        return empty
+    stats = stats.iloc[0]
+    low, high = float(stats['MIN_VALUE']), float(stats['MAX_VALUE'])
+    width = (high - low) / bins or 1.0
+    iqr = float(stats['Q3']) - float(stats['Q1'])
+    fence_low = float(stats['Q1']) - 1.5 * iqr
+    fence_high = float(stats['Q3']) + 1.5 * iqr
+    
+    # The division can put a value lying on an edge one bin off; like
+    # numpy.histogram, check it against the edges themselves
+    raw_bin = f"FLOOR(({column} - {_sql_float(low)}) / {_sql_float(width)})"
+    bin_expr = (
+        f"LEAST({raw_bin} + CASE"
+        f" WHEN {column} >= {_sql_float(low)} + ({raw_bin} + 1) * {_sql_float(width)} THEN 1"
+        f" WHEN {column} < {_sql_float(low)} + {raw_bin} * {_sql_float(width)} THEN -1"
+        f" ELSE 0 END, {bins - 1})"
+    )
+    query = (
+        trimmed()
+        .select(
+            f'{bin_expr} AS BIN',
+            'COUNT(*) AS COUNT',
+            # Whiskers end at the most extreme values inside the 1.5 IQR fences
+            f'MIN(CASE WHEN {column} >= {_sql_float(fence_low)} THEN {column} END) AS WHISKER_LOW',
+            f'MAX(CASE WHEN {column} <= {_sql_float(fence_high)} THEN {column} END) AS WHISKER_HIGH',
+            *extra
+        )
+        .group_by(bin_expr)
+        .order_by('BIN')
+        .build()
+    )
+    histogram = execute_query(conn, *query)
+    if histogram.empty:
+        return empty
+    
+    histogram['BIN'] = histogram['BIN'].astype(int)
+    histogram['BIN_START'] = low + histogram['BIN'] * width
+    histogram['BIN_END'] = histogram['BIN_START'] + width
+    box = {
+        'count': int(stats['VALUE_COUNT']),
+        'min': low,
+        'q1': float(stats['Q1']),
+        'median': float(stats['MEDIAN_VALUE']),
+        'q3': float(stats['Q3']),
+        'max': high,
+        'lowerfence': float(histogram['WHISKER_LOW'].min()),
+        'upperfence': float(histogram['WHISKER_HIGH'].max()),
+    }
+    histogram = histogram.drop(columns=['WHISKER_LOW', 'WHISKER_HIGH'])
+    return {'histogram': histogram, 'box': box}
+
+
+def get_payment_summary() -> dict:
+    """
+    Get payment KPIs over all orders
+    
+    Returns:
+        Dictionary with TOTAL_TRANSACTIONS, TOTAL_VALUE, AVG_TRANSACTION
+        and AVG_INSTALLMENTS
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _payment_rows()
+        .select(
+            'COUNT(*) AS TOTAL_TRANSACTIONS',
+            'SUM(TOTAL_PAYMENT_VALUE) AS TOTAL_VALUE',
+            'AVG(TOTAL_PAYMENT_VALUE) AS AVG_TRANSACTION',
+            'AVG(MAX_INSTALLMENTS) AS AVG_INSTALLMENTS'
+        )
+        .build()
+    )
+    
+    df = execute_query(conn, *query)
+    
+    if not df.empty:
+        return df.iloc[0].to_dict()
+    return {}
+
+
+def get_payment_type_stats() -> pd.DataFrame:
+    """
+    Get transaction count and value statistics per payment type
+    
+    Orders paid with several methods are grouped under their combined
+    PAYMENT_TYPES value (e.g. 'credit_card, voucher').
+    
+    Returns:
+        DataFrame with one row per payment type
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _payment_rows()
+        .select(
+            'PAYMENT_TYPES AS PAYMENT_TYPE',
+            'COUNT(ORDER_ID) AS TRANSACTION_COUNT',
+            'SUM(TOTAL_PAYMENT_VALUE) AS TOTAL_VALUE',
+            'AVG(TOTAL_PAYMENT_VALUE) AS AVG_VALUE',
+            'MEDIAN(TOTAL_PAYMENT_VALUE) AS MEDIAN_VALUE',
+            'STDDEV(TOTAL_PAYMENT_VALUE) AS STD_VALUE',
+            'AVG(MAX_INSTALLMENTS) AS AVG_INSTALLMENTS'
+        )
+        .group_by('PAYMENT_TYPES')
+        .order_by('TOTAL_VALUE DESC')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_installment_distribution() -> pd.DataFrame:
+    """
+    Get transaction count and average payment value per installment count
+    
+    Returns:
+        DataFrame with INSTALLMENTS, COUNT and AVG_VALUE
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _payment_rows()
+        .select(
+            'MAX_INSTALLMENTS AS INSTALLMENTS',
+            'COUNT(*) AS COUNT',
+            'AVG(TOTAL_PAYMENT_VALUE) AS AVG_VALUE'
+        )
+        .where('MAX_INSTALLMENTS > 0')
+        .group_by('MAX_INSTALLMENTS')
+        .order_by('INSTALLMENTS')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_payment_value_distribution(bins: int = 50) -> dict:
+    """
+    Get the payment value histogram and box statistics (1st-99th percentile)
+    
+    Args:
+        bins: Number of histogram bins
+        
+    Returns:
+        See _value_distribution()
+    """
+    return _value_distribution(_payment_rows, 'TOTAL_PAYMENT_VALUE', bins=bins, trim=(0.01, 0.99))
+
+
+def get_payment_trends() -> pd.DataFrame:
+    """
+    Get daily payment value and transaction count per payment type
+    
+    Returns:
+        DataFrame with DATE, PAYMENT_TYPE, TOTAL_VALUE and TRANSACTION_COUNT
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _payment_rows()
+        .select(
+            "DATE_TRUNC('DAY', ORDER_PURCHASE_TIMESTAMP) AS DATE",
+            'PAYMENT_TYPES AS PAYMENT_TYPE',
+            'SUM(TOTAL_PAYMENT_VALUE) AS TOTAL_VALUE',
+            'COUNT(ORDER_ID) AS TRANSACTION_COUNT'
+        )
+        .where_not_null('ORDER_PURCHASE_TIMESTAMP')
+        .group_by("DATE_TRUNC('DAY', ORDER_PURCHASE_TIMESTAMP)", 'PAYMENT_TYPES')
+        .order_by('DATE', 'PAYMENT_TYPE')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_delivery_days_distribution(bins: int = 50) -> dict:
+    """
+    Get the delivery days histogram and box statistics (0-100 days)
+    
+    Args:
+        bins: Number of histogram bins
+        
+    Returns:
+        See _value_distribution()
+    """
+    return _value_distribution(_delivered_rows, 'ACTUAL_DELIVERY_DAYS', bins=bins)
+
+
+def get_late_delivery_split() -> pd.DataFrame:
+    """
+    Get on-time vs late delivery counts
+    
+    Returns:
+        DataFrame with IS_LATE_DELIVERY and COUNT
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _delivered_rows()
+        .select('IS_LATE_DELIVERY', 'COUNT(*) AS COUNT')
+        .where_not_null('IS_LATE_DELIVERY')
+        .group_by('IS_LATE_DELIVERY')
+        .order_by('IS_LATE_DELIVERY')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_delivery_estimate_grid() -> pd.DataFrame:
+    """
+    Get order counts per (estimated days, actual days, late flag) cell
+    
+    Delivery days are whole numbers, so the grid replaces a sampled scatter
+    plot with exact counts over every delivered order.
+    
+    Returns:
+        DataFrame with ESTIMATED_DELIVERY_DAYS, ACTUAL_DELIVERY_DAYS,
+        IS_LATE_DELIVERY and ORDER_COUNT
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _delivered_rows()
+        .select(
+            'ESTIMATED_DELIVERY_DAYS',
+            'ACTUAL_DELIVERY_DAYS',
+            'IS_LATE_DELIVERY',
+            'COUNT(*) AS ORDER_COUNT'
+        )
+        .where_not_null('ESTIMATED_DELIVERY_DAYS')
+        .where('ESTIMATED_DELIVERY_DAYS > 0')
+        .group_by('ESTIMATED_DELIVERY_DAYS', 'ACTUAL_DELIVERY_DAYS', 'IS_LATE_DELIVERY')
+        .order_by('ESTIMATED_DELIVERY_DAYS', 'ACTUAL_DELIVERY_DAYS', 'IS_LATE_DELIVERY')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_category_trends(categories: list) -> pd.DataFrame:
+    """
+    Get daily order count and revenue for the given product categories
+    
+    Args:
+        categories: Product categories (English names) to include
+        
+    Returns:
+        DataFrame with DATE, CATEGORY, ORDERS and REVENUE
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _obt_rows()
+        .select(
+            "DATE_TRUNC('DAY', ORDER_PURCHASE_TIMESTAMP) AS DATE",
+            'PRODUCT_CATEGORY_ENGLISH AS CATEGORY',
+            'COUNT(ORDER_ID) AS ORDERS',
+            'SUM(TOTAL_PAYMENT_VALUE) AS REVENUE'
+        )
+        .where_in('PRODUCT_CATEGORY_ENGLISH', categories)
+        .where_not_null('ORDER_PURCHASE_TIMESTAMP')
+        .group_by("DATE_TRUNC('DAY', ORDER_PURCHASE_TIMESTAMP)", 'PRODUCT_CATEGORY_ENGLISH')
+        .order_by('DATE', 'CATEGORY')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_review_summary() -> dict:
+    """
+    Get review KPIs over all reviewed orders
+    
+    Returns:
+        Dictionary with TOTAL_REVIEWS, AVG_SCORE, POSITIVE_RATE and NEGATIVE_RATE
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _review_rows()
+        .select(
+            'COUNT(*) AS TOTAL_REVIEWS',
+            'AVG(REVIEW_SCORE) AS AVG_SCORE',
+            'AVG(CASE WHEN REVIEW_SCORE >= 4 THEN 1.0 ELSE 0.0 END) AS POSITIVE_RATE',
+            'AVG(CASE WHEN REVIEW_SCORE <= 2 THEN 1.0 ELSE 0.0 END) AS NEGATIVE_RATE'
+        )
+        .build()
+    )
+    
+    df = execute_query(conn, *query)
+    
+    if not df.empty and df['TOTAL_REVIEWS'].iloc[0]:
+        return df.iloc[0].to_dict()
+    return {}
+
+
+def get_review_score_distribution() -> pd.DataFrame:
+    """
+    Get the number of reviews per score
+    
+    Returns:
+        DataFrame with SCORE and COUNT
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _review_rows()
+        .select('REVIEW_SCORE AS SCORE', 'COUNT(*) AS COUNT')
+        .group_by('REVIEW_SCORE')
+        .order_by('SCORE')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_review_sentiment_distribution() -> pd.DataFrame:
+    """
+    Get the number of reviews per sentiment
+    
+    Returns:
+        DataFrame with SENTIMENT and COUNT
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _review_rows()
+        .select('REVIEW_SENTIMENT AS SENTIMENT', 'COUNT(*) AS COUNT')
+        .where_not_null('REVIEW_SENTIMENT')
+        .group_by('REVIEW_SENTIMENT')
+        .order_by('COUNT DESC', 'SENTIMENT')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_review_scores_by_category(min_reviews: int = 10) -> pd.DataFrame:
+    """
+    Get average review score per product category
+    
+    Args:
+        min_reviews: Drop categories with fewer reviews than this
+        
+    Returns:
+        DataFrame with CATEGORY, AVG_SCORE and REVIEW_COUNT, best first
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _review_rows()
+        .select(
+            'PRODUCT_CATEGORY_ENGLISH AS CATEGORY',
+            'AVG(REVIEW_SCORE) AS AVG_SCORE',
+            'COUNT(REVIEW_SCORE) AS REVIEW_COUNT'
+        )
+        .where_not_null('PRODUCT_CATEGORY_ENGLISH')
+        .group_by('PRODUCT_CATEGORY_ENGLISH')
+        .order_by('AVG_SCORE DESC', 'CATEGORY')
+        .build()
+    )
+    
+    df = execute_query(conn, *query)
+    
+    # One row per category, so the HAVING-style filter is cheap client-side
+    if not df.empty:
+        df = df[df['REVIEW_COUNT'] >= min_reviews].reset_index(drop=True)
+    return df
+
+
+def get_review_delivery_grid() -> pd.DataFrame:
+    """
+    Get review counts per (delivery days, review score) cell
+    
+    Returns:
+        DataFrame with ACTUAL_DELIVERY_DAYS, REVIEW_SCORE and REVIEW_COUNT
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _delivered_rows()
+        .select('ACTUAL_DELIVERY_DAYS', 'REVIEW_SCORE', 'COUNT(*) AS REVIEW_COUNT')
+        .where_not_null('REVIEW_SCORE')
+        .group_by('ACTUAL_DELIVERY_DAYS', 'REVIEW_SCORE')
+        .order_by('ACTUAL_DELIVERY_DAYS', 'REVIEW_SCORE')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+def get_review_score_by_delivery_bucket() -> pd.DataFrame:
+    """
+    Get average review score per delivery time bucket
+    
+    Returns:
+        DataFrame with DELIVERY_BUCKET, REVIEW_SCORE (average) and REVIEW_COUNT
+    """
+    conn = get_snowflake_connection()
+    
+    bucket = (
+        "CASE WHEN ACTUAL_DELIVERY_DAYS <= 7 THEN '0-7 days' "
+        "WHEN ACTUAL_DELIVERY_DAYS <= 14 THEN '8-14 days' "
+        "WHEN ACTUAL_DELIVERY_DAYS <= 21 THEN '15-21 days' "
+        "WHEN ACTUAL_DELIVERY_DAYS <= 30 THEN '22-30 days' "
+        "ELSE '30+ days' END"
+    )
+    query = (
+        _delivered_rows()
+        .select(
+            f'{bucket} AS DELIVERY_BUCKET',
+            'AVG(REVIEW_SCORE) AS REVIEW_SCORE',
+            'COUNT(*) AS REVIEW_COUNT',
+            'MIN(ACTUAL_DELIVERY_DAYS) AS MIN_DAYS'
+        )
+        .where_not_null('REVIEW_SCORE')
+        .group_by(bucket)
+        .order_by('MIN_DAYS')
+        .build()
+    )
+    
+    df = execute_query(conn, *query)
+    return df.drop(columns=['MIN_DAYS'], errors='ignore')
+
+
+def get_review_score_by_price_bucket(buckets: int = 5) -> pd.DataFrame:
+    """
+    Get average review score per equal-width payment value bucket
+    
+    Payment values outside the 1st-99th percentile are dropped first.
+    
+    Args:
+        buckets: Number of price buckets
+        
+    Returns:
+        DataFrame with BIN, BIN_START, BIN_END, COUNT and AVG_SCORE
+    """
+    distribution = _value_distribution(
+        _review_rows, 'TOTAL_PAYMENT_VALUE',
+        bins=buckets, trim=(0.01, 0.99),
+        extra=('AVG(REVIEW_SCORE) AS AVG_SCORE',)
+    )
+    return distribution['histogram']
+
+
+def get_monthly_review_trend() -> pd.DataFrame:
+    """
+    Get average review score and review count per month
+    
+    Returns:
+        DataFrame with DATE, AVG_SCORE and REVIEW_COUNT
+    """
+    conn = get_snowflake_connection()
+    
+    query = (
+        _review_rows()
+        .select(
+            "DATE_TRUNC('MONTH', ORDER_PURCHASE_TIMESTAMP) AS DATE",
+            'AVG(REVIEW_SCORE) AS AVG_SCORE',
+            'COUNT(REVIEW_SCORE) AS REVIEW_COUNT'
+        )
+        .where_not_null('ORDER_PURCHASE_TIMESTAMP')
+        .group_by("DATE_TRUNC('MONTH', ORDER_PURCHASE_TIMESTAMP)")
+        .order_by('DATE')
+        .build()
+    )
+    
+    return execute_query(conn, *query)
+
+
+class PageQueryPlan:
+    """
+    Declare all datasets a page needs and load them concurrently
+    
+    Each dataset runs on its own worker thread with its own pooled
+    connection, so a page's cold load takes roughly as long as its slowest
+    query instead of the sum of all of them.
+    
+    Example:
+        plan = PageQueryPlan('overview')
+        plan.add('kpis', get_kpi_metrics, start_date, end_date)
+        plan.add('segments', get_customer_segments)
+        data = plan.run()
+        plan.render_timings()
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._queries = {}
+        self.timings = []
+        self.wall_seconds = 0.0
+    
+    def add(self, key: str, loader: Callable, *args, **kwargs) -> 'PageQueryPlan':
+        """
+        Register a dataset
+        
+        Args:
+            key: Name of the dataset in the run() result
+            loader: Loader function from this module
+            args, kwargs: Arguments passed to the loader
+        """
+        self._queries[key] = (loader, args, kwargs)
+        return self
+    
+    def _run_one(self, key: str) -> Tuple[object, dict]:
+        loader, args, kwargs = self._queries[key]
+        started = time.perf_counter()
+        error = None
+        try:
+            result = loader(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"❌ {self.name}.{key} failed: {e}")
+            result, error = None, str(e)
+        seconds = time.perf_counter() - started
+        rows = len(result) if isinstance(result, pd.DataFrame) else int(bool(result))
+        return result, {
+            'dataset': key,
+            'loader': getattr(loader, '__name__', repr(loader)),
+            'seconds': round(seconds, 3),
+            'rows': rows,
+            'error': error,
+        }
+    
+    def run(self, max_workers: Optional[int] = None) -> dict:
+        """
+        Run every registered dataset concurrently
+        
+        Args:
+            max_workers: Thread count (defaults to one per dataset, capped by
+                the connection pool size)
+            
+        Returns:
+            Dictionary of dataset key -> loader result
+        """
+        if not self._queries:
+            return {}
+        
+        pool = get_snowflake_connection()
+        limit = pool.max_size if pool is not None else len(self._queries)
+        max_workers = max_workers or min(len(self._queries), limit)
+        
+        # Worker threads need the script context to use st.cache_resource / st.error
+        ctx = get_script_run_ctx()
+        
+        def attach_context():
+            if ctx is not None:
+                add_script_run_ctx(ctx=ctx)
+        
+        started = time.perf_counter()
+        with span(f"plan.{self.name}", kind='plan', datasets=len(self._queries)), \
+                ThreadPoolExecutor(max_workers=max_workers,
+                                   thread_name_prefix=f"plan-{self.name}",
+                                   initializer=attach_context) as executor:
+            # Query spans recorded on the workers become children of the plan span
+            run_one = propagate(self._run_one)
+            futures = {key: executor.submit(run_one, key) for key in self._queries}
+            outcomes = {key: future.result() for key, future in futures.items()}
+        self.wall_seconds = time.perf_counter() - started
+        
+        self.timings = [timing for _, timing in outcomes.values()]
+        logger.info(
+            f"Plan '{self.name}': {len(outcomes)} datasets in {self.wall_seconds:.2f}s "
+            f"(serial would be ~{sum(t['seconds'] for t in self.timings):.2f}s)"
+        )
+        return {key: result for key, (result, _) in outcomes.items()}
+    
+    def render_timings(self):
+        """Show per-dataset timings in a collapsible panel"""
+        if not self.timings:
+            return
+        serial = sum(t['seconds'] for t in self.timings)
+        with st.expander(f"⏱️ Query timings ({self.wall_seconds:.2f}s)"):
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Wall Time", f"{self.wall_seconds:.2f}s")
+            col2.metric("Sum of Queries", f"{serial:.2f}s")
+            col3.metric("Slowest Query", f"{max(t['seconds'] for t in self.timings):.2f}s")
+            st.dataframe(pd.DataFrame(self.timings), use_container_width=True)
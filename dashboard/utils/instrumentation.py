@@ -0,0 +1,378 @@
+"""
+Span timing for dashboard queries and page renders
+
+Every page render, PageQueryPlan and execute_query call is recorded as a
+span (duration plus attributes such as query hash, rows, bytes, cache
+status and Snowflake query ID). Spans are kept per Streamlit session for
+the debug sidebar panel and can be appended to a local file for offline
+analysis:
+
+- DASHBOARD_INSTRUMENTATION: set to 0 to disable (default on)
+- DASHBOARD_TRACE_FILE: append finished spans to this file
+- DASHBOARD_TRACE_FORMAT: 'jsonl' (one span per line, default) or 'otlp'
+  (one OTLP/JSON ExportTraceServiceRequest per page render, readable by
+  the OpenTelemetry collector's otlpjsonfile receiver)
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import contextvars
+import pandas as pd
+import streamlit as st
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'ecommerce-dashboard'
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('dashboard_span', default=None)
+
+
+def enabled() -> bool:
+    return os.getenv('DASHBOARD_INSTRUMENTATION', '1').lower() not in ('0', 'false', 'no')
+
+
+def query_hash(query: str) -> str:
+    """Short stable hash of the SQL text (bind values excluded)"""
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]
+
+
+def _session_id() -> str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'local'
+
+
+class Span:
+    """One timed operation; root spans (page renders) start a new trace"""
+
+    __slots__ = ('name', 'kind', 'trace_id', 'span_id', 'parent_id', 'session_id',
+                 'start', 'duration', 'attributes', 'error', 'children_duration', '_started')
+
+    def __init__(self, name: str, kind: str, parent: Optional['Span'], attributes: dict):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.session_id = parent.session_id if parent is not None else _session_id()
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+        self.error = None
+        self.children_duration = 0.0
+        self._started = time.perf_counter()
+
+    @property
+    def self_duration(self) -> float:
+        """Time not covered by child spans (e.g. pandas and Plotly work in a render)"""
+        return max((self.duration or 0.0) - self.children_duration, 0.0)
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'session_id': self.session_id,
+            'start': self.start,
+            'duration_s': self.duration,
+            'self_s': self.self_duration,
+            'error': self.error,
+            **self.attributes,
+        }
+
+
+class SessionRecorder:
+    """Bounded span history of one Streamlit session"""
+
+    def __init__(self, max_spans: int = 2000):
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock:
+            spans = list(self.spans)
+        return pd.DataFrame([span.to_dict() for span in spans])
+
+    def last_trace(self, kind: str = 'render') -> List[Span]:
+        """Spans of the most recent trace whose root has the given kind"""
+        with self._lock:
+            spans = list(self.spans)
+        roots = [s for s in spans if s.parent_id is None and s.kind == kind]
+        if not roots:
+            return []
+        trace_id = roots[-1].trace_id
+        return [s for s in spans if s.trace_id == trace_id]
+
+    def summary(self) -> pd.DataFrame:
+        """Per (kind, name) call count, timing percentiles, rows, bytes and cache hits"""
+        df = self.frame()
+        if df.empty:
+            return df
+        for column in ('rows', 'bytes', 'cache'):
+            if column not in df:
+                df[column] = None
+        df['cached'] = df['cache'].isin(['hit', 'stale'])
+        summary = df.groupby(['kind', 'name']).agg(
+            calls=('duration_s', 'size'),
+            total_s=('duration_s', 'sum'),
+            mean_s=('duration_s', 'mean'),
+            p95_s=('duration_s', lambda d: d.quantile(0.95)),
+            self_s=('self_s', 'sum'),
+            rows=('rows', 'sum'),
+            mb=('bytes', lambda b: b.sum() / 1024 ** 2),
+            cache_hits=('cached', 'sum'),
+        )
+        return summary.sort_values('total_s', ascending=False).reset_index()
+
+
+class _SpanFileExporter:
+    """Append finished spans to a JSONL or OTLP/JSON file"""
+
+    def __init__(self, path: str, fmt: str = 'jsonl'):
+        if fmt not in ('jsonl', 'otlp'):
+            raise ValueError("DASHBOARD_TRACE_FORMAT must be 'jsonl' or 'otlp'")
+        self.path = path
+        self.fmt = fmt
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Span]] = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: Span):
+        if self.fmt == 'jsonl':
+            self._write([json.dumps(span.to_dict(), default=str)])
+            return
+        # OTLP requests are written per trace, once its root span ends
+        with self._lock:
+            self._pending.setdefault(span.trace_id, []).append(span)
+            spans = self._pending.pop(span.trace_id) if span.parent_id is None else None
+        if spans:
+            self._write([json.dumps(to_otlp(spans))])
+
+    def _write(self, lines: List[str]):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans: List[Span]) -> dict:
+    """Spans as an OTLP/JSON ExportTraceServiceRequest"""
+    otlp_spans = []
+    for span in spans:
+        start_ns = int(span.start * 1e9)
+        attributes = {'dashboard.kind': span.kind, 'session.id': span.session_id, **span.attributes}
+        otlp_spans.append({
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'parentSpanId': span.parent_id or '',
+            'name': span.name,
+            'kind': 3 if span.kind == 'query' else 1,  # CLIENT / INTERNAL
+            'startTimeUnixNano': str(start_ns),
+            'endTimeUnixNano': str(start_ns + int((span.duration or 0.0) * 1e9)),
+            'attributes': [{'key': k, 'value': _otlp_value(v)}
+                           for k, v in attributes.items() if v is not None],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+        })
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': __name__}, 'spans': otlp_spans}],
+    }]}
+
+
+_sessions: 'OrderedDict[str, SessionRecorder]' = OrderedDict()
+_sessions_lock = threading.Lock()
+_MAX_SESSIONS = 64
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_recorder(session_id: Optional[str] = None) -> SessionRecorder:
+    """Span history of a session (the current one by default)"""
+    session_id = session_id or _session_id()
+    with _sessions_lock:
+        recorder = _sessions.get(session_id)
+        if recorder is None:
+            recorder = _sessions[session_id] = SessionRecorder()
+            while len(_sessions) > _MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        _sessions.move_to_end(session_id)
+        return recorder
+
+
+def _get_exporter() -> Optional[_SpanFileExporter]:
+    global _exporter
+    path = os.getenv('DASHBOARD_TRACE_FILE')
+    if not path:
+        return None
+    with _exporter_lock:
+        if _exporter is None or _exporter.path != path:
+            _exporter = _SpanFileExporter(path, os.getenv('DASHBOARD_TRACE_FORMAT', 'jsonl').lower())
+        return _exporter
+
+
+def _finish(span: Span):
+    get_recorder(span.session_id).add(span)
+    exporter = _get_exporter()
+    if exporter is not None:
+        try:
+            exporter.export(span)
+        except Exception as e:
+            logger.warning(f"⚠️ Span export failed: {e}")
+
+
+@contextmanager
+def span(name: str, kind: str = 'internal', **attributes):
+    """
+    Time a block as a child of the current span (or as a new trace)
+
+    Example:
+        with span('build_figures', kind='render_phase'):
+            fig = px.line(df, ...)
+    """
+    if not enabled():
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, kind, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current._started
+        if parent is not None:
+            parent.children_duration += current.duration
+        _finish(current)
+
+
+def annotate(**attributes):
+    """Add attributes to the current span (no-op outside a span)"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def propagate(fn: Callable) -> Callable:
+    """Bind fn to the caller's span context, for work submitted to other threads"""
+    context = contextvars.copy_context()
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def _frame_bytes(df) -> Optional[int]:
+    if isinstance(df, pd.DataFrame):
+        return int(df.memory_usage(deep=True).sum())
+    return None
+
+
+def traced_query(fn: Callable) -> Callable:
+    """
+    Record execute_query(_conn, query, params, ...) calls as query spans
+
+    Spans are named after the calling loader (e.g. query.get_payment_summary).
+    """
+    @wraps(fn)
+    def wrapper(_conn, query: str, params=None, *args, **kwargs):
+        if not enabled():
+            return fn(_conn, query, params, *args, **kwargs)
+        caller = sys._getframe(1).f_code.co_name
+        with span(f"query.{caller}", kind='query',
+                  query_hash=query_hash(query), statement=query,
+                  params=len(params or ())) as current:
+            df = fn(_conn, query, params, *args, **kwargs)
+            current.attributes['rows'] = len(df) if isinstance(df, pd.DataFrame) else None
+            current.attributes['bytes'] = _frame_bytes(df)
+            return df
+    return wrapper
+
+
+def traced_render(page: str, render: Callable) -> Callable:
+    """Wrap a page's render() so the whole page run is one trace"""
+    @wraps(render)
+    def wrapper(*args, **kwargs):
+        with span(f"render.{page}", kind='render', page=page):
+            return render(*args, **kwargs)
+    return wrapper
+
+
+def render_debug_panel():
+    """Collapsible sidebar panel with the last render breakdown and session totals"""
+    if not enabled():
+        return
+    recorder = get_recorder()
+    with st.sidebar.expander("🐞 Timings"):
+        trace = recorder.last_trace()
+        root = next((s for s in trace if s.parent_id is None), None)
+        if root is not None:
+            queries = [s for s in trace if s.kind == 'query']
+            cached = sum(s.attributes.get('cache') in ('hit', 'stale') for s in queries)
+            st.caption(f"Last render: {root.name.split('.', 1)[-1]}")
+            col1, col2 = st.columns(2)
+            col1.metric("Render", f"{root.duration:.2f}s")
+            col2.metric("Outside Queries", f"{root.self_duration:.2f}s")
+            st.caption(
+                f"{len(queries)} queries ({cached} cached) · "
+                f"{sum(s.attributes.get('warehouse_s') or 0.0 for s in queries):.2f}s warehouse · "
+                f"{sum(s.attributes.get('convert_s') or 0.0 for s in queries):.2f}s to pandas · "
+                f"{sum(s.attributes.get('rows') or 0 for s in queries):,} rows"
+            )
+            slowest = sorted(queries, key=lambda s: s.duration or 0.0, reverse=True)[:5]
+            if slowest:
+                st.dataframe(pd.DataFrame([{
+                    'query': s.attributes.get('query_hash'),
+                    'seconds': round(s.duration, 3),
+                    'cache': s.attributes.get('cache'),
+                    'rows': s.attributes.get('rows'),
+                    'query_id': s.attributes.get('query_id'),
+                } for s in slowest]), use_container_width=True, hide_index=True)
+
+        summary = recorder.summary()
+        if summary.empty:
+            st.caption("No spans recorded yet")
+            return
+        st.caption("This session")
+        st.dataframe(summary.round(3), use_container_width=True, hide_index=True)
+        spans = list(recorder.spans)
+        st.download_button(
+            "📥 Spans (JSONL)",
+            data='\n'.join(json.dumps(s.to_dict(), default=str) for s in spans),
+            file_name="dashboard_spans.jsonl",
+            mime="application/x-ndjson"
+        )
+        st.download_button(
+            "📥 Spans (OTLP JSON)",
+            data=json.dumps(to_otlp(spans)),
+            file_name="dashboard_spans.otlp.json",
+            mime="application/json"
+        )
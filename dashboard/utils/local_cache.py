@@ -0,0 +1,253 @@
+"""
+In-process columnar cache for dashboard queries
+Snapshots projected gold tables into DuckDB and answers filter/aggregate
+queries locally instead of re-querying Snowflake
+"""
+import re
+import time
+import logging
+import threading
+import pandas as pd
+from typing import Dict, Optional, Sequence
+
+from arrow_fetch import arrow_to_pandas, iter_arrow_batches
+from query_builder import QueryBuilder
+
+logger = logging.getLogger(__name__)
+
+# Columns kept locally per gold table - enough to answer every data_loader
+# query against these tables without pulling the full 85+ column OBT
+SNAPSHOT_COLUMNS = {
+    'gold_fact_order_summary': [
+        'ORDER_ID',
+        'CUSTOMER_ID',
+        'ORDER_STATUS',
+        'ORDER_PURCHASE_TIMESTAMP',
+        'ORDER_DATE_KEY',
+        'ACTUAL_DELIVERY_DAYS',
+        'IS_LATE_DELIVERY',
+        'TOTAL_UNIQUE_PRODUCTS',
+        'TOTAL_ITEMS',
+        'TOTAL_PRODUCT_VALUE',
+        'TOTAL_FREIGHT_VALUE',
+        'TOTAL_ORDER_VALUE',
+        'TOTAL_PAYMENT_VALUE',
+        'MAX_INSTALLMENTS',
+        'PAYMENT_TYPES_USED',
+        'REVIEW_SCORE',
+        'REVIEW_SENTIMENT',
+        'HAS_REVIEW_COMMENT'
+    ],
+    'gold_obt_orders': [
+        'ORDER_ID',
+        'CUSTOMER_ID',
+        'ORDER_STATUS',
+        'ORDER_PURCHASE_TIMESTAMP',
+        'CUSTOMER_STATE',
+        'CUSTOMER_CITY',
+        'PRODUCT_CATEGORY_ENGLISH',
+        'SELLER_STATE',
+        'PAYMENT_TYPES',
+        'MAX_INSTALLMENTS',
+        'TOTAL_PAYMENT_VALUE',
+        'TOTAL_ORDER_VALUE',
+        'TOTAL_FREIGHT_VALUE',
+        'ACTUAL_DELIVERY_DAYS',
+        'ESTIMATED_DELIVERY_DAYS',
+        'IS_LATE_DELIVERY',
+        'REVIEW_SCORE',
+        'REVIEW_SENTIMENT',
+        'CUSTOMER_ORDER_COUNT',
+        'CUSTOMER_LIFETIME_VALUE',
+        'DAYS_SINCE_LAST_ORDER'
+    ],
+}
+
+# QueryBuilder renders exactly one "FROM <table>" line; anything with joins
+# or subqueries is left to Snowflake
+_FROM_LINE = re.compile(r'^FROM ([A-Za-z_][A-Za-z0-9_$.]*)$', re.MULTILINE)
+_UNSUPPORTED = re.compile(r'\b(JOIN|HLL_\w+|QUALIFY)\b|\(\s*SELECT\b', re.IGNORECASE)
+
+
+class LocalColumnarCache:
+    """
+    DuckDB-backed snapshot of projected gold tables
+
+    Each table is pulled from Snowflake once per TTL as Arrow and copied
+    into an in-memory DuckDB database. Queries built with QueryBuilder
+    (qmark placeholders, ANSI aggregates) run unchanged against the
+    snapshot, so sidebar and page filters are answered locally. A query is
+    sent back to Snowflake when its table is not snapshotted, it references
+    a column outside the projection, or the snapshot would exceed the
+    memory budget.
+
+    Example:
+        cache = LocalColumnarCache(pool, ttl_seconds=900, max_bytes=512 * 1024 ** 2)
+        df = cache.query(*bound_query)   # None means "not covered"
+    """
+
+    def __init__(self, pool, ttl_seconds: float = 900.0,
+                 max_bytes: int = 512 * 1024 ** 2,
+                 tables: Optional[Dict[str, list]] = None):
+        """
+        Initialize the local cache
+
+        Args:
+            pool: ConnectionPool used to load snapshots
+            ttl_seconds: Snapshot lifetime before it is reloaded
+            max_bytes: Memory budget for all snapshots (Arrow size) and the
+                DuckDB memory limit
+            tables: Table -> projected columns (defaults to SNAPSHOT_COLUMNS)
+        """
+        import duckdb
+
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.tables = tables or SNAPSHOT_COLUMNS
+
+        self._db = duckdb.connect(':memory:')
+        self._db.execute(f"SET memory_limit='{max(max_bytes // 1024 ** 2, 64)}MB'")
+        self._errors = (duckdb.Error,)
+
+        self._lock = threading.Lock()
+        self._table_locks = {table: threading.Lock() for table in self.tables}
+        self._snapshots: Dict[str, dict] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'loads': 0,
+                       'load_seconds': 0.0, 'rejected_too_large': 0}
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _snapshot_bytes(self, exclude: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(s['bytes'] for t, s in self._snapshots.items() if t != exclude and s['loaded'])
+
+    def _is_fresh(self, table: str) -> bool:
+        snapshot = self._snapshots.get(table)
+        return snapshot is not None and time.time() - snapshot['loaded_at'] < self.ttl_seconds
+
+    def _load(self, table: str):
+        """Pull the projected table from Snowflake into DuckDB"""
+        import pyarrow as pa
+
+        started = time.perf_counter()
+        query = QueryBuilder(table).select(*self.tables[table]).build()
+        with self.pool.connection() as conn:
+            batches = list(iter_arrow_batches(conn, *query))
+        if not batches:
+            arrow_table = None
+        elif isinstance(batches[0], pa.RecordBatch):
+            arrow_table = pa.Table.from_batches(batches)
+        else:
+            arrow_table = pa.concat_tables(batches)
+        del batches
+
+        size = arrow_table.nbytes if arrow_table is not None else 0
+        loaded = arrow_table is not None and size + self._snapshot_bytes(exclude=table) <= self.max_bytes
+
+        # DuckDB connections are not thread-safe; every thread uses its own cursor
+        db = self._db.cursor()
+        try:
+            if loaded:
+                staging = f"_staging_{table}"
+                db.register(staging, arrow_table)
+                db.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM {staging}")
+                db.unregister(staging)
+            else:
+                db.execute(f"DROP TABLE IF EXISTS {table}")
+        finally:
+            db.close()
+        if not loaded and arrow_table is not None:
+            self._count('rejected_too_large')
+            logger.warning(f"⚠️ Snapshot of {table} ({size / 1024 ** 2:.1f} MB) exceeds the local cache budget")
+
+        seconds = time.perf_counter() - started
+        with self._lock:
+            # A rejected table is remembered for one TTL so it is not re-pulled on every query
+            self._snapshots[table] = {
+                'loaded': loaded,
+                'loaded_at': time.time(),
+                'rows': arrow_table.num_rows if arrow_table is not None else 0,
+                'bytes': size if loaded else 0,
+                'seconds': round(seconds, 3),
+            }
+            self._stats['loads'] += 1
+            self._stats['load_seconds'] += seconds
+        logger.info(f"Loaded local snapshot of {table}: {self._snapshots[table]['rows']:,} rows "
+                    f"({size / 1024 ** 2:.1f} MB) in {seconds:.2f}s")
+
+    def _ensure_loaded(self, table: str) -> bool:
+        if not self._is_fresh(table):
+            with self._table_locks[table]:
+                # Another thread may have loaded it while we waited
+                if not self._is_fresh(table):
+                    self._load(table)
+        return self._snapshots.get(table, {}).get('loaded', False)
+
+    def covers(self, query: str) -> Optional[str]:
+        """Return the snapshotted table a query reads from, or None"""
+        tables = _FROM_LINE.findall(query)
+        if len(tables) != 1 or _UNSUPPORTED.search(query):
+            return None
+        table = tables[0].lower()
+        return table if table in self.tables else None
+
+    def query(self, query: str, params: Optional[Sequence] = None) -> Optional[pd.DataFrame]:
+        """
+        Answer a query from the local snapshot
+
+        Args:
+            query: SQL with ? placeholders (as produced by QueryBuilder)
+            params: Bind parameters
+
+        Returns:
+            DataFrame, or None when the query must go to Snowflake
+        """
+        table = self.covers(query)
+        if table is None:
+            self._count('bypassed')
+            return None
+
+        try:
+            if not self._ensure_loaded(table):
+                self._count('misses')
+                return None
+            cursor = self._db.cursor()
+            try:
+                result = cursor.execute(query, list(params or ())).fetch_arrow_table()
+            finally:
+                cursor.close()
+        except self._errors as e:
+            # Typically a column outside the projection; Snowflake can answer it
+            logger.info(f"Local cache miss for {table}: {e}")
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return arrow_to_pandas(result)
+
+    def invalidate(self, table: Optional[str] = None):
+        """Drop one snapshot (or all) so the next query reloads it"""
+        with self._lock:
+            targets = [table] if table else list(self._snapshots)
+            for name in targets:
+                self._snapshots.pop(name, None)
+        db = self._db.cursor()
+        try:
+            for name in targets:
+                db.execute(f"DROP TABLE IF EXISTS {name}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and per-table snapshot sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['snapshots'] = {table: dict(s) for table, s in self._snapshots.items()}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['bytes'] = sum(s['bytes'] for s in stats['snapshots'].values())
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -0,0 +1,283 @@
+"""
+Stale-while-revalidate result cache for dashboard queries
+Serves expired results immediately and refreshes them on a background
+thread, re-running a query only when its gold tables have been rebuilt
+"""
+import re
+import time
+import logging
+import threading
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from query_builder import BoundQuery
+from .instrumentation import annotate
+
+logger = logging.getLogger(__name__)
+
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_$.]*)', re.IGNORECASE)
+
+
+def referenced_tables(query: str) -> frozenset:
+    """Lower-cased, schema-stripped names of the tables a query reads"""
+    return frozenset(name.split('.')[-1].lower() for name in _TABLE_REFERENCE.findall(query))
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at', 'ttl', 'tables', 'versions', 'refreshing')
+
+    def __init__(self, value, ttl: float, tables: frozenset, versions: Optional[dict]):
+        self.value = value
+        self.fetched_at = time.time()
+        self.ttl = ttl
+        self.tables = tables
+        self.versions = versions
+        self.refreshing = False
+
+
+class StaleWhileRevalidateCache:
+    """
+    In-process query result cache with background revalidation
+
+    - Fresh entries (younger than their TTL) are returned directly.
+    - Expired entries are returned immediately while one background thread
+      revalidates them: if none of the query's tables changed version since
+      the entry was fetched, the entry is simply re-stamped; otherwise the
+      query is re-run and the entry replaced.
+    - Table versions (the time dbt last rebuilt each table) are probed with
+      a single metadata query, at most once per version_check_seconds and
+      off the request path for cached reads. Once a newer version has been
+      seen, entries reading that table are treated as expired.
+    - on_version_change is called once per table whose version moved, so
+      layers below the cache (e.g. local table snapshots) can drop data
+      from before the rebuild before the query is re-run.
+
+    Example:
+        cache = StaleWhileRevalidateCache(version_probe=probe)
+        df = cache.get(query, params, loader=lambda: run(query, params), ttl=600)
+        cache.invalidate_tables('gold_fact_order_summary')
+    """
+
+    def __init__(self,
+                 version_probe: Optional[Callable[[Iterable[str]], Optional[Dict[str, object]]]] = None,
+                 default_ttl: float = 300.0,
+                 version_check_seconds: float = 60.0,
+                 max_entries: int = 256,
+                 refresh_workers: int = 2,
+                 on_version_change: Optional[Callable[[str], None]] = None):
+        """
+        Initialize the cache
+
+        Args:
+            version_probe: Callable mapping table names to a version value
+                (None when versions cannot be determined)
+            default_ttl: TTL in seconds for queries that do not pass one
+            version_check_seconds: Minimum interval between version probes
+            max_entries: Least-recently-used entries beyond this are dropped
+            refresh_workers: Background refresh threads
+            on_version_change: Called with the table name whenever a probe
+                sees a new version of a previously seen table
+        """
+        self.version_probe = version_probe
+        self.default_ttl = default_ttl
+        self.version_check_seconds = version_check_seconds
+        self.max_entries = max_entries
+        self.on_version_change = on_version_change
+
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='swr-refresh')
+        self._versions: Optional[Dict[str, object]] = {}
+        self._versions_checked_at = 0.0
+        self._probe_pending = False
+        # Last successfully probed version per table, kept across failed probes
+        self._seen_versions: Dict[str, object] = {}
+        self._version_lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0,
+                       'revalidated_unchanged': 0, 'refresh_errors': 0, 'invalidations': 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def table_versions(self, tables: Iterable[str], force: bool = False) -> Optional[dict]:
+        """
+        Current versions of the given tables
+
+        Probes at most once per version_check_seconds (unless forced or a
+        table has not been seen yet). A failing probe is not retried until
+        the interval has passed.
+
+        Returns:
+            Table -> version, or None when versions are unavailable
+        """
+        tables = frozenset(tables)
+        if self.version_probe is None or not tables:
+            return None
+        changed = []
+        with self._version_lock:
+            due = force or time.time() - self._versions_checked_at >= self.version_check_seconds
+            unseen = self._versions is not None and not tables <= self._versions.keys()
+            if due or unseen:
+                try:
+                    probed = dict(self.version_probe(tables | (self._versions or {}).keys()))
+                except Exception as e:
+                    logger.warning(f"⚠️ Table version probe failed: {e}")
+                    probed = None
+                self._versions = probed
+                self._versions_checked_at = time.time()
+                self._probe_pending = False
+                for table, version in (probed or {}).items():
+                    previous = self._seen_versions.get(table)
+                    if version is None:
+                        continue
+                    if previous is not None and version != previous:
+                        changed.append(table)
+                    self._seen_versions[table] = version
+            current = None if self._versions is None else {table: self._versions.get(table) for table in tables}
+        for table in changed:
+            logger.info(f"Table {table} was rebuilt; dropping derived snapshots")
+            if self.on_version_change is not None:
+                try:
+                    self.on_version_change(table)
+                except Exception as e:
+                    logger.warning(f"⚠️ Version change handler failed for {table}: {e}")
+        return current
+
+    def _known_versions(self, tables: frozenset) -> Optional[dict]:
+        """Last probed versions without blocking; schedules a probe when due"""
+        with self._version_lock:
+            due = time.time() - self._versions_checked_at >= self.version_check_seconds
+            if due and not self._probe_pending and self.version_probe is not None:
+                self._probe_pending = True
+                self._executor.submit(self.table_versions, tables, True)
+            if self._versions is None:
+                return None
+            return {table: self._versions.get(table) for table in tables}
+
+    def _changed(self, entry: _Entry, force: bool = False) -> bool:
+        if entry.versions is None:
+            return True
+        current = self.table_versions(entry.tables, force=force)
+        return current is None or current != entry.versions
+
+    def _store(self, key: str, entry: _Entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key: str, loader: Callable, entry: _Entry):
+        try:
+            if not self._changed(entry, force=True):
+                # Tables not rebuilt since the last fetch: keep the result
+                entry.fetched_at = time.time()
+                self._count('revalidated_unchanged')
+                return
+            versions = self.table_versions(entry.tables)
+            value = loader()
+            if value is None:
+                raise RuntimeError("loader returned no result")
+            self._store(key, _Entry(value, entry.ttl, entry.tables, versions))
+            self._count('refreshes')
+        except Exception as e:
+            logger.warning(f"⚠️ Background refresh failed, keeping stale result: {e}")
+            self._count('refresh_errors')
+        finally:
+            entry.refreshing = False
+
+    def get(self, query: str, params: Optional[Sequence] = None,
+            loader: Callable[[], Optional[pd.DataFrame]] = None,
+            ttl: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """
+        Return a cached result, loading or revalidating as needed
+
+        Args:
+            query: SQL text (used for the cache key and table extraction)
+            params: Bind parameters
+            loader: Runs the query; returning None marks a failure that is
+                not cached
+            ttl: Seconds before the entry is revalidated (default_ttl if None)
+
+        Returns:
+            A copy of the cached DataFrame, or None if the loader failed
+        """
+        key = BoundQuery(query, tuple(params or ())).cache_key
+        ttl = self.default_ttl if ttl is None else ttl
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            expired = time.time() - entry.fetched_at >= entry.ttl
+            if not expired and entry.versions is not None:
+                # A background probe may have seen a newer dbt run
+                current = self._known_versions(entry.tables)
+                expired = current is not None and current != entry.versions
+            if not expired:
+                self._count('hits')
+                annotate(cache='hit')
+                return entry.value.copy()
+
+            self._count('stale_hits')
+            annotate(cache='stale')
+            with self._lock:
+                schedule = not entry.refreshing
+                entry.refreshing = True
+            if schedule:
+                self._executor.submit(self._refresh, key, loader, entry)
+            return entry.value.copy()
+
+        self._count('misses')
+        annotate(cache='miss')
+        tables = referenced_tables(query)
+        versions = self.table_versions(tables)
+        value = loader()
+        if value is not None:
+            self._store(key, _Entry(value, ttl, tables, versions))
+            return value.copy()
+        return None
+
+    def invalidate_tables(self, *tables: str) -> int:
+        """
+        Drop every entry that reads any of the given tables
+
+        Returns:
+            Number of entries removed
+        """
+        targets = {t.split('.')[-1].lower() for t in tables}
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry.tables & targets]
+            for key in keys:
+                del self._entries[key]
+            self._stats['invalidations'] += len(keys)
+        with self._version_lock:
+            self._versions_checked_at = 0.0
+        return len(keys)
+
+    def clear(self) -> int:
+        """
+        Drop every entry
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            removed = len(self._entries)
+            self._stats['invalidations'] += removed
+            self._entries.clear()
+        with self._version_lock:
+            self._versions_checked_at = 0.0
+        return removed
+
+    def stats(self) -> dict:
+        """Hit/stale/miss counters and entry count"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
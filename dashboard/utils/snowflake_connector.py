@@ -2,8 +2,8 @@
 Snowflake connection utilities for Streamlit dashboard
 """
 import os
+import sys
 import streamlit as st
-import snowflake.connector
 import pandas as pd
 from dotenv import load_dotenv
 from typing import Optional
@@ -14,17 +14,44 @@ from pathlib import Path
 env_path = Path(__file__).parent.parent.parent / 'ml_pipeline' / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Shared modules live in ml_pipeline/src
+sys.path.append(str(Path(__file__).parent.parent.parent / 'ml_pipeline' / 'src'))
+
+from backends import get_backend
+from connection_pool import ConnectionPool, get_pool, snowflake_connection_factory
+from arrow_fetch import fetch_dataframe
+from schema_dtypes import downcast_frame
+from .query_cache import StaleWhileRevalidateCache
+from .instrumentation import annotate, traced_query
+
 logger = logging.getLogger(__name__)
 
 
 @st.cache_resource
-def get_snowflake_connection():
+def get_snowflake_connection() -> Optional[ConnectionPool]:
     """
-    Get cached Snowflake connection
+    Get the shared Snowflake connection pool
+    
+    Concurrent Streamlit sessions each check out their own connection
+    from the pool instead of serializing on a single connection.
+    With DATA_BACKEND=duckdb the pool serves the offline synthetic
+    dataset instead (see backends.DuckDBBackend).
     
     Returns:
-        Snowflake connection object
+        ConnectionPool object (or None if credentials are missing)
     """
+    backend = get_backend()
+    if backend.name != 'snowflake':
+        try:
+            pool = backend.pool(min_size=1)
+            logger.info(f"✅ Connected to {backend.describe()}")
+            st.success(f"✅ Connected to {backend.describe()}")
+            return pool
+        except Exception as e:
+            logger.error(f"❌ Failed to open {backend.name} backend: {e}")
+            st.error(f"Failed to open {backend.name} backend: {e}")
+            return None
+    
     # Get credentials
     user = os.getenv('SNOWFLAKE_USER')
     password = os.getenv('SNOWFLAKE_PASSWORD')
@@ -54,18 +81,22 @@ def get_snowflake_connection():
         return None
     
     try:
-        conn = snowflake.connector.connect(
-            user=user,
-            password=password,
-            account=account,
-            warehouse=warehouse,
-            database=database,
-            schema=schema,
-            role=role
+        pool = get_pool(
+            'snowflake',
+            factory=snowflake_connection_factory(
+                user=user,
+                password=password,
+                account=account,
+                warehouse=warehouse,
+                database=database,
+                schema=schema,
+                role=role
+            ),
+            min_size=1
         )
         logger.info("✅ Connected to Snowflake successfully")
         st.success(f"✅ Connected to Snowflake: {database}.{schema}")
-        return conn
+        return pool
     except Exception as e:
         logger.error(f"❌ Failed to connect to Snowflake: {e}")
         st.error(f"Failed to connect to Snowflake: {e}")
@@ -73,14 +104,147 @@ def get_snowflake_connection():
         return None
 
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def execute_query(_conn, query: str) -> pd.DataFrame:
+@st.cache_resource
+def get_local_cache(_conn):
+    """
+    Get the shared in-process columnar cache (or None if disabled)
+    
+    Controlled by DASHBOARD_LOCAL_CACHE (default on),
+    DASHBOARD_LOCAL_CACHE_TTL (seconds, default 900) and
+    DASHBOARD_LOCAL_CACHE_MAX_MB (default 512). Requires duckdb.
+    
+    Args:
+        _conn: Snowflake connection pool used to load snapshots
+        
+    Returns:
+        LocalColumnarCache object
+    """
+    if _conn is None or os.getenv('DASHBOARD_LOCAL_CACHE', '1').lower() in ('0', 'false', 'no'):
+        return None
+    if not get_backend().remote:
+        # Queries already run in-process
+        return None
+    try:
+        from .local_cache import LocalColumnarCache
+        return LocalColumnarCache(
+            _conn,
+            ttl_seconds=float(os.getenv('DASHBOARD_LOCAL_CACHE_TTL', 900)),
+            max_bytes=int(float(os.getenv('DASHBOARD_LOCAL_CACHE_MAX_MB', 512)) * 1024 ** 2)
+        )
+    except ImportError:
+        logger.warning("duckdb not installed; local columnar cache disabled")
+        return None
+
+
+def _table_version_probe(pool: ConnectionPool):
+    """
+    Build a probe returning the last rebuild time per gold table
+    
+    On Snowflake this is INFORMATION_SCHEMA.TABLES.LAST_ALTERED: dbt rebuilds
+    (or merges into) a table on every run, so it changes exactly when a dbt
+    run touched that table.
+    """
+    backend = get_backend()
+    
+    def probe(tables) -> dict:
+        return backend.table_versions(pool, tables)
+    return probe
+
+
+@st.cache_resource
+def get_query_cache(_conn) -> StaleWhileRevalidateCache:
+    """
+    Get the shared stale-while-revalidate query cache
+    
+    Controlled by DASHBOARD_QUERY_TTL (seconds, default 300) and
+    DASHBOARD_VERSION_CHECK_SECONDS (default 60). When a probe sees that
+    dbt rebuilt a table, its local columnar snapshot is dropped so the
+    re-run query does not read rows from before the rebuild.
+    
+    Args:
+        _conn: Snowflake connection pool used for table version probes
+        
+    Returns:
+        StaleWhileRevalidateCache object
+    """
+    local_cache = get_local_cache(_conn)
+    return StaleWhileRevalidateCache(
+        version_probe=_table_version_probe(_conn) if _conn is not None else None,
+        on_version_change=local_cache.invalidate if local_cache is not None else None,
+        default_ttl=float(os.getenv('DASHBOARD_QUERY_TTL', 300)),
+        version_check_seconds=float(os.getenv('DASHBOARD_VERSION_CHECK_SECONDS', 60))
+    )
+
+
+def _run_query(pool: ConnectionPool, local_cache, query: str,
+               params: Optional[tuple], use_arrow: bool) -> pd.DataFrame:
+    """Answer a query from the local columnar cache or Snowflake (raises on failure)"""
+    if local_cache is not None:
+        try:
+            df = local_cache.query(query, params)
+        except Exception as e:
+            logger.warning(f"⚠️ Local cache failed, falling back to Snowflake: {e}")
+            df = None
+        if df is not None:
+            logger.info(f"✅ Query answered locally: {len(df)} rows returned")
+            annotate(source='local')
+            return df
+    
+    stats = {}
+    with pool.connection() as conn:
+        df = fetch_dataframe(conn, query, params=params, use_arrow=use_arrow, stats=stats)
+    logger.info(f"✅ Query executed: {len(df)} rows returned")
+    annotate(
+        source='warehouse',
+        query_id=stats.get('query_id'),
+        warehouse_s=stats.get('execute_s', 0.0) + stats.get('fetch_s', 0.0),
+        convert_s=stats.get('convert_s'),
+        arrow_bytes=stats.get('arrow_bytes')
+    )
+    return df
+
+
+def _downcast(df: pd.DataFrame, model: str, aliases: Optional[dict]) -> pd.DataFrame:
+    """Narrow a result to the dtypes declared in the dbt properties.yml"""
+    if os.getenv('DASHBOARD_DOWNCAST', '1').lower() in ('0', 'false', 'no'):
+        return df
+    stats = {}
+    df = downcast_frame(df, model, aliases=aliases, stats=stats)
+    logger.info(f"Downcast {model}: {stats['bytes_before'] / 1024 ** 2:.2f} MB -> "
+                f"{stats['bytes_after'] / 1024 ** 2:.2f} MB")
+    annotate(bytes_before_downcast=stats['bytes_before'], downcast_columns=len(stats['columns']))
+    return df
+
+
+@traced_query
+def execute_query(_conn, query: str, params: Optional[tuple] = None,
+                  use_arrow: bool = True, ttl: Optional[float] = None,
+                  model: Optional[str] = None, aliases: Optional[dict] = None) -> pd.DataFrame:
     """
     Execute Snowflake query and return results as DataFrame
     
+    Results are cached with stale-while-revalidate semantics: once an
+    entry's TTL passes, the cached result is still returned immediately
+    while a background thread checks whether the query's tables were
+    rebuilt by dbt and re-runs the query only if they were. Identical
+    logical queries built with QueryBuilder produce identical (query,
+    params) pairs, so they share a cache entry and Snowflake's server-side
+    result cache. Queries against snapshotted gold tables are answered by
+    the local columnar cache first; only uncovered queries reach Snowflake.
+    Each call is recorded as a span (see instrumentation). Results of
+    queries against a declared gold model are downcast to the dtypes in
+    the dbt properties.yml before they are cached (DASHBOARD_DOWNCAST=0
+    turns this off).
+    
     Args:
-        _conn: Snowflake connection (underscore prefix prevents hashing)
-        query: SQL query to execute
+        _conn: Snowflake connection pool
+        query: SQL query to execute, with ? placeholders
+        params: Bind parameters for the placeholders
+        use_arrow: Fetch result chunks as Arrow batches instead of pd.read_sql
+        ttl: Seconds before the cached result is revalidated
+            (DASHBOARD_QUERY_TTL, 300s, if None)
+        model: Gold model the selected columns come from, for downcasting
+        aliases: Output column -> model column for renamed columns
         
     Returns:
         DataFrame with query results
@@ -89,18 +253,68 @@ def execute_query(_conn, query: str) -> pd.DataFrame:
         st.error("No Snowflake connection available")
         return pd.DataFrame()
     
+    # Resolve shared resources here; background refreshes run without a
+    # Streamlit script context
+    local_cache = get_local_cache(_conn)
+    
+    def loader() -> pd.DataFrame:
+        df = _run_query(_conn, local_cache, query, params, use_arrow)
+        return _downcast(df, model, aliases) if model else df
+    
     try:
-        df = pd.read_sql(query, _conn)
-        logger.info(f"✅ Query executed: {len(df)} rows returned")
-        return df
+        return get_query_cache(_conn).get(query, params, loader=loader, ttl=ttl)
     except Exception as e:
         logger.error(f"❌ Query failed: {e}")
         st.error(f"Query execution failed: {e}")
         return pd.DataFrame()
 
 
+def get_pool_metrics() -> dict:
+    """Get metrics (wait time, in-use count, ...) for the shared connection pool"""
+    pool = get_snowflake_connection()
+    return pool.metrics() if pool is not None else {}
+
+
+def get_local_cache_stats() -> dict:
+    """Get hit/miss counters and snapshot sizes for the local columnar cache"""
+    local_cache = get_local_cache(get_snowflake_connection())
+    return local_cache.stats() if local_cache is not None else {}
+
+
+def get_query_cache_stats() -> dict:
+    """Get hit/stale/miss counters for the query result cache"""
+    return get_query_cache(get_snowflake_connection()).stats()
+
+
+def refresh_data(*tables: str) -> int:
+    """
+    Invalidate cached results so the next read goes back to the warehouse
+    
+    Keeps the connection pool and other cached resources alive.
+    
+    Args:
+        tables: Gold tables to invalidate (all cached results if omitted)
+        
+    Returns:
+        Number of query cache entries removed
+    """
+    pool = get_snowflake_connection()
+    query_cache = get_query_cache(pool)
+    local_cache = get_local_cache(pool)
+    
+    if not tables:
+        if local_cache is not None:
+            local_cache.invalidate()
+        return query_cache.clear()
+    
+    if local_cache is not None:
+        for table in tables:
+            local_cache.invalidate(table.lower())
+    return query_cache.invalidate_tables(*tables)
+
+
 def clear_cache():
-    """Clear all Streamlit caches"""
+    """Clear all Streamlit caches, including the connection pool"""
     st.cache_data.clear()
     st.cache_resource.clear()
     st.success("✅ Cache cleared!")
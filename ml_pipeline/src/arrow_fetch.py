@@ -0,0 +1,228 @@
+"""
+Arrow-native result fetching for Snowflake (and DB-API stand-in) connections
+"""
+import time
+import logging
+from typing import Iterator, Optional, Sequence
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DTYPE_BACKENDS = ('numpy', 'numpy_nullable', 'pyarrow')
+
+
+def _cursor_supports_arrow(cursor) -> bool:
+    """Snowflake cursors expose fetch_arrow_batches, DuckDB exposes fetch_record_batch"""
+    return hasattr(cursor, 'fetch_arrow_batches') or hasattr(cursor, 'fetch_record_batch')
+
+
+def _empty_frame(cursor) -> pd.DataFrame:
+    columns = [col[0] for col in (cursor.description or [])]
+    return pd.DataFrame(columns=columns)
+
+
+def _execute(cursor, query: str, params: Optional[Sequence] = None):
+    if params is None:
+        cursor.execute(query)
+    else:
+        cursor.execute(query, params)
+
+
+def _cursor_batches(cursor, batch_rows: int) -> Iterator:
+    if hasattr(cursor, 'fetch_arrow_batches'):
+        yield from cursor.fetch_arrow_batches()
+    elif hasattr(cursor, 'fetch_record_batch'):
+        yield from cursor.fetch_record_batch(batch_rows)
+    else:
+        raise TypeError(f"{type(cursor).__name__} does not support Arrow fetching")
+
+
+def iter_arrow_batches(conn, query: str,
+                       params: Optional[Sequence] = None,
+                       batch_rows: int = 100_000) -> Iterator:
+    """
+    Execute a query and yield results as pyarrow batches
+
+    Snowflake returns one Arrow table per downloaded result chunk, so rows
+    are never materialized as Python tuples.
+
+    Args:
+        conn: Snowflake (or DuckDB) DB-API connection
+        query: SQL query to execute
+        params: Optional bind parameters
+        batch_rows: Target batch size for engines that let the client choose it
+
+    Returns:
+        Iterator of pyarrow.Table / pyarrow.RecordBatch objects
+    """
+    cursor = conn.cursor()
+    try:
+        _execute(cursor, query, params)
+        yield from _cursor_batches(cursor, batch_rows)
+    finally:
+        cursor.close()
+
+
+def arrow_to_pandas(table, dtype_backend: str = 'numpy') -> pd.DataFrame:
+    """
+    Convert an Arrow table to pandas without losing integer/boolean dtypes
+
+    Args:
+        table: pyarrow.Table
+        dtype_backend: 'numpy' (default pandas dtypes; integer columns with
+            nulls become float64 as with pd.read_sql), 'numpy_nullable'
+            (Int64/boolean/string extension dtypes) or 'pyarrow' (ArrowDtype)
+
+    Returns:
+        DataFrame
+    """
+    if dtype_backend not in DTYPE_BACKENDS:
+        raise ValueError(f"dtype_backend must be one of {DTYPE_BACKENDS}")
+
+    if dtype_backend == 'pyarrow':
+        return table.to_pandas(types_mapper=pd.ArrowDtype, split_blocks=True, self_destruct=True)
+
+    import pyarrow as pa
+
+    # Fixed-point NUMBER(p, s) columns would otherwise become object columns
+    # of decimal.Decimal
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+
+    types_mapper = None
+    if dtype_backend == 'numpy_nullable':
+        nullable = {
+            pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+            pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+            pa.bool_(): pd.BooleanDtype(), pa.string(): pd.StringDtype(),
+            pa.float32(): pd.Float32Dtype(), pa.float64(): pd.Float64Dtype(),
+        }
+        types_mapper = nullable.get
+
+    # split_blocks + self_destruct release Arrow buffers column by column,
+    # keeping peak memory close to the size of the final frame
+    return table.to_pandas(types_mapper=types_mapper, split_blocks=True, self_destruct=True)
+
+
+def fetch_dataframe(conn, query: str,
+                    params: Optional[Sequence] = None,
+                    use_arrow: bool = True,
+                    dtype_backend: str = 'numpy',
+                    stats: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Execute a query and return a DataFrame
+
+    Uses the connector's Arrow batch interface when available and falls back
+    to pd.read_sql otherwise (e.g. for the SQLite stand-in).
+
+    Args:
+        conn: DB-API connection
+        query: SQL query to execute
+        params: Optional bind parameters
+        use_arrow: Fetch via Arrow batches instead of pd.read_sql
+        dtype_backend: See arrow_to_pandas()
+        stats: Optional dict filled with the Snowflake query ID and the time
+            spent executing, fetching and converting to pandas (seconds)
+
+    Returns:
+        DataFrame with query results
+    """
+    stats = {} if stats is None else stats
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        if not (use_arrow and _cursor_supports_arrow(cursor)):
+            df = pd.read_sql(query, conn, params=params)
+            stats['execute_s'] = time.perf_counter() - started
+            return df
+
+        import pyarrow as pa
+
+        _execute(cursor, query, params)
+        stats['query_id'] = getattr(cursor, 'sfqid', None)
+        executed = time.perf_counter()
+        stats['execute_s'] = executed - started
+        batches = list(_cursor_batches(cursor, batch_rows=100_000))
+        stats['fetch_s'] = time.perf_counter() - executed
+        if not batches:
+            return _empty_frame(cursor)
+    finally:
+        cursor.close()
+
+    converting = time.perf_counter()
+    if isinstance(batches[0], pa.RecordBatch):
+        table = pa.Table.from_batches(batches)
+    else:
+        table = pa.concat_tables(batches)
+    del batches
+    stats['arrow_bytes'] = table.nbytes
+
+    df = arrow_to_pandas(table, dtype_backend=dtype_backend)
+    stats['convert_s'] = time.perf_counter() - converting
+    return df
+
+
+def _widen_integers(schema):
+    """Promote integer fields to int64 (uint64 is left as is)"""
+    import pyarrow as pa
+
+    fields = [
+        field.with_type(pa.int64())
+        if pa.types.is_integer(field.type) and not pa.types.is_uint64(field.type) else field
+        for field in schema
+    ]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def rebatch(batches: Iterator, batch_rows: int) -> Iterator:
+    """
+    Re-slice a stream of Arrow batches into tables of batch_rows rows
+
+    Snowflake result chunks vary in size and pick the narrowest integer type
+    that fits each chunk's values, so a later chunk can be wider than the
+    first. Integer columns are therefore always emitted as int64, and any
+    other difference (e.g. an all-null first chunk) is resolved with
+    pa.unify_schemas so consumers see a stable schema. At most one pending
+    chunk plus one output table is held in memory at a time.
+
+    Args:
+        batches: Iterator of pyarrow.Table / pyarrow.RecordBatch
+        batch_rows: Rows per output table (the final table may be smaller)
+
+    Returns:
+        Iterator of pyarrow.Table
+    """
+    import pyarrow as pa
+
+    if batch_rows < 1:
+        raise ValueError("batch_rows must be at least 1")
+
+    schema = None
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        table = pa.Table.from_batches([batch]) if isinstance(batch, pa.RecordBatch) else batch
+        widened = _widen_integers(table.schema)
+        if schema is None:
+            schema = widened
+        elif not widened.equals(schema):
+            unified = pa.unify_schemas([schema, widened], promote_options='permissive')
+            if not unified.equals(schema):
+                schema = unified
+                pending = [t.cast(schema) for t in pending]
+        if not table.schema.equals(schema):
+            table = table.cast(schema)
+        pending.append(table)
+        pending_rows += table.num_rows
+
+        while pending_rows >= batch_rows:
+            combined = pa.concat_tables(pending)
+            yield combined.slice(0, batch_rows)
+            rest = combined.slice(batch_rows)
+            pending = [rest]
+            pending_rows = rest.num_rows
+
+    if pending_rows:
+        yield pa.concat_tables(pending)
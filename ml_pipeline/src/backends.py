@@ -0,0 +1,341 @@
+"""
+Pluggable warehouse backends for the dashboard and ML pipeline
+
+The dashboard and SnowflakeDataLoader only need a pool of DB-API
+connections that understand the gold-layer SQL. A backend provides that
+pool plus the few engine-specific hooks (table versions, bulk loads,
+description):
+
+- SnowflakeBackend: the production warehouse (SNOWFLAKE_* env vars)
+- DuckDBBackend: an offline stand-in holding a synthetic Olist-shaped
+  dataset in tables named like the gold models, at a configurable scale
+
+Select one with DATA_BACKEND=snowflake|duckdb (default snowflake); the
+DuckDB backend reads DUCKDB_SCALE (default 1), DUCKDB_SEED (default 42)
+DUCKDB_PATH (default ml_pipeline/data/synthetic/olist_sf<scale>_seed<seed>.duckdb,
+':memory:' for a throwaway in-memory database), DUCKDB_BRONZE_DIR (build
+from bronze parquet written by synthetic_olist instead of generating in-process)
+and DUCKDB_PREDICTIONS_PATH (writable database receiving bulk loads, default
+ml_pipeline/data/synthetic/predictions.duckdb).
+"""
+import os
+import threading
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from arrow_fetch import fetch_dataframe
+from connection_pool import ConnectionPool, get_pool, snowflake_connection_factory
+from query_builder import QueryBuilder, validate_identifier
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNTHETIC_DIR = Path(__file__).parent.parent / 'data' / 'synthetic'
+
+
+class Backend:
+    """Base class: a named source of pooled DB-API connections"""
+
+    #: Registry / pool name
+    name = 'backend'
+    #: Whether queries leave the process (worth caching results locally)
+    remote = True
+
+    def connection_factory(self) -> Callable:
+        """Zero-argument callable returning a new DB-API connection"""
+        raise NotImplementedError
+
+    def pool(self, **kwargs) -> ConnectionPool:
+        """
+        Get the process-wide connection pool for this backend
+
+        Args:
+            kwargs: Extra ConnectionPool arguments, used only on first creation
+
+        Returns:
+            Shared ConnectionPool instance
+        """
+        return get_pool(self.name, factory=self.connection_factory(), **kwargs)
+
+    def table_versions(self, pool: ConnectionPool, tables: Iterable[str]) -> Dict[str, str]:
+        """
+        Version (last rebuild time) of each table
+
+        Args:
+            pool: Pool returned by pool()
+            tables: Lower-case table names
+
+        Returns:
+            Table -> version string for the tables that exist
+        """
+        raise NotImplementedError
+
+    def load_parquet(self, table: str, directory: str, overwrite: bool = True) -> int:
+        """
+        Bulk-load a hive-partitioned parquet directory into a table
+
+        The table is created from the files' schema (partition keys become
+        columns) if it does not exist.
+
+        Args:
+            table: Target table name
+            directory: Parquet dataset root (key=value subdirectories)
+            overwrite: Replace the table's rows instead of appending
+
+        Returns:
+            Rows loaded
+        """
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        """Human-readable location, e.g. for connection banners"""
+        return self.name
+
+
+def _parquet_chunks(directory: str, chunk_rows: int) -> Iterator:
+    """pyarrow.Tables of about chunk_rows rows from a hive-partitioned directory"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    pending, rows = [], 0
+    for batch in ds.dataset(directory, format='parquet', partitioning='hive').to_batches():
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= chunk_rows:
+            yield pa.Table.from_batches(pending)
+            pending, rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending)
+
+
+class SnowflakeBackend(Backend):
+    """Production Snowflake warehouse configured from SNOWFLAKE_* env vars"""
+
+    name = 'snowflake'
+    remote = True
+
+    def __init__(self, **overrides):
+        """
+        Args:
+            overrides: Keyword arguments passed through to snowflake.connector.connect
+        """
+        self.overrides = overrides
+
+    def connection_factory(self) -> Callable:
+        return snowflake_connection_factory(**self.overrides)
+
+    def table_versions(self, pool: ConnectionPool, tables: Iterable[str]) -> Dict[str, str]:
+        # dbt rebuilds (or merges into) a table on every run, so LAST_ALTERED
+        # changes exactly when a dbt run touched that table
+        query = (
+            QueryBuilder('INFORMATION_SCHEMA.TABLES')
+            .select('TABLE_NAME', 'LAST_ALTERED')
+            .where('TABLE_SCHEMA = CURRENT_SCHEMA()')
+            .where_in('TABLE_NAME', [t.upper() for t in tables])
+            .build()
+        )
+        with pool.connection() as conn:
+            df = fetch_dataframe(conn, *query)
+        return {row.TABLE_NAME.lower(): str(row.LAST_ALTERED) for row in df.itertuples()}
+
+    def load_parquet(self, table: str, directory: str, overwrite: bool = True,
+                     chunk_rows: int = 1_000_000) -> int:
+        # write_pandas stages each chunk as parquet (PUT) and runs one COPY
+        # INTO per chunk, so the load never goes through INSERT statements
+        from snowflake.connector.pandas_tools import write_pandas
+
+        validate_identifier(table)
+        rows = 0
+        with self.pool().connection() as conn:
+            for i, chunk in enumerate(_parquet_chunks(directory, chunk_rows)):
+                success, _, nrows, _ = write_pandas(conn, chunk.to_pandas(), table.upper(),
+                                                    auto_create_table=True, overwrite=overwrite and i == 0,
+                                                    quote_identifiers=False)
+                if not success:
+                    raise RuntimeError(f"COPY INTO {table} failed after {rows:,} rows")
+                rows += nrows
+        return rows
+
+    def describe(self) -> str:
+        database = self.overrides.get('database', os.getenv('SNOWFLAKE_DATABASE'))
+        schema = self.overrides.get('schema', os.getenv('SNOWFLAKE_SCHEMA', 'gold'))
+        return f"Snowflake: {database}.{schema}"
+
+
+class DuckDBBackend(Backend):
+    """
+    Offline DuckDB database holding synthetic gold tables
+
+    The dataset is generated on first use (see synthetic_olist) and, for
+    file-backed databases, reused by later processes with the same scale
+    and seed. Each pooled connection is a cursor on one shared database
+    handle, so pooled connections can be used from different threads.
+    """
+
+    name = 'duckdb'
+    remote = False
+
+    def __init__(self,
+                 scale: float = 1.0,
+                 seed: int = 42,
+                 path: Optional[str] = None,
+                 rebuild: bool = False,
+                 bronze_dir: Optional[str] = None,
+                 predictions_path: Optional[str] = None):
+        """
+        Args:
+            scale: Dataset scale factor (1.0 = public Olist row counts)
+            seed: Seed for the synthetic generators
+            path: Database file, or ':memory:' (default: a file per scale/seed
+                under ml_pipeline/data/synthetic)
+            rebuild: Regenerate the dataset even if the file already holds it
+            bronze_dir: Bronze parquet directory written by synthetic_olist;
+                its metadata overrides scale and seed
+            predictions_path: Writable database that load_parquet writes to
+                (the synthetic dataset itself is opened read-only)
+        """
+        if bronze_dir is not None:
+            from synthetic_olist import read_bronze_metadata
+            metadata = read_bronze_metadata(bronze_dir)
+            scale, seed = metadata.get('scale', scale), metadata.get('seed', seed)
+        self.scale = float(scale)
+        self.seed = int(seed)
+        self.bronze_dir = bronze_dir
+        self.path = str(path or DEFAULT_SYNTHETIC_DIR / f"olist_sf{self.scale:g}_seed{self.seed}.duckdb")
+        self.rebuild = rebuild
+        self.predictions_path = str(predictions_path or DEFAULT_SYNTHETIC_DIR / 'predictions.duckdb')
+        self._db = None
+        self._lock = threading.Lock()
+
+    def database(self):
+        """Shared DuckDB handle, generating the dataset if needed"""
+        with self._lock:
+            if self._db is None:
+                self._db = self._open()
+            return self._db
+
+    def _open(self):
+        import duckdb
+        from synthetic_olist import build_gold_tables, dataset_info
+
+        wanted = {'scale': self.scale, 'seed': self.seed}
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            if Path(self.path).exists() and not self.rebuild:
+                # Read-only handles let several processes share one file
+                db = duckdb.connect(self.path, read_only=True)
+                info = dataset_info(db)
+                if {k: info.get(k) for k in wanted} == wanted:
+                    logger.info(f"Using synthetic dataset {self.path} (built {info['built_at']})")
+                    return db
+                db.close()
+
+        db = duckdb.connect(self.path)
+        build_gold_tables(db, scale=self.scale, seed=self.seed, bronze_dir=self.bronze_dir)
+        if self.path == ':memory:':
+            return db
+        db.close()
+        return duckdb.connect(self.path, read_only=True)
+
+    def connection_factory(self) -> Callable:
+        def connect():
+            return self.database().cursor()
+        return connect
+
+    def table_versions(self, pool: ConnectionPool, tables: Iterable[str]) -> Dict[str, str]:
+        query = (
+            QueryBuilder('_table_versions')
+            .select('table_name', 'last_altered')
+            .where_in('table_name', [t.lower() for t in tables])
+            .build()
+        )
+        with pool.connection() as conn:
+            df = fetch_dataframe(conn, *query)
+        return dict(zip(df['table_name'], df['last_altered'].astype(str)))
+
+    def load_parquet(self, table: str, directory: str, overwrite: bool = True) -> int:
+        import duckdb
+
+        validate_identifier(table)
+        source = "read_parquet('{}', hive_partitioning = true)".format(
+            os.path.join(directory, '**', '*.parquet').replace("'", "''"))
+        if self.predictions_path != ':memory:':
+            Path(self.predictions_path).parent.mkdir(parents=True, exist_ok=True)
+        with duckdb.connect(self.predictions_path) as db:
+            if overwrite:
+                db.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM {source}")
+                return db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            db.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT * FROM {source} LIMIT 0")
+            return db.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {source}").fetchone()[0]
+
+    def describe(self) -> str:
+        return f"DuckDB (synthetic Olist ×{self.scale:g}): {self.path}"
+
+
+BACKENDS = {
+    'snowflake': SnowflakeBackend,
+    'duckdb': DuckDBBackend,
+}
+
+_backends: Dict[str, Backend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: Optional[str] = None) -> Backend:
+    """
+    Get the process-wide backend
+
+    Args:
+        name: Backend name (defaults to the DATA_BACKEND env var, then 'snowflake')
+
+    Returns:
+        Shared Backend instance
+    """
+    name = (name or os.getenv('DATA_BACKEND') or 'snowflake').lower()
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+            if name == 'duckdb':
+                backend = DuckDBBackend(
+                    scale=float(os.getenv('DUCKDB_SCALE', 1)),
+                    seed=int(os.getenv('DUCKDB_SEED', 42)),
+                    path=os.getenv('DUCKDB_PATH') or None,
+                    bronze_dir=os.getenv('DUCKDB_BRONZE_DIR') or None,
+                    predictions_path=os.getenv('DUCKDB_PREDICTIONS_PATH') or None
+                )
+            else:
+                backend = BACKENDS[name]()
+            _backends[name] = backend
+        return backend
+
+
+def set_backend(backend: Backend) -> Backend:
+    """Register a backend instance under its name (e.g. a DuckDBBackend at another scale)"""
+    with _backends_lock:
+        _backends[backend.name] = backend
+    return backend
+
+
+if __name__ == "__main__":
+    # Pre-build a synthetic dataset so later runs start instantly
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Build the offline DuckDB stand-in dataset")
+    parser.add_argument('--scale', type=float, default=1.0, help='1 = Olist size; try 10 or 100')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--path', default=None)
+    parser.add_argument('--rebuild', action='store_true')
+    parser.add_argument('--bronze-dir', default=None, help='Build from synthetic_olist bronze parquet')
+    args = parser.parse_args()
+
+    backend = DuckDBBackend(scale=args.scale, seed=args.seed, path=args.path,
+                            rebuild=args.rebuild, bronze_dir=args.bronze_dir)
+    db = backend.database()
+    print(f"\n=== {backend.describe()} ===")
+    for table in ('gold_fact_order_summary', 'gold_obt_orders', 'gold_obt_orders_ml_export',
+                  'fs_customer_features', 'gold_agg_sales_daily'):
+        print(f"{table}: {db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:,} rows")
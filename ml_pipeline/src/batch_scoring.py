@@ -0,0 +1,343 @@
+"""
+Score the full ML export in parallel shards
+
+Splits gold_obt_orders_ml_export into partitions by order_year/order_month
+(or by a hash bucket of order_id for an even split), scores each partition
+on a process pool, and writes the predictions as hive-partitioned parquet:
+
+    <output-dir>/order_year=2018/order_month=3/part-0.parquet
+    <output-dir>/bucket=7/part-0.parquet            (--partition-by hash)
+
+Each worker opens its own warehouse connection, streams its partition in
+--batch-rows chunks (one row group each) and loads the model once through
+the process-wide ModelRegistry, so memory per worker is one chunk plus the
+model. Partitions are submitted largest first so the pool drains evenly;
+cores are split between workers as in train_grid. Rerunning replaces
+partitions in place (files are written to a temp name and renamed), and
+part files of partitions outside the new plan are deleted first.
+
+Optionally the parquet is bulk-loaded into a predictions table through the
+backend (write_pandas into Snowflake, CREATE TABLE ... AS read_parquet into
+the DuckDB stand-in's DUCKDB_PREDICTIONS_PATH). Per-partition throughput
+and run totals are written to <output-dir>/_metrics.json.
+
+With DATA_BACKEND=duckdb, use a file-backed database (the default): every
+worker opens the same file read-only.
+
+Usage:
+    python src/batch_scoring.py --output-dir predictions/delivery
+    python src/batch_scoring.py --partition-by hash --buckets 32 --workers 8
+    DATA_BACKEND=duckdb DUCKDB_SCALE=1 python src/batch_scoring.py --write-back ml_delivery_predictions
+"""
+import os
+import json
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from arrow_fetch import fetch_dataframe
+from query_builder import BoundQuery, QueryBuilder
+
+logger = logging.getLogger(__name__)
+
+SOURCE = 'gold_obt_orders_ml_export'
+PARTITION_BY = ('month', 'hash')
+ID_COLUMNS = ('order_id', 'ORDER_ID')
+DEFAULT_MODEL = '../models/IS_DELAYED_xgboost_model.pkl'
+
+
+def plan_partitions(conn, partition_by: str = 'month', buckets: int = 16) -> List[Tuple[dict, BoundQuery]]:
+    """
+    Partitions of the ML export and the query selecting each
+
+    Args:
+        conn: Warehouse connection
+        partition_by: 'month' (order_year/order_month) or 'hash' (order_id bucket)
+        buckets: Bucket count for 'hash'
+
+    Returns:
+        (partition keys, query) pairs, largest partition first for 'month'
+    """
+    if partition_by not in PARTITION_BY:
+        raise ValueError(f"Unknown partitioning '{partition_by}'. Choose from: {', '.join(PARTITION_BY)}")
+    if partition_by == 'hash':
+        # Buckets are near-equal in size, so no counting pass is needed
+        return [({'bucket': b}, QueryBuilder(SOURCE).where("MOD(ABS(HASH(order_id)), ?) = ?", buckets, b).build())
+                for b in range(buckets)]
+
+    query = (QueryBuilder(SOURCE)
+             .select('order_year', 'order_month', 'COUNT(*) AS n_rows')
+             .group_by('order_year', 'order_month')
+             .build())
+    counts = fetch_dataframe(conn, *query)
+    counts.columns = counts.columns.str.lower()
+    plan = []
+    for row in counts.sort_values('n_rows', ascending=False).itertuples():
+        builder = QueryBuilder(SOURCE)
+        keys = {}
+        for col in ('order_year', 'order_month'):
+            value = getattr(row, col)
+            if pd.isna(value):
+                builder.where(f"{col} IS NULL")
+                keys[col] = '__HIVE_DEFAULT_PARTITION__'
+            else:
+                builder.where_eq(col, int(value))
+                keys[col] = int(value)
+        plan.append((keys, builder.build()))
+    return plan
+
+
+def partition_dir(output_dir: str, keys: dict) -> str:
+    """Hive-style directory of one partition"""
+    return os.path.join(output_dir, *[f"{k}={v}" for k, v in keys.items()])
+
+
+def remove_stale_partitions(output_dir: str, plan: List[Tuple[dict, BoundQuery]]) -> int:
+    """
+    Delete part files of partitions that are not in the plan
+
+    A previous run with another --partition-by, more --buckets, or months
+    that have since left the export leaves part files the write-back would
+    load next to this run's. Only part-*.parquet files under hive-style
+    (key=value) directories are touched; emptied directories are removed.
+
+    Returns:
+        Number of part files removed
+    """
+    planned = {os.path.normpath(partition_dir(output_dir, keys)) for keys, _ in plan}
+    removed = 0
+    for directory, subdirs, files in os.walk(output_dir, topdown=False):
+        relative = os.path.relpath(directory, output_dir)
+        if relative == os.curdir or not all('=' in part for part in relative.split(os.sep)):
+            continue
+        if os.path.normpath(directory) not in planned:
+            for name in files:
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+        if not os.listdir(directory):
+            os.rmdir(directory)
+    return removed
+
+
+def score_partition(model_path: str, keys: dict, query: BoundQuery, output_dir: str,
+                    threshold: float = 0.5, batch_rows: int = 100_000,
+                    scored_at: Optional[datetime] = None) -> dict:
+    """
+    Stream one partition through the model and write its parquet file
+
+    Args:
+        model_path: Model .pkl or registry name
+        keys: Partition keys (directory names)
+        query: Query selecting the partition
+        output_dir: Dataset root
+        threshold: Probability at which prediction is 1
+        batch_rows: Rows fetched and scored per chunk
+        scored_at: Run timestamp stored with every row
+
+    Returns:
+        Metrics row: partition keys, status, rows, timings (seconds) and
+        the worker's peak RSS so far
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from arrow_fetch import arrow_to_pandas, iter_arrow_batches, rebatch
+    from load_training_data import SnowflakeDataLoader
+    from predict import PREDICTION_DTYPE, _scoring_features, get_registry
+    from train_grid import _peak_rss_mb
+
+    row = {**keys, 'pid': os.getpid(), 'rows': 0}
+    timings = {'fetch_s': 0.0, 'score_s': 0.0, 'write_s': 0.0}
+    started = time.perf_counter()
+    directory = partition_dir(output_dir, keys)
+    path = os.path.join(directory, 'part-0.parquet')
+    tmp_path = os.path.join(directory, f".part-0.parquet.{os.getpid()}.tmp")
+    writer = None
+    try:
+        predictor = get_registry().get(model_path)
+        os.makedirs(directory, exist_ok=True)
+        with SnowflakeDataLoader(use_cache=False) as loader:
+            chunks = rebatch(iter_arrow_batches(loader.conn, query.sql, params=query.params,
+                                                batch_rows=batch_rows), batch_rows)
+            while True:
+                t = time.perf_counter()
+                table = next(chunks, None)
+                if table is None:
+                    break
+                df = arrow_to_pandas(table)
+                timings['fetch_s'] += time.perf_counter() - t
+
+                t = time.perf_counter()
+                id_col = next((col for col in ID_COLUMNS if col in df.columns), None)
+                predictions = predictor.predict_with_confidence(_scoring_features(predictor, df), threshold)
+                timings['score_s'] += time.perf_counter() - t
+
+                t = time.perf_counter()
+                columns = {'order_id': df[id_col].to_numpy() if id_col else np.arange(len(df)) + row['rows']}
+                columns.update((name, predictions[name]) for name in PREDICTION_DTYPE.names)
+                result = pa.table(columns)
+                if scored_at is not None:
+                    result = result.append_column(
+                        'scored_at', pa.repeat(pa.scalar(scored_at, pa.timestamp('s', tz='UTC')), len(df)))
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, result.schema)
+                writer.write_table(result)
+                timings['write_s'] += time.perf_counter() - t
+                row['rows'] += len(df)
+
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.replace(tmp_path, path)
+        elif os.path.exists(path):
+            # The partition is empty now; drop the previous run's file
+            os.remove(path)
+        row['status'] = 'ok'
+    except Exception as e:
+        logger.exception(f"Partition {keys} failed")
+        row.update(status='failed', error=f"{type(e).__name__}: {e}")
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        timings['total_s'] = time.perf_counter() - started
+        row.update({k: round(v, 4) for k, v in timings.items()})
+        row['rows_per_sec'] = row['rows'] / timings['total_s'] if timings['total_s'] else 0.0
+        row['peak_rss_mb'] = _peak_rss_mb()
+    return row
+
+
+def run_batch_scoring(model_path: str = DEFAULT_MODEL,
+                      output_dir: str = 'predictions',
+                      partition_by: str = 'month',
+                      buckets: int = 16,
+                      workers: Optional[int] = None,
+                      cores: Optional[int] = None,
+                      threshold: float = 0.5,
+                      batch_rows: int = 100_000,
+                      write_back: Optional[str] = None,
+                      append: bool = False) -> pd.DataFrame:
+    """
+    Score every partition on a process pool
+
+    Args:
+        model_path: Model .pkl or registry name
+        output_dir: Parquet dataset root
+        partition_by: 'month' or 'hash' (see plan_partitions)
+        buckets: Bucket count for 'hash'
+        workers: Concurrent partitions (default: one per core)
+        cores: Cores to divide between workers (default: all)
+        threshold: Probability at which prediction is 1
+        batch_rows: Rows fetched and scored per chunk
+        write_back: Predictions table to bulk-load the output into (None = off)
+        append: Append to the write_back table instead of replacing its rows
+
+    Returns:
+        Per-partition metrics, in completion order
+    """
+    from backends import get_backend
+    from load_training_data import SnowflakeDataLoader
+    from predict import get_registry
+    from train_grid import _limit_threads, thread_budget
+
+    # Resolved once here so a missing model fails before any worker starts
+    model_path = get_registry().resolve(model_path)
+    started = time.perf_counter()
+    with SnowflakeDataLoader(use_cache=False) as loader:
+        plan = plan_partitions(loader.conn, partition_by, buckets)
+    if not plan:
+        logger.warning("No rows to score")
+        return pd.DataFrame()
+    workers, threads = thread_budget(len(plan), workers, cores)
+    os.makedirs(output_dir, exist_ok=True)
+    stale = remove_stale_partitions(output_dir, plan)
+    if stale:
+        logger.info(f"Removed {stale} part files of partitions outside this run's plan")
+    scored_at = datetime.now(timezone.utc).replace(microsecond=0)
+    logger.info(f"Scoring {len(plan)} partitions on {workers} workers x {threads} threads")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=_limit_threads, initargs=(threads,)) as pool:
+        futures = {
+            pool.submit(score_partition, model_path, keys, query, output_dir, threshold, batch_rows,
+                        scored_at): keys
+            for keys, query in plan
+        }
+        for future in as_completed(futures):
+            keys = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                row = {**keys, 'status': 'failed', 'rows': 0, 'error': f"{type(e).__name__}: {e}"}
+            rows.append(row)
+            logger.info(f"[{len(rows)}/{len(plan)}] {keys}: {row['status']}"
+                        + (f" {row['rows']:,} rows in {row['total_s']:.1f}s" if row['status'] == 'ok' else
+                           f" ({row.get('error')})"))
+
+    metrics = pd.DataFrame(rows)
+    scoring_s = time.perf_counter() - started
+    total_rows = int(metrics['rows'].sum())
+    failed = int((metrics['status'] != 'ok').sum())
+    run = {'model': model_path, 'partition_by': partition_by, 'partitions': len(plan), 'failed': failed,
+           'workers': workers, 'threads_per_worker': threads, 'rows': total_rows,
+           'scoring_s': round(scoring_s, 3), 'rows_per_sec': round(total_rows / scoring_s, 1),
+           'scored_at': scored_at.isoformat()}
+
+    if write_back:
+        if failed:
+            logger.warning(f"{failed} partitions failed; skipping write-back to {write_back}")
+        else:
+            t = time.perf_counter()
+            backend = get_backend()
+            loaded = backend.load_parquet(write_back, output_dir, overwrite=not append)
+            run.update(write_back=write_back, write_back_rows=int(loaded),
+                       write_back_s=round(time.perf_counter() - t, 3))
+            logger.info(f"Loaded {loaded:,} rows into {write_back} ({backend.name}) "
+                        f"in {run['write_back_s']:.1f}s")
+
+    run['wall_s'] = round(time.perf_counter() - started, 3)
+    path = os.path.join(output_dir, '_metrics.json')
+    with open(path, 'w') as f:
+        json.dump({'run': run, 'partitions': json.loads(metrics.to_json(orient='records'))}, f, indent=2)
+    logger.info(f"Scored {total_rows:,} rows in {scoring_s:.1f}s ({run['rows_per_sec']:,.0f} rows/s); "
+                f"metrics saved to {path}")
+    return metrics
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Score the full ML export in parallel partitions")
+    parser.add_argument('--model', default=DEFAULT_MODEL, help='Model .pkl or registry name')
+    parser.add_argument('--output-dir', default='predictions')
+    parser.add_argument('--partition-by', choices=PARTITION_BY, default='month')
+    parser.add_argument('--buckets', type=int, default=16, help="Hash buckets for --partition-by hash")
+    parser.add_argument('--workers', type=int, default=None, help='Concurrent partitions (default: one per core)')
+    parser.add_argument('--cores', type=int, default=None, help='Cores to divide between workers (default: all)')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--batch-rows', type=int, default=100_000)
+    parser.add_argument('--write-back', default=None, metavar='TABLE',
+                        help='Bulk-load the predictions into this table')
+    parser.add_argument('--append', action='store_true', help='Append to --write-back instead of replacing it')
+    args = parser.parse_args()
+
+    result = run_batch_scoring(args.model, args.output_dir, partition_by=args.partition_by, buckets=args.buckets,
+                               workers=args.workers, cores=args.cores, threshold=args.threshold,
+                               batch_rows=args.batch_rows, write_back=args.write_back, append=args.append)
+    if not result.empty:
+        keys = [c for c in ('order_year', 'order_month', 'bucket') if c in result.columns]
+        columns = keys + [c for c in ('status', 'rows', 'fetch_s', 'score_s', 'write_s', 'total_s', 'rows_per_sec')
+                          if c in result.columns]
+        print("\n=== Partitions ===")
+        print(result.sort_values(keys)[columns].to_string(index=False, float_format=lambda v: f"{v:.2f}"))
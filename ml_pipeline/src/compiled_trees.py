@@ -0,0 +1,337 @@
+"""
+Tree ensembles flattened into NumPy arrays for low-overhead scoring
+
+The sklearn wrappers add a fixed cost to every predict_proba call (input
+validation, DMatrix/Dataset construction, thread pool start-up) that
+dominates checkout-time scoring of a handful of rows. compile_model()
+converts a fitted XGBoost, LightGBM, CatBoost or random forest classifier
+into a CompiledTrees: every tree's nodes in a few flat arrays, laid out so
+the two children of a node are adjacent and leaves point back to
+themselves. Scoring is then depth-many vectorized gathers over a
+(rows, trees) index matrix, with no per-call setup.
+
+MLTrainer.save_model writes it next to the model as <name>_compiled.pkl
+(plain arrays, so ModelRegistry can memory-map it) and ModelPredictor
+scores small batches with it. The native libraries stay faster for large
+batches, where their multi-threaded C++ traversal wins; see
+benchmarks/bench_compiled_trees.py.
+"""
+import json
+import logging
+import os
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Rows scored per chunk: keeps the (rows, trees) index matrices cache-sized
+CHUNK_ROWS = 1024
+
+# How a node treats NaN (and, for LightGBM zero_as_missing, zero)
+MISSING_DEFAULT, MISSING_AS_ZERO, MISSING_ZERO_OR_NAN = 0, 1, 2
+_ZERO_THRESHOLD = 1e-35
+
+
+def compiled_path(model_path: str) -> str:
+    """Location of the compiled trees saved next to a model .pkl"""
+    return model_path.replace('.pkl', '_compiled.pkl')
+
+
+class _Tree:
+    """One tree in canonical form: node lists indexed locally from the root (0)"""
+
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.default_left, self.missing, self.value = [], [], []
+
+    def add(self, feature=-1, threshold=np.nan, default_left=False, missing=MISSING_DEFAULT, value=0.0) -> int:
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.default_left.append(default_left)
+        self.missing.append(missing)
+        self.value.append(value)
+        return len(self.feature) - 1
+
+
+class CompiledTrees:
+    """
+    A binary classifier's trees as flat arrays
+
+    Internal node i sends a row to child[i] (left) or child[i] + 1 (right);
+    a leaf has a NaN threshold, which always compares false, and
+    child = itself - 1, so traversal can run a fixed number of levels.
+
+    Attributes:
+        feature, threshold, child, default_left, missing, value: Per-node arrays
+        roots: First node of every tree
+        depth: Levels to traverse (deepest tree)
+        strict: Go left when x < threshold (XGBoost) instead of x <= threshold
+        link: 'sigmoid' (sum of leaf margins + base_margin) or 'mean' (averaged leaf probabilities)
+        base_margin: Margin added before the sigmoid
+        classes: Class labels, negative class first
+    """
+
+    def __init__(self, trees: List[_Tree], strict: bool, link: str, base_margin: float = 0.0,
+                 classes=(0, 1), n_features: Optional[int] = None, source: str = ''):
+        if link not in ('sigmoid', 'mean'):
+            raise ValueError(f"Unknown link '{link}'")
+        self.format_version = FORMAT_VERSION
+        self.strict = strict
+        self.link = link
+        self.base_margin = float(base_margin)
+        self.classes = np.asarray(classes)
+        self.source = source
+        self._flatten(trees)
+        self.n_features = int(n_features if n_features is not None else self.feature.max() + 1)
+
+    def _flatten(self, trees: List[_Tree]):
+        feature, threshold, child, default_left, missing, value, roots = [], [], [], [], [], [], []
+        depth = 0
+        for tree in trees:
+            base = len(feature)
+            roots.append(base)
+            # Breadth-first, giving each internal node's children adjacent slots
+            position = {0: base}
+            order, levels = [0], {0: 0}
+            next_slot = base + 1
+            for node in order:
+                if tree.left[node] >= 0:
+                    for offset, kid in enumerate((tree.left[node], tree.right[node])):
+                        position[kid] = next_slot + offset
+                        levels[kid] = levels[node] + 1
+                        order.append(kid)
+                    next_slot += 2
+            depth = max(depth, max(levels.values()))
+            for node in sorted(order, key=position.get):
+                internal = tree.left[node] >= 0
+                feature.append(tree.feature[node] if internal else 0)
+                threshold.append(tree.threshold[node] if internal else np.nan)
+                child.append(position[tree.left[node]] if internal else position[node] - 1)
+                default_left.append(bool(tree.default_left[node]) if internal else False)
+                missing.append(tree.missing[node] if internal else MISSING_DEFAULT)
+                value.append(0.0 if internal else tree.value[node])
+
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.child = np.asarray(child, dtype=np.int64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing = np.asarray(missing, dtype=np.int8)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.depth = int(depth)
+        self._zero_missing = bool((self.missing == MISSING_ZERO_OR_NAN).any())
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _go_left(self, x: np.ndarray, threshold: np.ndarray) -> np.ndarray:
+        return np.less(x, threshold) if self.strict else np.less_equal(x, threshold)
+
+    def _leaves(self, X: np.ndarray) -> np.ndarray:
+        """(rows, trees) leaf node index for a C-ordered chunk"""
+        n_rows = len(X)
+        flat = X.ravel()
+        row_base = (np.arange(n_rows, dtype=np.int64) * X.shape[1])[:, None]
+        idx = np.repeat(self.roots[None, :], n_rows, axis=0)
+        check_missing = self._zero_missing or np.isnan(flat).any()
+        for _ in range(self.depth):
+            x = flat[row_base + self.feature[idx]]
+            threshold = self.threshold[idx]
+            go_left = self._go_left(x, threshold)
+            if check_missing:
+                nan = np.isnan(x)
+                mode = self.missing[idx]
+                as_zero = nan & (mode == MISSING_AS_ZERO)
+                is_missing = (nan & ~as_zero) | ((mode == MISSING_ZERO_OR_NAN) & (np.abs(x) <= _ZERO_THRESHOLD))
+                go_left = np.where(as_zero, self._go_left(np.zeros_like(x), threshold), go_left)
+                # Leaves (NaN threshold) never take the default branch
+                go_left = np.where(is_missing & ~np.isnan(threshold), self.default_left[idx], go_left)
+            idx = self.child[idx] + ~go_left
+        return idx
+
+    def predict_proba(self, X, chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+        """(rows, 2) class probabilities, as the source model's predict_proba"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected (rows, {self.n_features}) features, got {X.shape}")
+        positive = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), chunk_rows):
+            leaf_values = self.value[self._leaves(X[start:start + chunk_rows])]
+            if self.link == 'mean':
+                positive[start:start + chunk_rows] = leaf_values.mean(axis=1)
+            else:
+                margin = leaf_values.sum(axis=1) + self.base_margin
+                positive[start:start + chunk_rows] = 1.0 / (1.0 + np.exp(-margin))
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X, chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+        """Class labels (positive when its probability exceeds 0.5)"""
+        return self.classes[(self.predict_proba(X, chunk_rows)[:, 1] > 0.5).astype(np.int64)]
+
+
+def _binary_classes(model) -> np.ndarray:
+    classes = np.asarray(getattr(model, 'classes_', [0, 1]))
+    if len(classes) != 2:
+        raise NotImplementedError(f"Only binary classifiers can be compiled, got {len(classes)} classes")
+    return classes
+
+
+def from_xgboost(model) -> CompiledTrees:
+    """XGBClassifier (gbtree, binary:logistic)"""
+    learner = json.loads(model.get_booster().save_raw(raw_format='json'))['learner']
+    if learner['gradient_booster']['name'] != 'gbtree':
+        raise NotImplementedError(f"XGBoost booster '{learner['gradient_booster']['name']}' cannot be compiled")
+    if learner['objective']['name'] != 'binary:logistic':
+        raise NotImplementedError(f"XGBoost objective '{learner['objective']['name']}' cannot be compiled")
+    base_score = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+
+    trees = []
+    for spec in learner['gradient_booster']['model']['trees']:
+        if any(spec.get('split_type', [])):
+            raise NotImplementedError("Categorical XGBoost splits cannot be compiled")
+        tree = _Tree()
+        for node, (left, right) in enumerate(zip(spec['left_children'], spec['right_children'])):
+            leaf = left == -1
+            tree.add(feature=-1 if leaf else spec['split_indices'][node],
+                     threshold=np.nan if leaf else np.float32(spec['split_conditions'][node]),
+                     default_left=bool(spec['default_left'][node]),
+                     value=spec['split_conditions'][node] if leaf else 0.0)
+            tree.left[node], tree.right[node] = left, right
+        trees.append(tree)
+    return CompiledTrees(trees, strict=True, link='sigmoid', base_margin=np.log(base_score / (1 - base_score)),
+                         classes=_binary_classes(model), n_features=int(learner['learner_model_param']['num_feature']),
+                         source='xgboost')
+
+
+_LIGHTGBM_MISSING = {'None': MISSING_AS_ZERO, 'Zero': MISSING_ZERO_OR_NAN, 'NaN': MISSING_DEFAULT}
+
+
+def from_lightgbm(model) -> CompiledTrees:
+    """LGBMClassifier (binary objective, numerical splits)"""
+    dump = model.booster_.dump_model()
+    objective = dump.get('objective', '')
+    if not objective.startswith('binary'):
+        raise NotImplementedError(f"LightGBM objective '{objective}' cannot be compiled")
+    sigmoid = float(objective.split('sigmoid:')[1].split()[0]) if 'sigmoid:' in objective else 1.0
+
+    def add(tree: _Tree, node: dict) -> int:
+        if 'leaf_value' in node or 'split_feature' not in node:
+            return tree.add(value=sigmoid * node.get('leaf_value', 0.0))
+        if node['decision_type'] != '<=':
+            raise NotImplementedError("Categorical LightGBM splits cannot be compiled")
+        i = tree.add(feature=node['split_feature'], threshold=node['threshold'],
+                     default_left=node['default_left'], missing=_LIGHTGBM_MISSING[node['missing_type']])
+        tree.left[i] = add(tree, node['left_child'])
+        tree.right[i] = add(tree, node['right_child'])
+        return i
+
+    trees = []
+    for info in dump['tree_info']:
+        tree = _Tree()
+        add(tree, info['tree_structure'])
+        trees.append(tree)
+    return CompiledTrees(trees, strict=False, link='sigmoid', classes=_binary_classes(model),
+                         n_features=dump['max_feature_idx'] + 1, source='lightgbm')
+
+
+def from_catboost(model) -> CompiledTrees:
+    """CatBoostClassifier (symmetric trees on float features)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.json')
+        model.save_model(path, format='json')
+        with open(path) as f:
+            spec = json.load(f)
+    if spec.get('features_info', {}).get('categorical_features'):
+        raise NotImplementedError("CatBoost models with categorical features cannot be compiled")
+    scale, bias = 1.0, 0.0
+    if 'scale_and_bias' in spec:
+        scale, bias = spec['scale_and_bias']
+        bias = bias[0] if isinstance(bias, list) else bias
+
+    trees = []
+    for oblivious in spec['oblivious_trees']:
+        splits = oblivious['splits']
+        if any(s.get('split_type', 'FloatFeature') != 'FloatFeature' for s in splits):
+            raise NotImplementedError("Only float-feature CatBoost splits can be compiled")
+        # Leaf index bit d is (x > border of splits[d]); the root tests the
+        # most significant bit. NaN counts as the minimum (goes left).
+        tree = _Tree()
+        frontier = [tree.add()]
+        for level in range(len(splits) - 1, -1, -1):
+            split = splits[level]
+            next_frontier = []
+            for node in frontier:
+                tree.feature[node] = split['float_feature_index']
+                tree.threshold[node] = split['border']
+                tree.default_left[node] = True
+                tree.left[node], tree.right[node] = tree.add(), tree.add()
+                next_frontier += [tree.left[node], tree.right[node]]
+            frontier = next_frontier
+        for leaf_index, node in enumerate(frontier):
+            tree.value[node] = scale * oblivious['leaf_values'][leaf_index]
+        trees.append(tree)
+    n_features = len(spec.get('features_info', {}).get('float_features', [])) or None
+    return CompiledTrees(trees, strict=False, link='sigmoid', base_margin=bias,
+                         classes=_binary_classes(model), n_features=n_features, source='catboost')
+
+
+def from_random_forest(model) -> CompiledTrees:
+    """RandomForestClassifier (probabilities averaged over trees)"""
+    classes = _binary_classes(model)
+    trees = []
+    for estimator in model.estimators_:
+        spec = estimator.tree_
+        go_left = getattr(spec, 'missing_go_to_left', np.zeros(spec.node_count, dtype=bool))
+        counts = spec.value[:, 0, :]
+        positive = counts[:, 1] / np.maximum(counts.sum(axis=1), np.finfo(float).tiny)
+        tree = _Tree()
+        for node in range(spec.node_count):
+            leaf = spec.children_left[node] == -1
+            tree.add(feature=-1 if leaf else int(spec.feature[node]),
+                     threshold=np.nan if leaf else float(spec.threshold[node]),
+                     default_left=bool(go_left[node]), value=float(positive[node]) if leaf else 0.0)
+            tree.left[node], tree.right[node] = int(spec.children_left[node]), int(spec.children_right[node])
+        trees.append(tree)
+    return CompiledTrees(trees, strict=False, link='mean', classes=classes, n_features=model.n_features_in_,
+                         source='random_forest')
+
+
+def compile_model(model) -> CompiledTrees:
+    """
+    Compile a fitted tree classifier
+
+    Raises:
+        NotImplementedError: For model types, objectives or split kinds the
+            evaluator does not reproduce exactly
+    """
+    name = type(model).__name__
+    if name == 'XGBClassifier':
+        return from_xgboost(model)
+    if name == 'LGBMClassifier':
+        return from_lightgbm(model)
+    if name == 'CatBoostClassifier':
+        return from_catboost(model)
+    if name == 'RandomForestClassifier':
+        return from_random_forest(model)
+    raise NotImplementedError(f"No compiler for {name}")
+
+
+def load_compiled(model_path: str, mmap_mode: Optional[str] = None) -> Optional[CompiledTrees]:
+    """Compiled trees saved alongside a model, or None"""
+    import joblib
+
+    path = compiled_path(model_path)
+    if not os.path.exists(path):
+        return None
+    compiled = joblib.load(path, mmap_mode=mmap_mode)
+    if getattr(compiled, 'format_version', None) != FORMAT_VERSION:
+        logger.warning(f"Ignoring {path}: unsupported compiled format")
+        return None
+    logger.info(f"Compiled trees loaded from {path} ({compiled.n_trees} trees, depth {compiled.depth})")
+    return compiled
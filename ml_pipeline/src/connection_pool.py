@@ -0,0 +1,471 @@
+"""
+Bounded, thread-safe connection pool shared by the dashboard and ML pipeline
+"""
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(TimeoutError):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class PoolClosed(RuntimeError):
+    """Raised when checking out from a pool that has been closed"""
+
+
+class _PooledConnection:
+    """Bookkeeping wrapper for a raw DB-API connection held by the pool"""
+
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections with health checks and recycling"""
+
+    def __init__(self,
+                 factory: Callable,
+                 max_size: int = 4,
+                 min_size: int = 0,
+                 timeout: float = 30.0,
+                 max_idle_seconds: Optional[float] = 600.0,
+                 max_lifetime_seconds: Optional[float] = 3600.0,
+                 health_check_after: Optional[float] = 60.0,
+                 health_check_query: str = 'SELECT 1',
+                 name: str = 'pool'):
+        """
+        Initialize connection pool
+
+        Args:
+            factory: Zero-argument callable returning a new DB-API connection
+            max_size: Maximum number of open connections (idle + in use)
+            min_size: Connections opened eagerly and kept through idle eviction
+            timeout: Default seconds to wait for a free connection on checkout
+            max_idle_seconds: Close idle connections unused for this long (None = never)
+            max_lifetime_seconds: Recycle connections older than this (None = never)
+            health_check_after: Ping idle connections unused for this long before
+                handing them out (None = never, 0 = always)
+            health_check_query: Query used to ping a connection
+            name: Pool name used in logs and metrics
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if not 0 <= min_size <= max_size:
+            raise ValueError("min_size must be between 0 and max_size")
+
+        self.name = name
+        self.factory = factory
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.max_idle_seconds = max_idle_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+        self.health_check_after = health_check_after
+        self.health_check_query = health_check_query
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'failed_health_checks': 0,
+            'recycled': 0,
+            'evicted_idle': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append(self._open())
+
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+    def checkout(self, timeout: Optional[float] = None):
+        """
+        Borrow a connection from the pool
+
+        Args:
+            timeout: Seconds to wait for a free connection (defaults to pool timeout)
+
+        Returns:
+            Raw DB-API connection; must be returned with checkin()
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosed(f"Connection pool '{self.name}' is closed")
+                    self._evict_idle_locked()
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"Timed out after {timeout:.1f}s waiting for a connection "
+                            f"from pool '{self.name}' ({self.max_size} in use)"
+                        )
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    entry = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(entry):
+                self._discard(entry)
+                continue
+
+            entry.last_used = time.monotonic()
+            waited = entry.last_used - started
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += waited
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            return entry.conn
+
+    def checkin(self, conn, discard: bool = False):
+        """
+        Return a connection to the pool
+
+        Args:
+            conn: Connection previously obtained from checkout()
+            discard: Close the connection instead of reusing it (e.g. after an error)
+        """
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError(f"Connection was not checked out from pool '{self.name}'")
+
+        entry.last_used = time.monotonic()
+        if discard or self._closed:
+            self._discard(entry)
+            return
+        if self._expired(entry, entry.last_used):
+            self._discard(entry, reason='recycled')
+            return
+
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Context manager that checks a connection out and back in
+
+        Connections that raised a driver-level error are discarded rather
+        than returned to the pool.
+        """
+        conn = self.checkout(timeout)
+        discard = False
+        try:
+            yield conn
+        except Exception as e:
+            discard = _is_connection_error(e)
+            raise
+        finally:
+            self.checkin(conn, discard=discard)
+
+    # ------------------------------------------------------------------
+    # Metrics & lifecycle
+    # ------------------------------------------------------------------
+    def metrics(self) -> dict:
+        """Get a snapshot of pool metrics"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'name': self.name,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+            })
+        stats['wait_time_avg'] = (
+            stats['wait_time_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        )
+        return stats
+
+    def close(self):
+        """Close idle connections and stop handing out new ones"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+        logger.info(f"Connection pool '{self.name}' closed")
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _open(self) -> _PooledConnection:
+        entry = _PooledConnection(self.factory())
+        with self._cond:
+            self._stats['created'] += 1
+        logger.debug(f"Pool '{self.name}' opened connection ({self._size}/{self.max_size})")
+        return entry
+
+    def _discard(self, entry: _PooledConnection, reason: Optional[str] = None):
+        try:
+            entry.conn.close()
+        except Exception as e:
+            logger.debug(f"Pool '{self.name}' error closing connection: {e}")
+        with self._cond:
+            self._stats['closed'] += 1
+            if reason:
+                self._stats[reason] += 1
+            self._size -= 1
+            self._cond.notify()
+
+    def _expired(self, entry: _PooledConnection, now: float) -> bool:
+        return (self.max_lifetime_seconds is not None
+                and now - entry.created_at >= self.max_lifetime_seconds)
+
+    def _evict_idle_locked(self):
+        """Drop idle connections past their idle timeout or lifetime (lock held)"""
+        if not self._idle:
+            return
+        now = time.monotonic()
+        keep = deque()
+        stale = []
+        while self._idle:
+            entry = self._idle.popleft()
+            idle_too_long = (self.max_idle_seconds is not None
+                             and now - entry.last_used >= self.max_idle_seconds
+                             and len(keep) + len(self._in_use) >= self.min_size)
+            if idle_too_long or self._expired(entry, now):
+                stale.append(entry)
+                self._stats['evicted_idle' if idle_too_long else 'recycled'] += 1
+            else:
+                keep.append(entry)
+        self._idle = keep
+        for entry in stale:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+            self._stats['closed'] += 1
+            self._size -= 1
+
+    def _is_healthy(self, entry: _PooledConnection) -> bool:
+        if self.health_check_after is None:
+            return True
+        if time.monotonic() - entry.last_used < self.health_check_after:
+            return True
+        try:
+            cursor = entry.conn.cursor()
+            try:
+                cursor.execute(self.health_check_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Pool '{self.name}' health check failed, reconnecting: {e}")
+            with self._cond:
+                self._stats['failed_health_checks'] += 1
+            return False
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Whether an error means the connection itself is unusable"""
+    if isinstance(error, (ConnectionError, OSError)):
+        return True
+    # DB-API drivers (sqlite3, snowflake.connector) each define their own classes
+    return any(cls.__name__ in ('OperationalError', 'InterfaceError')
+               for cls in type(error).__mro__)
+
+
+# ----------------------------------------------------------------------
+# Connection factories
+# ----------------------------------------------------------------------
+def snowflake_connection_factory(**overrides) -> Callable:
+    """
+    Build a factory that opens Snowflake connections from SNOWFLAKE_* env vars
+
+    Args:
+        overrides: Keyword arguments passed through to snowflake.connector.connect
+
+    Returns:
+        Zero-argument callable returning a new connection
+    """
+    def connect():
+        import snowflake.connector
+
+        # Server-side qmark binding keeps query text identical across filter
+        # values, so Snowflake's result cache can serve repeated queries
+        snowflake.connector.paramstyle = 'qmark'
+
+        params = {
+            'user': os.getenv('SNOWFLAKE_USER'),
+            'password': os.getenv('SNOWFLAKE_PASSWORD'),
+            'account': os.getenv('SNOWFLAKE_ACCOUNT'),
+            'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE'),
+            'database': os.getenv('SNOWFLAKE_DATABASE'),
+            'schema': os.getenv('SNOWFLAKE_SCHEMA', 'gold'),
+            'role': os.getenv('SNOWFLAKE_ROLE'),
+            'client_session_keep_alive': True,
+        }
+        params.update(overrides)
+        return snowflake.connector.connect(**params)
+
+    return connect
+
+
+def local_connection_factory(database: str = 'olist_local',
+                             connect_latency: float = 0.0) -> Callable:
+    """
+    Build a factory for an offline DB-API stand-in backed by in-memory SQLite
+
+    All connections from the same factory share one in-memory database, so
+    tables created on one connection are visible to the others.
+
+    Args:
+        database: Name of the shared in-memory database
+        connect_latency: Seconds to sleep per connect, simulating the login handshake
+
+    Returns:
+        Zero-argument callable returning a new sqlite3 connection
+    """
+    uri = f"file:{database}?mode=memory&cache=shared"
+    # Keep one connection open so the shared in-memory database outlives
+    # pool recycling of individual connections
+    anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def connect():
+        if connect_latency:
+            time.sleep(connect_latency)
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    connect.anchor = anchor
+    return connect
+
+
+# ----------------------------------------------------------------------
+# Process-wide pool registry
+# ----------------------------------------------------------------------
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str = 'snowflake', factory: Optional[Callable] = None, **kwargs) -> ConnectionPool:
+    """
+    Get (or lazily create) a named process-wide connection pool
+
+    Pool sizing defaults can be tuned with SNOWFLAKE_POOL_MAX_SIZE,
+    SNOWFLAKE_POOL_TIMEOUT, SNOWFLAKE_POOL_MAX_IDLE and SNOWFLAKE_POOL_MAX_LIFETIME.
+
+    Args:
+        name: Pool name
+        factory: Connection factory (defaults to snowflake_connection_factory())
+        kwargs: Extra ConnectionPool arguments, used only on first creation
+
+    Returns:
+        Shared ConnectionPool instance
+    """
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None or pool.closed:
+            config = {
+                'max_size': int(os.getenv('SNOWFLAKE_POOL_MAX_SIZE', 4)),
+                'timeout': float(os.getenv('SNOWFLAKE_POOL_TIMEOUT', 30)),
+                'max_idle_seconds': float(os.getenv('SNOWFLAKE_POOL_MAX_IDLE', 600)),
+                'max_lifetime_seconds': float(os.getenv('SNOWFLAKE_POOL_MAX_LIFETIME', 3600)),
+            }
+            config.update(kwargs)
+            pool = ConnectionPool(factory or snowflake_connection_factory(), name=name, **config)
+            _pools[name] = pool
+            logger.info(f"Created connection pool '{name}' (max_size={pool.max_size})")
+        return pool
+
+
+def close_all_pools():
+    """Close every registered pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+if __name__ == "__main__":
+    # Offline load test against the local SQLite stand-in
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Load-test the connection pool offline")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--connect-latency', type=float, default=0.2)
+    parser.add_argument('--query-latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    pool = ConnectionPool(
+        local_connection_factory(connect_latency=args.connect_latency),
+        max_size=args.pool_size,
+        name='load_test'
+    )
+
+    def run_query(_):
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+            cursor.close()
+            time.sleep(args.query_latency)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(run_query, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    print("\n=== Pool Load Test ===")
+    print(f"{args.requests} queries / {args.workers} workers in {elapsed:.2f}s "
+          f"({args.requests / elapsed:,.0f} queries/sec)")
+    for key, val in pool.metrics().items():
+        print(f"{key}: {val}")
+    pool.close()
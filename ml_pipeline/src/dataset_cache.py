@@ -0,0 +1,254 @@
+"""
+Content-addressed local parquet cache for Snowflake training pulls
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / 'data' / 'cache'
+METADATA_FILE = '_metadata.json'
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_LINE_COMMENT = re.compile(r"--[^\n]*")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonicalize SQL text so formatting differences map to the same cache key
+
+    Comments are stripped, whitespace is collapsed and everything outside
+    string literals is lower-cased.
+    """
+    parts = _STRING_LITERAL.split(query)
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            part = _LINE_COMMENT.sub(' ', part)
+            normalized.append(re.sub(r'\s+', ' ', part).lower())
+    return ''.join(normalized).strip().rstrip(';').strip()
+
+
+def cache_key(query: str, source_version: str, params=None) -> str:
+    """Hash of normalized query text, bind parameters and source table version"""
+    payload = json.dumps(
+        {'query': normalize_query(query), 'params': params, 'version': str(source_version)},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CacheWriter:
+    """Write one cache entry as a series of parquet parts, committed atomically"""
+
+    def __init__(self, cache: 'DatasetCache', key: str, metadata: dict):
+        self.cache = cache
+        self.key = key
+        self.metadata = metadata
+        self.tmp_dir = cache.root / f".tmp-{key}-{uuid.uuid4().hex[:8]}"
+        self.tmp_dir.mkdir(parents=True)
+        self.parts = 0
+        self.rows = 0
+        self.columns = None
+        self.done = False
+
+    def write(self, data):
+        """Append a DataFrame or pyarrow.Table as the next part file"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+        pq.write_table(table, self.tmp_dir / f"part-{self.parts:05d}.parquet")
+        if self.columns is None:
+            self.columns = table.column_names
+        self.parts += 1
+        self.rows += table.num_rows
+
+    def commit(self):
+        """Publish the entry and enforce the cache size limit"""
+        if self.done:
+            return
+        size = sum(f.stat().st_size for f in self.tmp_dir.iterdir())
+        self.metadata.update({
+            'key': self.key,
+            'rows': self.rows,
+            'parts': self.parts,
+            'columns': self.columns or [],
+            'bytes': size,
+            'created_at': time.time(),
+        })
+        with open(self.tmp_dir / METADATA_FILE, 'w') as f:
+            json.dump(self.metadata, f, indent=2, default=str)
+
+        final_dir = self.cache._entry_dir(self.key)
+        final_dir.parent.mkdir(parents=True, exist_ok=True)
+        if final_dir.exists():
+            shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(self.tmp_dir, final_dir)
+        self.done = True
+        logger.info(f"Cached {self.rows:,} rows ({size / 1024 ** 2:.1f} MB) as {self.key[:12]}")
+        self.cache.evict()
+
+    def abort(self):
+        """Discard a partially written entry"""
+        if not self.done:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            self.done = True
+
+
+class DatasetCache:
+    """On-disk LRU cache of query results stored as partitioned parquet"""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Initialize dataset cache
+
+        Args:
+            root: Cache directory (defaults to ML_DATASET_CACHE_DIR or ml_pipeline/data/cache)
+            max_bytes: Size limit before least-recently-used entries are evicted
+                (defaults to ML_DATASET_CACHE_MAX_GB, 5 GB)
+        """
+        self.root = Path(root or os.getenv('ML_DATASET_CACHE_DIR', DEFAULT_CACHE_DIR))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('ML_DATASET_CACHE_MAX_GB', 5)) * 1024 ** 3)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _parts(self, key: str) -> list:
+        return sorted(self._entry_dir(key).glob('part-*.parquet'))
+
+    def contains(self, key: str) -> bool:
+        return (self._entry_dir(key) / METADATA_FILE).exists()
+
+    def metadata(self, key: str) -> Optional[dict]:
+        path = self._entry_dir(key) / METADATA_FILE
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _touch(self, key: str):
+        # Last access time for LRU eviction is the metadata file mtime
+        try:
+            os.utime(self._entry_dir(key) / METADATA_FILE)
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Load a cached result
+
+        Returns:
+            DataFrame, or None on a cache miss
+        """
+        if not self.contains(key):
+            return None
+        import pyarrow.parquet as pq
+        import pyarrow as pa
+
+        tables = [pq.read_table(part) for part in self._parts(key)]
+        self._touch(key)
+        if not tables:
+            return pd.DataFrame(columns=self.metadata(key).get('columns', []))
+        return pa.concat_tables(tables).to_pandas(split_blocks=True, self_destruct=True)
+
+    def iter_tables(self, key: str) -> Iterator:
+        """Yield a cached result part by part as pyarrow tables"""
+        import pyarrow.parquet as pq
+
+        self._touch(key)
+        for part in self._parts(key):
+            yield pq.read_table(part)
+
+    def open_writer(self, key: str, **metadata) -> CacheWriter:
+        """Start writing a new entry; call commit() when complete or abort() on failure"""
+        return CacheWriter(self, key, metadata)
+
+    def put(self, key: str, df: pd.DataFrame, part_rows: int = 1_000_000, **metadata) -> None:
+        """Store a DataFrame, split into parquet parts of part_rows rows"""
+        writer = self.open_writer(key, **metadata)
+        try:
+            for start in range(0, max(len(df), 1), part_rows):
+                writer.write(df.iloc[start:start + part_rows])
+            writer.commit()
+        finally:
+            writer.abort()
+
+    def entries(self) -> list:
+        """Metadata for every entry, most recently used first"""
+        entries = []
+        for meta_path in self.root.glob(f'*/*/{METADATA_FILE}'):
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            meta['last_access'] = meta_path.stat().st_mtime
+            entries.append(meta)
+        return sorted(entries, key=lambda m: m['last_access'], reverse=True)
+
+    def total_bytes(self) -> int:
+        return sum(entry.get('bytes', 0) for entry in self.entries())
+
+    def remove(self, key: str):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def evict(self) -> int:
+        """
+        Remove least-recently-used entries until the cache fits in max_bytes
+
+        Returns:
+            Number of entries removed
+        """
+        entries = self.entries()
+        total = sum(entry.get('bytes', 0) for entry in entries)
+        removed = 0
+        while entries and total > self.max_bytes:
+            oldest = entries.pop()
+            self.remove(oldest['key'])
+            total -= oldest.get('bytes', 0)
+            removed += 1
+            logger.info(f"Evicted cached dataset {oldest['key'][:12]} ({oldest.get('bytes', 0) / 1024 ** 2:.1f} MB)")
+        return removed
+
+    def clear(self):
+        """Remove every entry"""
+        for entry in self.entries():
+            self.remove(entry['key'])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the local dataset cache")
+    parser.add_argument('--clear', action='store_true', help="Remove every cached dataset")
+    args = parser.parse_args()
+
+    cache = DatasetCache()
+    if args.clear:
+        cache.clear()
+        print(f"✅ Cleared {cache.root}")
+    else:
+        print(f"\n=== Dataset Cache: {cache.root} ===")
+        for entry in cache.entries():
+            print(f"{entry['key'][:12]}  {entry['rows']:>10,} rows  {entry['bytes'] / 1024 ** 2:>8.1f} MB  "
+                  f"version={entry.get('source_version')}")
+        print(f"Total: {cache.total_bytes() / 1024 ** 2:.1f} MB / {cache.max_bytes / 1024 ** 2:.0f} MB")
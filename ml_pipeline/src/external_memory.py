@@ -0,0 +1,188 @@
+"""
+Out-of-core training data: parquet row groups streamed into XGBoost / LightGBM
+
+For training sets that do not fit in memory (e.g. the full order history
+written by build_ml_dataset_streaming), the feature matrix is never
+materialized. Parquet row groups are read and transformed one at a time:
+
+- XGBoost: a DataIter feeds row groups to ExtMemQuantileDMatrix, which
+  keeps its quantized pages in an on-disk cache
+- LightGBM: one lightgbm.Sequence per row group; Dataset construction
+  samples rows for the bin boundaries, then pushes the row groups in order
+  and keeps only the binned (1 byte per value) representation
+
+Peak RAM is one transformed row group plus the library's compact training
+structure. Row groups come from the writer (save_dataset_batches writes
+one per chunk), so their size is the knob that bounds memory.
+"""
+import logging
+import os
+from typing import Iterator, List, Optional, Sequence as RowGroupList, Tuple
+
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+import pyarrow.parquet as pq
+import xgboost as xgb
+
+logger = logging.getLogger(__name__)
+
+# Rows read for fitting the FeaturePreprocessor when none is given
+DEFAULT_SAMPLE_ROWS = 100_000
+
+
+class ParquetRowGroups:
+    """
+    Row-group access to a training set in parquet
+
+    Features and labels may share one file (target_col is a column of
+    features_path) or be split as save_dataset_batches writes them
+    (<prefix>_features.parquet / <prefix>_target.parquet with aligned row
+    groups). Only the most recently transformed row group is kept.
+    """
+
+    def __init__(self, features_path: str, target_path: Optional[str] = None,
+                 target_col: str = 'target', preprocessor=None):
+        """
+        Args:
+            features_path: Parquet file with the feature columns
+            target_path: Parquet file with the label column (None = features_path)
+            target_col: Label column name
+            preprocessor: Fitted FeaturePreprocessor (see fit_preprocessor)
+        """
+        self.features = pq.ParquetFile(features_path)
+        self.target = pq.ParquetFile(target_path) if target_path else self.features
+        self.target_col = target_col
+        self.preprocessor = preprocessor
+        self._cached: Tuple[Optional[int], Optional[np.ndarray]] = (None, None)
+
+        if self.target.metadata.num_row_groups != self.num_row_groups or any(
+                self.target.metadata.row_group(i).num_rows != self.rows(i) for i in range(self.num_row_groups)):
+            raise ValueError(f"Row groups of {features_path} and {target_path} do not line up")
+        if target_col not in self.target.schema_arrow.names:
+            raise ValueError(f"Target column '{target_col}' not found in {target_path or features_path}")
+
+    @property
+    def num_row_groups(self) -> int:
+        return self.features.metadata.num_row_groups
+
+    def rows(self, i: int) -> int:
+        return self.features.metadata.row_group(i).num_rows
+
+    def frame(self, i: int) -> pd.DataFrame:
+        return self.features.read_row_group(i).to_pandas()
+
+    def labels(self, row_groups: RowGroupList[int]) -> np.ndarray:
+        """Labels of the given row groups, concatenated (8 bytes per row)"""
+        return np.concatenate([
+            self.target.read_row_group(i, columns=[self.target_col]).column(0).to_numpy().astype('float64')
+            for i in row_groups
+        ])
+
+    def matrix(self, i: int) -> np.ndarray:
+        """Row group i as a C-ordered feature matrix"""
+        if self._cached[0] != i:
+            self._cached = (None, None)
+            self._cached = (i, np.ascontiguousarray(self.preprocessor.transform(self.frame(i))))
+        return self._cached[1]
+
+    def fit_preprocessor(self, sample_rows: int = DEFAULT_SAMPLE_ROWS):
+        """
+        Fit a FeaturePreprocessor on the leading row groups
+
+        Imputation medians and categories come from the first sample_rows
+        rows instead of the full history, which is fine for frames already
+        imputed upstream (build_ml_dataset_streaming uses full-data medians).
+        """
+        from load_training_data import _feature_drop_columns
+        from preprocessing import FeaturePreprocessor
+
+        frames, rows = [], 0
+        for i in range(self.num_row_groups):
+            frames.append(self.frame(i))
+            rows += len(frames[-1])
+            if rows >= sample_rows:
+                break
+        sample = pd.concat(frames, ignore_index=True).head(sample_rows)
+        self.preprocessor = FeaturePreprocessor().fit(sample, drop_columns=_feature_drop_columns([self.target_col]))
+        return self.preprocessor
+
+    def batches(self, row_groups: RowGroupList[int]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(X, y) per row group"""
+        for i in row_groups:
+            yield self.matrix(i), self.labels([i])
+
+
+class ParquetBatchIter(xgb.DataIter):
+    """XGBoost external-memory iterator over parquet row groups"""
+
+    def __init__(self, source: ParquetRowGroups, row_groups: RowGroupList[int], cache_prefix: str):
+        self.source = source
+        self.row_groups = list(row_groups)
+        self._position = 0
+        super().__init__(cache_prefix=cache_prefix, release_data=True)
+
+    def next(self, input_data) -> bool:
+        if self._position == len(self.row_groups):
+            return False
+        i = self.row_groups[self._position]
+        input_data(data=self.source.matrix(i), label=self.source.labels([i]))
+        self._position += 1
+        return True
+
+    def reset(self):
+        self._position = 0
+
+
+class ParquetRowGroupSequence(lgb.Sequence):
+    """One parquet row group as a lightgbm.Sequence (random and range access)"""
+
+    def __init__(self, source: ParquetRowGroups, row_group: int, batch_size: int = 65_536):
+        self.source = source
+        self.row_group = row_group
+        self.batch_size = batch_size
+        self._rows = source.rows(row_group)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __getitem__(self, idx):
+        rows = self.source.matrix(self.row_group)[idx]
+        # Single rows feed LightGBM's bin sampling, which requires float64
+        return rows.astype('float64') if rows.ndim == 1 else rows
+
+
+def xgboost_dmatrix(source: ParquetRowGroups, row_groups: RowGroupList[int], cache_dir: str,
+                    max_bin: int = 256):
+    """
+    External-memory DMatrix over the given row groups
+
+    Uses ExtMemQuantileDMatrix (XGBoost >= 3.0), falling back to the
+    iterator-backed DMatrix of older releases.
+    """
+    iterator = ParquetBatchIter(source, row_groups, cache_prefix=os.path.join(cache_dir, 'xgb'))
+    if hasattr(xgb, 'ExtMemQuantileDMatrix'):
+        return xgb.ExtMemQuantileDMatrix(iterator, max_bin=max_bin)
+    return xgb.DMatrix(iterator)
+
+
+def lightgbm_dataset(source: ParquetRowGroups, row_groups: RowGroupList[int], params: Optional[dict] = None):
+    """Constructed lgb.Dataset built row group by row group"""
+    sequences: List[lgb.Sequence] = [ParquetRowGroupSequence(source, i) for i in row_groups]
+    params = {'verbosity': -1, 'feature_pre_filter': False, **(params or {})}
+    return lgb.Dataset(sequences, label=source.labels(row_groups), params=params).construct()
+
+
+def split_row_groups(num_row_groups: int, holdout_every: int = 0) -> Tuple[List[int], List[int]]:
+    """
+    Train / held-out row groups, holding out every holdout_every-th group
+
+    Row groups are a few thousand rows or more, so holding out whole groups
+    gives an unbiased test set without reading the data twice.
+    """
+    if holdout_every and holdout_every > 1 and num_row_groups >= holdout_every:
+        test = list(range(holdout_every - 1, num_row_groups, holdout_every))
+    else:
+        test = []
+    held = set(test)
+    return [i for i in range(num_row_groups) if i not in held], test
@@ -3,11 +3,18 @@ Load training data from Snowflake Gold layer OBT
 """
 import os
 import pandas as pd
-import snowflake.connector
+import numpy as np
 from dotenv import load_dotenv
-from typing import Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
 import logging
 
+from backends import get_backend
+from connection_pool import ConnectionPool
+from arrow_fetch import arrow_to_pandas, fetch_dataframe, iter_arrow_batches, rebatch
+from dataset_cache import DatasetCache, cache_key, normalize_query
+from query_builder import BoundQuery, QueryBuilder, validate_identifier
+from schema_dtypes import downcast_frame, format_report
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,23 +26,78 @@ load_dotenv()
 class SnowflakeDataLoader:
     """Load data from Snowflake OBT for ML training"""
     
-    def __init__(self):
-        """Initialize Snowflake connection"""
-        self.conn = snowflake.connector.connect(
-            user=os.getenv('SNOWFLAKE_USER'),
-            password=os.getenv('SNOWFLAKE_PASSWORD'),
-            account=os.getenv('SNOWFLAKE_ACCOUNT'),
-            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-            database=os.getenv('SNOWFLAKE_DATABASE'),
-            schema=os.getenv('SNOWFLAKE_SCHEMA'),
-            role=os.getenv('SNOWFLAKE_ROLE')
-        )
+    # Table whose dbt_run_timestamp versions the ML export view
+    SOURCE_TABLE = 'gold_obt_orders'
+    # Model whose declared column types drive downcasting
+    EXPORT_MODEL = 'gold_obt_orders_ml_export'
+    
+    def __init__(self,
+                 pool: Optional[ConnectionPool] = None,
+                 cache: Optional[DatasetCache] = None,
+                 use_cache: bool = True,
+                 downcast: bool = True):
+        """
+        Check out a Snowflake connection from the shared pool
+        
+        Args:
+            pool: Connection pool to use (defaults to the pool of the
+                DATA_BACKEND backend, normally Snowflake)
+            cache: Local dataset cache (defaults to DatasetCache())
+            use_cache: Serve repeated pulls of an unchanged dbt run from local parquet
+            downcast: Narrow frames to the int8/int16/float32/category dtypes
+                declared in the dbt properties.yml (see schema_dtypes)
+        """
+        if pool is None:
+            backend = get_backend()
+            pool = backend.pool()
+            logger.info(f"Using {backend.describe()}")
+        self.pool = pool
+        self.conn = self.pool.checkout()
+        self.cache = (cache or DatasetCache()) if use_cache else None
+        self.downcast = downcast
+        self._source_version = None
         logger.info("Connected to Snowflake successfully")
     
+    def get_source_version(self) -> Optional[str]:
+        """
+        Get the dbt run timestamp of the source table
+        
+        Returns:
+            Latest dbt_run_timestamp, or None if it cannot be determined
+        """
+        if self._source_version is None:
+            try:
+                result = fetch_dataframe(
+                    self.conn,
+                    f"SELECT MAX(dbt_run_timestamp) AS version FROM {self.SOURCE_TABLE}"
+                )
+                version = result.iloc[0, 0]
+                self._source_version = None if pd.isna(version) else str(version)
+            except Exception as e:
+                logger.warning(f"Could not read dbt_run_timestamp, caching disabled: {e}")
+        return self._source_version
+    
+    def _downcast(self, df: pd.DataFrame, model: str, report: bool = True) -> pd.DataFrame:
+        if not self.downcast:
+            return df
+        stats = {} if report else None
+        df = downcast_frame(df, model, stats=stats)
+        if report:
+            logger.info(f"Downcast {format_report(stats, model)}")
+        return df
+    
+    def _cache_key(self, query: BoundQuery) -> Optional[str]:
+        if self.cache is None:
+            return None
+        version = self.get_source_version()
+        return cache_key(query.sql, version, params=query.params) if version is not None else None
+    
     def load_obt_data(self, 
                       start_date: Optional[str] = None, 
                       end_date: Optional[str] = None,
-                      sample_size: Optional[int] = None) -> pd.DataFrame:
+                      sample_size: Optional[int] = None,
+                      use_arrow: bool = True,
+                      refresh: bool = False) -> pd.DataFrame:
         """
         Load data from gold_obt_orders_ml_export view
         
@@ -43,88 +105,204 @@ class SnowflakeDataLoader:
             start_date: Filter data from this date (YYYY-MM-DD)
             end_date: Filter data until this date (YYYY-MM-DD)
             sample_size: Limit number of rows (for testing)
+            use_arrow: Fetch result chunks as Arrow batches instead of pd.read_sql
+            refresh: Bypass the local cache and re-query Snowflake
             
         Returns:
             DataFrame with ML-ready features
         """
-        query = """
-        SELECT * FROM gold_obt_orders_ml_export
-        WHERE 1=1
-        """
+        query = self._obt_query(start_date=start_date, end_date=end_date, sample_size=sample_size)
+        key = self._cache_key(query)
         
-        if start_date:
-            query += f"\n  AND order_purchase_timestamp >= '{start_date}'"
-        if end_date:
-            query += f"\n  AND order_purchase_timestamp <= '{end_date}'"
-        if sample_size:
-            query += f"\n  LIMIT {sample_size}"
+        if key and not refresh:
+            df = self.cache.get(key)
+            if df is not None:
+                logger.info(f"Loaded {len(df):,} rows with {len(df.columns)} features from local cache")
+                return self._downcast(df, self.EXPORT_MODEL)
         
-        logger.info(f"Executing query:\n{query}")
-        df = pd.read_sql(query, self.conn)
+        logger.info(f"Executing query:\n{query.sql}\nparams: {query.params}")
+        df = fetch_dataframe(self.conn, query.sql, params=query.params, use_arrow=use_arrow)
         logger.info(f"Loaded {len(df):,} rows with {len(df.columns)} features")
+        df = self._downcast(df, self.EXPORT_MODEL)
+        
+        if key:
+            self.cache.put(key, df, query=normalize_query(query.sql), params=query.params,
+                           source_version=self._source_version)
         
         return df
     
+    @staticmethod
+    def _obt_query(columns: Optional[List[str]] = None,
+                   start_date: Optional[str] = None,
+                   end_date: Optional[str] = None,
+                   sample_size: Optional[int] = None) -> BoundQuery:
+        """Build the gold_obt_orders_ml_export query shared by the loaders"""
+        builder = QueryBuilder('gold_obt_orders_ml_export')
+        if columns:
+            builder.select(*[validate_identifier(col) for col in columns])
+        
+        return (
+            builder
+            .where_gte('order_purchase_timestamp', start_date)
+            .where_lte('order_purchase_timestamp', end_date)
+            .limit(sample_size or None)
+            .build()
+        )
+    
+    def iter_obt_batches(self,
+                         batch_rows: int = 100_000,
+                         columns: Optional[List[str]] = None,
+                         start_date: Optional[str] = None,
+                         end_date: Optional[str] = None,
+                         as_arrow: bool = False,
+                         dtype_backend: str = 'numpy_nullable',
+                         refresh: bool = False) -> Iterator:
+        """
+        Stream gold_obt_orders_ml_export in fixed-size chunks
+        
+        Only one chunk (plus one downloaded result chunk) is held in memory
+        at a time, so the full history can be processed on a small machine.
+        DataFrame chunks are downcast to the declared dtypes; with the
+        nullable dtype backend nulls do not change a column's dtype, so
+        every chunk gets the same narrowed schema.
+        
+        Args:
+            batch_rows: Rows per chunk
+            columns: Columns to select (None = all)
+            start_date: Filter data from this date (YYYY-MM-DD)
+            end_date: Filter data until this date (YYYY-MM-DD)
+            as_arrow: Yield pyarrow.Table chunks instead of DataFrames
+            dtype_backend: DataFrame dtypes (see arrow_fetch.arrow_to_pandas);
+                the nullable default keeps dtypes identical across chunks
+            refresh: Bypass the local cache and re-query Snowflake
+                
+        Returns:
+            Iterator of DataFrame (or pyarrow.Table) chunks
+        """
+        query = self._obt_query(columns=columns, start_date=start_date, end_date=end_date)
+        key = self._cache_key(query)
+        writer = None
+        
+        if key and not refresh and self.cache.contains(key):
+            logger.info(f"Streaming {batch_rows:,}-row chunks from local cache")
+            source = self.cache.iter_tables(key)
+        else:
+            logger.info(f"Streaming query in {batch_rows:,}-row chunks:\n{query.sql}\nparams: {query.params}")
+            source = iter_arrow_batches(self.conn, query.sql, params=query.params, batch_rows=batch_rows)
+            if key:
+                # Write-through: the entry is only published if the stream completes
+                writer = self.cache.open_writer(key, query=normalize_query(query.sql), params=query.params,
+                                                source_version=self._source_version)
+        
+        total = 0
+        try:
+            for table in rebatch(source, batch_rows):
+                total += table.num_rows
+                if writer is not None:
+                    writer.write(table)
+                if as_arrow:
+                    yield table
+                else:
+                    df = arrow_to_pandas(table, dtype_backend=dtype_backend)
+                    yield self._downcast(df, self.EXPORT_MODEL, report=False)
+            if writer is not None:
+                writer.commit()
+        finally:
+            if writer is not None:
+                writer.abort()
+        
+        logger.info(f"Streamed {total:,} rows")
+    
+    def get_column_stats(self,
+                         columns: List[str],
+                         start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> Tuple[dict, set]:
+        """
+        Compute exact medians and null presence for columns in Snowflake
+        
+        Args:
+            columns: Numeric columns of gold_obt_orders_ml_export
+            start_date: Filter data from this date (YYYY-MM-DD)
+            end_date: Filter data until this date (YYYY-MM-DD)
+            
+        Returns:
+            Tuple of ({column: median}, {columns containing nulls})
+        """
+        aggregates = []
+        for i, col in enumerate(columns):
+            validate_identifier(col)
+            aggregates.append(f"MEDIAN({col}) AS m{i}")
+            aggregates.append(f"COUNT(*) - COUNT({col}) AS n{i}")
+        
+        base = self._obt_query(start_date=start_date, end_date=end_date)
+        query = f"SELECT {', '.join(aggregates)} FROM ({base.sql})"
+        row = fetch_dataframe(self.conn, query, params=base.params).iloc[0]
+        
+        medians = {col: row.iloc[2 * i] for i, col in enumerate(columns)}
+        null_columns = {col for i, col in enumerate(columns) if row.iloc[2 * i + 1] > 0}
+        return medians, null_columns
+    
     def load_full_obt(self, filters: Optional[dict] = None) -> pd.DataFrame:
         """
         Load full OBT with all features (including categorical)
         
         Args:
-            filters: Dictionary of column: value filters
+            filters: Dictionary of column: value (or list of values) filters
             
         Returns:
             Full OBT DataFrame
         """
-        query = "SELECT * FROM gold_obt_orders WHERE 1=1"
+        builder = QueryBuilder('gold_obt_orders')
         
-        if filters:
-            for col, val in filters.items():
-                if isinstance(val, str):
-                    query += f"\n  AND {col} = '{val}'"
-                else:
-                    query += f"\n  AND {col} = {val}"
+        for col, val in (filters or {}).items():
+            if isinstance(val, (list, tuple, set)):
+                builder.where_in(col, val)
+            else:
+                builder.where_eq(col, val)
         
-        df = pd.read_sql(query, self.conn)
+        query = builder.build()
+        df = fetch_dataframe(self.conn, query.sql, params=query.params)
         logger.info(f"Loaded full OBT: {len(df):,} rows")
-        return df
+        return self._downcast(df, self.SOURCE_TABLE)
     
     def get_data_summary(self) -> dict:
         """Get summary statistics from Snowflake"""
+        def obt() -> QueryBuilder:
+            return QueryBuilder('gold_obt_orders')
+        
         queries = {
-            'total_orders': "SELECT COUNT(*) as cnt FROM gold_obt_orders",
-            'delivered_orders': "SELECT COUNT(*) as cnt FROM gold_obt_orders WHERE order_status = 'delivered'",
-            'date_range': "SELECT MIN(order_purchase_timestamp) as min_date, MAX(order_purchase_timestamp) as max_date FROM gold_obt_orders",
-            'avg_order_value': "SELECT AVG(total_order_value) as avg_val FROM gold_obt_orders",
-            'late_delivery_rate': "SELECT AVG(is_delayed::FLOAT) as rate FROM gold_obt_orders WHERE order_status = 'delivered'"
+            'total_orders': obt().select('COUNT(*) AS cnt'),
+            'delivered_orders': obt().select('COUNT(*) AS cnt').where_eq('order_status', 'delivered'),
+            'date_range': obt().select('MIN(order_purchase_timestamp) AS min_date',
+                                       'MAX(order_purchase_timestamp) AS max_date'),
+            'avg_order_value': obt().select('AVG(total_order_value) AS avg_val'),
+            'late_delivery_rate': obt().select('AVG(is_delayed::FLOAT) AS rate').where_eq('order_status', 'delivered'),
         }
         
         summary = {}
-        for name, query in queries.items():
-            result = pd.read_sql(query, self.conn)
+        for name, builder in queries.items():
+            query = builder.build()
+            result = fetch_dataframe(self.conn, query.sql, params=query.params)
             summary[name] = result.iloc[0].to_dict()
         
         return summary
     
     def close(self):
-        """Close Snowflake connection"""
-        self.conn.close()
-        logger.info("Snowflake connection closed")
+        """Return the Snowflake connection to the pool"""
+        if self.conn is not None:
+            self.pool.checkin(self.conn)
+            self.conn = None
+            logger.info("Snowflake connection returned to pool")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
-def prepare_ml_dataset(df: pd.DataFrame, 
-                       target_col: str,
-                       drop_cols: list = None) -> Tuple[pd.DataFrame, pd.Series]:
-    """
-    Prepare features and target for ML
-    
-    Args:
-        df: Input DataFrame
-        target_col: Name of target column
-        drop_cols: Additional columns to drop
-        
-    Returns:
-        Tuple of (X, y)
-    """
+def _feature_drop_columns(drop_cols: list = None) -> list:
+    """Columns excluded from features: IDs, targets and leakage columns"""
     # Default columns to drop
     default_drop = ['ORDER_ID', 'order_id']
     
@@ -142,7 +320,24 @@ def prepare_ml_dataset(df: pd.DataFrame,
         all_drops.extend(drop_cols)
     
     # Remove duplicates
-    all_drops = list(set(all_drops))
+    return list(set(all_drops))
+
+
+def prepare_ml_dataset(df: pd.DataFrame, 
+                       target_col: str,
+                       drop_cols: list = None) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Prepare features and target for ML
+    
+    Args:
+        df: Input DataFrame
+        target_col: Name of target column
+        drop_cols: Additional columns to drop
+        
+    Returns:
+        Tuple of (X, y)
+    """
+    all_drops = _feature_drop_columns(drop_cols) + [target_col]
     
     # Get target (check if exists)
     if target_col not in df.columns:
@@ -174,9 +369,163 @@ def save_dataset(X: pd.DataFrame, y: pd.Series,
     logger.info(f"Saved dataset to {output_dir}/")
 
 
+def prepare_ml_batches(batches: Iterator[pd.DataFrame],
+                       target_col: str,
+                       medians: dict,
+                       null_columns: set = None,
+                       drop_cols: list = None) -> Iterator[Tuple[pd.DataFrame, pd.Series]]:
+    """
+    Streaming version of prepare_ml_dataset
+    
+    Medians must be computed over the whole dataset up front (see
+    SnowflakeDataLoader.get_column_stats) so every chunk is imputed with
+    the same values. Columns listed in null_columns are emitted as float64
+    and the rest keep their integer/float dtype, so all chunks share one
+    schema.
+    
+    Args:
+        batches: Iterator of DataFrame chunks
+        target_col: Name of target column
+        medians: Column -> median used for imputation
+        null_columns: Columns that contain nulls anywhere in the dataset
+        drop_cols: Additional columns to drop
+        
+    Returns:
+        Iterator of (X, y) chunks
+    """
+    all_drops = _feature_drop_columns(drop_cols) + [target_col]
+    null_columns = set(medians) if null_columns is None else null_columns
+    
+    for df in batches:
+        if target_col not in df.columns:
+            raise ValueError(f"Target column '{target_col}' not found in dataframe. Available columns: {df.columns.tolist()}")
+        y = df[target_col].copy()
+        X = df.drop(columns=[col for col in all_drops if col in df.columns])
+        
+        for col in X.columns:
+            if col in null_columns and col in medians:
+                X[col] = X[col].astype('float64').fillna(medians[col])
+            elif isinstance(X[col].dtype, pd.api.extensions.ExtensionDtype) and hasattr(X[col].dtype, 'numpy_dtype'):
+                X[col] = X[col].to_numpy(dtype=X[col].dtype.numpy_dtype)
+        
+        if hasattr(y.dtype, 'numpy_dtype') and not y.isna().any():
+            y = y.astype(y.dtype.numpy_dtype)
+        
+        yield X, y
+
+
+def save_dataset_batches(batches: Iterator[Tuple[pd.DataFrame, pd.Series]],
+                         output_dir: str = 'data',
+                         prefix: str = 'train') -> int:
+    """
+    Streaming version of save_dataset
+    
+    Each (X, y) chunk is appended to the features/target parquet files as
+    its own row group, so memory stays bounded by the chunk size.
+    
+    Args:
+        batches: Iterator of (X, y) chunks
+        output_dir: Output directory
+        prefix: File name prefix
+        
+    Returns:
+        Number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    os.makedirs(output_dir, exist_ok=True)
+    features_path = f"{output_dir}/{prefix}_features.parquet"
+    target_path = f"{output_dir}/{prefix}_target.parquet"
+    
+    features_writer = None
+    target_writer = None
+    rows = 0
+    try:
+        for X, y in batches:
+            features = pa.Table.from_pandas(X, preserve_index=False)
+            target = pa.Table.from_pandas(y.to_frame('target'), preserve_index=False)
+            if features_writer is None:
+                features_writer = pq.ParquetWriter(features_path, features.schema)
+                target_writer = pq.ParquetWriter(target_path, target.schema)
+            features_writer.write_table(features.cast(features_writer.schema))
+            target_writer.write_table(target.cast(target_writer.schema))
+            rows += len(X)
+            logger.info(f"Wrote {rows:,} rows to {output_dir}/")
+    finally:
+        if features_writer is not None:
+            features_writer.close()
+            target_writer.close()
+    
+    logger.info(f"Saved dataset to {output_dir}/ ({rows:,} rows)")
+    return rows
+
+
+def build_ml_dataset_streaming(loader: SnowflakeDataLoader,
+                               target_col: str,
+                               output_dir: str = 'data',
+                               prefix: str = 'train',
+                               batch_rows: int = 100_000,
+                               start_date: Optional[str] = None,
+                               end_date: Optional[str] = None,
+                               drop_cols: list = None,
+                               refresh: bool = False) -> int:
+    """
+    Build a full-history training set without loading it into memory
+    
+    Args:
+        loader: Connected SnowflakeDataLoader
+        target_col: Name of target column
+        output_dir: Output directory
+        prefix: File name prefix
+        batch_rows: Rows per chunk
+        start_date: Filter data from this date (YYYY-MM-DD)
+        end_date: Filter data until this date (YYYY-MM-DD)
+        drop_cols: Additional columns to drop
+        refresh: Bypass the local cache and re-query Snowflake
+        
+    Returns:
+        Number of rows written
+    """
+    batches = loader.iter_obt_batches(batch_rows=batch_rows, start_date=start_date,
+                                      end_date=end_date, refresh=refresh)
+    first = next(batches, None)
+    if first is None:
+        logger.warning("No rows returned; nothing saved")
+        return 0
+    
+    # Medians are computed server-side over the full filtered view
+    all_drops = set(_feature_drop_columns(drop_cols))
+    numeric_cols = [col for col in first.select_dtypes(include=[np.number]).columns
+                    if col not in all_drops]
+    medians, null_columns = loader.get_column_stats(numeric_cols, start_date=start_date, end_date=end_date)
+    
+    def chunks():
+        yield first
+        yield from batches
+    
+    return save_dataset_batches(
+        prepare_ml_batches(chunks(), target_col, medians, null_columns, drop_cols),
+        output_dir=output_dir,
+        prefix=prefix
+    )
+
+
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Load training data from Snowflake")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the full history to parquet in bounded memory")
+    parser.add_argument('--batch-rows', type=int, default=100_000)
+    parser.add_argument('--start-date', default='2017-01-01')
+    parser.add_argument('--refresh', action='store_true',
+                        help="Ignore the local dataset cache and re-query Snowflake")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the local dataset cache")
+    args = parser.parse_args()
+    
     # Example usage
-    loader = SnowflakeDataLoader()
+    loader = SnowflakeDataLoader(use_cache=not args.no_cache)
     
     # Get summary
     summary = loader.get_data_summary()
@@ -184,9 +533,24 @@ if __name__ == "__main__":
     for key, val in summary.items():
         print(f"{key}: {val}")
     
+    if args.stream:
+        print("\n=== Streaming Training Data ===")
+        build_ml_dataset_streaming(
+            loader,
+            target_col='IS_DELAYED',
+            output_dir='data',
+            prefix='delivery_prediction',
+            batch_rows=args.batch_rows,
+            start_date=args.start_date,
+            refresh=args.refresh
+        )
+        loader.close()
+        print("\n✅ Data loading complete!")
+        raise SystemExit(0)
+    
     # Load data for delivery prediction
     print("\n=== Loading Training Data ===")
-    df = loader.load_obt_data(start_date='2017-01-01')
+    df = loader.load_obt_data(start_date=args.start_date, refresh=args.refresh)
     
     # Prepare dataset for delivery delay prediction
     # Use the correct column name from Snowflake (uppercase)
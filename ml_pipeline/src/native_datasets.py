@@ -0,0 +1,280 @@
+"""
+On-disk cache of gradient-boosting libraries' native training datasets
+
+Handing pandas frames or arrays to XGBoost/LightGBM/CatBoost makes them
+re-ingest (and, for LightGBM/CatBoost, re-bin) the data on every fit. This
+cache builds each library's native form once, saves its binary format
+keyed by a fingerprint of the feature matrix, labels and construction
+parameters, and loads it back on later runs, CV folds and tuning trials:
+
+- XGBoost: DMatrix binary (DMatrix.save_binary; QuantileDMatrix cannot be
+  saved, so the cached form is the plain DMatrix)
+- LightGBM: binned Dataset (Dataset.save_binary)
+- CatBoost: quantized Pool (Pool.quantize + Pool.save, loaded via quantized://)
+
+Every build/load is timed in NativeDatasetCache.stats, so ingest savings
+can be compared (see benchmarks/bench_native_datasets.py).
+
+fit_native() trains the sklearn-API estimators MLTrainer uses on a cached
+dataset and returns them fitted, so saved models and ModelPredictor are
+unchanged.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / 'data' / 'cache' / 'native'
+FORMAT_VERSION = 1
+LIBRARIES = ('xgboost', 'lightgbm', 'catboost')
+_EXTENSIONS = {'xgboost': 'buffer', 'lightgbm': 'bin', 'catboost': 'qpool'}
+
+
+def _library_version(library: str) -> str:
+    module = __import__(library)
+    return getattr(module, '__version__', 'unknown')
+
+
+def fingerprint(X: np.ndarray, y=None, **params) -> str:
+    """
+    Content hash of a feature matrix, its labels and construction parameters
+
+    Hashes the raw buffers (no copy for C- or F-ordered arrays), so equal
+    data always maps to the same cached dataset regardless of where it
+    came from.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    X = np.asarray(X)
+    buffer = X.T if X.flags.f_contiguous and not X.flags.c_contiguous else np.ascontiguousarray(X)
+    digest.update(json.dumps({'shape': X.shape, 'dtype': str(X.dtype), 'order': 'F' if buffer is not X else 'C',
+                              'params': params, 'format': FORMAT_VERSION}, sort_keys=True, default=str).encode())
+    digest.update(memoryview(buffer).cast('B'))
+    if y is not None:
+        digest.update(memoryview(np.ascontiguousarray(np.asarray(y, dtype='float64'))).cast('B'))
+    return digest.hexdigest()
+
+
+class NativeDatasetCache:
+    """Build-once, load-many cache of DMatrix / lgb.Dataset / CatBoost Pool files"""
+
+    def __init__(self, root: Optional[str] = None, lightgbm_params: Optional[dict] = None):
+        """
+        Args:
+            root: Cache directory (defaults to ML_NATIVE_CACHE_DIR or
+                ml_pipeline/data/cache/native)
+            lightgbm_params: Dataset construction parameters for LightGBM
+                (max_bin, bin_construct_sample_cnt, seed, ...); part of the key
+        """
+        self.root = Path(root or os.getenv('ML_NATIVE_CACHE_DIR', DEFAULT_CACHE_DIR))
+        self.root.mkdir(parents=True, exist_ok=True)
+        # feature_pre_filter off so one binned Dataset serves any min_child_samples
+        self.lightgbm_params = {'verbosity': -1, 'feature_pre_filter': False, **(lightgbm_params or {})}
+        self.stats = []
+
+    def path(self, library: str, key: str) -> Path:
+        return self.root / f"{library}-{key}.{_EXTENSIONS[library]}"
+
+    def _record(self, library: str, key: str, action: str, seconds: float, rows: int):
+        path = self.path(library, key)
+        size = path.stat().st_size if path.exists() else 0
+        self.stats.append({'library': library, 'key': key[:12], 'action': action, 'rows': rows,
+                           'seconds': seconds, 'bytes': size})
+        logger.info(f"{library} dataset {key[:12]}: {action} {rows:,} rows in {seconds:.3f}s")
+
+    def _save(self, library: str, key: str, save):
+        # Write beside the final path and rename, so readers never see a partial file
+        final = self.path(library, key)
+        tmp = final.with_name(f".tmp-{uuid.uuid4().hex[:8]}-{final.name}")
+        try:
+            save(str(tmp))
+            os.replace(tmp, final)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def key(self, library: str, X, y=None, reference: Optional[str] = None) -> str:
+        params = {'library': library, 'version': _library_version(library), 'reference': reference}
+        if library == 'lightgbm':
+            params['dataset'] = self.lightgbm_params
+        return fingerprint(X, y, **params)
+
+    def xgboost(self, X, y=None):
+        """DMatrix for (X, y), loaded from its saved binary when present"""
+        import xgboost as xgb
+
+        key = self.key('xgboost', X, y)
+        path = self.path('xgboost', key)
+        started = time.perf_counter()
+        if path.exists():
+            dmatrix = xgb.DMatrix(str(path))
+            self._record('xgboost', key, 'load', time.perf_counter() - started, dmatrix.num_row())
+            return dmatrix
+        dmatrix = xgb.DMatrix(X, label=y)
+        self._save('xgboost', key, dmatrix.save_binary)
+        self._record('xgboost', key, 'build', time.perf_counter() - started, dmatrix.num_row())
+        return dmatrix
+
+    def lightgbm(self, X, y=None, reference=None):
+        """
+        Constructed (binned) lgb.Dataset for (X, y)
+
+        Args:
+            reference: Training Dataset whose bins a validation set must share
+        """
+        import lightgbm as lgb
+
+        reference_key = getattr(reference, '_cache_key', None)
+        key = self.key('lightgbm', X, y, reference=reference_key)
+        path = self.path('lightgbm', key)
+        started = time.perf_counter()
+        if path.exists():
+            dataset = lgb.Dataset(str(path), reference=reference, params=self.lightgbm_params,
+                                  free_raw_data=False).construct()
+            action = 'load'
+        else:
+            dataset = lgb.Dataset(X, label=y, reference=reference, params=self.lightgbm_params,
+                                  free_raw_data=False).construct()
+            self._save('lightgbm', key, dataset.save_binary)
+            action = 'build'
+        dataset._cache_key = key
+        self._record('lightgbm', key, action, time.perf_counter() - started, dataset.num_data())
+        return dataset
+
+    def catboost(self, X, y=None):
+        """Quantized CatBoost Pool for (X, y)"""
+        from catboost import Pool
+
+        key = self.key('catboost', X, y)
+        path = self.path('catboost', key)
+        started = time.perf_counter()
+        if path.exists():
+            pool = Pool(f"quantized://{path}")
+            action = 'load'
+        else:
+            pool = Pool(X, label=y)
+            pool.quantize()
+            self._save('catboost', key, pool.save)
+            action = 'build'
+        self._record('catboost', key, action, time.perf_counter() - started, pool.num_row())
+        return pool
+
+    def get(self, library: str, X, y=None, reference=None):
+        """Native dataset for any supported library"""
+        if library == 'xgboost':
+            return self.xgboost(X, y)
+        if library == 'lightgbm':
+            return self.lightgbm(X, y, reference=reference)
+        if library == 'catboost':
+            return self.catboost(X, y)
+        raise ValueError(f"No native dataset format for '{library}'. Choose from: {', '.join(LIBRARIES)}")
+
+    def total_bytes(self) -> int:
+        return sum(f.stat().st_size for f in self.root.iterdir() if f.is_file())
+
+    def clear(self):
+        """Remove every cached dataset"""
+        for f in self.root.iterdir():
+            if f.is_file():
+                f.unlink()
+
+
+def lightgbm_train_params(estimator) -> dict:
+    """lgb.train parameters equivalent to an LGBMClassifier's settings"""
+    params = {k: v for k, v in estimator.get_params().items()
+              if v is not None and k not in ('n_estimators', 'importance_type', 'class_weight', 'subsample_for_bin')}
+    params['objective'] = params.get('objective') or 'binary'
+    return params
+
+
+def attach_booster(estimator, model_type: str, booster, classes):
+    """
+    Make an unfitted XGBClassifier / LGBMClassifier wrap a natively trained Booster
+
+    Args:
+        estimator: Estimator whose parameters the booster was trained with
+        model_type: 'xgboost' or 'lightgbm'
+        booster: xgb.Booster from xgb.train or lgb.Booster from lgb.train
+        classes: Class labels seen in training
+
+    Returns:
+        The fitted estimator
+    """
+    if model_type == 'xgboost':
+        estimator.load_model(bytearray(booster.save_raw(raw_format='ubj')))
+        return estimator
+    if model_type != 'lightgbm':
+        raise ValueError(f"Cannot attach a native booster to '{model_type}'")
+    from sklearn.preprocessing import LabelEncoder
+
+    estimator._Booster = booster
+    estimator._le = LabelEncoder().fit(np.asarray(classes))
+    estimator._classes = estimator._le.classes_
+    estimator._n_classes = len(estimator._classes)
+    estimator._n_features = estimator._n_features_in = booster.num_feature()
+    estimator._objective = lightgbm_train_params(estimator)['objective']
+    estimator._fitted_with_feature_names = False
+    estimator.fitted_ = True
+    return estimator
+
+
+def fit_native(estimator, model_type: str, X: np.ndarray, y, cache: NativeDatasetCache):
+    """
+    Fit an sklearn-API booster on a cached native dataset
+
+    The result is the same estimator class MLTrainer would get from
+    estimator.fit(X, y) (identical trees for XGBoost and, with pre-filtering
+    off, for LightGBM), so it pickles and predicts as before.
+
+    Args:
+        estimator: Unfitted XGBClassifier, LGBMClassifier or CatBoostClassifier
+        model_type: 'xgboost', 'lightgbm' or 'catboost'
+        X: Feature matrix
+        y: Labels
+        cache: Dataset cache
+
+    Returns:
+        The fitted estimator
+    """
+    y = np.asarray(y)
+    if model_type == 'xgboost':
+        import xgboost as xgb
+        dtrain = cache.xgboost(X, y)
+        booster = xgb.train(estimator.get_xgb_params(), dtrain, num_boost_round=estimator.n_estimators)
+        return attach_booster(estimator, model_type, booster, np.unique(y))
+    if model_type == 'lightgbm':
+        import lightgbm as lgb
+        train_set = cache.lightgbm(X, y)
+        booster = lgb.train(lightgbm_train_params(estimator), train_set, num_boost_round=estimator.n_estimators)
+        return attach_booster(estimator, model_type, booster, np.unique(y))
+    if model_type == 'catboost':
+        return estimator.fit(cache.catboost(X, y))
+    raise ValueError(f"No native dataset format for '{model_type}'. Choose from: {', '.join(LIBRARIES)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the native dataset cache")
+    parser.add_argument('--clear', action='store_true', help="Remove every cached dataset")
+    args = parser.parse_args()
+
+    cache = NativeDatasetCache()
+    if args.clear:
+        cache.clear()
+        print(f"✅ Cleared {cache.root}")
+    else:
+        print(f"\n=== Native Dataset Cache: {cache.root} ===")
+        for f in sorted(cache.root.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True):
+            if f.is_file():
+                print(f"{f.name:<60} {f.stat().st_size / 1024 ** 2:>8.1f} MB")
+        print(f"Total: {cache.total_bytes() / 1024 ** 2:.1f} MB")
@@ -6,25 +6,72 @@ import numpy as np
 import joblib
 import logging
 import os
-from typing import Union, List
+import threading
+from collections import OrderedDict
+from typing import Union, List, Optional
 from load_training_data import SnowflakeDataLoader
+from arrow_fetch import fetch_dataframe
+from query_builder import QueryBuilder
+from preprocessing import load_preprocessor
+from compiled_trees import compiled_path, load_compiled
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Batches up to this many rows use the compiled trees under backend='auto';
+# larger ones go to the library's own (multi-threaded) predictor
+COMPILED_MAX_ROWS = int(os.getenv('ML_COMPILED_MAX_ROWS', 1000))
+BACKENDS = ('auto', 'compiled', 'native')
+
+# Rows returned by ModelPredictor.predict_with_confidence / batch_predict
+PREDICTION_DTYPE = np.dtype([('prediction', 'i1'), ('confidence', 'f8'),
+                             ('prob_class_0', 'f8'), ('prob_class_1', 'f8')])
+
+
 class ModelPredictor:
     """Make predictions using trained models"""
     
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, mmap_mode: Optional[str] = None, backend: Optional[str] = None):
         """
         Initialize predictor
         
         Args:
             model_path: Path to saved model file
+            mmap_mode: joblib.load mmap_mode ('r' maps numpy arrays stored in
+                the artifact read-only instead of copying them into memory)
+            backend: 'auto' (compiled trees for batches up to COMPILED_MAX_ROWS),
+                'compiled' or 'native'; defaults to ML_PREDICT_BACKEND or 'auto'.
+                Models saved without <name>_compiled.pkl always use 'native'.
         """
-        self.model = joblib.load(model_path)
+        backend = backend or os.getenv('ML_PREDICT_BACKEND', 'auto')
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+        self.model = joblib.load(model_path, mmap_mode=mmap_mode)
         logger.info(f"Model loaded from {model_path}")
+        self.preprocessor = load_preprocessor(model_path)
+        self.model_path = model_path
+        self.backend = backend
+        self.compiled = load_compiled(model_path, mmap_mode=mmap_mode) if backend != 'native' else None
+        if backend == 'compiled' and self.compiled is None:
+            logger.warning(f"No compiled trees for {model_path}; using the native predictor")
+    
+    def _use_compiled(self, X) -> bool:
+        if self.compiled is None:
+            return False
+        return self.backend == 'compiled' or len(X) <= COMPILED_MAX_ROWS
+    
+    def features(self, X: pd.DataFrame):
+        """
+        Model input for a scoring frame
+        
+        Uses the preprocessor saved with the model (training columns and
+        medians, no statistics from the scoring batch). Models saved
+        without one get the frame as-is.
+        """
+        if self.preprocessor is None or not isinstance(X, pd.DataFrame):
+            return X
+        return self.preprocessor.transform(X)
     
     def predict(self, X: pd.DataFrame) -> np.ndarray:
         """
@@ -36,6 +83,9 @@ class ModelPredictor:
         Returns:
             Array of predictions
         """
+        X = self.features(X)
+        if self._use_compiled(X):
+            return self.compiled.predict(X)
         return self.model.predict(X)
     
     def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
@@ -49,55 +99,227 @@ class ModelPredictor:
             Array of probabilities
         """
         if hasattr(self.model, 'predict_proba'):
+            X = self.features(X)
+            if self._use_compiled(X):
+                return self.compiled.predict_proba(X)
             return self.model.predict_proba(X)
         else:
             logger.warning("Model does not support probability predictions")
             return None
     
-    def predict_with_confidence(self, X: pd.DataFrame, threshold: float = 0.5) -> pd.DataFrame:
+    def predict_with_confidence(self, X: pd.DataFrame, threshold: float = 0.5) -> np.ndarray:
         """
         Make predictions with confidence scores
         
+        Probabilities are computed once and labels derived from them, so
+        each tree is traversed a single time.
+        
         Args:
             X: Feature DataFrame
-            threshold: Classification threshold
+            threshold: Positive-class probability at which prediction is 1
             
         Returns:
-            DataFrame with predictions and confidence
+            Structured array (PREDICTION_DTYPE) with prediction, confidence,
+            prob_class_0 and prob_class_1 fields; pd.DataFrame(result) gives
+            the equivalent frame
         """
-        predictions = self.predict(X)
+        return self._score_into(X, threshold, np.empty(len(X), dtype=PREDICTION_DTYPE))
+    
+    def _score_into(self, X: pd.DataFrame, threshold: float, out: np.ndarray) -> np.ndarray:
+        """Fill the PREDICTION_DTYPE array out with the scores of X"""
         probabilities = self.predict_proba(X)
-        
-        results = pd.DataFrame({
-            'prediction': predictions,
-            'confidence': np.max(probabilities, axis=1) if probabilities is not None else None,
-            'prob_class_0': probabilities[:, 0] if probabilities is not None else None,
-            'prob_class_1': probabilities[:, 1] if probabilities is not None else None
-        })
-        
-        return results
+        if probabilities is None:
+            out['prediction'] = self.predict(X)
+            out['confidence'] = out['prob_class_0'] = out['prob_class_1'] = np.nan
+            return out
+        out['prob_class_0'] = probabilities[:, 0]
+        out['prob_class_1'] = probabilities[:, 1]
+        out['confidence'] = probabilities.max(axis=1)
+        out['prediction'] = probabilities[:, 1] >= threshold
+        return out
     
-    def batch_predict(self, X: pd.DataFrame, batch_size: int = 1000) -> pd.DataFrame:
+    def batch_predict(self, X: pd.DataFrame, batch_size: int = 1000, threshold: float = 0.5) -> np.ndarray:
         """
         Make predictions in batches
         
         Args:
             X: Feature DataFrame
             batch_size: Size of each batch
+            threshold: See predict_with_confidence
             
         Returns:
-            DataFrame with predictions
+            Structured array (PREDICTION_DTYPE), one row per row of X
         """
-        all_predictions = []
+        results = np.empty(len(X), dtype=PREDICTION_DTYPE)
+        n_batches = (len(X) - 1) // batch_size + 1
         
         for i in range(0, len(X), batch_size):
-            batch = X.iloc[i:i+batch_size]
-            predictions = self.predict_with_confidence(batch)
-            all_predictions.append(predictions)
+            self._score_into(X.iloc[i:i+batch_size], threshold, results[i:i+batch_size])
             
-            logger.info(f"Processed batch {i//batch_size + 1}/{(len(X)-1)//batch_size + 1}")
+            logger.debug(f"Processed batch {i//batch_size + 1}/{n_batches}")
         
-        return pd.concat(all_predictions, ignore_index=True)
+        return results
+
+
+# Registry names for the artifacts the predictors below use
+MODEL_ALIASES = {
+    'delivery_delay': 'IS_DELAYED_xgboost_model.pkl',
+    'churn': 'churn_prediction_model.pkl',
+}
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models
+    
+    Resolves model names (and optional versions) to artifacts, loads each
+    artifact at most once per process, and evicts the least recently used
+    models when the loaded artifacts exceed a memory budget. Artifacts are
+    loaded with joblib mmap_mode='r', so numpy arrays inside them (e.g.
+    random forest or compiled tree arrays) are mapped from the page cache
+    rather than copied, and are shared by every process that maps the
+    same file. Call preload() before forking workers to share the rest
+    copy-on-write.
+    
+    Example:
+        registry = get_registry()
+        predictor = registry.get('delivery_delay')          # models/IS_DELAYED_xgboost_model.pkl
+        predictor = registry.get('churn', version='2024-06') # models/2024-06/churn_prediction_model.pkl
+    """
+    
+    def __init__(self, model_dir: Optional[str] = None, memory_budget_mb: Optional[float] = None,
+                 mmap_mode: Optional[str] = 'r'):
+        """
+        Args:
+            model_dir: Where names are resolved (default ML_MODEL_DIR or ../models)
+            memory_budget_mb: Artifact bytes kept loaded before LRU eviction
+                (default ML_MODEL_MEMORY_MB or 2048)
+            mmap_mode: joblib mmap_mode for loading (None to copy into memory)
+        """
+        self.model_dir = model_dir or os.getenv('ML_MODEL_DIR', '../models')
+        self.memory_budget = float(memory_budget_mb or os.getenv('ML_MODEL_MEMORY_MB', 2048)) * 1024 ** 2
+        self.mmap_mode = mmap_mode
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def resolve(self, name: str, version: Optional[str] = None) -> str:
+        """
+        Artifact path for a model name, alias or path
+        
+        Args:
+            name: .pkl path, alias from MODEL_ALIASES, or artifact stem
+                ('IS_DELAYED_xgboost' -> IS_DELAYED_xgboost_model.pkl)
+            version: Subdirectory of model_dir holding that version
+        
+        Raises:
+            FileNotFoundError: If the artifact does not exist
+        """
+        if name.endswith('.pkl'):
+            path = name
+        else:
+            filename = MODEL_ALIASES.get(name, f"{name}_model.pkl")
+            path = os.path.join(self.model_dir, *([version] if version else []), filename)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No artifact for model '{name}'" + (f" version '{version}'" if version else '')
+                                    + f" at {path}")
+        return os.path.realpath(path)
+    
+    def get(self, name: str, version: Optional[str] = None) -> ModelPredictor:
+        """Loaded predictor for a model, loading it on first use"""
+        path = self.resolve(name, version)
+        # Retrained artifacts (new mtime) are reloaded rather than served stale
+        key = (path, os.path.getmtime(path))
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key][0]
+            
+            self.misses += 1
+            for stale in [k for k in self._models if k[0] == path]:
+                del self._models[stale]
+            predictor = ModelPredictor(path, mmap_mode=self.mmap_mode)
+            size = os.path.getsize(path)
+            if predictor.compiled is not None:
+                size += os.path.getsize(compiled_path(path))
+            self._models[key] = (predictor, size)
+            self._evict(keep=key)
+            return predictor
+    
+    def preload(self, *names: str):
+        """Load models up front, e.g. in a parent process before forking workers"""
+        for name in names:
+            self.get(name)
+    
+    def _evict(self, keep):
+        while self.loaded_bytes() > self.memory_budget and len(self._models) > 1:
+            key = next(k for k in self._models if k != keep)
+            del self._models[key]
+            self.evictions += 1
+            logger.info(f"Evicted {os.path.basename(key[0])} (model memory budget "
+                        f"{self.memory_budget / 1024 ** 2:.0f} MB)")
+    
+    def loaded_bytes(self) -> int:
+        return sum(size for _, size in self._models.values())
+    
+    def loaded(self) -> List[str]:
+        """Loaded artifact paths, least recently used first"""
+        with self._lock:
+            return [path for path, _ in self._models]
+    
+    def evict(self, name: str, version: Optional[str] = None):
+        """Drop one model from the cache"""
+        path = self.resolve(name, version)
+        with self._lock:
+            for key in [k for k in self._models if k[0] == path]:
+                del self._models[key]
+    
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """The process-wide ModelRegistry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+# Target, ID and leakage columns never used as features
+SCORING_DROP_COLUMNS = ['ORDER_ID', 'order_id', 'CUSTOMER_ID', 'customer_id',
+                        'IS_DELAYED', 'IS_CANCELED', 'IS_SATISFIED',
+                        'is_delayed', 'is_canceled', 'is_satisfied',
+                        'target_review_score', 'TARGET_REVIEW_SCORE',
+                        'target_delivery_days', 'TARGET_DELIVERY_DAYS',
+                        'review_score', 'REVIEW_SCORE', 'order_status', 'ORDER_STATUS',
+                        'status', 'STATUS', 'is_churned']
+
+
+def _scoring_features(predictor: ModelPredictor, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Feature frame for a model saved without a preprocessor
+    
+    Models trained by MLTrainer carry their own preprocessor and receive
+    df unchanged; older models get the previous behaviour of dropping known
+    non-feature columns and imputing medians of the scoring batch.
+    """
+    if predictor.preprocessor is not None:
+        return df
+    logger.warning("Model has no saved preprocessor; imputing with medians of this batch")
+    X = df.drop(columns=[col for col in SCORING_DROP_COLUMNS if col in df.columns])
+    numeric_cols = X.select_dtypes(include=[np.number]).columns
+    X[numeric_cols] = X[numeric_cols].fillna(X[numeric_cols].median())
+    return X
 
 
 class DeliveryDelayPredictor:
@@ -105,7 +327,7 @@ class DeliveryDelayPredictor:
     
     def __init__(self, model_path: str = '../models/IS_DELAYED_xgboost_model.pkl'):
         try:
-            self.predictor = ModelPredictor(model_path)
+            self.predictor = get_registry().get(model_path)
         except FileNotFoundError:
             logger.error(f"Model not found at {model_path}")
             logger.info("Please train the model first using notebook 03_model_training.ipynb")
@@ -121,18 +343,13 @@ class DeliveryDelayPredictor:
         Returns:
             DataFrame with predictions
         """
-        loader = SnowflakeDataLoader()
-        
-        # Load data
-        if order_ids:
-            # Build IN clause properly
-            order_ids_str = ','.join([f"'{oid}'" for oid in order_ids])
-            query = f"SELECT * FROM gold_obt_orders_ml_export WHERE order_id IN ({order_ids_str})"
-            df = pd.read_sql(query, loader.conn)
-        else:
-            df = loader.load_obt_data()
-        
-        loader.close()
+        # Load data (connection is borrowed from the shared pool)
+        with SnowflakeDataLoader() as loader:
+            if order_ids:
+                query = QueryBuilder('gold_obt_orders_ml_export').where_in('order_id', order_ids).build()
+                df = fetch_dataframe(loader.conn, query.sql, params=query.params)
+            else:
+                df = loader.load_obt_data()
         
         # Prepare features
         # Find order ID column (case-insensitive)
@@ -142,27 +359,20 @@ class DeliveryDelayPredictor:
                 order_id_col = df[col].copy()
                 break
         
-        # Drop target and leakage columns (check existence first)
-        cols_to_drop = ['ORDER_ID', 'order_id', 'IS_DELAYED', 'IS_CANCELED', 'IS_SATISFIED',
-                       'is_delayed', 'is_canceled', 'is_satisfied',
-                       'target_review_score', 'TARGET_REVIEW_SCORE',
-                       'target_delivery_days', 'TARGET_DELIVERY_DAYS',
-                       'review_score', 'REVIEW_SCORE', 'order_status', 'ORDER_STATUS',
-                       'status', 'STATUS']
-        
-        X = df.drop(columns=[col for col in cols_to_drop if col in df.columns])
-        
-        # Handle missing values only for numeric columns
-        numeric_cols = X.select_dtypes(include=[np.number]).columns
-        X[numeric_cols] = X[numeric_cols].fillna(X[numeric_cols].median())
+        # Training columns and medians come from the model's preprocessor
+        X = _scoring_features(self.predictor, df)
         
         # Predict
         predictions = self.predictor.predict_with_confidence(X)
         
         # Combine with order IDs
-        results = pd.concat([order_id_col.reset_index(drop=True), predictions], axis=1)
-        results.columns = ['order_id', 'will_be_delayed', 'confidence', 
-                          'prob_on_time', 'prob_delayed']
+        results = pd.DataFrame({
+            'order_id': order_id_col.to_numpy() if order_id_col is not None else np.arange(len(predictions)),
+            'will_be_delayed': predictions['prediction'],
+            'confidence': predictions['confidence'],
+            'prob_on_time': predictions['prob_class_0'],
+            'prob_delayed': predictions['prob_class_1']
+        })
         
         # Add risk category
         results['risk_category'] = pd.cut(
@@ -188,7 +398,7 @@ class ChurnPredictor:
     
     def __init__(self, model_path: str = '../models/churn_prediction_model.pkl'):
         try:
-            self.predictor = ModelPredictor(model_path)
+            self.predictor = get_registry().get(model_path)
         except FileNotFoundError:
             logger.error(f"Model not found at {model_path}")
             logger.info("Churn prediction model not yet implemented in notebooks")
@@ -204,28 +414,26 @@ class ChurnPredictor:
         Returns:
             DataFrame with churn predictions
         """
-        loader = SnowflakeDataLoader()
-        
-        # Load latest order per customer
-        if customer_ids:
-            customer_ids_str = ','.join([f"'{cid}'" for cid in customer_ids])
-            filter_clause = f"WHERE customer_id IN ({customer_ids_str})"
-        else:
-            filter_clause = ""
-        
-        query = f"""
-        SELECT *
-        FROM gold_obt_orders_ml_export
-        WHERE order_id IN (
-            SELECT order_id
-            FROM gold_obt_orders
-            QUALIFY ROW_NUMBER() OVER (PARTITION BY customer_id ORDER BY order_purchase_timestamp DESC) = 1
+        # Load latest order per customer (the customer filter is applied in
+        # the subquery, since the ML export view has no customer_id column)
+        latest_orders = (
+            QueryBuilder('gold_obt_orders')
+            .select('order_id')
+            .where_in('customer_id', customer_ids)
+            .build()
+        )
+        subquery = (
+            latest_orders.sql
+            + "\nQUALIFY ROW_NUMBER() OVER (PARTITION BY customer_id ORDER BY order_purchase_timestamp DESC) = 1"
+        )
+        query = (
+            QueryBuilder('gold_obt_orders_ml_export')
+            .where(f"order_id IN ({subquery})", *latest_orders.params)
+            .build()
         )
-        {filter_clause}
-        """
         
-        df = pd.read_sql(query, loader.conn)
-        loader.close()
+        with SnowflakeDataLoader() as loader:
+            df = fetch_dataframe(loader.conn, query.sql, params=query.params)
         
         # Calculate churn label (handle column name case-insensitively)
         days_col = None
@@ -246,20 +454,8 @@ class ChurnPredictor:
                 customer_id_col = df[col].copy()
                 break
         
-        # Drop columns safely
-        cols_to_drop = ['ORDER_ID', 'order_id', 'CUSTOMER_ID', 'customer_id',
-                       'IS_DELAYED', 'IS_CANCELED', 'IS_SATISFIED',
-                       'is_delayed', 'is_canceled', 'is_satisfied',
-                       'target_review_score', 'TARGET_REVIEW_SCORE',
-                       'target_delivery_days', 'TARGET_DELIVERY_DAYS',
-                       'review_score', 'REVIEW_SCORE', 'order_status', 'ORDER_STATUS',
-                       'status', 'STATUS', 'is_churned']
-        
-        X = df.drop(columns=[col for col in cols_to_drop if col in df.columns])
-        
-        # Handle missing values for numeric columns only
-        numeric_cols = X.select_dtypes(include=[np.number]).columns
-        X[numeric_cols] = X[numeric_cols].fillna(X[numeric_cols].median())
+        # Training columns and medians come from the model's preprocessor
+        X = _scoring_features(self.predictor, df.drop(columns=['is_churned']))
         
         # Predict
         predictions = self.predictor.predict_with_confidence(X)
@@ -297,20 +493,16 @@ def predict_new_orders(new_orders_df: pd.DataFrame,
     
     Args:
         new_orders_df: DataFrame with new order features
-        model_path: Path to trained model
+        model_path: Path or registry name of the trained model (loaded once
+            per process, see ModelRegistry)
         
     Returns:
         DataFrame with predictions
     """
-    predictor = ModelPredictor(model_path)
-    
-    # Ensure all required features are present
-    # Fill missing values for numeric columns only
-    numeric_cols = new_orders_df.select_dtypes(include=[np.number]).columns
-    new_orders_df[numeric_cols] = new_orders_df[numeric_cols].fillna(new_orders_df[numeric_cols].median())
+    predictor = get_registry().get(model_path)
     
-    # Predict
-    predictions = predictor.predict_with_confidence(new_orders_df)
+    # Missing values are imputed with the training medians
+    predictions = pd.DataFrame(predictor.predict_with_confidence(_scoring_features(predictor, new_orders_df)))
     
     logger.info(f"Predictions made for {len(predictions)} new orders")
     
@@ -0,0 +1,187 @@
+"""
+Fit-once feature preprocessing shared by training and prediction
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def preprocessor_path(model_path: str) -> str:
+    """Location of the preprocessor saved next to a model .pkl"""
+    return model_path.replace('.pkl', '_preprocessor.json')
+
+
+class FeaturePreprocessor:
+    """
+    Column selection, category encoding and median imputation learned once
+
+    fit() records the feature columns (in order), their dtypes, the median
+    of every numeric column and the categories of every non-numeric column
+    on the training frame. transform() then turns any scoring frame into the
+    model's feature matrix in one vectorized pass, imputing with the stored
+    medians, so results do not depend on which rows share a batch.
+
+    Example:
+        preprocessor = FeaturePreprocessor().fit(X_train)
+        model.fit(preprocessor.transform(X_train), y_train)
+        preprocessor.save(preprocessor_path('models/model.pkl'))
+        ...
+        X = FeaturePreprocessor.load(path).transform(scoring_df)
+    """
+
+    def __init__(self, dtype: str = 'float32'):
+        """
+        Args:
+            dtype: Feature matrix dtype (tree libraries train on float32)
+        """
+        self.dtype = dtype
+        self.feature_names: List[str] = []
+        self.dtypes: Dict[str, str] = {}
+        self.medians: Dict[str, float] = {}
+        self.categories: Dict[str, List[str]] = {}
+        self.drop_columns: List[str] = []
+        self._medians = None
+
+    @property
+    def fitted(self) -> bool:
+        return bool(self.feature_names)
+
+    def fit(self, X: pd.DataFrame, drop_columns: Optional[list] = None) -> 'FeaturePreprocessor':
+        """
+        Learn the feature layout and imputation values
+
+        Args:
+            X: Training frame
+            drop_columns: Columns never used as features (defaults to the IDs,
+                targets and leakage columns excluded by prepare_ml_dataset)
+
+        Returns:
+            self
+        """
+        if drop_columns is None:
+            from load_training_data import _feature_drop_columns
+            drop_columns = _feature_drop_columns()
+        self.drop_columns = sorted(drop_columns)
+        dropped = set(drop_columns)
+
+        self.feature_names = [col for col in X.columns if col not in dropped]
+        self.dtypes = {col: str(X[col].dtype) for col in self.feature_names}
+        self.categories = {}
+        self.medians = {}
+        for col in self.feature_names:
+            values = X[col]
+            if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                median = pd.to_numeric(values, errors='coerce').astype('float64').median()
+                self.medians[col] = 0.0 if pd.isna(median) else float(median)
+            else:
+                # Codes are positions in the sorted training categories;
+                # unseen values score as -1
+                self.categories[col] = sorted(values.dropna().astype(str).unique().tolist())
+                self.medians[col] = -1.0
+        self._medians = None
+
+        logger.info(f"Fitted preprocessor: {len(self.feature_names)} features, "
+                    f"{len(self.categories)} categorical")
+        return self
+
+    def _column(self, df: pd.DataFrame, col: str, lookup: Dict[str, str]) -> Optional[np.ndarray]:
+        name = col if col in df.columns else lookup.get(col.upper())
+        if name is None:
+            return None
+        values = df[name]
+        if col in self.categories:
+            codes = pd.Categorical(values.astype('string'), categories=self.categories[col]).codes
+            return codes.astype(self.dtype)
+        if isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+            return values.to_numpy(dtype=self.dtype, na_value=np.nan)
+        return values.to_numpy(dtype=self.dtype, copy=False)
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Build the feature matrix for a frame
+
+        Extra columns (IDs, targets) are ignored; column names are matched
+        case-insensitively so Snowflake upper-case frames score against a
+        model trained on lower-case ones. Missing columns are imputed
+        entirely with their training median.
+
+        Args:
+            df: Frame with (at least) the training feature columns
+
+        Returns:
+            (rows, features) array in feature_names order
+        """
+        if not self.fitted:
+            raise RuntimeError("FeaturePreprocessor must be fitted before transform()")
+        if self._medians is None:
+            self._medians = np.array([self.medians[col] for col in self.feature_names], dtype=self.dtype)
+
+        lookup = {col.upper(): col for col in df.columns}
+        out = np.empty((len(df), len(self.feature_names)), dtype=self.dtype, order='F')
+        missing = []
+        for j, col in enumerate(self.feature_names):
+            values = self._column(df, col, lookup)
+            if values is None:
+                missing.append(col)
+                out[:, j] = np.nan
+            else:
+                out[:, j] = values
+        if missing:
+            logger.warning(f"Scoring frame lacks {len(missing)} features, imputing training medians: {missing[:5]}")
+
+        nan_rows, nan_cols = np.nonzero(np.isnan(out))
+        out[nan_rows, nan_cols] = self._medians[nan_cols]
+        return out
+
+    def to_dict(self) -> dict:
+        return {
+            'format_version': FORMAT_VERSION,
+            'dtype': self.dtype,
+            'feature_names': self.feature_names,
+            'dtypes': self.dtypes,
+            'medians': self.medians,
+            'categories': self.categories,
+            'drop_columns': self.drop_columns,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'FeaturePreprocessor':
+        if state.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported preprocessor format: {state.get('format_version')}")
+        preprocessor = cls(dtype=state['dtype'])
+        preprocessor.feature_names = state['feature_names']
+        preprocessor.dtypes = state['dtypes']
+        preprocessor.medians = state['medians']
+        preprocessor.categories = state['categories']
+        preprocessor.drop_columns = state['drop_columns']
+        return preprocessor
+
+    def save(self, filepath: str):
+        """Save as JSON"""
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        with open(filepath, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Preprocessor saved to {filepath}")
+
+    @classmethod
+    def load(cls, filepath: str) -> 'FeaturePreprocessor':
+        with open(filepath) as f:
+            return cls.from_dict(json.load(f))
+
+
+def load_preprocessor(model_path: str) -> Optional[FeaturePreprocessor]:
+    """Preprocessor saved alongside a model, or None for models saved without one"""
+    path = preprocessor_path(model_path)
+    if not os.path.exists(path):
+        return None
+    preprocessor = FeaturePreprocessor.load(path)
+    logger.info(f"Preprocessor loaded from {path}")
+    return preprocessor
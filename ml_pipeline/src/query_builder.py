@@ -0,0 +1,159 @@
+"""
+Small typed SQL builder emitting bind-parameterized, canonical query text
+"""
+import hashlib
+import json
+import re
+from datetime import date, datetime
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*)*$')
+
+
+def validate_identifier(name: str) -> str:
+    """
+    Check that a table/column name is a plain SQL identifier
+
+    Raises:
+        ValueError: If the name could inject SQL
+    """
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+
+def canonical_value(value):
+    """
+    Normalize a bind value so logically equal filters bind identically
+
+    Dates and datetimes bind as ISO strings and numpy scalars as Python
+    scalars, which also keeps Streamlit cache keys stable.
+    """
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"Unsupported bind value type: {type(value).__name__}")
+
+
+class BoundQuery(NamedTuple):
+    """SQL text with qmark (?) placeholders and its bind parameters"""
+    sql: str
+    params: Tuple
+
+    @property
+    def cache_key(self) -> str:
+        """Stable hash of query text and bind values"""
+        payload = json.dumps([self.sql, list(self.params)], default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class QueryBuilder:
+    """
+    Build a single-table SELECT with bound filter values
+
+    Filter helpers ignore None values, so optional dashboard filters can be
+    passed straight through. WHERE conditions are emitted in sorted order,
+    making the SQL text independent of the order filters were added in.
+
+    Example:
+        query = (QueryBuilder('gold_fact_order_summary')
+                 .select('ORDER_ID', 'TOTAL_ORDER_VALUE')
+                 .where_gte('ORDER_PURCHASE_TIMESTAMP', start_date)
+                 .where_eq('ORDER_STATUS', status)
+                 .order_by('ORDER_PURCHASE_TIMESTAMP DESC')
+                 .build())
+        df = execute_query(conn, *query)
+    """
+
+    def __init__(self, table: str):
+        self.table = validate_identifier(table)
+        self._select: List[str] = []
+        self._where: List[Tuple[str, Tuple]] = []
+        self._group_by: List[str] = []
+        self._order_by: List[str] = []
+        self._limit: Optional[int] = None
+
+    def select(self, *expressions: str) -> 'QueryBuilder':
+        """Add select-list expressions (trusted SQL written in code, never user input)"""
+        self._select.extend(expressions)
+        return self
+
+    def where(self, condition: str, *params) -> 'QueryBuilder':
+        """Add a raw condition with ? placeholders for its params"""
+        if condition.count('?') != len(params):
+            raise ValueError(f"Condition has {condition.count('?')} placeholders but {len(params)} params")
+        self._where.append((condition, tuple(canonical_value(p) for p in params)))
+        return self
+
+    def _compare(self, column: str, op: str, value) -> 'QueryBuilder':
+        if value is None:
+            return self
+        return self.where(f"{validate_identifier(column)} {op} ?", value)
+
+    def where_eq(self, column: str, value) -> 'QueryBuilder':
+        return self._compare(column, '=', value)
+
+    def where_ne(self, column: str, value) -> 'QueryBuilder':
+        return self._compare(column, '!=', value)
+
+    def where_gte(self, column: str, value) -> 'QueryBuilder':
+        return self._compare(column, '>=', value)
+
+    def where_lte(self, column: str, value) -> 'QueryBuilder':
+        return self._compare(column, '<=', value)
+
+    def where_in(self, column: str, values: Optional[Iterable]) -> 'QueryBuilder':
+        """Add an IN filter; values are de-duplicated and sorted for canonical binds"""
+        if values is None:
+            return self
+        values = sorted({canonical_value(v) for v in values}, key=lambda v: (str(type(v)), v))
+        if not values:
+            return self.where('1 = 0')
+        placeholders = ', '.join('?' for _ in values)
+        return self.where(f"{validate_identifier(column)} IN ({placeholders})", *values)
+
+    def where_not_null(self, column: str) -> 'QueryBuilder':
+        return self.where(f"{validate_identifier(column)} IS NOT NULL")
+
+    def group_by(self, *expressions: str) -> 'QueryBuilder':
+        self._group_by.extend(expressions)
+        return self
+
+    def order_by(self, *expressions: str) -> 'QueryBuilder':
+        self._order_by.extend(expressions)
+        return self
+
+    def limit(self, n: Optional[int]) -> 'QueryBuilder':
+        if n is not None:
+            n = int(n)
+            if n < 0:
+                raise ValueError("limit must be non-negative")
+        self._limit = n
+        return self
+
+    def build(self) -> BoundQuery:
+        """Render canonical SQL text and the matching parameter tuple"""
+        select_list = ',\n    '.join(self._select) if self._select else '*'
+        lines = [f"SELECT\n    {select_list}", f"FROM {self.table}"]
+        params: List = []
+
+        # De-duplicate and sort conditions so equivalent builders render identically
+        conditions = sorted(set(self._where), key=lambda c: (c[0], json.dumps(c[1], default=str)))
+        for i, (condition, condition_params) in enumerate(conditions):
+            lines.append(f"{'WHERE' if i == 0 else '  AND'} {condition}")
+            params.extend(condition_params)
+
+        if self._group_by:
+            lines.append(f"GROUP BY {', '.join(self._group_by)}")
+        if self._order_by:
+            lines.append(f"ORDER BY {', '.join(self._order_by)}")
+        if self._limit is not None:
+            lines.append("LIMIT ?")
+            params.append(self._limit)
+
+        return BoundQuery('\n'.join(lines), tuple(params))
@@ -0,0 +1,253 @@
+"""
+Schema-driven dtype downcasting for gold-layer query results
+
+Connectors return NUMBER columns as int64/float64 and strings as object
+(or str) columns, which is several times the memory the values need. The
+dbt properties.yml declares each gold column's data_type; this module
+turns those declarations into pandas dtypes and applies them on ingest:
+
+- number(p,0) -> the smallest of int8/int16/int32/int64 holding p digits
+- number(p,s>0), float -> float32
+- meta.pandas_dtype overrides the mapping (e.g. category for low-cardinality
+  strings), meta.categories fixes the category order
+
+Values are range-checked before narrowing, so a column that outgrew its
+declaration is widened instead of wrapped. Integer columns holding nulls
+become float32 (or nullable Int* when the frame already uses nullable
+dtypes). Set DBT_PROPERTIES_PATH to read another properties file.
+"""
+import os
+import re
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROPERTIES_PATH = (Path(__file__).parent.parent.parent
+                           / 'aws_dbt_snowflake_project' / 'models' / 'properties.yml')
+
+# (max decimal digits, dtype), narrowest first
+_INT_WIDTHS = ((2, 'int8'), (4, 'int16'), (9, 'int32'), (18, 'int64'))
+_INT_DTYPES = [dtype for _, dtype in _INT_WIDTHS]
+_FLOAT_TYPES = {'float', 'float4', 'float8', 'double', 'double precision', 'real'}
+_NUMBER = re.compile(r'(?:number|numeric|decimal)\s*(?:\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\))?')
+
+
+def pandas_dtype(data_type: Optional[str], meta: Optional[dict] = None) -> Optional[str]:
+    """
+    Map a declared column type to a pandas dtype
+
+    Args:
+        data_type: dbt data_type, e.g. 'number(4,0)', 'float', 'varchar'
+        meta: Column meta; meta['pandas_dtype'] wins over data_type
+
+    Returns:
+        dtype name, or None to keep whatever the connector returned
+    """
+    if meta and meta.get('pandas_dtype'):
+        return str(meta['pandas_dtype'])
+    if not data_type:
+        return None
+    data_type = data_type.strip().lower()
+    if data_type in _FLOAT_TYPES:
+        return 'float32'
+    match = _NUMBER.fullmatch(data_type)
+    if match:
+        precision, scale = int(match.group(1) or 38), int(match.group(2) or 0)
+        if scale > 0:
+            return 'float32'
+        return next((dtype for digits, dtype in _INT_WIDTHS if precision <= digits), 'int64')
+    return None
+
+
+@lru_cache(maxsize=4)
+def load_schema(path: Optional[str] = None) -> Dict[str, Dict[str, dict]]:
+    """
+    Read the declared dtypes of every model in a dbt properties file
+
+    Args:
+        path: properties.yml (defaults to DBT_PROPERTIES_PATH, then the
+            project's models/properties.yml)
+
+    Returns:
+        Lower-case model name -> upper-case column name ->
+        {'dtype': ..., 'categories': [...] or None}; empty if the file (or
+        pyyaml) is missing
+    """
+    path = path or os.getenv('DBT_PROPERTIES_PATH') or str(DEFAULT_PROPERTIES_PATH)
+    try:
+        import yaml
+        with open(path) as f:
+            properties = yaml.safe_load(f) or {}
+    except (ImportError, OSError) as e:
+        logger.warning(f"Column dtypes unavailable, frames keep connector dtypes: {e}")
+        return {}
+
+    schema = {}
+    for model in properties.get('models') or []:
+        columns = {}
+        for column in model.get('columns') or []:
+            meta = column.get('meta') or {}
+            dtype = pandas_dtype(column.get('data_type'), meta)
+            if dtype is not None:
+                columns[column['name'].upper()] = {'dtype': dtype, 'categories': meta.get('categories')}
+        if columns:
+            schema[model['name'].lower()] = columns
+    return schema
+
+
+def model_dtypes(model: str, path: Optional[str] = None) -> Dict[str, str]:
+    """Upper-case column -> declared pandas dtype for one model"""
+    return {col: spec['dtype'] for col, spec in load_schema(path).get(model.lower(), {}).items()}
+
+
+def _fits(values: pd.Series, dtype: str) -> bool:
+    info = np.iinfo(dtype)
+    low, high = values.min(), values.max()
+    return pd.isna(low) or (low >= info.min and high <= info.max)
+
+
+def _downcast_integer(values: pd.Series, dtype: str) -> pd.Series:
+    nullable = isinstance(values.dtype, pd.api.extensions.ExtensionDtype)
+    current = getattr(values.dtype, 'numpy_dtype', values.dtype)
+    if current.kind in 'iu' and current.itemsize <= np.dtype(dtype).itemsize:
+        return values
+    if pd.api.types.is_float_dtype(values.dtype) and not nullable:
+        # Integer columns with nulls arrive as float64 from the numpy backend
+        finite = values.dropna()
+        if len(finite) < len(values) or not np.array_equal(finite, np.floor(finite)):
+            return values.astype('float32')
+
+    # Widen rather than wrap when the data outgrew the declaration
+    for candidate in _INT_DTYPES[_INT_DTYPES.index(dtype):]:
+        if _fits(values, candidate):
+            dtype = candidate
+            break
+    else:
+        return values
+    return values.astype(dtype.capitalize() if nullable else dtype)
+
+
+def _downcast_float(values: pd.Series) -> pd.Series:
+    if isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+        return values.astype('Float32')
+    return values.astype('float32')
+
+
+def _to_category(values: pd.Series, categories: Optional[list]) -> pd.Series:
+    if categories is None:
+        return values.astype('category')
+    # Unexpected values extend the declared categories instead of becoming NaN
+    extra = sorted(set(values.dropna().unique()) - set(categories))
+    if extra:
+        logger.debug(f"{values.name}: values outside declared categories {extra[:5]}")
+    return values.astype(pd.CategoricalDtype(list(categories) + extra))
+
+
+def downcast_frame(df: pd.DataFrame,
+                   model: str,
+                   aliases: Optional[Dict[str, str]] = None,
+                   stats: Optional[dict] = None,
+                   path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Narrow a query result to the dtypes declared for its model
+
+    Columns are matched case-insensitively; undeclared columns (and
+    columns already at their target dtype) are left alone, so applying
+    it twice is cheap.
+
+    Args:
+        df: Query result
+        model: dbt model the columns come from, e.g. 'gold_obt_orders'
+        aliases: Output column -> model column for columns renamed in the
+            SELECT (e.g. {'PRICE': 'TOTAL_ORDER_VALUE'})
+        stats: Optional dict filled with rows, bytes_before, bytes_after
+            and columns ({column: 'old -> new dtype'})
+        path: properties.yml to read (see load_schema)
+
+    Returns:
+        DataFrame with narrowed dtypes (df itself if nothing changed)
+    """
+    specs = load_schema(path).get(model.lower(), {})
+    aliases = {k.upper(): v.upper() for k, v in (aliases or {}).items()}
+    if stats is not None:
+        stats.update(rows=len(df), bytes_before=int(df.memory_usage(deep=True).sum()), columns={})
+
+    changed = {}
+    for col in df.columns:
+        spec = specs.get(aliases.get(str(col).upper(), str(col).upper()))
+        if spec is None or str(df[col].dtype) == spec['dtype']:
+            continue
+        values = df[col]
+        try:
+            if spec['dtype'] == 'category':
+                converted = _to_category(values, spec['categories'])
+            elif spec['dtype'] in _INT_DTYPES:
+                if not (pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)):
+                    continue
+                converted = _downcast_integer(values, spec['dtype'])
+            elif spec['dtype'] == 'float32':
+                if not pd.api.types.is_numeric_dtype(values) or str(values.dtype) in ('float32', 'Float32'):
+                    continue
+                converted = _downcast_float(values)
+            else:
+                converted = values.astype(spec['dtype'])
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Could not convert {col} to {spec['dtype']}: {e}")
+            continue
+        if converted.dtype != values.dtype:
+            changed[col] = (values.dtype, converted)
+
+    if changed:
+        df = df.copy(deep=False)
+        for col, (_, values) in changed.items():
+            df[col] = values
+    if stats is not None:
+        stats['bytes_after'] = int(df.memory_usage(deep=True).sum())
+        stats['columns'] = {col: f"{old} -> {values.dtype}" for col, (old, values) in changed.items()}
+    return df
+
+
+def format_report(stats: dict, label: str = '') -> str:
+    """One-line summary of a downcast_frame stats dict"""
+    before, after = stats.get('bytes_before', 0), stats.get('bytes_after', 0)
+    saved = 1 - after / before if before else 0.0
+    prefix = f"{label}: " if label else ''
+    return (f"{prefix}{stats.get('rows', 0):,} rows, {before / 1024 ** 2:.2f} MB -> "
+            f"{after / 1024 ** 2:.2f} MB ({saved:.0%} smaller, {len(stats.get('columns', {}))} columns narrowed)")
+
+
+if __name__ == "__main__":
+    # Memory before/after for each declared gold model on the configured backend
+    import argparse
+
+    from arrow_fetch import fetch_dataframe
+    from backends import get_backend
+    from query_builder import QueryBuilder
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Report memory saved by schema-driven downcasting")
+    parser.add_argument('--models', nargs='*', default=None, help='Models to report (default: all declared)')
+    parser.add_argument('--limit', type=int, default=None, help='Rows per model (default: all)')
+    parser.add_argument('--columns', action='store_true', help='Also list per-column dtype changes')
+    args = parser.parse_args()
+
+    backend = get_backend()
+    print(f"\n=== Downcast report: {backend.describe()} ===")
+    pool = backend.pool()
+    for model in args.models or list(load_schema()):
+        query = QueryBuilder(model).limit(args.limit).build()
+        with pool.connection() as conn:
+            frame = fetch_dataframe(conn, *query)
+        stats = {}
+        downcast_frame(frame, model, stats=stats)
+        print(format_report(stats, model))
+        if args.columns:
+            for col, change in stats['columns'].items():
+                print(f"    {col:<32} {change}")
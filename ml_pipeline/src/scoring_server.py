@@ -0,0 +1,380 @@
+"""
+Online scoring server for the delivery-delay and churn models
+
+A small asyncio HTTP/1.1 server (standard library only) for checkout-time
+scoring. Each model is loaded once at startup. Concurrent requests are
+micro-batched: the first request waits at most max_wait_ms for others to
+arrive, then the whole batch is scored with one vectorized predict_proba
+call on a dedicated thread, so the event loop keeps accepting connections
+while the model runs. Feature values that are not numbers are rejected
+with a 400 before a request joins a batch, and if a batch still fails its
+requests are re-scored one by one so only the failing one gets a 500.
+
+Endpoints:
+    POST /predict/<model>  {"records": [{feature: value, ...}, ...]}
+                           (a bare list or a single object also works)
+                        -> {"model": ..., "predictions": [{"probability", "prediction"}, ...]}
+    GET  /metrics          per-model p50/p99 latency, throughput and batch sizes
+    GET  /health           loaded models
+
+Usage:
+    python src/scoring_server.py --port 8080
+    python src/scoring_server.py --max-wait-ms 5 --max-batch-rows 512
+    curl -s localhost:8080/predict/delivery -d '{"records": [{"estimated_delivery_days": 12}]}'
+
+benchmarks/bench_scoring_server.py is a local load generator for it.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from predict import ModelPredictor, get_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS = {
+    'delivery': '../models/IS_DELAYED_xgboost_model.pkl',
+    'churn': '../models/churn_prediction_model.pkl',
+}
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+def numeric_records(predictor: ModelPredictor, records: List[dict]) -> List[dict]:
+    """
+    Check a request's feature values before it joins a batch
+
+    Numeric features accept numbers, booleans, null and numeric strings
+    (converted to float). With a saved preprocessor only its numeric
+    feature columns are checked (IDs and categorical columns pass through);
+    without one every value is, since the frame goes to the model as-is.
+
+    Raises:
+        ValueError: naming the first record and feature that is not a number
+    """
+    numeric = None
+    preprocessor = predictor.preprocessor
+    if preprocessor is not None:
+        numeric = {col.upper() for col in preprocessor.feature_names if col not in preprocessor.categories}
+    checked = []
+    for i, record in enumerate(records):
+        row = dict(record)
+        for key, value in record.items():
+            if value is None or isinstance(value, (bool, int, float)):
+                continue
+            if numeric is not None and str(key).upper() not in numeric:
+                continue
+            if isinstance(value, str):
+                try:
+                    row[key] = float(value)
+                    continue
+                except ValueError:
+                    pass
+            raise ValueError(f"records[{i}].{key}: expected a number, got {json.dumps(value)}")
+        checked.append(row)
+    return checked
+
+
+class LatencyStats:
+    """Sliding window of request latencies plus batch counters"""
+
+    def __init__(self, window: int = 10_000):
+        self.window = deque(maxlen=window)
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.batch_rows = 0
+        self.errors = 0
+
+    def record(self, seconds: float, rows: int):
+        self.window.append((time.perf_counter(), seconds))
+        self.requests += 1
+        self.rows += rows
+
+    def snapshot(self) -> dict:
+        """p50/p99 latency (ms) and requests/sec over the window"""
+        snapshot = {'requests': self.requests, 'rows': self.rows, 'errors': self.errors,
+                    'batches': self.batches,
+                    'mean_batch_rows': self.batch_rows / self.batches if self.batches else 0.0}
+        if self.window:
+            finished = np.fromiter((t for t, _ in self.window), dtype='float64')
+            latencies = np.fromiter((s for _, s in self.window), dtype='float64') * 1000
+            span = finished[-1] - (finished[0] - latencies[0] / 1000)
+            snapshot.update(p50_ms=float(np.percentile(latencies, 50)),
+                            p99_ms=float(np.percentile(latencies, 99)),
+                            max_ms=float(latencies.max()),
+                            requests_per_sec=len(latencies) / span if span > 0 else 0.0)
+        return snapshot
+
+
+class MicroBatcher:
+    """Coalesces concurrent scoring requests into one predict_proba call"""
+
+    def __init__(self, predictor: ModelPredictor, max_batch_rows: int = 512, max_wait_ms: float = 2.0):
+        """
+        Args:
+            predictor: Loaded model
+            max_batch_rows: Rows after which a batch is scored without waiting
+            max_wait_ms: Longest the first request of a batch waits for company
+        """
+        self.predictor = predictor
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.stats = LatencyStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scoring')
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    async def score(self, records: List[dict]) -> np.ndarray:
+        """Positive-class probability for each record"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((records, future))
+        return await future
+
+    def _predict(self, records: List[dict]) -> np.ndarray:
+        frame = pd.DataFrame.from_records(records).infer_objects()
+        for col in frame.columns[frame.isna().all()]:
+            frame[col] = frame[col].astype('float64')
+        return self.predictor.predict_proba(self.predictor.features(frame))[:, 1]
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while rows < self.max_batch_rows:
+            if self._queue.empty():
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self._queue.get_nowait()
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            records = [record for request, _ in batch for record in request]
+            try:
+                probabilities = await loop.run_in_executor(self._executor, self._predict, records)
+            except Exception as e:
+                logger.exception("Scoring failed")
+                if len(batch) == 1:
+                    if not batch[0][1].done():
+                        batch[0][1].set_exception(e)
+                    continue
+                # Score each request on its own so only the bad one fails
+                for request, future in batch:
+                    try:
+                        result = await loop.run_in_executor(self._executor, self._predict, request)
+                    except Exception as request_error:
+                        if not future.done():
+                            future.set_exception(request_error)
+                        continue
+                    self.stats.batches += 1
+                    self.stats.batch_rows += len(request)
+                    if not future.done():
+                        future.set_result(result)
+                continue
+            self.stats.batches += 1
+            self.stats.batch_rows += len(records)
+            offset = 0
+            for request, future in batch:
+                if not future.done():
+                    future.set_result(probabilities[offset:offset + len(request)])
+                offset += len(request)
+
+
+class ScoringServer:
+    """HTTP front end over one MicroBatcher per model"""
+
+    def __init__(self, models: Optional[Dict[str, str]] = None, threshold: float = 0.5,
+                 max_batch_rows: int = 512, max_wait_ms: float = 2.0):
+        """
+        Args:
+            models: Route name -> model .pkl (DEFAULT_MODELS if None); models
+                whose file is missing are skipped with a warning
+            threshold: Probability at which prediction is 1
+            max_batch_rows: See MicroBatcher
+            max_wait_ms: See MicroBatcher
+        """
+        self.threshold = threshold
+        self.batchers: Dict[str, MicroBatcher] = {}
+        for name, path in (models or DEFAULT_MODELS).items():
+            if not os.path.exists(path):
+                logger.warning(f"Model '{name}' not found at {path}; /predict/{name} disabled")
+                continue
+            self.batchers[name] = MicroBatcher(get_registry().get(path), max_batch_rows, max_wait_ms)
+        if not self.batchers:
+            raise FileNotFoundError("No models to serve")
+        self._server = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080):
+        for batcher in self.batchers.values():
+            batcher.start()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"Serving {', '.join(self.batchers)} on http://{host}:{port}")
+        return self._server
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for batcher in self.batchers.values():
+            await batcher.stop()
+
+    def metrics(self) -> dict:
+        return {name: batcher.stats.snapshot() for name, batcher in self.batchers.items()}
+
+    async def _predict(self, name: str, body: bytes):
+        try:
+            payload = json.loads(body or b'null')
+        except ValueError as e:
+            return 400, {'error': f"Invalid JSON: {e}"}
+        records = payload.get('records') if isinstance(payload, dict) and 'records' in payload else payload
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+            return 400, {'error': "Expected {'records': [{feature: value, ...}, ...]}"}
+
+        batcher = self.batchers[name]
+        try:
+            records = numeric_records(batcher.predictor, records)
+        except ValueError as e:
+            batcher.stats.errors += 1
+            return 400, {'error': str(e)}
+        started = time.perf_counter()
+        try:
+            probabilities = await batcher.score(records)
+        except Exception as e:
+            batcher.stats.errors += 1
+            return 500, {'error': str(e)}
+        batcher.stats.record(time.perf_counter() - started, len(records))
+        return 200, {'model': name, 'predictions': [
+            {'probability': float(p), 'prediction': int(p >= self.threshold)} for p in probabilities
+        ]}
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        path = path.split('?', 1)[0].rstrip('/')
+        if path == '/health':
+            return 200, {'status': 'ok', 'models': list(self.batchers)}
+        if path == '/metrics':
+            return 200, self.metrics()
+        if path.startswith('/predict/'):
+            name = path[len('/predict/'):]
+            if name not in self.batchers:
+                return 404, {'error': f"Unknown model '{name}'. Available: {', '.join(self.batchers)}"}
+            if method != 'POST':
+                return 405, {'error': 'Use POST'}
+            return await self._predict(name, body)
+        return 404, {'error': f"No route for {path}"}
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        data = json.dumps(payload).encode()
+        response = [f"HTTP/1.1 {status} {REASONS[status]}", "Content-Type: application/json",
+                    f"Content-Length: {len(data)}"]
+        if not keep_alive:
+            response.append("Connection: close")
+        writer.write(('\r\n'.join(response) + '\r\n\r\n').encode() + data)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # HTTP/1.1 with keep-alive; one request at a time per connection.
+        # Malformed framing gets a 400 and the connection is closed, since
+        # the start of the next request cannot be found.
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+                try:
+                    method, path, version = request_line.split(' ', 2)
+                except ValueError:
+                    await self._respond(writer, 400, {'error': f"Malformed request line: {request_line!r}"}, False)
+                    break
+                headers = {}
+                for line in header_lines:
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {'error': f"Invalid Content-Length: "
+                                                               f"{headers.get('content-length')!r}"}, False)
+                    break
+                body = await reader.readexactly(length)
+
+                status, payload = await self._dispatch(method.upper(), path, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(models: Optional[Dict[str, str]] = None, host: str = '127.0.0.1', port: int = 8080,
+                **options):
+    """Run a ScoringServer until cancelled"""
+    server = ScoringServer(models, **options)
+    listener = await server.start(host, port)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Serve the delivery-delay and churn models over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--delivery-model', default=DEFAULT_MODELS['delivery'])
+    parser.add_argument('--churn-model', default=DEFAULT_MODELS['churn'])
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--max-batch-rows', type=int, default=512)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0,
+                        help='How long a request may wait for others to share its batch')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve({'delivery': args.delivery_model, 'churn': args.churn_model},
+                          host=args.host, port=args.port, threshold=args.threshold,
+                          max_batch_rows=args.max_batch_rows, max_wait_ms=args.max_wait_ms))
+    except KeyboardInterrupt:
+        print("\n✅ Server stopped")
@@ -0,0 +1,948 @@
+"""
+Synthetic Olist-shaped data for offline development and benchmarking
+
+Generates the nine bronze source tables of models/sources/sources.yml
+(orders, items, payments, reviews, customers, sellers, products,
+geolocation, category translations) with the volumes and rough
+distributions of the Brazilian E-Commerce dataset at any scale factor,
+and derives the gold models the dashboard and ML pipeline read
+(gold_fact_order_summary, gold_obt_orders, gold_obt_orders_ml_export,
+fs_customer_features, gold_agg_sales_daily) with SQL mirroring the dbt
+silver and gold models.
+
+Every value is a hash of (row number, stream, seed) evaluated inside
+DuckDB, so a given (scale, seed) always yields the same data regardless of
+threading or chunking, and any slice of orders can be generated on its own.
+That lets write_bronze_parquet stream 10M+ orders to partitioned parquet
+one chunk at a time in bounded memory.
+"""
+import json
+import time
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Row counts of the public Olist dataset (scale factor 1)
+BASE_ORDERS = 99_441
+BASE_CUSTOMERS = 96_096
+BASE_PRODUCTS = 32_951
+BASE_SELLERS = 3_095
+BASE_GEOLOCATION = 1_000_163
+BASE_ZIP_PREFIXES = 19_015
+
+FIRST_PURCHASE = '2016-09-04'
+PURCHASE_SPAN_DAYS = 775
+
+# Source tables, in models/sources/sources.yml order
+BRONZE_TABLES = [
+    'olist_customers',
+    'olist_geolocation',
+    'olist_orders',
+    'olist_order_items',
+    'olist_order_payments',
+    'olist_order_reviews',
+    'olist_products',
+    'olist_sellers',
+    'product_category_name_translation',
+]
+
+GOLD_TABLES = [
+    'gold_fact_order_summary',
+    'gold_obt_orders',
+    'gold_obt_orders_ml_export',
+    'fs_customer_features',
+    'gold_agg_sales_daily',
+]
+
+# (Portuguese name, English translation) as in product_category_name_translation
+CATEGORIES = [
+    ('cama_mesa_banho', 'bed_bath_table'),
+    ('beleza_saude', 'health_beauty'),
+    ('esporte_lazer', 'sports_leisure'),
+    ('moveis_decoracao', 'furniture_decor'),
+    ('informatica_acessorios', 'computers_accessories'),
+    ('utilidades_domesticas', 'housewares'),
+    ('relogios_presentes', 'watches_gifts'),
+    ('telefonia', 'telephony'),
+    ('ferramentas_jardim', 'garden_tools'),
+    ('automotivo', 'auto'),
+    ('brinquedos', 'toys'),
+    ('cool_stuff', 'cool_stuff'),
+    ('perfumaria', 'perfumery'),
+    ('bebes', 'baby'),
+    ('eletronicos', 'electronics'),
+    ('papelaria', 'stationery'),
+    ('fashion_bolsas_e_acessorios', 'fashion_bags_accessories'),
+    ('pet_shop', 'pet_shop'),
+    ('moveis_escritorio', 'office_furniture'),
+    ('consoles_games', 'consoles_games'),
+]
+
+# States repeated roughly in proportion to their share of Olist zip codes
+STATES = ['SP'] * 8 + ['RJ'] * 2 + ['MG'] * 2 + [
+    'RS', 'PR', 'SC', 'BA', 'DF', 'ES', 'GO', 'PE', 'CE', 'PA', 'MT', 'MA'
+]
+# Approximate centre of each state, for geolocation coordinates
+STATE_CENTERS = {
+    'SP': (-23.5, -46.6), 'RJ': (-22.9, -43.2), 'MG': (-19.9, -43.9), 'RS': (-30.0, -51.2),
+    'PR': (-25.4, -49.3), 'SC': (-27.6, -48.5), 'BA': (-12.9, -38.5), 'DF': (-15.8, -47.9),
+    'ES': (-20.3, -40.3), 'GO': (-16.7, -49.3), 'PE': (-8.1, -34.9), 'CE': (-3.7, -38.5),
+    'PA': (-1.5, -48.5), 'MT': (-15.6, -56.1), 'MA': (-2.5, -44.3),
+}
+
+REVIEW_TITLES = ['recomendo', 'otimo', 'bom', 'produto bom', 'nao recebi', 'pessimo', 'super recomendo']
+REVIEW_MESSAGES = [
+    'produto chegou antes do prazo', 'muito bom, recomendo', 'entrega rapida',
+    'ainda nao recebi o produto', 'produto diferente do anunciado', 'otima qualidade',
+]
+
+
+def _pick(values: list, u: str) -> str:
+    """SQL expression choosing one of values with the uniform expression u"""
+    quoted = ', '.join("'" + str(v).replace("'", "''") + "'" for v in values)
+    return f"[{quoted}][1 + floor({u} * {len(values)})::INT]"
+
+
+def scaled_counts(scale: float) -> dict:
+    """Entity counts for a scale factor (1.0 = the public Olist dataset)"""
+    return {
+        'orders': max(int(BASE_ORDERS * scale), 1),
+        'customers': max(int(BASE_CUSTOMERS * scale), 1),
+        'products': max(int(BASE_PRODUCTS * scale), 1),
+        'sellers': max(int(BASE_SELLERS * scale), 1),
+        'geolocation': max(int(BASE_GEOLOCATION * scale), 1),
+        # Five-digit prefixes cap the number of distinct zip codes
+        'zip_prefixes': min(max(int(BASE_ZIP_PREFIXES * scale), 1), 99_999),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Bronze generators
+#
+# Each function returns a SELECT producing one raw-shaped source table for
+# a half-open range of row numbers. Order-grain tables are generated from
+# an orders relation holding the same range, so a chunk of orders always
+# carries all of its items, payments and reviews.
+# ---------------------------------------------------------------------------
+def _install_macros(conn, counts: dict, seed: int):
+    """Deterministic per-row randoms and zip-code attributes (temp macros)"""
+    # Uniform [0, 1) from (row, stream); independent of threading and chunking
+    conn.execute(f"CREATE OR REPLACE TEMP MACRO _u(i, k) AS (hash(i, k, {int(seed)}) % 1000003) / 1000003.0")
+    conn.execute("CREATE OR REPLACE TEMP MACRO _zip_city(z) AS 'city_' || (z % 400)")
+    conn.execute(f"CREATE OR REPLACE TEMP MACRO _zip_state(z) AS {_pick(STATES, '_u(z % 400, 0)')}")
+    conn.execute(f"CREATE OR REPLACE TEMP MACRO _zip(i, k) AS floor(_u(i, k) * {counts['zip_prefixes']})::INT")
+
+
+def _customers_sql(counts: dict, start: int, stop: int) -> str:
+    return f"""
+        SELECT
+            md5('customer' || range) AS customer_id,
+            md5('unique' || range) AS customer_unique_id,
+            lpad(_zip(range, 1)::VARCHAR, 5, '0') AS customer_zip_code_prefix,
+            _zip_city(_zip(range, 1)) AS customer_city,
+            _zip_state(_zip(range, 1)) AS customer_state,
+            TIMESTAMP '{FIRST_PURCHASE}' AS created_at
+        FROM range({start}, {stop})
+    """
+
+
+def _sellers_sql(counts: dict, start: int, stop: int) -> str:
+    return f"""
+        SELECT
+            md5('seller' || range) AS seller_id,
+            lpad(_zip(range, 4)::VARCHAR, 5, '0') AS seller_zip_code_prefix,
+            _zip_city(_zip(range, 4)) AS seller_city,
+            -- Sellers are concentrated in SP
+            CASE WHEN _u(range, 5) < 0.6 THEN 'SP' ELSE _zip_state(_zip(range, 4)) END AS seller_state,
+            TIMESTAMP '{FIRST_PURCHASE}' AS created_at
+        FROM range({start}, {stop})
+    """
+
+
+def _products_sql(counts: dict, start: int, stop: int) -> str:
+    category = f"floor(_u(range, 6) * {len(CATEGORIES)})::INT + 1"
+    return f"""
+        SELECT
+            md5('product' || range) AS product_id,
+            CASE WHEN _u(range, 7) < 0.015 THEN NULL
+                 ELSE {[pt for pt, _ in CATEGORIES]}[{category}] END AS product_category_name,
+            CASE WHEN _u(range, 7) < 0.015 THEN NULL ELSE (5 + _u(range, 14) * 60)::INT END AS product_name_lenght,
+            CASE WHEN _u(range, 7) < 0.015 THEN NULL ELSE (50 + pow(_u(range, 15), 2) * 3000)::INT END AS product_description_lenght,
+            CASE WHEN _u(range, 7) < 0.015 THEN NULL ELSE 1 + floor(pow(_u(range, 13), 2) * 6)::INT END AS product_photos_qty,
+            CASE WHEN _u(range, 8) < 0.001 THEN NULL ELSE (50 + pow(_u(range, 9), 2) * 5000)::INT END AS product_weight_g,
+            CASE WHEN _u(range, 8) < 0.001 THEN NULL ELSE (10 + _u(range, 10) * 60)::INT END AS product_length_cm,
+            CASE WHEN _u(range, 8) < 0.001 THEN NULL ELSE (2 + _u(range, 11) * 40)::INT END AS product_height_cm,
+            CASE WHEN _u(range, 8) < 0.001 THEN NULL ELSE (8 + _u(range, 12) * 50)::INT END AS product_width_cm,
+            TIMESTAMP '{FIRST_PURCHASE}' AS created_at
+        FROM range({start}, {stop})
+    """
+
+
+def _geolocation_sql(counts: dict, start: int, stop: int) -> str:
+    centers = [STATE_CENTERS[state] for state in STATES]
+    state_index = f"1 + floor(_u(z % 400, 0) * {len(STATES)})::INT"
+    return f"""
+        WITH rows AS (
+            -- Every prefix appears at least once; the rest repeat random prefixes
+            SELECT range AS i,
+                   CASE WHEN range < {counts['zip_prefixes']} THEN range::INT ELSE _zip(range, 60) END AS z
+            FROM range({start}, {stop})
+        )
+        SELECT
+            lpad(z::VARCHAR, 5, '0') AS geolocation_zip_code_prefix,
+            round({[c[0] for c in centers]}[{state_index}] + (_u(z, 61) - 0.5) * 2
+                  + (_u(i, 62) - 0.5) * 0.05, 6) AS geolocation_lat,
+            round({[c[1] for c in centers]}[{state_index}] + (_u(z, 63) - 0.5) * 2
+                  + (_u(i, 64) - 0.5) * 0.05, 6) AS geolocation_lng,
+            _zip_city(z) AS geolocation_city,
+            _zip_state(z) AS geolocation_state,
+            TIMESTAMP '{FIRST_PURCHASE}' AS created_at
+        FROM rows
+    """
+
+
+def _translation_sql() -> str:
+    values = ', '.join(f"('{pt}', '{en}')" for pt, en in CATEGORIES)
+    return f"""
+        SELECT product_category_name, product_category_name_english,
+               TIMESTAMP '{FIRST_PURCHASE}' AS created_at
+        FROM (VALUES {values}) AS t(product_category_name, product_category_name_english)
+    """
+
+
+def _orders_sql(counts: dict, start: int, stop: int) -> str:
+    """Raw orders plus generator-only columns (i, n_items) used by the order-grain tables"""
+    # Order volume grows over time (sqrt skew). Most orders come from a
+    # one-time customer; ~8% are repeat purchases skewed towards low customer
+    # numbers so a few customers reach the LOYAL segment
+    return f"""
+        WITH base AS (
+            SELECT
+                range AS i,
+                md5('order' || range) AS order_id,
+                md5('customer' || CASE WHEN _u(range, 19) < 0.08
+                                       THEN floor({counts['customers']} * pow(_u(range, 20), 3))::BIGINT
+                                       ELSE range % {counts['customers']} END) AS customer_id,
+                CASE WHEN _u(range, 21) < 0.970 THEN 'delivered'
+                     WHEN _u(range, 21) < 0.981 THEN 'shipped'
+                     WHEN _u(range, 21) < 0.987 THEN 'canceled'
+                     WHEN _u(range, 21) < 0.993 THEN 'unavailable'
+                     WHEN _u(range, 21) < 0.996 THEN 'invoiced'
+                     ELSE 'processing' END AS order_status,
+                TIMESTAMP '{FIRST_PURCHASE}'
+                    + to_seconds(floor(sqrt(_u(range, 22)) * {PURCHASE_SPAN_DAYS} * 86400)::BIGINT) AS order_purchase_timestamp,
+                12 + floor(_u(range, 23) * 36)::INT AS estimated_days,
+                least(1 + floor(-ln(1 - _u(range, 24)) * 10)::INT, 200) AS delivered_days,
+                1 + floor(_u(range, 25) * 48)::INT AS approval_hours,
+                1 + (_u(range, 26) < 0.10)::INT + (_u(range, 26) < 0.03)::INT + (_u(range, 26) < 0.01)::INT AS n_items
+            FROM range({start}, {stop})
+        )
+        SELECT
+            i,
+            n_items,
+            order_id,
+            customer_id,
+            order_status,
+            order_purchase_timestamp,
+            order_purchase_timestamp + to_hours(approval_hours) AS order_approved_at,
+            CASE WHEN order_status IN ('delivered', 'shipped')
+                 THEN order_purchase_timestamp + to_hours(approval_hours + 24) END AS order_delivered_carrier_date,
+            CASE WHEN order_status = 'delivered'
+                 THEN order_purchase_timestamp + to_days(delivered_days) END AS order_delivered_customer_date,
+            CAST(CAST(order_purchase_timestamp AS DATE) + estimated_days AS TIMESTAMP) AS order_estimated_delivery_date,
+            -- Landed in staging the day after purchase
+            order_purchase_timestamp + INTERVAL 1 DAY AS created_at
+        FROM base
+    """
+
+
+def _items_sql(counts: dict, orders: str) -> str:
+    item = "i * 8 + k"
+    return f"""
+        WITH exploded AS (
+            SELECT i, order_id, order_approved_at, created_at, unnest(range(n_items)) AS k FROM {orders}
+        )
+        SELECT
+            order_id,
+            k + 1 AS order_item_id,
+            md5('product' || floor({counts['products']} * pow(_u({item}, 30), 2))::BIGINT) AS product_id,
+            md5('seller' || floor({counts['sellers']} * pow(_u({item}, 31), 2))::BIGINT) AS seller_id,
+            order_approved_at + INTERVAL 6 DAY AS shipping_limit_date,
+            round(exp(2.3 + 4.2 * pow(_u({item}, 32), 1.4)), 2) AS price,
+            round(5 + _u({item}, 33) * 30, 2) AS freight_value,
+            created_at
+        FROM exploded
+    """
+
+
+def _payments_sql(orders: str, items: str) -> str:
+    # One payment per order, ~3% split with a voucher; the payments cover
+    # the order total exactly
+    return f"""
+        WITH totals AS (
+            SELECT o.i, o.order_id, o.created_at, COALESCE(SUM(it.price + it.freight_value), 0) AS order_total
+            FROM {orders} o
+            LEFT JOIN {items} it ON o.order_id = it.order_id
+            GROUP BY o.i, o.order_id, o.created_at
+        ),
+        first_payment AS (
+            SELECT
+                *,
+                _u(i, 40) < 0.03 AS split,
+                CASE WHEN _u(i, 41) < 0.74 THEN 'credit_card'
+                     WHEN _u(i, 41) < 0.935 THEN 'boleto'
+                     WHEN _u(i, 41) < 0.985 THEN 'voucher'
+                     ELSE 'debit_card' END AS payment_type
+            FROM totals
+        )
+        SELECT
+            order_id,
+            1 AS payment_sequential,
+            payment_type,
+            CASE WHEN payment_type = 'credit_card' THEN 1 + floor(pow(_u(i, 42), 2) * 10)::INT ELSE 1 END AS payment_installments,
+            CASE WHEN split THEN round(order_total * 0.7, 2) ELSE round(order_total, 2) END AS payment_value,
+            created_at
+        FROM first_payment
+        UNION ALL
+        SELECT
+            order_id,
+            2 AS payment_sequential,
+            'voucher' AS payment_type,
+            1 AS payment_installments,
+            round(order_total, 2) - round(order_total * 0.7, 2) AS payment_value,
+            created_at
+        FROM first_payment
+        WHERE split
+    """
+
+
+def _reviews_sql(orders: str) -> str:
+    # ~99% of orders are reviewed; late deliveries skew towards low scores
+    return f"""
+        WITH scored AS (
+            SELECT
+                i,
+                order_id,
+                COALESCE(order_delivered_customer_date, order_estimated_delivery_date) AS reviewed_after,
+                created_at,
+                _u(i, 50) * CASE WHEN order_delivered_customer_date > order_estimated_delivery_date
+                                 THEN 0.45 ELSE 1.0 END AS u
+            FROM {orders}
+            WHERE _u(i, 51) < 0.99
+        )
+        SELECT
+            md5('review' || i) AS review_id,
+            order_id,
+            CASE WHEN u < 0.115 THEN 1 WHEN u < 0.147 THEN 2 WHEN u < 0.229 THEN 3
+                 WHEN u < 0.422 THEN 4 ELSE 5 END AS review_score,
+            CASE WHEN _u(i, 52) < 0.12 THEN {_pick(REVIEW_TITLES, '_u(i, 53)')} END AS review_comment_title,
+            CASE WHEN _u(i, 52) < 0.41 THEN {_pick(REVIEW_MESSAGES, '_u(i, 54)')} END AS review_comment_message,
+            CAST(reviewed_after AS DATE) + 1 AS review_creation_date,
+            reviewed_after + to_hours(24 + floor(_u(i, 55) * 72)::INT) AS review_answer_timestamp,
+            created_at
+        FROM scored
+    """
+
+
+def _create_bronze_tables(conn, counts: dict, seed: int):
+    """Generate every bronze table in full as temp tables named bronze_<source table>"""
+    _install_macros(conn, counts, seed)
+    dimensions = {
+        'olist_customers': _customers_sql(counts, 0, counts['customers']),
+        'olist_sellers': _sellers_sql(counts, 0, counts['sellers']),
+        'olist_products': _products_sql(counts, 0, counts['products']),
+        'olist_geolocation': _geolocation_sql(counts, 0, counts['geolocation']),
+        'product_category_name_translation': _translation_sql(),
+    }
+    for table, sql in dimensions.items():
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE bronze_{table} AS {sql}")
+
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE _gen_orders AS {_orders_sql(counts, 0, counts['orders'])}")
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE bronze_olist_order_items AS {_items_sql(counts, '_gen_orders')}")
+    conn.execute("CREATE OR REPLACE TEMP TABLE bronze_olist_order_payments AS "
+                 f"{_payments_sql('_gen_orders', 'bronze_olist_order_items')}")
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE bronze_olist_order_reviews AS {_reviews_sql('_gen_orders')}")
+    conn.execute("CREATE OR REPLACE TEMP TABLE bronze_olist_orders AS SELECT * EXCLUDE (i, n_items) FROM _gen_orders")
+    conn.execute("DROP TABLE _gen_orders")
+
+
+def _register_bronze_parquet(conn, bronze_dir: str):
+    """Expose a write_bronze_parquet directory as temp views named bronze_<source table>"""
+    root = Path(bronze_dir)
+    for table in BRONZE_TABLES:
+        pattern = str(root / table / '*.parquet')
+        conn.execute(f"CREATE OR REPLACE TEMP VIEW bronze_{table} AS SELECT * FROM read_parquet('{pattern}')")
+
+
+def write_bronze_parquet(output_dir: str,
+                         scale: float = 1.0,
+                         seed: int = 42,
+                         chunk_rows: int = 1_000_000,
+                         memory_limit: str = '1GB',
+                         compression: str = 'zstd') -> dict:
+    """
+    Stream the bronze source tables to partitioned parquet
+
+    Layout: <output_dir>/<source table>/part-<chunk>.parquet plus
+    _metadata.json. Each chunk of chunk_rows rows (orders, for the
+    order-grain tables) is generated and written on its own, so peak memory
+    is bounded by the chunk size and memory_limit rather than the scale.
+
+    Args:
+        output_dir: Directory to write (existing part files are replaced)
+        scale: Scale factor; 1.0 matches the public Olist row counts
+        seed: Seed for the deterministic generators
+        chunk_rows: Rows (orders) per part file
+        memory_limit: DuckDB memory limit for the generating connection
+        compression: Parquet compression codec
+
+    Returns:
+        Source table -> rows written
+    """
+    import duckdb
+
+    counts = scaled_counts(scale)
+    root = Path(output_dir)
+    conn = duckdb.connect()
+    conn.execute(f"SET memory_limit = '{memory_limit}'")
+    conn.execute("SET preserve_insertion_order = false")
+    _install_macros(conn, counts, seed)
+    started = time.perf_counter()
+    rows = {table: 0 for table in BRONZE_TABLES}
+
+    for table in BRONZE_TABLES:
+        (root / table).mkdir(parents=True, exist_ok=True)
+        for old in (root / table).glob('part-*.parquet'):
+            old.unlink()
+
+    def copy(table: str, sql: str, part: int):
+        path = root / table / f"part-{part:05d}.parquet"
+        conn.execute(f"COPY ({sql}) TO '{path}' (FORMAT PARQUET, COMPRESSION {compression})")
+        rows[table] += conn.execute(f"SELECT COUNT(*) FROM read_parquet('{path}')").fetchone()[0]
+
+    dimensions = [
+        ('olist_customers', _customers_sql, counts['customers']),
+        ('olist_sellers', _sellers_sql, counts['sellers']),
+        ('olist_products', _products_sql, counts['products']),
+        ('olist_geolocation', _geolocation_sql, counts['geolocation']),
+    ]
+    for table, sql, total in dimensions:
+        for part, start in enumerate(range(0, total, chunk_rows)):
+            copy(table, sql(counts, start, min(start + chunk_rows, total)), part)
+    copy('product_category_name_translation', _translation_sql(), 0)
+
+    for part, start in enumerate(range(0, counts['orders'], chunk_rows)):
+        stop = min(start + chunk_rows, counts['orders'])
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE _chunk_orders AS {_orders_sql(counts, start, stop)}")
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE _chunk_items AS {_items_sql(counts, '_chunk_orders')}")
+        copy('olist_orders', "SELECT * EXCLUDE (i, n_items) FROM _chunk_orders", part)
+        copy('olist_order_items', "SELECT * FROM _chunk_items", part)
+        copy('olist_order_payments', _payments_sql('_chunk_orders', '_chunk_items'), part)
+        copy('olist_order_reviews', _reviews_sql('_chunk_orders'), part)
+        conn.execute("DROP TABLE _chunk_orders")
+        conn.execute("DROP TABLE _chunk_items")
+        logger.info(f"Wrote orders {start:,}-{stop:,} of {counts['orders']:,}")
+
+    conn.close()
+    metadata = {
+        'scale': float(scale),
+        'seed': int(seed),
+        'chunk_rows': chunk_rows,
+        'rows': rows,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+    (root / '_metadata.json').write_text(json.dumps(metadata, indent=2))
+    logger.info(f"Wrote bronze tables to {root} in {time.perf_counter() - started:.1f}s: "
+                + ', '.join(f"{table}={n:,}" for table, n in rows.items()))
+    return rows
+
+
+def read_bronze_metadata(bronze_dir: str) -> dict:
+    """Scale, seed and row counts recorded by write_bronze_parquet ({} if missing)"""
+    path = Path(bronze_dir) / '_metadata.json'
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+# ---------------------------------------------------------------------------
+# Silver and gold (mirrors models/silver and models/gold)
+# ---------------------------------------------------------------------------
+def _create_silver_tables(conn):
+    """Apply the silver-layer cleaning to the bronze_* relations"""
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE silver_customers AS
+        SELECT customer_id, customer_unique_id,
+               TRIM(UPPER(customer_zip_code_prefix)) AS customer_zip_code_prefix,
+               TRIM(UPPER(customer_city)) AS customer_city,
+               TRIM(UPPER(customer_state)) AS customer_state
+        FROM bronze_olist_customers
+    """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE silver_sellers AS
+        SELECT seller_id,
+               TRIM(UPPER(seller_city)) AS seller_city,
+               TRIM(UPPER(seller_state)) AS seller_state
+        FROM bronze_olist_sellers
+    """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE silver_products AS
+        SELECT
+            p.product_id,
+            COALESCE(NULLIF(TRIM(p.product_category_name), ''), 'UNKNOWN_CATEGORY') AS product_category_name,
+            COALESCE(NULLIF(TRIM(t.product_category_name_english), ''), 'UNKNOWN') AS product_category_english,
+            COALESCE(p.product_photos_qty, 0) AS product_photos_qty,
+            COALESCE(p.product_weight_g, 0) AS product_weight_g,
+            COALESCE(p.product_length_cm, 0) AS product_length_cm,
+            COALESCE(p.product_height_cm, 0) AS product_height_cm,
+            COALESCE(p.product_width_cm, 0) AS product_width_cm,
+            COALESCE(p.product_length_cm, 0) * COALESCE(p.product_height_cm, 0)
+                * COALESCE(p.product_width_cm, 0) AS product_volume_cm3
+        FROM bronze_olist_products p
+        LEFT JOIN bronze_product_category_name_translation t
+            ON p.product_category_name = t.product_category_name
+    """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE silver_orders AS
+        SELECT
+            md5('order_key' || order_id) AS order_key,
+            order_id,
+            customer_id,
+            COALESCE(NULLIF(TRIM(order_status), ''), 'UNKNOWN') AS order_status,
+            order_purchase_timestamp,
+            order_approved_at,
+            order_delivered_carrier_date,
+            order_delivered_customer_date,
+            order_estimated_delivery_date,
+            date_diff('day', order_purchase_timestamp, order_delivered_customer_date) AS actual_delivery_days,
+            date_diff('day', order_purchase_timestamp, order_estimated_delivery_date) AS estimated_delivery_days,
+            COALESCE(order_delivered_customer_date > order_estimated_delivery_date, FALSE) AS is_late_delivery,
+            strftime(order_purchase_timestamp, '%Y%m%d')::INTEGER AS order_date_key
+        FROM bronze_olist_orders
+    """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE silver_order_items AS
+        SELECT order_id, order_item_id, product_id, seller_id, price, freight_value,
+               price + freight_value AS total_item_value
+        FROM bronze_olist_order_items
+    """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE silver_payments AS
+        SELECT order_id, payment_sequential, TRIM(UPPER(payment_type)) AS payment_type,
+               payment_installments, payment_value
+        FROM bronze_olist_order_payments
+    """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE silver_reviews AS
+        SELECT
+            order_id,
+            review_score,
+            CASE WHEN review_score >= 4 THEN 'POSITIVE'
+                 WHEN review_score = 3 THEN 'NEUTRAL'
+                 ELSE 'NEGATIVE' END AS review_sentiment,
+            COALESCE(TRIM(review_comment_message) != '', FALSE) AS has_comment
+        FROM bronze_olist_order_reviews
+    """)
+
+
+def _create_gold_tables(conn, run_timestamp: str):
+    """Derive the gold models from the silver tables (mirrors models/gold)"""
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE _order_items_agg AS
+        SELECT
+            order_id,
+            COUNT(DISTINCT product_id) AS total_unique_products,
+            COUNT(order_item_id) AS total_items,
+            SUM(price) AS total_product_value,
+            SUM(freight_value) AS total_freight_value,
+            SUM(total_item_value) AS total_order_value
+        FROM silver_order_items
+        GROUP BY order_id
+    """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE _order_payments_agg AS
+        SELECT
+            order_id,
+            SUM(payment_value) AS total_payment_value,
+            MAX(payment_installments) AS max_installments,
+            AVG(payment_installments) AS avg_installments,
+            COUNT(DISTINCT payment_type) AS payment_types_count,
+            string_agg(DISTINCT payment_type, ', ' ORDER BY payment_type) AS payment_types,
+            MAX(CASE WHEN payment_type = 'CREDIT_CARD' THEN 1 ELSE 0 END) AS payment_credit_card,
+            MAX(CASE WHEN payment_type = 'BOLETO' THEN 1 ELSE 0 END) AS payment_boleto,
+            MAX(CASE WHEN payment_type = 'VOUCHER' THEN 1 ELSE 0 END) AS payment_voucher,
+            MAX(CASE WHEN payment_type = 'DEBIT_CARD' THEN 1 ELSE 0 END) AS payment_debit_card
+        FROM silver_payments
+        GROUP BY order_id
+    """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE _order_reviews AS
+        SELECT order_id, MAX(review_score) AS review_score, MAX(review_sentiment) AS review_sentiment,
+               MAX(has_comment) AS has_comment
+        FROM silver_reviews
+        GROUP BY order_id
+    """)
+
+    # models/gold/facts/gold_fact_order_summary.sql (one row per order)
+    conn.execute("""
+        CREATE OR REPLACE TABLE gold_fact_order_summary AS
+        SELECT
+            o.order_id,
+            o.customer_id,
+            o.order_status,
+            o.order_purchase_timestamp,
+            o.order_date_key,
+            o.actual_delivery_days,
+            o.is_late_delivery,
+            COALESCE(i.total_unique_products, 0) AS total_unique_products,
+            COALESCE(i.total_items, 0) AS total_items,
+            i.total_product_value,
+            i.total_freight_value,
+            i.total_order_value,
+            p.total_payment_value,
+            p.max_installments,
+            p.payment_types AS payment_types_used,
+            r.review_score,
+            r.review_sentiment,
+            r.has_comment AS has_review_comment,
+            CURRENT_TIMESTAMP AS dw_created_at
+        FROM silver_orders o
+        LEFT JOIN _order_items_agg i ON o.order_id = i.order_id
+        LEFT JOIN _order_payments_agg p ON o.order_id = p.order_id
+        LEFT JOIN _order_reviews r ON o.order_id = r.order_id
+    """)
+
+    # models/gold/obt/gold_obt_orders.sql (order x product x seller grain)
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE gold_obt_orders AS
+        WITH customer_history AS (
+            SELECT
+                customer_id,
+                COUNT(DISTINCT order_id) AS customer_order_count,
+                SUM(total_order_value) AS customer_lifetime_value,
+                AVG(total_order_value) AS customer_avg_order_value,
+                MAX(order_purchase_timestamp) AS customer_last_order_date,
+                date_diff('day', MIN(order_purchase_timestamp), MAX(order_purchase_timestamp)) AS customer_tenure_days
+            FROM gold_fact_order_summary
+            GROUP BY customer_id
+        ),
+        product_features AS (
+            SELECT product_id,
+                   COUNT(DISTINCT order_id) AS product_order_count,
+                   AVG(price) AS product_avg_price,
+                   SUM(price) AS product_total_revenue
+            FROM silver_order_items
+            GROUP BY product_id
+        ),
+        seller_features AS (
+            SELECT seller_id,
+                   COUNT(DISTINCT order_id) AS seller_order_count,
+                   AVG(price) AS seller_avg_item_price
+            FROM silver_order_items
+            GROUP BY seller_id
+        ),
+        line_items AS (
+            SELECT order_id, product_id, seller_id,
+                   COUNT(DISTINCT product_id) AS total_unique_products,
+                   COUNT(order_item_id) AS total_items,
+                   SUM(price) AS total_product_value,
+                   SUM(freight_value) AS total_freight_value,
+                   SUM(total_item_value) AS total_order_value,
+                   AVG(price) AS avg_item_price,
+                   MIN(price) AS min_item_price,
+                   MAX(price) AS max_item_price,
+                   STDDEV(price) AS stddev_item_price
+            FROM silver_order_items
+            GROUP BY order_id, product_id, seller_id
+        )
+        SELECT
+            o.order_id,
+            o.order_key,
+            c.customer_id,
+            c.customer_unique_id,
+            c.customer_city,
+            c.customer_state,
+            c.customer_zip_code_prefix,
+            ch.customer_order_count,
+            ch.customer_lifetime_value,
+            ch.customer_avg_order_value,
+            ch.customer_tenure_days,
+            date_diff('day', ch.customer_last_order_date, o.order_purchase_timestamp) AS days_since_last_order,
+            CASE
+                WHEN ch.customer_order_count = 1 THEN 'NEW'
+                WHEN ch.customer_order_count BETWEEN 2 AND 5 THEN 'REGULAR'
+                WHEN ch.customer_order_count > 5 THEN 'LOYAL'
+            END AS customer_segment,
+            o.order_status,
+            o.order_purchase_timestamp,
+            o.order_approved_at,
+            o.order_delivered_carrier_date,
+            o.order_delivered_customer_date,
+            o.order_estimated_delivery_date,
+            o.actual_delivery_days,
+            o.estimated_delivery_days,
+            o.is_late_delivery,
+            year(o.order_purchase_timestamp) AS order_year,
+            quarter(o.order_purchase_timestamp) AS order_quarter,
+            month(o.order_purchase_timestamp) AS order_month,
+            monthname(o.order_purchase_timestamp) AS order_month_name,
+            weekofyear(o.order_purchase_timestamp) AS order_week,
+            day(o.order_purchase_timestamp) AS order_day,
+            dayofweek(o.order_purchase_timestamp) AS order_day_of_week,
+            dayname(o.order_purchase_timestamp) AS order_day_name,
+            dayofweek(o.order_purchase_timestamp) IN (0, 6) AS order_on_weekend,
+            hour(o.order_purchase_timestamp) AS order_hour,
+            CASE
+                WHEN hour(o.order_purchase_timestamp) BETWEEN 6 AND 11 THEN 'MORNING'
+                WHEN hour(o.order_purchase_timestamp) BETWEEN 12 AND 17 THEN 'AFTERNOON'
+                WHEN hour(o.order_purchase_timestamp) BETWEEN 18 AND 21 THEN 'EVENING'
+                ELSE 'NIGHT'
+            END AS order_time_of_day,
+            p.product_id,
+            p.product_category_name,
+            p.product_category_english,
+            p.product_weight_g,
+            p.product_length_cm,
+            p.product_height_cm,
+            p.product_width_cm,
+            p.product_volume_cm3,
+            p.product_photos_qty,
+            pf.product_order_count,
+            pf.product_avg_price,
+            pf.product_total_revenue,
+            s.seller_id,
+            s.seller_city,
+            s.seller_state,
+            sf.seller_order_count,
+            sf.seller_avg_item_price,
+            CASE WHEN c.customer_state = s.seller_state THEN 1 ELSE 0 END AS is_same_state,
+            CASE WHEN c.customer_city = s.seller_city THEN 1 ELSE 0 END AS is_same_city,
+            COALESCE(li.total_unique_products, 0) AS total_unique_products,
+            COALESCE(li.total_items, 0) AS total_items,
+            li.total_product_value,
+            li.total_freight_value,
+            li.total_order_value,
+            li.avg_item_price,
+            li.min_item_price,
+            li.max_item_price,
+            li.stddev_item_price,
+            pay.total_payment_value,
+            pay.max_installments,
+            pay.avg_installments,
+            COALESCE(pay.payment_types_count, 0) AS payment_types_count,
+            pay.payment_types,
+            COALESCE(pay.payment_credit_card, 0) AS payment_credit_card,
+            COALESCE(pay.payment_boleto, 0) AS payment_boleto,
+            COALESCE(pay.payment_voucher, 0) AS payment_voucher,
+            COALESCE(pay.payment_debit_card, 0) AS payment_debit_card,
+            r.review_score,
+            r.review_sentiment,
+            r.has_comment AS has_review_comment,
+            CASE WHEN r.review_score >= 4 THEN 1 ELSE 0 END AS is_positive_review,
+            CASE WHEN r.review_score <= 2 THEN 1 ELSE 0 END AS is_negative_review,
+            CASE
+                WHEN o.order_status = 'delivered' AND NOT o.is_late_delivery THEN 'ON_TIME'
+                WHEN o.order_status = 'delivered' AND o.is_late_delivery THEN 'LATE'
+                WHEN o.order_status = 'canceled' THEN 'CANCELED'
+                ELSE 'OTHER'
+            END AS delivery_performance,
+            CASE WHEN o.is_late_delivery THEN 1 ELSE 0 END AS is_delayed,
+            CASE
+                WHEN li.total_order_value >= 500 THEN 'HIGH_VALUE'
+                WHEN li.total_order_value >= 100 THEN 'MEDIUM_VALUE'
+                ELSE 'LOW_VALUE'
+            END AS order_value_segment,
+            CASE WHEN o.order_status = 'canceled' THEN 1 ELSE 0 END AS is_canceled,
+            CASE WHEN r.review_score >= 4 THEN 1 ELSE 0 END AS is_satisfied,
+            li.total_freight_value / NULLIF(li.total_product_value, 0) AS freight_to_product_ratio,
+            li.total_order_value / NULLIF(li.total_items, 0) AS avg_value_per_item,
+            pay.max_installments * pay.total_payment_value AS total_credit_extended,
+            CURRENT_TIMESTAMP AS dw_created_at,
+            '{run_timestamp}' AS dbt_run_timestamp
+        FROM silver_orders o
+        LEFT JOIN silver_customers c ON o.customer_id = c.customer_id
+        LEFT JOIN customer_history ch ON o.customer_id = ch.customer_id
+        LEFT JOIN line_items li ON o.order_id = li.order_id
+        LEFT JOIN silver_products p ON li.product_id = p.product_id
+        LEFT JOIN product_features pf ON li.product_id = pf.product_id
+        LEFT JOIN silver_sellers s ON li.seller_id = s.seller_id
+        LEFT JOIN seller_features sf ON li.seller_id = sf.seller_id
+        LEFT JOIN _order_payments_agg pay ON o.order_id = pay.order_id
+        LEFT JOIN _order_reviews r ON o.order_id = r.order_id
+    """)
+
+    # models/gold/obt/gold_obt_orders_ml_export.sql
+    conn.execute("""
+        CREATE OR REPLACE VIEW gold_obt_orders_ml_export AS
+        SELECT
+            order_id,
+            customer_order_count, customer_lifetime_value, customer_avg_order_value,
+            customer_tenure_days, days_since_last_order,
+            actual_delivery_days, estimated_delivery_days,
+            order_year, order_quarter, order_month, order_week, order_day,
+            order_day_of_week, order_hour, order_on_weekend::INT AS ORDER_ON_WEEKEND,
+            product_weight_g, product_length_cm, product_height_cm, product_width_cm,
+            product_volume_cm3, product_photos_qty, product_order_count, product_avg_price,
+            seller_order_count, seller_avg_item_price, is_same_state, is_same_city,
+            total_unique_products, total_items, total_product_value, total_freight_value,
+            total_order_value, avg_item_price, min_item_price, max_item_price, stddev_item_price,
+            max_installments, avg_installments, payment_types_count, payment_credit_card,
+            payment_boleto, payment_voucher, payment_debit_card,
+            review_score, is_positive_review, is_negative_review,
+            freight_to_product_ratio, avg_value_per_item, total_credit_extended,
+            is_delayed,
+            is_canceled,
+            is_satisfied,
+            review_score AS TARGET_REVIEW_SCORE,
+            actual_delivery_days AS TARGET_DELIVERY_DAYS
+        FROM gold_obt_orders
+        WHERE order_status = 'delivered'
+    """)
+
+    # models/gold/feature_store/fs_customer_features.sql (latest order per customer)
+    conn.execute("""
+        CREATE OR REPLACE TABLE fs_customer_features AS
+        SELECT
+            customer_id,
+            arg_max(customer_state, order_id) AS customer_state,
+            arg_max(customer_order_count, order_id) AS customer_order_count,
+            arg_max(customer_lifetime_value, order_id) AS customer_lifetime_value,
+            arg_max(customer_avg_order_value, order_id) AS customer_avg_order_value,
+            arg_max(customer_tenure_days, order_id) AS customer_tenure_days,
+            CASE
+                WHEN arg_max(customer_order_count, order_id) = 1 THEN 'NEW'
+                WHEN arg_max(customer_order_count, order_id) BETWEEN 2 AND 5 THEN 'REGULAR'
+                ELSE 'LOYAL'
+            END AS customer_segment,
+            CURRENT_TIMESTAMP AS feature_timestamp
+        FROM gold_obt_orders
+        GROUP BY customer_id
+    """)
+
+    # models/gold/aggregates/gold_agg_sales_daily.sql. Snowflake stores HLL
+    # states; here customer_hll holds the day's distinct customer hashes and
+    # HLL_COMBINE / HLL_ESTIMATE are macros over lists, giving exact counts
+    conn.execute("""
+        CREATE OR REPLACE TABLE gold_agg_sales_daily AS
+        SELECT
+            CAST(order_purchase_timestamp AS DATE) AS order_date,
+            order_status,
+            COUNT(DISTINCT order_id) AS order_count,
+            SUM(total_order_value) AS revenue,
+            COUNT(total_order_value) AS revenue_order_count,
+            SUM(total_items) AS total_items,
+            SUM(total_freight_value) AS total_freight_value,
+            list(DISTINCT hash(customer_id)) AS customer_hll,
+            CURRENT_TIMESTAMP AS dw_updated_at
+        FROM gold_fact_order_summary
+        WHERE order_purchase_timestamp IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    conn.execute("CREATE OR REPLACE MACRO hll_combine(state) AS flatten(list(state))")
+    conn.execute("CREATE OR REPLACE MACRO hll_estimate(state) AS len(list_distinct(state))")
+
+
+def _uppercase_columns(conn, tables):
+    """
+    Rename columns to upper case, as Snowflake stores unquoted identifiers
+
+    DuckDB reports a column under its stored name, so without this a query
+    for ORDER_ID would come back as order_id and break pages that index
+    results the way Snowflake returns them.
+    """
+    for table in tables:
+        for (column,) in conn.execute(
+                "SELECT column_name FROM duckdb_columns() WHERE table_name = ? AND database_name = current_database()",
+                [table]).fetchall():
+            if column != column.upper():
+                conn.execute(f'ALTER TABLE {table} RENAME COLUMN "{column}" TO "{column.upper()}"')
+
+
+def build_gold_tables(conn,
+                      scale: float = 1.0,
+                      seed: int = 42,
+                      bronze_dir: Optional[str] = None) -> dict:
+    """
+    Create the synthetic gold tables inside a DuckDB connection
+
+    Also records the build in _synthetic_dataset and per-table build times
+    in _table_versions (the stand-in for INFORMATION_SCHEMA.TABLES.LAST_ALTERED).
+
+    Args:
+        conn: DuckDB connection (file-backed for scales above ~10)
+        scale: Scale factor; 1.0 matches the public Olist row counts
+        seed: Seed for the deterministic generators
+        bronze_dir: Read the bronze tables from a write_bronze_parquet
+            directory instead of generating them (scale and seed are then
+            taken from its metadata)
+
+    Returns:
+        Table name -> row count
+    """
+    run_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    started = time.perf_counter()
+
+    if bronze_dir:
+        metadata = read_bronze_metadata(bronze_dir)
+        scale, seed = metadata.get('scale', scale), metadata.get('seed', seed)
+        logger.info(f"Building gold tables from bronze parquet in {bronze_dir}")
+        _register_bronze_parquet(conn, bronze_dir)
+    else:
+        counts = scaled_counts(scale)
+        logger.info(f"Generating synthetic Olist data at scale {scale:g} ({counts['orders']:,} orders)")
+        _create_bronze_tables(conn, counts, seed)
+
+    _create_silver_tables(conn)
+    _create_gold_tables(conn, run_timestamp)
+    _uppercase_columns(conn, [t for t in GOLD_TABLES if t != 'gold_obt_orders_ml_export'])
+
+    rows = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in GOLD_TABLES
+    }
+    conn.execute("CREATE OR REPLACE TABLE _table_versions (table_name VARCHAR, last_altered VARCHAR)")
+    conn.executemany("INSERT INTO _table_versions VALUES (?, ?)",
+                     [(table, run_timestamp) for table in GOLD_TABLES])
+    conn.execute("CREATE OR REPLACE TABLE _synthetic_dataset (scale DOUBLE, seed INTEGER, built_at VARCHAR)")
+    conn.execute("INSERT INTO _synthetic_dataset VALUES (?, ?, ?)", [float(scale), int(seed), run_timestamp])
+
+    for table in ('silver_customers', 'silver_sellers', 'silver_products', 'silver_orders',
+                  'silver_order_items', 'silver_payments', 'silver_reviews',
+                  '_order_items_agg', '_order_payments_agg', '_order_reviews'):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for table in BRONZE_TABLES:
+        conn.execute(f"DROP {'VIEW' if bronze_dir else 'TABLE'} IF EXISTS bronze_{table}")
+
+    logger.info(f"Built synthetic gold tables in {time.perf_counter() - started:.1f}s: "
+                + ', '.join(f"{table}={n:,}" for table, n in rows.items()))
+    return rows
+
+
+def dataset_info(conn) -> dict:
+    """Scale, seed and build time of the synthetic dataset in conn ({} if none)"""
+    try:
+        row = conn.execute("SELECT scale, seed, built_at FROM _synthetic_dataset").fetchone()
+    except Exception:
+        return {}
+    return {'scale': row[0], 'seed': row[1], 'built_at': row[2]} if row else {}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Write synthetic Olist bronze tables as partitioned parquet")
+    parser.add_argument('--output', default=str(Path(__file__).parent.parent / 'data' / 'synthetic' / 'bronze'))
+    parser.add_argument('--scale', type=float, default=1.0, help='1 = Olist size (~100k orders); 100 = ~10M')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000, help='Orders (or rows) per part file')
+    parser.add_argument('--memory-limit', default='1GB')
+    args = parser.parse_args()
+
+    written = write_bronze_parquet(args.output, scale=args.scale, seed=args.seed,
+                                   chunk_rows=args.chunk_rows, memory_limit=args.memory_limit)
+    print(f"\n=== Bronze tables in {args.output} ===")
+    for table, n in written.items():
+        print(f"{table}: {n:,} rows")
@@ -0,0 +1,341 @@
+"""
+Train the (model_type x target) grid in parallel
+
+Loads the ML export once, writes its columns as .npy files that every
+worker memory-maps (instead of pickling the frame into each process),
+then runs one MLTrainer job per (model_type, target) on a process pool.
+Cores are split between concurrent jobs: each worker caps its OpenMP/BLAS
+pools and passes the same budget as n_jobs/thread_count to the model, so
+four concurrent jobs on 16 cores use 4 threads each instead of 64.
+
+Writes <output-dir>/<TARGET>_<model_type>_model.pkl (+ preprocessor and
+metrics, as MLTrainer.save_model) for every job, and a consolidated
+leaderboard.csv / leaderboard.json with metrics and per-job timings.
+
+Usage:
+    python src/train_grid.py
+    python src/train_grid.py --models xgboost lightgbm --targets IS_DELAYED --workers 2
+    DATA_BACKEND=duckdb DUCKDB_SCALE=1 python src/train_grid.py --output-dir models/grid
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MODEL_TYPES = ['xgboost', 'lightgbm', 'catboost', 'random_forest']
+TARGETS = ['IS_DELAYED', 'IS_CANCELED', 'IS_SATISFIED']
+
+# Thread-pool environment variables read by OpenMP/BLAS when a library loads
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+MANIFEST = 'manifest.json'
+
+
+def write_shared_frame(df: pd.DataFrame, directory: str) -> dict:
+    """
+    Write a frame as one .npy file per column for memory-mapped reads
+
+    Numeric and boolean columns are stored as-is (nullable columns as
+    float32 with NaN), categoricals as codes plus their categories. Other
+    columns (e.g. string IDs) are not features and are skipped.
+
+    Args:
+        df: Frame to share
+        directory: Empty directory to write into
+
+    Returns:
+        Manifest describing the stored columns
+    """
+    os.makedirs(directory, exist_ok=True)
+    columns, skipped = [], []
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        entry = {'name': col, 'file': f"c{i:04d}.npy"}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            array = values.cat.codes.to_numpy()
+            entry['categories'] = values.cat.categories.astype(str).tolist()
+        elif pd.api.types.is_bool_dtype(values) and not values.hasnans:
+            array = values.to_numpy(dtype=bool)
+        elif pd.api.types.is_numeric_dtype(values):
+            if values.hasnans and isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+                array = values.to_numpy(dtype='float32', na_value=np.nan)
+            else:
+                array = values.to_numpy(dtype=getattr(values.dtype, 'numpy_dtype', None))
+        else:
+            skipped.append(col)
+            continue
+        np.save(os.path.join(directory, entry['file']), np.ascontiguousarray(array))
+        columns.append(entry)
+
+    manifest = {'rows': len(df), 'columns': columns}
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+    if skipped:
+        logger.info(f"Not shared with workers (non-numeric): {skipped}")
+    return manifest
+
+
+def read_shared_frame(directory: str) -> pd.DataFrame:
+    """Frame whose numeric columns are read-only memory maps of write_shared_frame files"""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    data = {}
+    for entry in manifest['columns']:
+        array = np.load(os.path.join(directory, entry['file']), mmap_mode='r')
+        if 'categories' in entry:
+            data[entry['name']] = pd.Categorical.from_codes(np.asarray(array), categories=entry['categories'])
+        else:
+            data[entry['name']] = array
+    return pd.DataFrame(data, copy=False)
+
+
+def _limit_threads(threads: int):
+    """Worker initializer: cap native thread pools before any job runs"""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+    logging.basicConfig(level=logging.WARNING)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def train_job(data_dir: str, model_type: str, target: str, threads: int,
+              output_dir: str, test_size: float = 0.2, seed: int = 42,
+              native_cache_dir: Optional[str] = None) -> dict:
+    """
+    Train and evaluate one (model_type, target) pair in a worker
+
+    Args:
+        data_dir: Directory written by write_shared_frame
+        model_type: MLTrainer model type
+        target: Target column
+        threads: Thread budget passed to the model as n_jobs
+        output_dir: Where to save the model, preprocessor and metrics
+        test_size: Held-out fraction for evaluation
+        seed: Split seed
+        native_cache_dir: Train boosters on native datasets cached here
+            (see native_datasets), so re-running the grid skips ingest
+
+    Returns:
+        Leaderboard row: job identity, status, metrics and timings (seconds)
+    """
+    from sklearn.model_selection import train_test_split
+    from train_model import MLTrainer
+
+    row = {'model_type': model_type, 'target': target, 'threads': threads, 'pid': os.getpid()}
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(name, since):
+        now = time.perf_counter()
+        timings[f"{name}_s"] = round(now - since, 4)
+        return now
+
+    try:
+        t = time.perf_counter()
+        df = read_shared_frame(data_dir)
+        if target not in df.columns:
+            raise ValueError(f"Target column '{target}' not in dataset")
+        y = df[target]
+        X = df.drop(columns=[target])
+        t = lap('load', t)
+
+        if y.nunique() < 2:
+            row.update(status='skipped', error=f"{target} has a single class")
+            return row
+
+        train_idx, test_idx = train_test_split(
+            np.arange(len(df)), test_size=test_size, random_state=seed, stratify=y
+        )
+        X_train, y_train = X.iloc[train_idx], y.iloc[train_idx]
+        X_test, y_test = X.iloc[test_idx], y.iloc[test_idx]
+        t = lap('split', t)
+
+        native_cache = None
+        if native_cache_dir:
+            from native_datasets import NativeDatasetCache
+            native_cache = NativeDatasetCache(native_cache_dir)
+        trainer = MLTrainer(model_type=model_type, task='classification', n_jobs=threads,
+                            native_cache=native_cache)
+        trainer.train(X_train, y_train)
+        t = lap('train', t)
+
+        metrics = trainer.evaluate(X_test, y_test)
+        t = lap('evaluate', t)
+
+        model_path = os.path.join(output_dir, f"{target}_{model_type}_model.pkl")
+        trainer.save_model(model_path, metrics=metrics)
+        lap('save', t)
+
+        row.update(status='ok', train_rows=len(train_idx), test_rows=len(test_idx),
+                   model_path=model_path, **{k: float(v) for k, v in metrics.items()})
+    except Exception as e:
+        logger.exception(f"{model_type} x {target} failed")
+        row.update(status='failed', error=f"{type(e).__name__}: {e}")
+    finally:
+        timings['total_s'] = round(time.perf_counter() - started, 4)
+        row.update(timings, peak_rss_mb=_peak_rss_mb())
+    return row
+
+
+def thread_budget(jobs: int, workers: Optional[int] = None, cores: Optional[int] = None):
+    """
+    Split cores between concurrent jobs
+
+    Returns:
+        (workers, threads per job)
+    """
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, min(workers or cores, jobs, cores))
+    return workers, max(1, cores // workers)
+
+
+def run_grid(df: pd.DataFrame,
+             model_types: List[str],
+             targets: List[str],
+             output_dir: str = 'models',
+             workers: Optional[int] = None,
+             cores: Optional[int] = None,
+             test_size: float = 0.2,
+             mmap_dir: Optional[str] = None,
+             native_cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Train every (model_type, target) pair on a process pool
+
+    Args:
+        df: Dataset with features and target columns
+        model_types: Model types to train
+        targets: Target columns
+        output_dir: Directory for models and the leaderboard
+        workers: Concurrent jobs (default: one per core, at most one per job)
+        cores: Cores to divide between workers (default: all)
+        test_size: Held-out fraction for evaluation
+        mmap_dir: Parent directory for the memory-mapped dataset (default: system temp)
+        native_cache_dir: Native dataset cache shared by the workers (None = off)
+
+    Returns:
+        Leaderboard, best ROC-AUC first within each target
+    """
+    jobs = [(model_type, target) for target in targets for model_type in model_types]
+    workers, threads = thread_budget(len(jobs), workers, cores)
+    os.makedirs(output_dir, exist_ok=True)
+    if mmap_dir:
+        os.makedirs(mmap_dir, exist_ok=True)
+    data_dir = tempfile.mkdtemp(prefix='train_grid_', dir=mmap_dir)
+
+    started = time.perf_counter()
+    try:
+        t = time.perf_counter()
+        manifest = write_shared_frame(df, data_dir)
+        logger.info(f"Shared {manifest['rows']:,} rows x {len(manifest['columns'])} columns "
+                    f"via {data_dir} in {time.perf_counter() - t:.2f}s")
+        logger.info(f"Running {len(jobs)} jobs on {workers} workers x {threads} threads")
+
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_limit_threads, initargs=(threads,)) as pool:
+            futures = {
+                pool.submit(train_job, data_dir, model_type, target, threads, output_dir, test_size,
+                            native_cache_dir=native_cache_dir): (model_type, target)
+                for model_type, target in jobs
+            }
+            for future in as_completed(futures):
+                model_type, target = futures[future]
+                try:
+                    row = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. out of memory)
+                    row = {'model_type': model_type, 'target': target, 'threads': threads,
+                           'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+                rows.append(row)
+                logger.info(f"[{len(rows)}/{len(jobs)}] {model_type} x {target}: {row['status']}"
+                            + (f" roc_auc={row['roc_auc']:.4f} in {row['total_s']:.1f}s" if row['status'] == 'ok' else
+                               f" ({row.get('error')})"))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    leaderboard = pd.DataFrame(rows)
+    if 'roc_auc' in leaderboard.columns:
+        leaderboard = leaderboard.sort_values(['target', 'roc_auc'], ascending=[True, False], na_position='last')
+    leaderboard = leaderboard.reset_index(drop=True)
+    wall_s = time.perf_counter() - started
+    write_leaderboard(leaderboard, output_dir, {
+        'workers': workers, 'threads_per_job': threads, 'rows': len(df), 'wall_s': round(wall_s, 3),
+        'job_s': round(float(leaderboard.get('total_s', pd.Series(dtype=float)).sum()), 3),
+    })
+    return leaderboard
+
+
+def write_leaderboard(leaderboard: pd.DataFrame, output_dir: str, run: Dict) -> str:
+    """Write leaderboard.csv and leaderboard.json (rows plus run summary)"""
+    leaderboard.to_csv(os.path.join(output_dir, 'leaderboard.csv'), index=False)
+    path = os.path.join(output_dir, 'leaderboard.json')
+    with open(path, 'w') as f:
+        json.dump({'run': run, 'jobs': json.loads(leaderboard.to_json(orient='records'))}, f, indent=2)
+    logger.info(f"Leaderboard saved to {path}")
+    return path
+
+
+def load_dataset(parquet: Optional[str] = None,
+                 start_date: Optional[str] = None,
+                 sample_size: Optional[int] = None,
+                 refresh: bool = False) -> pd.DataFrame:
+    """ML export from a parquet file, or from the warehouse via SnowflakeDataLoader"""
+    if parquet:
+        return pd.read_parquet(parquet)
+    from load_training_data import SnowflakeDataLoader
+    with SnowflakeDataLoader() as loader:
+        return loader.load_obt_data(start_date=start_date, sample_size=sample_size, refresh=refresh)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Train the model_type x target grid in parallel")
+    parser.add_argument('--models', nargs='+', default=MODEL_TYPES, choices=MODEL_TYPES)
+    parser.add_argument('--targets', nargs='+', default=TARGETS)
+    parser.add_argument('--workers', type=int, default=None, help='Concurrent jobs (default: one per core)')
+    parser.add_argument('--cores', type=int, default=None, help='Cores to divide between jobs (default: all)')
+    parser.add_argument('--output-dir', default='models')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--parquet', default=None, help='Read the dataset from parquet instead of the warehouse')
+    parser.add_argument('--start-date', default=None)
+    parser.add_argument('--sample-size', type=int, default=None)
+    parser.add_argument('--refresh', action='store_true', help='Bypass the local dataset cache')
+    parser.add_argument('--mmap-dir', default=None, help='Where to put the memory-mapped dataset')
+    parser.add_argument('--native-cache', default=None, metavar='DIR',
+                        help='Cache DMatrix/Dataset/Pool binaries here and reuse them across runs')
+    args = parser.parse_args()
+
+    data = load_dataset(args.parquet, args.start_date, args.sample_size, args.refresh)
+    board = run_grid(data, args.models, args.targets, output_dir=args.output_dir, workers=args.workers,
+                     cores=args.cores, test_size=args.test_size, mmap_dir=args.mmap_dir,
+                     native_cache_dir=args.native_cache)
+
+    columns = [c for c in ('target', 'model_type', 'status', 'roc_auc', 'f1_score', 'threads',
+                           'load_s', 'train_s', 'evaluate_s', 'total_s', 'peak_rss_mb') if c in board.columns]
+    print("\n=== Leaderboard ===")
+    print(board[columns].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
@@ -2,9 +2,10 @@
 Train ML models for various prediction tasks
 """
 import os
+import time
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
+from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV, StratifiedKFold
 from sklearn.metrics import (
     accuracy_score, precision_score, recall_score, f1_score,
     roc_auc_score, classification_report, confusion_matrix,
@@ -16,8 +17,9 @@ from lightgbm import LGBMClassifier
 from catboost import CatBoostClassifier
 import joblib
 import logging
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
 import json
+from preprocessing import FeaturePreprocessor, preprocessor_path
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,18 +28,25 @@ logger = logging.getLogger(__name__)
 class MLTrainer:
     """Train and evaluate ML models"""
     
-    def __init__(self, model_type: str = 'xgboost', task: str = 'classification'):
+    def __init__(self, model_type: str = 'xgboost', task: str = 'classification',
+                 n_jobs: Optional[int] = None, native_cache=None):
         """
         Initialize trainer
         
         Args:
             model_type: Type of model ('xgboost', 'lightgbm', 'catboost', 'random_forest')
             task: 'classification' or 'regression'
+            n_jobs: Threads the model may use (None = library default, usually all cores)
+            native_cache: native_datasets.NativeDatasetCache; boosters then train,
+                cross-validate and tune on cached DMatrix/Dataset/Pool binaries
         """
         self.model_type = model_type
         self.task = task
+        self.n_jobs = n_jobs
+        self.native_cache = native_cache
         self.model = self._get_model()
         self.best_model = None
+        self.preprocessor = None
         
     def _get_model(self):
         """Get model based on type"""
@@ -48,25 +57,29 @@ class MLTrainer:
                     max_depth=6,
                     learning_rate=0.1,
                     random_state=42,
-                    eval_metric='logloss'
+                    eval_metric='logloss',
+                    n_jobs=self.n_jobs
                 ),
                 'lightgbm': LGBMClassifier(
                     n_estimators=100,
                     max_depth=6,
                     learning_rate=0.1,
-                    random_state=42
+                    random_state=42,
+                    n_jobs=self.n_jobs
                 ),
                 'catboost': CatBoostClassifier(
                     iterations=100,
                     depth=6,
                     learning_rate=0.1,
                     random_state=42,
-                    verbose=False
+                    verbose=False,
+                    thread_count=self.n_jobs or -1
                 ),
                 'random_forest': RandomForestClassifier(
                     n_estimators=100,
                     max_depth=10,
-                    random_state=42
+                    random_state=42,
+                    n_jobs=self.n_jobs
                 )
             }
         else:
@@ -74,12 +87,31 @@ class MLTrainer:
         
         return models[self.model_type]
     
+    def _features(self, X: pd.DataFrame, fit: bool = False):
+        """
+        Feature matrix for X via the fit-once preprocessor
+        
+        The preprocessor (columns, dtypes, medians, category codes) is fit
+        on the training frame only and saved with the model, so prediction
+        applies exactly the same transformation.
+        """
+        if not isinstance(X, pd.DataFrame):
+            return X
+        if fit or self.preprocessor is None:
+            self.preprocessor = FeaturePreprocessor().fit(X)
+        return self.preprocessor.transform(X)
+    
     def train(self, X_train: pd.DataFrame, y_train: pd.Series):
         """Train model"""
         logger.info(f"Training {self.model_type} model...")
         logger.info(f"Training data shape: {X_train.shape}")
         
-        self.model.fit(X_train, y_train)
+        X = self._features(X_train, fit=True)
+        if self.native_cache is not None and self.model_type != 'random_forest':
+            from native_datasets import fit_native
+            fit_native(self.model, self.model_type, X, y_train, self.native_cache)
+        else:
+            self.model.fit(X, y_train)
         logger.info("✅ Training complete")
         
         return self.model
@@ -88,9 +120,14 @@ class MLTrainer:
         """Evaluate model performance"""
         logger.info("Evaluating model...")
         
+        X_test = self._features(X_test)
         y_pred = self.model.predict(X_test)
         y_pred_proba = self.model.predict_proba(X_test)[:, 1]
         
+        return self._report(y_test, y_pred, y_pred_proba)
+    
+    def _report(self, y_test, y_pred, y_pred_proba) -> Dict:
+        """Metrics for a set of predictions, logged with the confusion matrix"""
         metrics = {
             'accuracy': accuracy_score(y_test, y_pred),
             'precision': precision_score(y_test, y_pred),
@@ -112,6 +149,129 @@ class MLTrainer:
         
         return metrics
     
+    def train_external_memory(self, features_path: str, target_path: Optional[str] = None,
+                              target_col: str = 'target', row_groups: Optional[list] = None,
+                              cache_dir: Optional[str] = None,
+                              sample_rows: int = 100_000):
+        """
+        Train on a parquet training set without loading it into memory
+        
+        Row groups are streamed into XGBoost's external-memory DMatrix or a
+        LightGBM Dataset built incrementally (see external_memory), so peak
+        RAM is one row group plus the quantized training data. The
+        preprocessor is fit on the first sample_rows rows.
+        
+        Args:
+            features_path: Parquet with the features (and target_col, if
+                target_path is None)
+            target_path: Parquet with the labels, row groups aligned with
+                features_path (as written by save_dataset_batches)
+            target_col: Label column
+            row_groups: Row groups to train on (default: all)
+            cache_dir: Directory for XGBoost's external-memory pages
+                (default: a temporary directory removed after training)
+            sample_rows: Rows used to fit the preprocessor
+        
+        Returns:
+            Trained model
+        """
+        import shutil
+        import tempfile
+        from external_memory import ParquetRowGroups, lightgbm_dataset, xgboost_dmatrix
+        from native_datasets import attach_booster, lightgbm_train_params
+        
+        if self.model_type not in ('xgboost', 'lightgbm'):
+            raise ValueError(f"External-memory training supports xgboost and lightgbm, not '{self.model_type}'")
+        
+        source = ParquetRowGroups(features_path, target_path, target_col)
+        row_groups = list(range(source.num_row_groups)) if row_groups is None else list(row_groups)
+        rows = sum(source.rows(i) for i in row_groups)
+        logger.info(f"Training {self.model_type} model out of core...")
+        logger.info(f"Training data: {rows:,} rows in {len(row_groups)} row groups of {features_path}")
+        
+        self.preprocessor = source.fit_preprocessor(sample_rows)
+        classes = np.unique(source.labels(row_groups))
+        if self.model_type == 'xgboost':
+            import xgboost as xgb
+            work_dir = cache_dir or tempfile.mkdtemp(prefix='xgb_extmem_')
+            os.makedirs(work_dir, exist_ok=True)
+            try:
+                dtrain = xgboost_dmatrix(source, row_groups, work_dir)
+                params = {**self.model.get_xgb_params(), 'tree_method': 'hist'}
+                booster = xgb.train(params, dtrain, num_boost_round=self.model.n_estimators)
+                del dtrain
+            finally:
+                if cache_dir is None:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            import lightgbm as lgb
+            params = lightgbm_train_params(self.model)
+            train_set = lightgbm_dataset(source, row_groups, {'seed': params.get('random_state', 0)})
+            booster = lgb.train(params, train_set, num_boost_round=self.model.n_estimators)
+        attach_booster(self.model, self.model_type, booster, classes)
+        logger.info("✅ Training complete")
+        
+        return self.model
+    
+    def evaluate_external(self, features_path: str, target_path: Optional[str] = None,
+                          target_col: str = 'target', row_groups: Optional[list] = None) -> Dict:
+        """Evaluate on parquet row groups, scoring one row group at a time"""
+        from external_memory import ParquetRowGroups
+        
+        logger.info("Evaluating model...")
+        source = ParquetRowGroups(features_path, target_path, target_col, preprocessor=self.preprocessor)
+        row_groups = list(range(source.num_row_groups)) if row_groups is None else list(row_groups)
+        y_test = source.labels(row_groups).astype('int64')
+        y_pred_proba = np.concatenate([self.model.predict_proba(X)[:, 1] for X, _ in source.batches(row_groups)])
+        y_pred = (y_pred_proba >= 0.5).astype('int64')
+        
+        return self._report(y_test, y_pred, y_pred_proba)
+    
+    def cross_validate(self, X: pd.DataFrame, y: pd.Series, cv: int = 5) -> Dict:
+        """
+        Stratified k-fold ROC-AUC of the configured model
+        
+        With a native cache the boosters run their own CV (xgb.cv, lgb.cv,
+        catboost.cv) on one cached dataset that every fold slices, instead
+        of re-ingesting each fold.
+        
+        Returns:
+            {'roc_auc_mean', 'roc_auc_std', 'folds', 'seconds'}
+        """
+        logger.info(f"Cross-validating {self.model_type} ({cv} folds)...")
+        
+        started = time.perf_counter()
+        X = self._features(X, fit=True)
+        y = np.asarray(y)
+        folds = list(StratifiedKFold(n_splits=cv, shuffle=True, random_state=42).split(X, y))
+        
+        if self.native_cache is not None and self.model_type == 'xgboost':
+            import xgboost as xgb
+            params = {**self.model.get_xgb_params(), 'eval_metric': 'auc'}
+            history = xgb.cv(params, self.native_cache.xgboost(X, y), num_boost_round=self.model.n_estimators,
+                             folds=folds)
+            mean, std = history['test-auc-mean'].iloc[-1], history['test-auc-std'].iloc[-1]
+        elif self.native_cache is not None and self.model_type == 'lightgbm':
+            import lightgbm as lgb
+            from native_datasets import lightgbm_train_params
+            params = {**lightgbm_train_params(self.model), 'metric': 'auc'}
+            history = lgb.cv(params, self.native_cache.lightgbm(X, y), num_boost_round=self.model.n_estimators,
+                             folds=folds)
+            mean, std = history['valid auc-mean'][-1], history['valid auc-stdv'][-1]
+        elif self.native_cache is not None and self.model_type == 'catboost':
+            from catboost import cv as catboost_cv
+            params = {**self.model.get_params(), 'loss_function': 'Logloss', 'eval_metric': 'AUC'}
+            history = catboost_cv(self.native_cache.catboost(X, y), params, folds=folds, verbose=False)
+            mean, std = history['test-AUC-mean'].iloc[-1], history['test-AUC-std'].iloc[-1]
+        else:
+            scores = cross_val_score(self.model, X, y, cv=folds, scoring='roc_auc')
+            mean, std = scores.mean(), scores.std()
+        
+        result = {'roc_auc_mean': float(mean), 'roc_auc_std': float(std), 'folds': cv,
+                  'seconds': time.perf_counter() - started}
+        logger.info(f"CV ROC-AUC: {mean:.4f} ± {std:.4f} ({result['seconds']:.1f}s)")
+        return result
+    
     def get_feature_importance(self, feature_names: list, top_n: int = 20) -> pd.DataFrame:
         """Get feature importance"""
         if hasattr(self.model, 'feature_importances_'):
@@ -129,9 +289,42 @@ class MLTrainer:
             return None
     
     def hyperparameter_tuning(self, X_train: pd.DataFrame, y_train: pd.Series,
-                             param_grid: dict, cv: int = 5):
-        """Perform hyperparameter tuning"""
-        logger.info("Starting hyperparameter tuning...")
+                             param_grid: Optional[dict] = None, cv: int = 5,
+                             method: str = 'grid', **search_options):
+        """
+        Perform hyperparameter tuning
+        
+        Args:
+            X_train: Training features
+            y_train: Training target
+            param_grid: Parameter -> candidate values (required for 'grid';
+                tuning.DEFAULT_SEARCH_SPACES for 'halving' if None)
+            cv: Cross-validation folds ('grid' only)
+            method: 'grid' (exhaustive GridSearchCV) or 'halving'
+                (successive halving with native early stopping on a
+                held-out split, see tuning.SuccessiveHalvingSearch)
+            search_options: SuccessiveHalvingSearch arguments, e.g.
+                n_trials, time_budget, eta, early_stopping_rounds
+        
+        Returns:
+            Fitted search object (best_params_, best_score_, best_estimator_)
+        """
+        logger.info(f"Starting hyperparameter tuning ({method})...")
+        
+        if method == 'halving':
+            from tuning import SuccessiveHalvingSearch
+            search_options.setdefault('native_cache', self.native_cache)
+            search = SuccessiveHalvingSearch(self.model, self.model_type, param_grid=param_grid,
+                                             **search_options)
+            search.fit(self._features(X_train, fit=True), y_train)
+            logger.info(f"Best parameters: {search.best_params_} ({search.best_iteration_} rounds)")
+            logger.info(f"Best validation score: {search.best_score_:.4f}")
+            self.best_model = search.best_estimator_
+            return search
+        if method != 'grid':
+            raise ValueError(f"Unknown tuning method '{method}'. Choose 'grid' or 'halving'")
+        if param_grid is None:
+            raise ValueError("param_grid is required for grid search")
         
         grid_search = GridSearchCV(
             self.model, 
@@ -142,7 +335,7 @@ class MLTrainer:
             verbose=1
         )
         
-        grid_search.fit(X_train, y_train)
+        grid_search.fit(self._features(X_train, fit=True), y_train)
         
         logger.info(f"Best parameters: {grid_search.best_params_}")
         logger.info(f"Best CV score: {grid_search.best_score_:.4f}")
@@ -150,14 +343,33 @@ class MLTrainer:
         self.best_model = grid_search.best_estimator_
         return grid_search
     
-    def save_model(self, filepath: str, metrics: dict = None):
-        """Save trained model"""
+    def save_model(self, filepath: str, metrics: dict = None, compile: bool = True):
+        """
+        Save trained model (and its preprocessor as <name>_preprocessor.json)
+        
+        With compile=True the trees are also exported as flat arrays to
+        <name>_compiled.pkl (see compiled_trees), which ModelPredictor uses
+        for low-latency scoring of small batches.
+        """
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
         # Save model
         joblib.dump(self.model, filepath)
         logger.info(f"Model saved to {filepath}")
         
+        if compile:
+            from compiled_trees import compile_model, compiled_path
+            try:
+                compiled = compile_model(self.model)
+            except NotImplementedError as e:
+                logger.warning(f"Model not compiled: {e}")
+            else:
+                joblib.dump(compiled, compiled_path(filepath))
+                logger.info(f"Compiled {compiled.n_trees} trees to {compiled_path(filepath)}")
+        
+        if self.preprocessor is not None:
+            self.preprocessor.save(preprocessor_path(filepath))
+        
         # Save metrics
         if metrics:
             metrics_path = filepath.replace('.pkl', '_metrics.json')
@@ -173,12 +385,41 @@ class MLTrainer:
         return model
 
 
-def train_delivery_prediction_model():
-    """Train delivery delay prediction model"""
+def train_delivery_prediction_model(external_memory: bool = False, holdout_every: int = 5):
+    """
+    Train delivery delay prediction model
+    
+    Args:
+        external_memory: Train out of core on the full-history parquet written
+            by `load_training_data.py --stream` (data/delivery_prediction_*.parquet),
+            holding out every holdout_every-th row group for evaluation
+        holdout_every: Row-group holdout interval for external_memory
+    """
     logger.info("\n" + "="*50)
     logger.info("TRAINING DELIVERY DELAY PREDICTION MODEL")
     logger.info("="*50)
     
+    if external_memory:
+        from external_memory import ParquetRowGroups, split_row_groups
+        features_path = '../data/delivery_prediction_features.parquet'
+        target_path = '../data/delivery_prediction_target.parquet'
+        if not os.path.exists(features_path):
+            logger.error("Streamed dataset not found. Run `python src/load_training_data.py --stream` first")
+            raise FileNotFoundError(features_path)
+        
+        train_groups, test_groups = split_row_groups(ParquetRowGroups(features_path, target_path).num_row_groups,
+                                                     holdout_every)
+        if not test_groups:
+            logger.warning(f"Fewer than {holdout_every} row groups; evaluating on the training rows")
+        trainer = MLTrainer(model_type='xgboost', task='classification')
+        trainer.train_external_memory(features_path, target_path, row_groups=train_groups)
+        metrics = trainer.evaluate_external(features_path, target_path, row_groups=test_groups or None)
+        importance_df = trainer.get_feature_importance(trainer.preprocessor.feature_names)
+        trainer.save_model('../models/IS_DELAYED_xgboost_model.pkl', metrics=metrics)
+        if importance_df is not None:
+            importance_df.to_csv('../models/IS_DELAYED_xgboost_feature_importance.csv', index=False)
+        return trainer, metrics
+    
     # Load data (use notebook naming convention)
     try:
         X_train = pd.read_parquet('../data/X_train_delayed.parquet')
@@ -206,7 +447,7 @@ def train_delivery_prediction_model():
     metrics = trainer.evaluate(X_test, y_test)
     
     # Feature importance
-    importance_df = trainer.get_feature_importance(X.columns.tolist())
+    importance_df = trainer.get_feature_importance(trainer.preprocessor.feature_names)
     
     # Save model with notebook naming convention
     os.makedirs('../models', exist_ok=True)
@@ -219,8 +460,13 @@ def train_delivery_prediction_model():
     return trainer, metrics
 
 
-def train_churn_prediction_model():
-    """Train customer churn prediction model"""
+def train_churn_prediction_model(refresh: bool = False):
+    """
+    Train customer churn prediction model
+    
+    Args:
+        refresh: Bypass the local dataset cache and re-query Snowflake
+    """
     logger.info("\n" + "="*50)
     logger.info("TRAINING CHURN PREDICTION MODEL")
     logger.info("="*50)
@@ -229,7 +475,7 @@ def train_churn_prediction_model():
     from load_training_data import SnowflakeDataLoader, prepare_ml_dataset
     
     loader = SnowflakeDataLoader()
-    df = loader.load_obt_data()
+    df = loader.load_obt_data(refresh=refresh)
     
     # Create churn label (no order in last 90 days)
     # Check column name (case-insensitive)
@@ -267,8 +513,13 @@ def train_churn_prediction_model():
     return trainer, metrics
 
 
-def train_review_score_model():
-    """Train review score prediction model"""
+def train_review_score_model(refresh: bool = False):
+    """
+    Train review score prediction model
+    
+    Args:
+        refresh: Bypass the local dataset cache and re-query Snowflake
+    """
     logger.info("\n" + "="*50)
     logger.info("TRAINING REVIEW SCORE PREDICTION MODEL")
     logger.info("="*50)
@@ -276,7 +527,7 @@ def train_review_score_model():
     from load_training_data import SnowflakeDataLoader, prepare_ml_dataset
     
     loader = SnowflakeDataLoader()
-    df = loader.load_obt_data()
+    df = loader.load_obt_data(refresh=refresh)
     loader.close()
     
     # Binary classification: positive (4-5) vs negative (1-3)
@@ -317,6 +568,13 @@ def train_review_score_model():
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Train the delivery delay model")
+    parser.add_argument('--external-memory', action='store_true',
+                        help="Train out of core on the streamed full-history parquet")
+    args = parser.parse_args()
+    
     # Create models directory
     os.makedirs('../models', exist_ok=True)
     
@@ -325,7 +583,7 @@ if __name__ == "__main__":
     
     # Train delivery delay prediction model
     try:
-        trainer, metrics = train_delivery_prediction_model()
+        trainer, metrics = train_delivery_prediction_model(external_memory=args.external_memory)
         
         print("\n✅ Model training complete!")
         print(f"Model saved to: ../models/IS_DELAYED_xgboost_model.pkl")
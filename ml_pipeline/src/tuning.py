@@ -0,0 +1,327 @@
+"""
+Successive-halving hyperparameter search with native early stopping
+
+GridSearchCV refits every configuration on every fold for the full number
+of estimators. This search instead:
+
+- samples up to n_trials configurations from the parameter grid,
+- trains them all with a small round budget, keeps the best 1/eta, and
+  retries the survivors with eta times more rounds (successive halving),
+- stops each boosted trial as soon as validation AUC stops improving
+  (XGBoost/LightGBM/CatBoost native early stopping), and reuses the result
+  of a trial that already stopped early instead of retraining it at a
+  larger budget,
+- builds the quantized training data (xgboost QuantileDMatrix, LightGBM
+  Dataset, CatBoost Pool) once and shares it across all trials, or loads
+  it from a native_datasets.NativeDatasetCache so repeated searches on
+  the same data skip the build,
+- stops starting new trials once a time budget is spent.
+
+The best configuration is refit on the full training set with the number
+of rounds early stopping chose.
+"""
+import math
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, train_test_split
+
+logger = logging.getLogger(__name__)
+
+# Grids sampled when no param_grid is given (sklearn-wrapper parameter names)
+DEFAULT_SEARCH_SPACES = {
+    'xgboost': {
+        'max_depth': [3, 4, 5, 6, 8, 10],
+        'learning_rate': [0.02, 0.05, 0.1, 0.2],
+        'min_child_weight': [1, 3, 5, 10],
+        'subsample': [0.6, 0.8, 1.0],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+        'reg_lambda': [0.1, 1.0, 10.0],
+    },
+    'lightgbm': {
+        'num_leaves': [15, 31, 63, 127],
+        'max_depth': [-1, 6, 8, 12],
+        'learning_rate': [0.02, 0.05, 0.1, 0.2],
+        'min_child_samples': [5, 10, 20, 50],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+        'reg_lambda': [0.0, 1.0, 10.0],
+    },
+    'catboost': {
+        'depth': [4, 6, 8, 10],
+        'learning_rate': [0.02, 0.05, 0.1, 0.2],
+        'l2_leaf_reg': [1, 3, 5, 10],
+        'random_strength': [0.5, 1, 2],
+    },
+    'random_forest': {
+        'max_depth': [6, 10, 16, None],
+        'min_samples_leaf': [1, 2, 5, 10],
+        'max_features': ['sqrt', 0.5, 0.8],
+    },
+}
+
+# Parameter counting rounds/trees: the halving resource, never sampled
+ROUNDS_PARAM = {'xgboost': 'n_estimators', 'lightgbm': 'n_estimators',
+                'catboost': 'iterations', 'random_forest': 'n_estimators'}
+
+# (min rounds, max rounds) per model type
+DEFAULT_RESOURCES = {'xgboost': (50, 2000), 'lightgbm': (50, 2000),
+                     'catboost': (50, 2000), 'random_forest': (25, 400)}
+
+
+class _XGBoostTrials:
+    """Trials on one QuantileDMatrix pair built up front (cached DMatrix pair with a cache)"""
+
+    def __init__(self, estimator, X_fit, y_fit, X_val, y_val, cache=None):
+        import xgboost as xgb
+        self.xgb = xgb
+        # The estimator's own settings, as the refit uses them; sampled params go on top
+        self.base = {k: v for k, v in estimator.get_xgb_params().items() if v is not None}
+        self.base.setdefault('objective', 'binary:logistic')
+        self.base.setdefault('tree_method', 'hist')
+        self.base['eval_metric'] = 'auc'
+        if cache is not None:
+            self.dtrain, self.dvalid = cache.xgboost(X_fit, y_fit), cache.xgboost(X_val, y_val)
+        else:
+            self.dtrain = xgb.QuantileDMatrix(X_fit, y_fit, max_bin=self.base.get('max_bin', 256))
+            self.dvalid = xgb.QuantileDMatrix(X_val, y_val, ref=self.dtrain)
+
+    def run(self, params: dict, rounds: int, early_stopping_rounds: int) -> Tuple[float, int]:
+        booster = self.xgb.train(
+            {**self.base, **params}, self.dtrain, num_boost_round=rounds,
+            evals=[(self.dvalid, 'valid')], early_stopping_rounds=early_stopping_rounds,
+            verbose_eval=False
+        )
+        return float(booster.best_score), booster.best_iteration + 1
+
+
+class _LightGBMTrials:
+    """Trials on one binned lgb.Dataset pair built up front"""
+
+    def __init__(self, estimator, X_fit, y_fit, X_val, y_val, cache=None):
+        import lightgbm as lgb
+        from native_datasets import lightgbm_train_params
+        self.lgb = lgb
+        self.base = {**lightgbm_train_params(estimator), 'metric': 'auc', 'verbosity': -1}
+        if cache is not None:
+            self.train_set = cache.lightgbm(X_fit, y_fit)
+            self.valid_set = cache.lightgbm(X_val, y_val, reference=self.train_set)
+            return
+        # feature_pre_filter off so min_child_samples can vary between trials
+        # without rebuilding the bins
+        self.train_set = lgb.Dataset(X_fit, y_fit, free_raw_data=False,
+                                     params={'feature_pre_filter': False, 'verbosity': -1}).construct()
+        self.valid_set = lgb.Dataset(X_val, y_val, reference=self.train_set).construct()
+
+    def run(self, params: dict, rounds: int, early_stopping_rounds: int) -> Tuple[float, int]:
+        booster = self.lgb.train(
+            {**self.base, **params}, self.train_set, num_boost_round=rounds,
+            valid_sets=[self.valid_set], valid_names=['valid'],
+            callbacks=[self.lgb.early_stopping(early_stopping_rounds, verbose=False)]
+        )
+        return float(booster.best_score['valid']['auc']), booster.best_iteration or rounds
+
+
+class _CatBoostTrials:
+    """Trials on one quantized Pool built up front"""
+
+    def __init__(self, estimator, X_fit, y_fit, X_val, y_val, cache=None):
+        from catboost import CatBoostClassifier, Pool
+        self.classifier = CatBoostClassifier
+        # get_params() holds only the explicitly set parameters; logging and
+        # round-count aliases are replaced by the trial's own
+        params = {k: v for k, v in estimator.get_params().items()
+                  if k not in ('iterations', 'n_estimators', 'num_boost_round', 'num_trees',
+                               'verbose', 'silent', 'logging_level', 'verbose_eval')}
+        self.base = {**params, 'eval_metric': 'AUC', 'verbose': False, 'use_best_model': True}
+        if cache is not None:
+            self.train_pool = cache.catboost(X_fit, y_fit)
+        else:
+            self.train_pool = Pool(X_fit, y_fit)
+            self.train_pool.quantize()
+        self.valid_pool = Pool(X_val, y_val)
+
+    def run(self, params: dict, rounds: int, early_stopping_rounds: int) -> Tuple[float, int]:
+        model = self.classifier(**{**self.base, **params}, iterations=rounds)
+        model.fit(self.train_pool, eval_set=self.valid_pool, early_stopping_rounds=early_stopping_rounds)
+        return float(model.get_best_score()['validation']['AUC']), model.get_best_iteration() + 1
+
+
+class _ForestTrials:
+    """Random forests have no early stopping; the resource is the tree count"""
+
+    def __init__(self, estimator, X_fit, y_fit, X_val, y_val, cache=None):
+        self.estimator = estimator
+        self.X_fit, self.y_fit, self.X_val, self.y_val = X_fit, y_fit, X_val, y_val
+
+    def run(self, params: dict, rounds: int, early_stopping_rounds: int) -> Tuple[float, int]:
+        model = clone(self.estimator).set_params(**params, n_estimators=rounds)
+        model.fit(self.X_fit, self.y_fit)
+        return float(roc_auc_score(self.y_val, model.predict_proba(self.X_val)[:, 1])), rounds
+
+
+TRIALS = {'xgboost': _XGBoostTrials, 'lightgbm': _LightGBMTrials,
+          'catboost': _CatBoostTrials, 'random_forest': _ForestTrials}
+
+
+class SuccessiveHalvingSearch:
+    """
+    Successive-halving search over one estimator's parameter grid
+
+    Attributes set by fit() mirror GridSearchCV where they overlap:
+    best_params_, best_score_ (validation ROC-AUC), best_estimator_ (refit
+    on all training rows), plus best_iteration_, trials_ (one row per
+    trained configuration and rung) and elapsed_.
+
+    Example:
+        search = SuccessiveHalvingSearch(XGBClassifier(), 'xgboost', n_trials=81, time_budget=600)
+        search.fit(X, y)
+        search.best_params_, search.best_score_
+    """
+
+    def __init__(self,
+                 estimator,
+                 model_type: str,
+                 param_grid: Optional[dict] = None,
+                 n_trials: int = 27,
+                 time_budget: Optional[float] = None,
+                 eta: int = 3,
+                 min_resource: Optional[int] = None,
+                 max_resource: Optional[int] = None,
+                 early_stopping_rounds: int = 50,
+                 validation_fraction: float = 0.2,
+                 random_state: int = 42,
+                 native_cache=None):
+        """
+        Args:
+            estimator: Unfitted sklearn-API estimator holding the fixed parameters
+            model_type: 'xgboost', 'lightgbm', 'catboost' or 'random_forest'
+            param_grid: Parameter -> candidate values (DEFAULT_SEARCH_SPACES if None)
+            n_trials: Configurations sampled from the grid (trial budget)
+            time_budget: Seconds after which no new trial starts (None = no limit)
+            eta: Keep the best 1/eta configurations per rung, with eta times the rounds
+            min_resource: Rounds (trees) in the first rung
+            max_resource: Rounds (trees) in the last rung
+            early_stopping_rounds: Rounds without validation AUC improvement before a trial stops
+            validation_fraction: Training rows held out to score trials
+            random_state: Seed for sampling and the validation split
+            native_cache: native_datasets.NativeDatasetCache to load/save the
+                trial and refit datasets (None = build them in memory)
+        """
+        if model_type not in TRIALS:
+            raise ValueError(f"Unknown model_type '{model_type}'. Choose from: {', '.join(TRIALS)}")
+        self.estimator = estimator
+        self.model_type = model_type
+        self.param_grid = param_grid or DEFAULT_SEARCH_SPACES[model_type]
+        self.n_trials = n_trials
+        self.time_budget = time_budget
+        self.eta = eta
+        default_min, default_max = DEFAULT_RESOURCES[model_type]
+        self.min_resource = min_resource or default_min
+        self.max_resource = max(max_resource or default_max, self.min_resource)
+        self.early_stopping_rounds = early_stopping_rounds
+        self.validation_fraction = validation_fraction
+        self.random_state = random_state
+        self.native_cache = native_cache
+
+    def resources(self) -> List[int]:
+        """Rounds per rung, ending at max_resource"""
+        rungs = int(math.floor(math.log(self.max_resource / self.min_resource, self.eta) + 1e-9))
+        return [int(round(self.max_resource / self.eta ** k)) for k in range(rungs, -1, -1)]
+
+    def _candidates(self) -> List[dict]:
+        rounds_param = ROUNDS_PARAM[self.model_type]
+        grid = {k: v for k, v in self.param_grid.items() if k != rounds_param}
+        size = len(ParameterGrid(grid))
+        return list(ParameterSampler(grid, n_iter=min(self.n_trials, size), random_state=self.random_state))
+
+    def fit(self, X, y) -> 'SuccessiveHalvingSearch':
+        """
+        Run the search and refit the best configuration
+
+        Args:
+            X: Feature matrix (e.g. FeaturePreprocessor.transform output)
+            y: Binary target
+
+        Returns:
+            self
+        """
+        started = time.perf_counter()
+        deadline = started + self.time_budget if self.time_budget else None
+        y = np.asarray(y)
+        fit_idx, val_idx = train_test_split(
+            np.arange(len(y)), test_size=self.validation_fraction,
+            random_state=self.random_state, stratify=y
+        )
+        trials = TRIALS[self.model_type](self.estimator, X[fit_idx], y[fit_idx], X[val_idx], y[val_idx],
+                                         cache=self.native_cache)
+        logger.info(f"Prepared {self.model_type} training data in {time.perf_counter() - started:.2f}s")
+
+        candidates = self._candidates()
+        resources = self.resources()
+        survivors = list(range(len(candidates)))
+        # Trials that early-stopped below their budget: larger budgets give the same model
+        converged: Dict[int, Tuple[float, int]] = {}
+        rows = []
+        out_of_time = False
+
+        for rung, rounds in enumerate(resources):
+            scored = []
+            for i in survivors:
+                if deadline is not None and time.perf_counter() > deadline:
+                    out_of_time = True
+                    break
+                t = time.perf_counter()
+                reused = i in converged
+                if reused:
+                    score, best_iteration = converged[i]
+                else:
+                    score, best_iteration = trials.run(candidates[i], rounds, self.early_stopping_rounds)
+                    if self.model_type != 'random_forest' and best_iteration + self.early_stopping_rounds <= rounds:
+                        converged[i] = (score, best_iteration)
+                rows.append({'trial': i, 'rung': rung, 'rounds': rounds, 'score': score,
+                             'best_iteration': best_iteration, 'reused': reused,
+                             'seconds': time.perf_counter() - t, **candidates[i]})
+                scored.append((score, i))
+
+            scored.sort(reverse=True)
+            keep = max(1, len(scored) // self.eta)
+            if scored:
+                logger.info(f"Rung {rung}: {len(scored)} configs x {rounds} rounds, "
+                            f"best AUC {scored[0][0]:.4f}, keeping {min(keep, len(scored))}")
+            if out_of_time:
+                logger.info(f"Time budget of {self.time_budget:.0f}s spent during rung {rung}")
+                break
+            survivors = [i for _, i in scored[:keep]]
+
+        if not rows:
+            raise RuntimeError("Time budget spent before any trial completed")
+
+        self.trials_ = pd.DataFrame(rows)
+        best = self.trials_.sort_values(['score', 'rung'], ascending=[False, False]).iloc[0]
+        self.best_params_ = dict(candidates[int(best['trial'])])
+        self.best_score_ = float(best['score'])
+        self.best_iteration_ = int(best['best_iteration'])
+        self.search_seconds_ = time.perf_counter() - started
+
+        # Refit on all rows with the round count early stopping picked
+        t = time.perf_counter()
+        self.best_estimator_ = clone(self.estimator).set_params(
+            **self.best_params_, **{ROUNDS_PARAM[self.model_type]: self.best_iteration_}
+        )
+        if self.native_cache is not None and self.model_type != 'random_forest':
+            from native_datasets import fit_native
+            fit_native(self.best_estimator_, self.model_type, X, y, self.native_cache)
+        else:
+            self.best_estimator_.fit(X, y)
+        self.refit_seconds_ = time.perf_counter() - t
+        self.elapsed_ = time.perf_counter() - started
+
+        logger.info(f"{len(self.trials_)} trials ({int(self.trials_['reused'].sum())} reused) over "
+                    f"{self.trials_['trial'].nunique()} configs in {self.search_seconds_:.1f}s; "
+                    f"refit in {self.refit_seconds_:.1f}s")
+        return self